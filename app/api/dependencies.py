@@ -1,9 +1,12 @@
 import logging
-from fastapi import Depends, HTTPException, Security, status
+import re
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Response, Security, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from app.core.security import decode_access_token  # Import the function
 from app.db.session import get_db
+from app.db.sharding import use_shard
 from app.models.user import User  # Assuming User model includes roles
 from dotenv import load_dotenv
 from app.core.config import settings
@@ -12,7 +15,9 @@ logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def get_current_user(token: str = Security(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+_ETAG_VERSION = re.compile(r'^(?:W/)?"(\d+)"$')
+
+def get_current_user(token: str = Security(oauth2_scheme), db: Session = Depends(get_db, scope="function")) -> User:
     """Decode and verify JWT token, and extract user information."""
     payload = decode_access_token(token)
     logger.info(f"Token payload: {payload}")  # Log the token payload
@@ -23,11 +28,16 @@ def get_current_user(token: str = Security(oauth2_scheme), db: Session = Depends
         logger.error("Invalid token: missing email or role")
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = db.query(User).options(joinedload(User.role)).filter(User.email == email).first()
     if not user:
         logger.error(f"User not found: {email}")
         raise HTTPException(status_code=404, detail="User not found")
 
+    # Identify the principal so the session can keep its reads on the primary after it writes
+    db.info["principal"] = email
+    # Work on the shard of the user's hospital until a service routes elsewhere
+    use_shard(db, user.shard)
+
     return user
 
 def check_role(allowed_roles: list):
@@ -40,3 +50,20 @@ def check_role(allowed_roles: list):
             )
         return user
     return role_dependency
+
+def if_match_version(if_match: Optional[str] = Header(None)) -> Optional[int]:
+    """The entity version an update expects, from an `If-Match: "<version>"` header (the ETag of a GET).
+
+    No header, or `*`, means no check.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    match = _ETAG_VERSION.match(if_match.strip())
+    if not match:
+        raise HTTPException(status_code=400, detail='If-Match must be an ETag from this API, e.g. "3"')
+    return int(match.group(1))
+
+def set_etag(response: Response, entity):
+    """Expose a versioned entity's version as its ETag."""
+    if entity is not None:
+        response.headers["ETag"] = f'"{entity.version}"'
@@ -0,0 +1,142 @@
+"""Sparse fieldsets (`?fields=`) and relationship expansion (`?expand=`) for read endpoints.
+
+    GET /patients/?fields=id,first_name,last_name&expand=doctor
+
+`fields` narrows both the SELECT (load_only) and the response to the listed columns. `expand`
+embeds related entities, each relation loaded for the whole page by one SELECT ... WHERE id IN
+(selectinload); every other relationship raises instead of lazy-loading row by row. Without
+either parameter an endpoint returns its full response model as before.
+
+Embedded patients and medical records are PHI reads like any other: respond() records them in
+the access audit log (the route audits the entities it returns itself).
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Type
+
+from fastapi import Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, load_only, raiseload, selectinload
+
+from app.core.audit import audit_access
+from app.db.session import get_db
+
+# Audit resource type of the PHI-bearing tables a relation can embed
+AUDITED_TABLES = {"patients": "patient", "medical_records": "medical_record"}
+
+
+def _serialize(schema: Type[BaseModel], entity) -> dict:
+    return schema.model_validate(entity, from_attributes=True).model_dump()
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return list(dict.fromkeys(filter(None, (part.strip() for part in (value or "").split(",")))))
+
+
+class Fieldset:
+    """The columns and relations one request asked for, as loader options and a response shape."""
+
+    def __init__(self, model, schema: Type[BaseModel], fields: Optional[List[str]], expand: List[str],
+                 relations: Dict[str, Type[BaseModel]], always: Sequence[str] = (), db: Optional[Session] = None):
+        self.db = db
+        self.model = model
+        self.schema = schema
+        self.fields = fields
+        self.expand = expand
+        self.relations = relations
+        self.always = always
+
+    @property
+    def sparse(self) -> bool:
+        return self.fields is not None or bool(self.expand)
+
+    def options(self) -> list:
+        """Loader options for the query; none when the full response was asked for."""
+        if not self.sparse:
+            return []
+        mapper = inspect(self.model)
+        options = [raiseload("*")]
+        if self.fields is not None:
+            # The primary key, the columns the route itself reads (owner checks, audit, sort keys),
+            # the version (ETag) and the foreign keys of expanded many-to-one relations
+            keys = {"id", *self.fields, *self.always}
+            if mapper.version_id_col is not None:
+                keys.add(mapper.get_property_by_column(mapper.version_id_col).key)
+            for name in self.expand:
+                keys.update(mapper.get_property_by_column(column).key
+                            for column in mapper.relationships[name].local_columns)
+            options.append(load_only(*(getattr(self.model, key) for key in sorted(keys))))
+        options.extend(selectinload(getattr(self.model, name)) for name in self.expand)
+        return options
+
+    def dump(self, entity) -> dict:
+        if self.fields is None:
+            data = _serialize(self.schema, entity)
+        else:
+            data = {key: getattr(entity, key) for key in self.fields}
+        for name in self.expand:
+            related, schema = getattr(entity, name), self.relations[name]
+            if isinstance(related, list):
+                data[name] = [_serialize(schema, item) for item in related]
+            else:
+                data[name] = _serialize(schema, related) if related is not None else None
+        return data
+
+    def respond(self, content, response: Optional[Response] = None):
+        """`content` (an entity or a list of them) shaped to the request; unchanged when not sparse.
+
+        Headers already set on the route's `response` (the ETag) are carried over.
+        """
+        if not self.sparse:
+            return content
+        entities = content if isinstance(content, list) else [content]
+        self._audit_expanded(entities, action="list" if isinstance(content, list) else "view")
+        body = [self.dump(entity) for entity in content] if isinstance(content, list) else self.dump(content)
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"} if response else None
+        return JSONResponse(jsonable_encoder(body), headers=headers)
+
+    def _audit_expanded(self, entities: list, action: str):
+        if self.db is None:
+            return
+        relationships = inspect(self.model).relationships
+        for name in self.expand:
+            resource_type = AUDITED_TABLES.get(relationships[name].mapper.persist_selectable.name)
+            if resource_type is None:
+                continue
+            related = {}
+            for entity in entities:
+                value = getattr(entity, name)
+                for item in value if isinstance(value, list) else [value]:
+                    if item is not None:
+                        related[item.id] = item
+            audit_access(self.db, resource_type, related.values(), action=action)
+
+
+def fieldset(model, schema: Type[BaseModel], relations: Optional[Dict[str, Type[BaseModel]]] = None,
+             always: Iterable[str] = ()):
+    """A dependency reading `fields` and `expand` for `model`, whose full response is `schema`.
+
+    `relations` maps the expandable relationships to their response models; `always` lists the
+    columns the route reads besides the requested ones.
+    """
+    relations = relations or {}
+    always = tuple(always)
+    columns = inspect(model).column_attrs.keys()
+    allowed = [name for name in schema.model_fields if name in columns]
+
+    def dependency(
+        fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(allowed)}"),
+        expand: Optional[str] = Query(None, description=f"Comma-separated relations to embed: {', '.join(relations)}"),
+        db: Session = Depends(get_db, scope="function"),
+    ) -> Fieldset:
+        requested = _split(fields) if fields is not None else None
+        unknown = [name for name in requested or () if name not in allowed]
+        if unknown or requested == []:
+            raise HTTPException(status_code=422, detail=f"fields must name some of: {', '.join(allowed)}")
+        expanded = _split(expand)
+        if any(name not in relations for name in expanded):
+            raise HTTPException(status_code=422, detail=f"expand may only name: {', '.join(relations) or 'nothing'}")
+        return Fieldset(model, schema, requested, expanded, relations, always, db)
+
+    return dependency
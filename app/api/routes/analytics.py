@@ -0,0 +1,28 @@
+from datetime import date
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.api.dependencies import check_role
+from app.db.session import get_db
+from app.schemas.analytics import RollupPoint, RollupStatus
+from app.services.analytics_service import get_rollup_series, get_rollup_status
+
+router = APIRouter()
+
+@router.get("/status", response_model=list[RollupStatus], dependencies=[Depends(check_role(["admin"]))])
+def rollup_status(db: Session = Depends(get_db, scope="function")):
+    """How far each source table has been counted into the rollups."""
+    return get_rollup_status(db)
+
+@router.get("/{metric}", response_model=list[RollupPoint], dependencies=[Depends(check_role(["admin"]))])
+def rollup_series(
+    metric: Literal["visits", "diagnoses", "appointments", "prescriptions"],
+    grain: Literal["day", "week", "month"] = "week",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    dimension: Optional[str] = None,
+    top: Optional[int] = Query(None, ge=1, le=1000),
+    db: Session = Depends(get_db, scope="function")
+):
+    """A metric per period, e.g. visits per doctor per week or the top diagnoses per month (top=10)."""
+    return get_rollup_series(db, metric, grain, start, end, dimension, top)
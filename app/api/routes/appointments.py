@@ -1,37 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import SessionLocal, get_db
+from app.core.events import ADMIN_CHANNEL, doctor_channel, stream_events
 from app.schemas.appointment import AppointmentCreate, AppointmentUpdate, AppointmentResponse
-from app.services.appointment_service import create_appointment, get_appointments_by_patient, get_appointments_by_doctor, update_appointment_status
-from app.api.dependencies import get_current_user
+from app.services.appointment_service import create_appointment, create_appointments, get_appointments_by_patient, get_appointments_by_doctor, update_appointment_status
+from app.api.dependencies import get_current_user, if_match_version, set_etag
 from app.models.doctor import Doctor
 from app.models.user import User  
-from app.core.security import get_current_doctor
+from app.core.config import settings
+from app.core.security import create_stream_token, decode_stream_token, get_current_doctor
 
 router = APIRouter()
 
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+def _channel_for(token: str, db: Session) -> str:
+    """All appointments for admins, their own for doctors."""
+    doctor = get_current_doctor(token, db)
+    return ADMIN_CHANNEL if doctor is None else doctor_channel(doctor.id)
+
+def get_event_channel(stream_token: Optional[str] = None, token: Optional[str] = Depends(optional_oauth2_scheme),
+                      db: Session = Depends(get_db, scope="function")) -> str:
+    """Resolve which appointments a stream carries, from the bearer token or a ?stream_token=.
+
+    Browsers' EventSource cannot set headers: they first POST /appointments/events/token with
+    their bearer token and open the stream with the short-lived token it returns, so the access
+    token itself never appears in a URL.
+    """
+    if token:
+        return _channel_for(token, db)
+    if stream_token:
+        return decode_stream_token(stream_token)
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+@router.post("/events/token")
+def create_event_stream_token(token: Optional[str] = Depends(optional_oauth2_scheme),
+                              db: Session = Depends(get_db, scope="function")):
+    """A token opening this caller's appointment event stream for EVENTS_STREAM_TOKEN_SECONDS."""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return {
+        "stream_token": create_stream_token(_channel_for(token, db), settings.EVENTS_STREAM_TOKEN_SECONDS),
+        "expires_in": settings.EVENTS_STREAM_TOKEN_SECONDS,
+    }
+
 @router.post("/", response_model=AppointmentResponse)
-def book_appointment(appointment_data: AppointmentCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def book_appointment(appointment_data: AppointmentCreate, db: Session = Depends(get_db, scope="function"), current_user: User = Depends(get_current_user)):
     """Book an appointment."""
     # Ensure only patients can book appointments (you can add role checks if needed)
     if current_user.role != "patient":
         raise HTTPException(status_code=403, detail="Only patients can book appointments.")
     return create_appointment(db, appointment_data, current_user.id)
 
+@router.post("/batch", response_model=list[AppointmentResponse])
+def book_appointments(appointments: list[AppointmentCreate], db: Session = Depends(get_db, scope="function"), current_doctor: Doctor = Depends(get_current_doctor)):
+    """Schedule several appointments (e.g. a course of follow-ups) in one transaction; results follow input order."""
+    return create_appointments(db, appointments, doctor_id=current_doctor.id if current_doctor else None)
+
+@router.get("/events")
+async def appointment_events(channel: str = Depends(get_event_channel), last_event_id: Optional[int] = Header(None)):
+    """Server-Sent Events stream of appointment creations and status changes, replacing list polling.
+
+    Reconnecting clients send Last-Event-ID (EventSource does this automatically) to receive what
+    they missed. The database session is released before streaming, so idle streams hold no connection.
+    """
+    return StreamingResponse(
+        stream_events(channel, last_event_id, SessionLocal),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/patient/{patient_id}", response_model=list[AppointmentResponse])
-def get_patient_appointments(patient_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_patient_appointments(patient_id: int, db: Session = Depends(get_db, scope="function"), current_user: User = Depends(get_current_user)):
     """Retrieve appointments for a patient."""
     if current_user.role != "patient" or current_user.id != patient_id:
         raise HTTPException(status_code=403, detail="You do not have permission to view this resource.")
     return get_appointments_by_patient(db, patient_id)
 
 @router.get("/doctor", response_model=list[AppointmentResponse])
-def get_doctor_appointments(current_user: Doctor = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_doctor_appointments(current_user: Doctor = Depends(get_current_user), db: Session = Depends(get_db, scope="function")):
     """Retrieve appointments for the logged-in doctor."""
     return get_appointments_by_doctor(db, current_user.id)
 
 @router.put("/{appointment_id}", response_model=AppointmentResponse)
-def update_appointment(appointment_id: int, update_data: AppointmentUpdate, db: Session = Depends(get_db), current_user: Doctor = Depends(get_current_doctor)):
-    """Update appointment status."""
+def update_appointment(appointment_id: int, update_data: AppointmentUpdate, response: Response,
+                       expected_version: Optional[int] = Depends(if_match_version),
+                       db: Session = Depends(get_db, scope="function"), current_user: Doctor = Depends(get_current_doctor)):
+    """Update appointment status; with `If-Match: "<version>"`, 409 if it changed since that version."""
     # Ensure only the doctor associated with the appointment can update it
-    return update_appointment_status(db, appointment_id, update_data, current_user.id)
+    appointment = update_appointment_status(db, appointment_id, update_data, current_user.id, expected_version)
+    set_etag(response, appointment)
+    return appointment
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.api.dependencies import check_role
+from app.db.session import get_db
+from app.schemas.assignment import AssignmentRequest, AssignmentResponse, DoctorLoadResponse, RebalanceRequest
+from app.services.assignment_service import assign_patient, get_load_index, rebalance_unassigned
+
+router = APIRouter()
+
+@router.post("/patients/{patient_id}", response_model=AssignmentResponse,
+             dependencies=[Depends(check_role(["admin", "doctor"]))])
+def assign(patient_id: int, criteria: AssignmentRequest = AssignmentRequest(), reassign: bool = False,
+           db: Session = Depends(get_db, scope="function")):
+    """Assign a patient to the least-loaded active doctor with the requested specialty and hospital."""
+    return assign_patient(db, patient_id, criteria.specialty, criteria.hospital, reassign=reassign)
+
+@router.post("/rebalance", response_model=list[AssignmentResponse], dependencies=[Depends(check_role(["admin"]))])
+def rebalance(criteria: RebalanceRequest = RebalanceRequest(), db: Session = Depends(get_db, scope="function")):
+    """Assign all unassigned patients, spreading them over the least-loaded doctors."""
+    return rebalance_unassigned(db, criteria.specialty, criteria.hospital, limit=criteria.limit)
+
+@router.get("/load", response_model=list[DoctorLoadResponse], dependencies=[Depends(check_role(["admin"]))])
+def doctor_load(db: Session = Depends(get_db, scope="function")):
+    """Current load of every active doctor, least loaded first."""
+    return get_load_index(db).snapshot()
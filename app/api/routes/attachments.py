@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.db.session import get_db
+from app.models import Doctor, Patient, User
+from app.schemas.attachment import AttachmentResponse
+from app.services.attachment_service import (
+    receive_upload, create_attachment, get_attachments, get_attachment, delete_attachment
+)
+from app.services.medical_record_service import get_medical_record_by_id
+from app.core.audit import audit_access
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.core.storage import get_storage
+
+router = APIRouter()
+
+def _check_record_access(db: Session, record_id: int, user: User):
+    """404 for unknown records; patients only reach their own records."""
+    patient = None
+    if user.role.name == "patient":  # user ids and patient ids are different id spaces
+        patient = db.query(Patient.id).filter(Patient.user_id == user.id).first()
+        if not patient:
+            raise HTTPException(status_code=403, detail="Not authorized to access this record")
+    record = get_medical_record_by_id(db, record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Medical record not found")
+    if patient is not None and record.patient_id != patient.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this record")
+    return record
+
+@router.post("/{record_id}/attachments", response_model=AttachmentResponse)
+async def upload_attachment(
+    record_id: int,
+    request: Request,
+    db: Session = Depends(get_db, scope="function"),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload a file (multipart form field `file`) to a medical record; streamed straight to storage."""
+    await run_in_threadpool(_check_record_access, db, record_id, current_user)
+    blob = await receive_upload(request, get_storage(), settings.ATTACHMENT_MAX_BYTES)
+    return await run_in_threadpool(create_attachment, db, record_id, blob, current_user.id)
+
+@router.get("/{record_id}/attachments", response_model=list[AttachmentResponse])
+def list_attachments(
+    record_id: int,
+    db: Session = Depends(get_db, scope="function"),
+    current_user: User = Depends(get_current_user)
+):
+    """List the attachments of a medical record."""
+    _check_record_access(db, record_id, current_user)
+    return get_attachments(db, record_id)
+
+@router.get("/{record_id}/attachments/{attachment_id}")
+def download_attachment(
+    record_id: int,
+    attachment_id: int,
+    db: Session = Depends(get_db, scope="function"),
+    current_user: User = Depends(get_current_user)
+):
+    """Download an attachment; supports Range requests for resumable and partial downloads."""
+    record = _check_record_access(db, record_id, current_user)
+    attachment = get_attachment(db, record_id, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    audit_access(db, "attachment", [attachment], patient_id=record.patient_id)
+
+    storage = get_storage()
+    path = storage.local_path(attachment.sha256)
+    if path:
+        # FileResponse answers Range requests and hands the file to the server via the
+        # http.response.pathsend extension (zero-copy) when the server supports it
+        return FileResponse(path, media_type=attachment.content_type, filename=attachment.filename)
+    return StreamingResponse(storage.open(attachment.sha256), media_type=attachment.content_type,
+                             headers={"Content-Disposition": f'attachment; filename="{attachment.filename}"'})
+
+@router.delete("/{record_id}/attachments/{attachment_id}")
+def remove_attachment(
+    record_id: int,
+    attachment_id: int,
+    db: Session = Depends(get_db, scope="function"),
+    current_user: User = Depends(get_current_user)
+):
+    """Delete an attachment."""
+    record = _check_record_access(db, record_id, current_user)
+    if current_user.role.name == "doctor":
+        doctor = db.query(Doctor.id).filter(Doctor.email == current_user.email).first()
+        if not doctor or record.doctor_id != doctor.id:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this attachment")
+    attachment = get_attachment(db, record_id, attachment_id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    delete_attachment(db, attachment, get_storage())
+    return {"message": "Attachment deleted successfully"}
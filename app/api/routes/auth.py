@@ -25,7 +25,7 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")  # Define this
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+def register(user: UserCreate, db: Session = Depends(get_db, scope="function")):
     """Register a new user."""
     logger.info("Registering a new user")
     if user.role not in UserRole.__members__.values():
@@ -51,7 +51,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     )
 
 @router.post("/token", response_model=Token)
-def token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db, scope="function")):
     """Authenticate user or doctor and return a JWT token."""
     logger.info("Attempting to authenticate and generate a token")
     login_data = UserLogin(email=form_data.username, password=form_data.password)
@@ -68,7 +68,7 @@ def token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     raise HTTPException(status_code=401, detail="Invalid email or password")
 
 @router.delete("/delete/{email}")
-def delete_user(email: str, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def delete_user(email: str, db: Session = Depends(get_db, scope="function"), token: str = Depends(oauth2_scheme)):
     """Delete a user or doctor by email."""
     logger.info(f"Attempting to delete user or doctor with email: {email}")
 
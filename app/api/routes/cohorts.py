@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.api.dependencies import check_role
+from app.db.session import get_db
+from app.schemas.cohort import CohortQuery, CohortResponse
+from app.services.cohort_service import get_cohort_index, query_cohort
+
+router = APIRouter()
+
+@router.post("/query", response_model=CohortResponse, dependencies=[Depends(check_role(["admin", "doctor"]))])
+def cohort_query(query: CohortQuery, db: Session = Depends(get_db, scope="function")):
+    """Count the patients matching a cohort expression and page through their ids."""
+    return query_cohort(db, query.expression, count_only=query.count_only, after=query.after, limit=query.limit)
+
+@router.get("/index", dependencies=[Depends(check_role(["admin"]))])
+def cohort_index_stats(db: Session = Depends(get_db, scope="function")):
+    """Size and freshness of the cohort bitmap index."""
+    return get_cohort_index(db).snapshot()
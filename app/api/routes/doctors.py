@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.schemas.doctor import DoctorCreate, DoctorUpdate, DoctorResponse
@@ -6,6 +7,10 @@ from app.services.doctor_service import (
     create_doctor, get_doctors, get_doctor_by_id, update_doctor, delete_doctor
 )
 from app.core.security import get_current_user
+from app.api.dependencies import if_match_version, set_etag
+from app.api.fieldsets import Fieldset, fieldset
+from app.models.doctor import Doctor
+from app.schemas.patient import PatientResponse
 from app.core.permissions import has_permission
 from app.schemas.user import UserSchema as User
 import logging
@@ -13,10 +18,12 @@ import logging
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+doctor_fields = fieldset(Doctor, DoctorResponse, relations={"patients": PatientResponse}, always=["user_id"])
+
 @router.post("/", response_model=DoctorResponse, status_code=status.HTTP_201_CREATED)
 def add_doctor(
     doctor: DoctorCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
     """Add a new doctor to the system. Only admins can create doctors."""
@@ -29,22 +36,25 @@ def add_doctor(
 
 @router.get("/", response_model=list[DoctorResponse])
 def list_doctors(
-    db: Session = Depends(get_db), 
+    view: Fieldset = Depends(doctor_fields),
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
     """Retrieve all doctors (admin or doctor only)."""
     if not has_permission(current_user.role.name, "view_all_doctors"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied")
-    return get_doctors(db)
+    return view.respond(get_doctors(db, view.options()))
 
 @router.get("/{doctor_id}", response_model=DoctorResponse)
 def get_doctor(
     doctor_id: int, 
-    db: Session = Depends(get_db), 
+    response: Response,
+    view: Fieldset = Depends(doctor_fields),
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
     """Retrieve a doctor by ID. Doctors can view only their own profile unless they are admin."""
-    doctor = get_doctor_by_id(db, doctor_id)
+    doctor = get_doctor_by_id(db, doctor_id, view.options())
     if not doctor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
     
@@ -52,16 +62,22 @@ def get_doctor(
     if current_user.role.name != "admin" and current_user.id != doctor.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied")
     
-    return doctor
+    set_etag(response, doctor)
+    return view.respond(doctor, response)
 
 @router.put("/{doctor_id}", response_model=DoctorResponse)
 def modify_doctor(
     doctor_id: int, 
     doctor: DoctorUpdate, 
-    db: Session = Depends(get_db), 
+    response: Response,
+    expected_version: Optional[int] = Depends(if_match_version),
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
-    """Update doctor details. Admins can update any doctor, while doctors can only update their own profile."""
+    """Update doctor details. Admins can update any doctor, while doctors can only update their own profile.
+
+    With `If-Match: "<version>"` the update is refused (409) if the doctor changed since that version.
+    """
     doctor_record = get_doctor_by_id(db, doctor_id)
     if not doctor_record:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
@@ -70,12 +86,14 @@ def modify_doctor(
     if current_user.role.name != "admin" and current_user.id != doctor_record.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied")
     
-    return update_doctor(db, doctor_id, doctor)
+    updated = update_doctor(db, doctor_id, doctor, expected_version)
+    set_etag(response, updated)
+    return updated
 
 @router.delete("/{doctor_id}")
 def remove_doctor(
     doctor_id: int, 
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
     """Delete a doctor. Only admins can delete, and doctors cannot delete themselves."""
@@ -1,67 +1,151 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.models import User
-from app.schemas.medical_record import MedicalRecordCreate, MedicalRecordResponse, MedicalRecordUpdate
+from app.models import Doctor, MedicalRecord, Patient, User
+from app.schemas.medical_record import (
+    MedicalRecordCreate, MedicalRecordResponse, MedicalRecordSearchPage, MedicalRecordUpdate
+)
 from app.services.medical_record_service import (
-    create_medical_record, get_medical_record_by_id, get_all_medical_records, update_medical_record, delete_medical_record
+    create_medical_record, create_medical_records, get_medical_record_by_id, get_all_medical_records, update_medical_record, delete_medical_record
 )
 from app.core.security import get_current_doctor, get_current_user  # Importing authentication functions
+from app.api.dependencies import if_match_version, set_etag
+from app.api.fieldsets import Fieldset, fieldset
+from app.schemas.doctor import DoctorResponse
+from app.schemas.patient import PatientResponse
+from app.services.search_service import SearchScope, search_medical_records
+from app.core.audit import audit_access
 
 router = APIRouter()
 
+# patient_id and doctor_id for the access checks and the audit log, visit_date to merge shard pages
+record_fields = fieldset(MedicalRecord, MedicalRecordResponse,
+                         relations={"patient": PatientResponse, "doctor": DoctorResponse},
+                         always=["patient_id", "doctor_id", "visit_date"])
+
 @router.post("/", response_model=MedicalRecordResponse)
 def add_medical_record(
     record_data: MedicalRecordCreate, 
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
     """Add a new medical record."""
     # Ensure that the current user has permission (e.g., doctors can add records)
-    if current_user.role != "doctor":
+    if current_user.role.name != "doctor":
         raise HTTPException(status_code=403, detail="Not authorized to add medical records")
     
     return create_medical_record(db, record_data)
 
+@router.post("/batch", response_model=list[MedicalRecordResponse])
+def add_medical_records(
+    records: list[MedicalRecordCreate],
+    db: Session = Depends(get_db, scope="function"),
+    current_doctor: Doctor = Depends(get_current_doctor)
+):
+    """Add several medical records in one transaction; results follow input order."""
+    if current_doctor is None:
+        raise HTTPException(status_code=403, detail="Not authorized to add medical records")
+
+    return create_medical_records(db, records, doctor_id=current_doctor.id)
+
+@router.get("/search", response_model=MedicalRecordSearchPage)
+def search_records(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db, scope="function"),
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over diagnosis, treatment, medicines and notes, best matches first.
+
+    Accepts web-search syntax ("quoted phrases", OR, -excluded). Doctors search the records
+    they wrote and those of their assigned patients; patients search their own.
+    """
+    role = current_user.role.name
+    if role == "doctor":
+        doctor = db.query(Doctor.id).filter(Doctor.email == current_user.email).first()
+        if not doctor:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        scope = SearchScope(doctor_id=doctor.id)
+    elif role == "patient":
+        patient = db.query(Patient.id).filter(Patient.user_id == current_user.id).first()
+        if not patient:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        scope = SearchScope(patient_id=patient.id)
+    elif role == "admin":
+        scope = SearchScope()
+    else:
+        raise HTTPException(status_code=403, detail="Not authorized to search medical records")
+
+    page = search_medical_records(db, q, scope, cursor, limit)
+    audit_access(db, "medical_record", [hit["record"] for hit in page["results"]], action="search")
+    return page
+
+def _own_patient_id(db: Session, user: User) -> int:
+    """The Patient id of a signed-in patient user (records are keyed by Patient, not User, ids)."""
+    patient = db.query(Patient.id).filter(Patient.user_id == user.id).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return patient.id
+
 @router.get("/{record_id}", response_model=MedicalRecordResponse)
 def fetch_medical_record(
     record_id: int, 
-    db: Session = Depends(get_db),
+    response: Response,
+    view: Fieldset = Depends(record_fields),
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
     """Get details of a specific medical record."""
-    record = get_medical_record_by_id(db, record_id)
+    # Patients may only fetch their own records; doctors and admins any record
+    own_patient_id = _own_patient_id(db, current_user) if current_user.role.name == "patient" else None
+    record = get_medical_record_by_id(db, record_id, view.options())
     if not record:
         raise HTTPException(status_code=404, detail="Medical record not found")
-    
-    # Optional: Add logic to allow patient to fetch their own records or a doctor to fetch any record
-    if current_user.role == "patient" and record.patient_id != current_user.id:
+    if own_patient_id is not None and record.patient_id != own_patient_id:
         raise HTTPException(status_code=403, detail="Not authorized to view this record")
     
-    return record
+    audit_access(db, "medical_record", [record])
+    set_etag(response, record)
+    return view.respond(record, response)
 
 @router.get("/", response_model=list[MedicalRecordResponse])
 def list_medical_records(
     skip: int = 0, 
     limit: int = 10, 
-    db: Session = Depends(get_db),
+    visit_from: Optional[date] = None,
+    visit_to: Optional[date] = None,
+    view: Fieldset = Depends(record_fields),
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
-    """Retrieve a list of medical records."""
+    """Retrieve a list of medical records, optionally limited to a visit date range.
+
+    `fields` limits the columns returned, `expand=patient,doctor` embeds the related entities.
+    """
     # Allow doctor to list all records, but patients can only view their own records
-    if current_user.role == "patient":
-        return get_all_medical_records(db, skip, limit, patient_id=current_user.id)
+    if current_user.role.name == "patient":
+        records = get_all_medical_records(db, skip, limit, patient_id=_own_patient_id(db, current_user),
+                                          visit_from=visit_from, visit_to=visit_to, options=view.options())
+    else:
+        records = get_all_medical_records(db, skip, limit, visit_from=visit_from, visit_to=visit_to,
+                                          options=view.options())
     
-    return get_all_medical_records(db, skip, limit)
+    audit_access(db, "medical_record", records, action="list")
+    return view.respond(records)
 
 @router.put("/{record_id}", response_model=MedicalRecordResponse)
 def modify_medical_record(
     record_id: int, 
     record_data: MedicalRecordUpdate, 
-    db: Session = Depends(get_db),
+    response: Response,
+    expected_version: Optional[int] = Depends(if_match_version),
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
-    """Update medical record details."""
+    """Update medical record details; with `If-Match: "<version>"`, 409 if it changed since that version."""
     record = get_medical_record_by_id(db, record_id)
     
     if not record:
@@ -74,12 +158,14 @@ def modify_medical_record(
     if current_user.role == "patient" and record.patient_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this record")
     
-    return update_medical_record(db, record_id, record_data)
+    updated = update_medical_record(db, record_id, record_data, expected_version)
+    set_etag(response, updated)
+    return updated
 
 @router.delete("/{record_id}")
 def remove_medical_record(
     record_id: int, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
     """Delete a medical record."""
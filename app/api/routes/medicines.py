@@ -11,13 +11,13 @@ from app.models import User  # Assuming User model exists
 router = APIRouter(tags=["Medicines"])
 
 @router.post("/", response_model=MedicineResponse)
-def add_medicine(medicine_data: MedicineCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def add_medicine(medicine_data: MedicineCreate, db: Session = Depends(get_db, scope="function"), current_user: User = Depends(get_current_user)):
     """Add a new medicine."""
     # You can now use current_user for authorization logic if needed
     return create_medicine(db, medicine_data)
 
 @router.get("/{medicine_id}", response_model=MedicineResponse)
-def fetch_medicine(medicine_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def fetch_medicine(medicine_id: int, db: Session = Depends(get_db, scope="function"), current_user: User = Depends(get_current_user)):
     """Get details of a specific medicine."""
     medicine = get_medicine_by_id(db, medicine_id)
     if not medicine:
@@ -25,12 +25,12 @@ def fetch_medicine(medicine_id: int, db: Session = Depends(get_db), current_user
     return medicine
 
 @router.get("/", response_model=list[MedicineResponse])
-def list_medicines(skip: int = 0, limit: int = 10, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def list_medicines(skip: int = 0, limit: int = 10, db: Session = Depends(get_db, scope="function"), current_user: User = Depends(get_current_user)):
     """Retrieve a list of medicines."""
     return get_all_medicines(db, skip, limit)
 
 @router.put("/{medicine_id}", response_model=MedicineResponse)
-def modify_medicine(medicine_id: int, medicine_data: MedicineUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def modify_medicine(medicine_id: int, medicine_data: MedicineUpdate, db: Session = Depends(get_db, scope="function"), current_user: User = Depends(get_current_user)):
     """Update medicine details."""
     updated_medicine = update_medicine(db, medicine_id, medicine_data)
     if not updated_medicine:
@@ -38,7 +38,7 @@ def modify_medicine(medicine_id: int, medicine_data: MedicineUpdate, db: Session
     return updated_medicine
 
 @router.delete("/{medicine_id}")
-def remove_medicine(medicine_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def remove_medicine(medicine_id: int, db: Session = Depends(get_db, scope="function"), current_user: User = Depends(get_current_user)):
     """Delete a medicine."""
     deleted_medicine = delete_medicine(db, medicine_id)
     if not deleted_medicine:
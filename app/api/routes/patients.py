@@ -1,23 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.schemas.patient import PatientCreate, PatientUpdate, PatientResponse
 from app.services.patient_service import (
-    create_patient, get_patients, get_patient_by_id, update_patient, delete_patient
+    create_patient, get_patients, get_patient_by_id, find_patient_by_contact, update_patient, delete_patient
 )
 from app.core.security import get_current_user
+from app.api.dependencies import if_match_version, set_etag
+from app.api.fieldsets import Fieldset, fieldset
+from app.models.patient import Patient
+from app.schemas.doctor import DoctorResponse
 from app.schemas.user import UserSchema as User
 from app.core.permissions import has_permission
+from app.core.audit import audit_access
 import logging
 
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+patient_fields = fieldset(Patient, PatientResponse, relations={"doctor": DoctorResponse}, always=["user_id"])
+
 @router.post("/", response_model=PatientResponse)
 def add_patient(
     patient: PatientCreate, 
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
     """Create a new patient. Only doctors and admins can add a patient."""
@@ -29,22 +37,44 @@ def add_patient(
 
 @router.get("/", response_model=list[PatientResponse])
 def list_patients(
-    db: Session = Depends(get_db), 
+    view: Fieldset = Depends(patient_fields),
+    db: Session = Depends(get_db, scope="function"), 
+    current_user: User = Depends(get_current_user)
+):
+    """Retrieve all patients. Only doctors and admins can access this.
+
+    `fields` limits the columns returned, `expand=doctor` embeds each patient's doctor.
+    """
+    if not has_permission(current_user.role.name, "view_all_patients"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied")
+    patients = get_patients(db, view.options())
+    audit_access(db, "patient", patients, action="list")
+    return view.respond(patients)
+
+@router.get("/lookup", response_model=PatientResponse)
+def lookup_patient(
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
-    """Retrieve all patients. Only doctors and admins can access this."""
+    """Find a patient by phone number or email. Only doctors and admins can look patients up."""
     if not has_permission(current_user.role.name, "view_all_patients"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied")
-    return get_patients(db)
+    patient = find_patient_by_contact(db, phone=phone, email=email)
+    audit_access(db, "patient", [patient], action="lookup")
+    return patient
 
 @router.get("/{patient_id}", response_model=PatientResponse)
 def get_patient(
     patient_id: int, 
-    db: Session = Depends(get_db), 
+    response: Response,
+    view: Fieldset = Depends(patient_fields),
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
     """Retrieve a patient by ID. Patients can view only their records, doctors can view all."""
-    patient = get_patient_by_id(db, patient_id)
+    patient = get_patient_by_id(db, patient_id, view.options())
     if not patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
     
@@ -52,16 +82,23 @@ def get_patient(
     if current_user.role.name == "patient" and current_user.id != patient.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
     
-    return patient
+    audit_access(db, "patient", [patient])
+    set_etag(response, patient)
+    return view.respond(patient, response)
 
 @router.put("/{patient_id}", response_model=PatientResponse)
 def modify_patient(
     patient_id: int, 
     patient: PatientUpdate, 
-    db: Session = Depends(get_db), 
+    response: Response,
+    expected_version: Optional[int] = Depends(if_match_version),
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
-    """Update patient details. Only doctors or the patient themselves can update."""
+    """Update patient details. Only doctors or the patient themselves can update.
+
+    With `If-Match: "<version>"` the update is refused (409) if the patient changed since that version.
+    """
     if not has_permission(current_user.role.name, "edit_patient"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied")
     
@@ -73,12 +110,14 @@ def modify_patient(
     if current_user.role.name == "patient" and current_user.id != patient_record.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    return update_patient(db, patient_id, patient)
+    updated = update_patient(db, patient_id, patient, expected_version)
+    set_etag(response, updated)
+    return updated
 
 @router.delete("/{patient_id}")
 def remove_patient(
     patient_id: int, 
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_db, scope="function"), 
     current_user: User = Depends(get_current_user)
 ):
     """Delete a patient. Only admins can delete."""
@@ -1,25 +1,57 @@
+from datetime import date
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models import User
 from app.schemas.prescription import PrescriptionCreate, PrescriptionResponse, PrescriptionUpdate
 from app.services.prescription_service import (
-    create_prescription, get_prescription_by_id, get_all_prescriptions, update_prescription, delete_prescription
+    create_prescription, create_prescriptions, get_prescription_by_id, get_all_prescriptions, update_prescription, delete_prescription,
+    get_active_prescriptions_for_patient, get_active_prescriptions_for_medicine
 )
 from app.core.security import get_current_doctor  # Import the dependency for authentication
+from app.core.audit import audit_access
 
 router = APIRouter(prefix="/prescriptions", tags=["Prescriptions"])
 
 @router.post("/", response_model=PrescriptionResponse)
-def add_prescription(prescription_data: PrescriptionCreate, db: Session = Depends(get_db), current_doctor: User = Depends(get_current_doctor)):
-    """Add a new prescription."""
+def add_prescription(prescription_data: PrescriptionCreate, acknowledge_alerts: bool = False, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
+    """Add a new prescription; interactions with the patient's active drugs come back as safety_alerts.
+
+    Major interactions are rejected with 409 unless acknowledge_alerts=true.
+    """
     # Ensure the current user is a doctor
     if not current_doctor:
         raise HTTPException(status_code=403, detail="Only doctors can create prescriptions")
-    return create_prescription(db, prescription_data)
+    return create_prescription(db, prescription_data, acknowledge_alerts=acknowledge_alerts)
+
+@router.post("/batch", response_model=list[PrescriptionResponse])
+def add_prescriptions(prescriptions: list[PrescriptionCreate], acknowledge_alerts: bool = False, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
+    """Add several prescriptions (e.g. a multi-drug regimen) in one transaction; results follow input order."""
+    return create_prescriptions(
+        db, prescriptions, doctor_id=current_doctor.id if current_doctor else None, acknowledge_alerts=acknowledge_alerts
+    )
+
+@router.get("/active/patient/{patient_id}", response_model=list[PrescriptionResponse])
+def list_active_for_patient(patient_id: int, on: Optional[date] = None, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
+    """Medication the patient is on as of `on` (default today)."""
+    if not current_doctor:
+        raise HTTPException(status_code=403, detail="Only doctors can list prescriptions")
+    prescriptions = get_active_prescriptions_for_patient(db, patient_id, on)
+    audit_access(db, "prescription", prescriptions, action="list", patient_id=patient_id)
+    return prescriptions
+
+@router.get("/active/medicine", response_model=list[PrescriptionResponse])
+def list_active_for_medicine(name: str, on: Optional[date] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
+    """Active prescriptions of a medicine as of `on`: which patients are on it."""
+    if not current_doctor:
+        raise HTTPException(status_code=403, detail="Only doctors can list prescriptions")
+    prescriptions = get_active_prescriptions_for_medicine(db, name, on, skip, min(limit, 1000))
+    audit_access(db, "prescription", prescriptions, action="list")
+    return prescriptions
 
 @router.get("/{prescription_id}", response_model=PrescriptionResponse)
-def fetch_prescription(prescription_id: int, db: Session = Depends(get_db), current_doctor: User = Depends(get_current_doctor)):
+def fetch_prescription(prescription_id: int, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
     """Get details of a specific prescription."""
     # Ensure the current user is a doctor
     if not current_doctor:
@@ -27,18 +59,21 @@ def fetch_prescription(prescription_id: int, db: Session = Depends(get_db), curr
     prescription = get_prescription_by_id(db, prescription_id)
     if not prescription:
         raise HTTPException(status_code=404, detail="Prescription not found")
+    audit_access(db, "prescription", [prescription])
     return prescription
 
 @router.get("/", response_model=list[PrescriptionResponse])
-def list_prescriptions(skip: int = 0, limit: int = 10, db: Session = Depends(get_db), current_doctor: User = Depends(get_current_doctor)):
+def list_prescriptions(skip: int = 0, limit: int = 10, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
     """Retrieve a list of prescriptions."""
     # Ensure the current user is a doctor
     if not current_doctor:
         raise HTTPException(status_code=403, detail="Only doctors can list prescriptions")
-    return get_all_prescriptions(db, skip, limit)
+    prescriptions = get_all_prescriptions(db, skip, limit)
+    audit_access(db, "prescription", prescriptions, action="list")
+    return prescriptions
 
 @router.put("/{prescription_id}", response_model=PrescriptionResponse)
-def modify_prescription(prescription_id: int, prescription_data: PrescriptionUpdate, db: Session = Depends(get_db), current_doctor: User = Depends(get_current_doctor)):
+def modify_prescription(prescription_id: int, prescription_data: PrescriptionUpdate, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
     """Update prescription details."""
     # Ensure the current user is a doctor
     if not current_doctor:
@@ -49,7 +84,7 @@ def modify_prescription(prescription_id: int, prescription_data: PrescriptionUpd
     return updated_prescription
 
 @router.delete("/{prescription_id}")
-def remove_prescription(prescription_id: int, db: Session = Depends(get_db), current_doctor: User = Depends(get_current_doctor)):
+def remove_prescription(prescription_id: int, db: Session = Depends(get_db, scope="function"), current_doctor: User = Depends(get_current_doctor)):
     """Delete a prescription."""
     # Ensure the current user is a doctor
     if not current_doctor:
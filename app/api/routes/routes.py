@@ -1,75 +1,115 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.api.dependencies import check_role, get_current_user
+from app.core.audit import audit_access
 from app.db.session import get_db
-from app.models import Appointment, MedicalRecord, Prescription, User, Doctor, Medicine
+from app.db.routing import read_only
+from app.db.sharding import scatter_gather
+from app.models import Appointment, MedicalRecord, Prescription, User, Doctor, Medicine, Job
 
 router = APIRouter()
 
 # ✅ Admin - Full access
 @router.get("/users", dependencies=[Depends(check_role(["admin"]))])
-def get_all_users(db: Session = Depends(get_db)):
+@read_only
+def get_all_users(db: Session = Depends(get_db, scope="function")):
     return db.query(User).all()
 
 @router.get("/doctors", dependencies=[Depends(check_role(["admin"]))])
-def get_all_doctors(db: Session = Depends(get_db)):
-    return db.query(Doctor).all()
+@read_only
+def get_all_doctors(db: Session = Depends(get_db, scope="function")):
+    return scatter_gather(db, lambda session: session.query(Doctor).order_by(Doctor.id), key=lambda d: d.id)
 
 @router.get("/patients", dependencies=[Depends(check_role(["admin"]))])
-def get_all_patients(db: Session = Depends(get_db)):
+@read_only
+def get_all_patients(db: Session = Depends(get_db, scope="function")):
     return db.query(User).filter(User.role == "patient").all()
 
 @router.get("/medicines", dependencies=[Depends(check_role(["admin", "doctor"]))])
-def get_all_medicines(db: Session = Depends(get_db)):
+@read_only
+def get_all_medicines(db: Session = Depends(get_db, scope="function")):
     return db.query(Medicine).all()
 
 @router.get("/prescriptions", dependencies=[Depends(check_role(["admin"]))])
-def get_all_prescriptions(db: Session = Depends(get_db)):
-    return db.query(Prescription).all()
+@read_only
+def get_all_prescriptions(db: Session = Depends(get_db, scope="function")):
+    prescriptions = scatter_gather(db, lambda session: session.query(Prescription).order_by(Prescription.id),
+                                   key=lambda p: p.id)
+    audit_access(db, "prescription", prescriptions, action="list")
+    return prescriptions
 
 @router.get("/medical_records", dependencies=[Depends(check_role(["admin"]))])
-def get_all_medical_records(db: Session = Depends(get_db)):
-    return db.query(MedicalRecord).all()
+@read_only
+def get_all_medical_records(db: Session = Depends(get_db, scope="function")):
+    records = scatter_gather(db, lambda session: session.query(MedicalRecord).order_by(MedicalRecord.id),
+                             key=lambda r: r.id)
+    audit_access(db, "medical_record", records, action="list")
+    return records
 
 @router.get("/appointments", dependencies=[Depends(check_role(["admin"]))])
-def get_all_appointments(db: Session = Depends(get_db)):
-    return db.query(Appointment).all()
+@read_only
+def get_all_appointments(db: Session = Depends(get_db, scope="function")):
+    appointments = scatter_gather(db, lambda session: session.query(Appointment).order_by(Appointment.id),
+                                  key=lambda a: a.id)
+    audit_access(db, "appointment", appointments, action="list")
+    return appointments
 
 # ✅ Doctor - Limited access
 @router.get("/appointments/doctor", dependencies=[Depends(check_role(["doctor"]))])
-def get_doctor_appointments(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Appointment).filter(Appointment.doctor_id == user.id).all()
+@read_only
+def get_doctor_appointments(user: User = Depends(get_current_user), db: Session = Depends(get_db, scope="function")):
+    appointments = db.query(Appointment).filter(Appointment.doctor_id == user.id).all()
+    audit_access(db, "appointment", appointments, action="list")
+    return appointments
 
 @router.get("/medical_records/doctor", dependencies=[Depends(check_role(["doctor"]))])
-def get_medical_records_for_doctor(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(MedicalRecord).filter(MedicalRecord.doctor_id == user.id).all()
+@read_only
+def get_medical_records_for_doctor(user: User = Depends(get_current_user), db: Session = Depends(get_db, scope="function")):
+    records = db.query(MedicalRecord).filter(MedicalRecord.doctor_id == user.id).all()
+    audit_access(db, "medical_record", records, action="list")
+    return records
 
 @router.get("/prescriptions/doctor", dependencies=[Depends(check_role(["doctor"]))])
-def get_prescriptions_for_doctor(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Prescription).filter(Prescription.doctor_id == user.id).all()
+@read_only
+def get_prescriptions_for_doctor(user: User = Depends(get_current_user), db: Session = Depends(get_db, scope="function")):
+    prescriptions = db.query(Prescription).filter(Prescription.doctor_id == user.id).all()
+    audit_access(db, "prescription", prescriptions, action="list")
+    return prescriptions
 
 # ✅ Patient - Limited access
 @router.get("/medical_records", dependencies=[Depends(check_role(["patient"]))])
-def get_patient_medical_records(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(MedicalRecord).filter(MedicalRecord.patient_id == user.id).all()
+@read_only
+def get_patient_medical_records(user: User = Depends(get_current_user), db: Session = Depends(get_db, scope="function")):
+    records = db.query(MedicalRecord).filter(MedicalRecord.patient_id == user.id).all()
+    audit_access(db, "medical_record", records, action="list")
+    return records
 
 @router.post("/prescriptions", dependencies=[Depends(check_role(["patient"]))])
-def post_prescription(user: User = Depends(get_current_user), db: Session = Depends(get_db), medicine: str = "", dosage: str = ""):
+def post_prescription(user: User = Depends(get_current_user), db: Session = Depends(get_db, scope="function"), medicine: str = "", dosage: str = ""):
     prescription = Prescription(patient_id=user.id, doctor_id=None, medicine=medicine, dosage=dosage)
     db.add(prescription)
-    db.commit()
+    db.flush()
     return {"message": "Prescription added"}
 
 @router.post("/appointments", dependencies=[Depends(check_role(["patient"]))])
-def book_appointment(user: User = Depends(get_current_user), db: Session = Depends(get_db), doctor_id: int = 0, date: str = "", time: str = ""):
+def book_appointment(user: User = Depends(get_current_user), db: Session = Depends(get_db, scope="function"), doctor_id: int = 0, date: str = "", time: str = ""):
     appointment = Appointment(patient_id=user.id, doctor_id=doctor_id, date=date, time=time)
     db.add(appointment)
-    db.commit()
+    db.flush()
     return {"message": "Appointment booked"}
 
 @router.post("/patients", dependencies=[Depends(check_role(["patient"]))])
-def post_patient(user: User = Depends(get_current_user), db: Session = Depends(get_db), name: str = "", age: int = 0, gender: str = ""):
+def post_patient(user: User = Depends(get_current_user), db: Session = Depends(get_db, scope="function"), name: str = "", age: int = 0, gender: str = ""):
     new_patient = User(name=name, age=age, gender=gender, role="patient")
     db.add(new_patient)
-    db.commit()
+    db.flush()
     return {"message": "Patient profile created"}
+
+# ✅ Admin - Background job throughput and queue depth
+@router.get("/jobs/metrics", dependencies=[Depends(check_role(["admin"]))])
+@read_only
+def get_job_metrics(db: Session = Depends(get_db, scope="function")):
+    from app.jobs import get_job_runner
+    queue_depth = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    return {**get_job_runner().metrics.snapshot(), "queue": queue_depth}
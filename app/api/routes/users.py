@@ -11,7 +11,7 @@ router = APIRouter()
 
 @router.get("/users", response_model=List[dict])
 def get_all_users(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
     """Get all users with their role information. Only admins can access this."""
@@ -44,7 +44,7 @@ def get_all_users(
 @router.get("/users/{user_id}", response_model=dict)
 def get_user_by_id(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db, scope="function"),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific user by ID with role information."""
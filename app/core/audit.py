@@ -0,0 +1,299 @@
+"""Write-behind audit log of PHI access.
+
+Read routes call audit_access(); events go into a bounded in-memory queue and a background thread
+writes them to `audit_log` in batches with multi-row INSERTs, so a request never waits on an audit
+INSERT. When the queue is full the caller blocks for at most AUDIT_ENQUEUE_TIMEOUT seconds
+(back-pressure), then appends the event to a local spill file instead of dropping it. Batches the
+database rejects are spilled too, and the spill file is replayed once writes succeed again.
+
+Every worker process shares the spill file: appends and the hand-over to replay take an fcntl
+lock on `<spill>.lock`, and one worker at a time replays (`<spill>.replay.lock`). A replay
+records its offset after each inserted batch, so one interrupted halfway resumes where it
+stopped; delivery is at-least-once only across a crash between an INSERT and that record.
+Lines that cannot be decoded (a write torn by a crash) are moved to `<spill>.corrupt`.
+"""
+import contextvars
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# (path, client ip) of the request being handled, set by AuditContextMiddleware
+_request_context: contextvars.ContextVar = contextvars.ContextVar("audit_request", default=(None, None))
+
+
+@contextmanager
+def _file_lock(path: str, blocking: bool = True):
+    """An exclusive flock on `path`, shared by every process; yields False if not blocking and taken."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class AuditWriter:
+    def __init__(self, engine: Optional[Engine] = None, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, enqueue_timeout: float = 0.05, spill_path: str = "audit-spill.jsonl"):
+        self.engine = engine
+        self.queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.spill_path = spill_path
+        self.written = 0
+        self.spilled = 0
+        self._spill_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._retry_at = 0.0
+        self._backoff = 0.0
+
+    # Producer side ------------------------------------------------------
+
+    def record(self, event: dict):
+        """Queue an event; blocks up to enqueue_timeout when the queue is full, then spills it."""
+        event.setdefault("occurred_at", datetime.utcnow())
+        try:
+            self.queue.put(event, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._spill([event])
+
+    # Writer thread ------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer and flush whatever is still queued (to the database, else the spill file)."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._retry_at = 0.0
+        while not self.queue.empty():
+            self._write(self._take_batch(block=False))
+
+    def _take_batch(self, block: bool = True) -> List[dict]:
+        batch = []
+        try:
+            if block:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                batch = self._take_batch()
+                if batch:
+                    self._write(batch)
+                if time.monotonic() >= self._retry_at:
+                    self.replay_spill()
+            except Exception as e:  # the thread must outlive any one failure (a full disk, a lost file)
+                logger.exception(f"Audit writer iteration failed: {e}")
+                self._stopping.wait(self.flush_interval)
+
+    def _write(self, batch: List[dict]):
+        """Insert a batch, or spill it while the database is failing."""
+        if not batch:
+            return
+        if time.monotonic() < self._retry_at or not self._insert(batch):
+            self._spill(batch)
+
+    def _insert(self, batch: List[dict]) -> bool:
+        if self.engine is None:
+            return False
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(AuditLog.__table__), batch)
+        except Exception as e:
+            self._backoff = min(self._backoff * 2 or 1.0, 60.0)
+            self._retry_at = time.monotonic() + self._backoff
+            logger.warning(f"Writing {len(batch)} audit events failed ({e}); retrying in {self._backoff:.0f}s")
+            return False
+        self._backoff = 0.0
+        self.written += len(batch)
+        return True
+
+    # Spill file ---------------------------------------------------------
+
+    def _spill(self, events: Iterable[dict]):
+        lines = "".join(json.dumps(event, default=_encode) + "\n" for event in events)
+        with self._spill_lock, _file_lock(self.spill_path + ".lock"):
+            with open(self.spill_path, "a", encoding="utf-8") as spill:
+                spill.write(lines)
+                spill.flush()
+                os.fsync(spill.fileno())
+            self.spilled += lines.count("\n")
+
+    def replay_spill(self) -> int:
+        """Insert spilled events; returns how many. One worker replays at a time, the others skip."""
+        replay_path = self.spill_path + ".replay"
+        with _file_lock(replay_path + ".lock", blocking=False) as replaying:
+            if not replaying:
+                return 0
+            with self._spill_lock, _file_lock(self.spill_path + ".lock"):
+                if not os.path.exists(replay_path):
+                    if not os.path.exists(self.spill_path):
+                        return 0
+                    _remove(replay_path + ".offset")
+                    os.replace(self.spill_path, replay_path)  # new spills start a fresh file
+            return self._replay(replay_path)
+
+    def _replay(self, replay_path: str) -> int:
+        """Insert the events after the recorded offset; the file goes once all of them are in."""
+        offset_path = replay_path + ".offset"
+        replayed = 0
+        batch = []
+        with open(replay_path, "rb") as spill:
+            spill.seek(_read_offset(offset_path))
+            while True:
+                line = spill.readline()
+                if line.strip():
+                    try:
+                        batch.append(_decode(json.loads(line)))
+                    except (ValueError, KeyError, TypeError) as e:
+                        self._quarantine(line, e)
+                if batch and (len(batch) >= self.batch_size or not line):
+                    if not self._insert(batch):
+                        return replayed
+                    replayed += len(batch)
+                    batch = []
+                    _write_offset(offset_path, spill.tell())
+                if not line:
+                    break
+        _remove(replay_path)
+        _remove(offset_path)
+        logger.info(f"Replayed {replayed} spilled audit events")
+        return replayed
+
+    def _quarantine(self, line: bytes, error: Exception):
+        logger.error(f"Moving an undecodable spilled audit event to {self.spill_path}.corrupt: {error}")
+        with open(self.spill_path + ".corrupt", "ab") as corrupt:
+            corrupt.write(line if line.endswith(b"\n") else line + b"\n")
+
+
+def _read_offset(path: str) -> int:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return int(f.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _write_offset(path: str, offset: int):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode(event: dict) -> dict:
+    event["occurred_at"] = datetime.fromisoformat(event["occurred_at"])
+    return event
+
+
+_writer: Optional[AuditWriter] = None
+
+
+def get_audit_writer() -> AuditWriter:
+    global _writer
+    if _writer is None:
+        from app.db.session import engine
+
+        _writer = AuditWriter(
+            engine,
+            max_queue=settings.AUDIT_QUEUE_SIZE,
+            batch_size=settings.AUDIT_BATCH_SIZE,
+            flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+            enqueue_timeout=settings.AUDIT_ENQUEUE_TIMEOUT,
+            spill_path=settings.AUDIT_SPILL_PATH,
+        )
+    return _writer
+
+
+def audit_access(db: Session, resource_type: str, entities: Iterable, action: str = "view",
+                 patient_id: Optional[int] = None):
+    """Record that the current principal read `entities` (one event each).
+
+    The patient whose PHI was read is the entity itself for patients, otherwise its patient_id
+    unless `patient_id` is given.
+    """
+    if not settings.AUDIT_ENABLED:
+        return
+    path, client_ip = _request_context.get()
+    actor = db.info.get("principal")
+    writer = get_audit_writer()
+    for entity in entities:
+        if patient_id is not None:
+            owner = patient_id
+        else:
+            owner = entity.id if resource_type == "patient" else getattr(entity, "patient_id", None)
+        writer.record({
+            "actor": actor,
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": entity.id,
+            "patient_id": owner,
+            "path": path,
+            "client_ip": client_ip,
+        })
+
+
+class AuditContextMiddleware:
+    """Pure ASGI middleware exposing the request path and client address to audit_access()."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        client = scope.get("client")
+        token = _request_context.set((scope.get("path"), client[0] if client else None))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_context.reset(token)
@@ -5,10 +5,129 @@ from pydantic_settings import BaseSettings
 load_dotenv()  # Load environment variables from .env file
 
 class Settings(BaseSettings):
-    DATABASE_URL: str 
+    DATABASE_URL: str
     SECRET_KEY : str
     ALGORITHM : str
 
+    # "development" creates missing tables on boot; "production" trusts Alembic migrations
+    STARTUP_MODE: str = "development"
+
+    # Server launcher (python -m app.serve)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_CONCURRENCY: int = 2
+    PRELOAD_APP: bool = True
+    MAX_REQUESTS_PER_WORKER: int = 0  # 0 disables worker recycling
+    MAX_REQUESTS_JITTER: int = 0
+    GRACEFUL_TIMEOUT: int = 30
+
+    # Database pool sizing; the launcher derives per-worker values from DB_CONNECTION_BUDGET
+    DB_CONNECTION_BUDGET: int = 40
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_SECONDARY_POOL_SIZE: int = 0  # replica and shard pools; 0 uses DB_POOL_SIZE
+    THREADPOOL_SIZE: int = 40
+
+    # Read replicas: comma separated URLs; empty sends everything to DATABASE_URL
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_MAX_LAG_SECONDS: float = 10.0
+    REPLICA_HEALTH_INTERVAL: float = 5.0
+    REPLICA_PROBE_TIMEOUT: float = 2.0  # connect and statement timeout of the replica lag probe
+    REPLICA_STICKY_SECONDS: float = 5.0
+
+    # Hospital shards: "name=url" pairs (append only, ids depend on the order) and "hospital=name" pairs;
+    # unlisted hospitals stay on DATABASE_URL, which also holds users, roles and other global tables
+    SHARD_URLS: str = ""
+    HOSPITAL_SHARDS: str = ""
+    SHARD_ID_SPAN: int = 100_000_000
+
+    # Query auditing (N+1 and slow query detection)
+    QUERY_AUDIT_ENABLED: bool = False
+    SLOW_QUERY_MS: float = 200.0
+    N_PLUS_ONE_THRESHOLD: int = 5
+    QUERY_BUDGET_STRICT: bool = False
+
+    # Monthly partitions of medical_records/appointments (PostgreSQL); empty tablespace disables archiving
+    PARTITION_MONTHS_AHEAD: int = 3
+    ARCHIVE_AFTER_MONTHS: int = 24
+    ARCHIVE_TABLESPACE: str = ""
+
+    # Medical record attachments: storage backend ("local") and its directory
+    ATTACHMENT_STORAGE: str = "local"
+    ATTACHMENT_DIR: str = "var/attachments"
+    ATTACHMENT_MAX_BYTES: int = 200 * 1024 * 1024
+
+    # Write-behind PHI access audit log
+    AUDIT_ENABLED: bool = True
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL: float = 1.0
+    AUDIT_ENQUEUE_TIMEOUT: float = 0.05
+    AUDIT_SPILL_PATH: str = "var/audit-spill.jsonl"
+
+    # Background jobs (python -m app.jobs runs them standalone)
+    JOBS_IN_PROCESS: bool = True
+    JOB_CONCURRENCY: int = 2
+    JOB_POLL_INTERVAL: float = 5.0
+    JOB_BATCH_SIZE: int = 10
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: float = 10.0
+    JOB_LOCK_TIMEOUT: int = 300
+    JOB_RETENTION_HOURS: int = 168  # finished jobs (and their dedupe keys); keep above REMINDER_LEAD_HOURS
+    REMINDER_LEAD_HOURS: float = 24.0
+    REMINDER_SCAN_SECONDS: int = 300
+
+    # Appointment event streams (GET /appointments/events)
+    EVENTS_QUEUE_SIZE: int = 256
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    EVENTS_RETRY_MS: int = 3000
+    EVENTS_REPLAY_LIMIT: int = 1000
+    EVENTS_RETENTION_HOURS: int = 24
+    EVENTS_STREAM_TOKEN_SECONDS: int = 60  # lifetime of the ?stream_token= that opens a stream
+
+    # Patient-to-doctor assignment: load = patients + weight * upcoming appointments
+    AUTO_ASSIGN_PATIENTS: bool = False
+    ASSIGNMENT_APPOINTMENT_WEIGHT: float = 0.5
+    ASSIGNMENT_REFRESH_SECONDS: int = 300
+
+    # Prescription safety checks: alerts at or above this severity need acknowledge_alerts=true
+    DRUG_SAFETY_BLOCK_SEVERITY: str = "major"
+    DRUG_SAFETY_REFRESH_SECONDS: int = 300
+
+    # Cohort bitmap index: full rebuild interval (writes are applied incrementally in between)
+    COHORT_REFRESH_SECONDS: int = 3600
+
+    # In-process search index (SQLite, or encrypted diagnoses): full rebuild interval; other
+    # workers' inserts are picked up at each search in between
+    SEARCH_REFRESH_SECONDS: int = 300
+
+    # Analytics rollups (/api/analytics): incremental refresh interval, ids per batch, days recomputed daily
+    ANALYTICS_REFRESH_SECONDS: int = 300
+    ANALYTICS_BATCH_SIZE: int = 10000
+    ANALYTICS_RECOMPUTE_DAYS: int = 7
+
+    # De-identified exports (python -m app.services.export_service); the key must stay secret
+    EXPORT_PSEUDONYM_KEY: str = ""
+    EXPORT_DATE_PRECISION: str = "month"
+    EXPORT_CHUNK_SIZE: int = 10000
+    EXPORT_ROW_GROUP_SIZE: int = 100000
+
+    # PHI field encryption: base64 32-byte master key (python -m app.core.crypto generate-key); empty disables
+    PHI_MASTER_KEY: str = ""
+    PHI_PREVIOUS_MASTER_KEY: str = ""  # only during a master key rollover (see app.core.crypto)
+    PHI_KEY_CACHE_SECONDS: int = 300
+    PHI_BLIND_INDEX_KEY: str = ""  # defaults to SECRET_KEY; changing it needs `python -m app.core.crypto reencrypt`
+
+    # Idempotency-Key on the create endpoints: how long responses are replayed, how long a duplicate
+    # waits for the in-flight original, and the lease of a claim (renewed while its request runs)
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0
+    IDEMPOTENCY_LOCK_SECONDS: int = 60
+
+    # Largest array accepted by the /batch create endpoints
+    BATCH_MAX_ITEMS: int = 500
+
     class Config:
         env_file=".env"
 
@@ -0,0 +1,351 @@
+"""Field-level encryption for PHI columns, and blind indexes for equality lookups on them.
+
+    python -m app.core.crypto generate-key          # a new PHI_MASTER_KEY
+    python -m app.core.crypto rotate TABLE          # new data key for TABLE; old values stay readable
+    python -m app.core.crypto reencrypt [--batch N] # rewrite every encrypted column under the active keys
+    python -m app.core.crypto rewrap [NEW_MASTER_KEY] # re-wrap the data keys under a new master key
+
+Envelope encryption: each table's values are encrypted with AES-256-GCM under that table's
+data key. Data keys live in `data_keys`, wrapped by PHI_MASTER_KEY, which never reaches the
+database. The KeyRing unwraps every data key once and keeps one AESGCM cipher per key, shared by
+all requests. Decrypting a list of rows therefore costs one AES-GCM operation per field and no
+key derivation or cipher setup per value. Keys are reloaded every PHI_KEY_CACHE_SECONDS and when
+a value names a key this process has not seen, so rotations by other workers are picked up.
+
+A value is stored as "phi1:" + base64(key id || nonce || ciphertext+tag), with "table.column"
+as associated data, so a ciphertext copied into another column fails to decrypt. Values
+without the prefix are read back unchanged. Existing plaintext rows therefore keep working
+until `reencrypt` converts them. With no PHI_MASTER_KEY set, nothing is encrypted.
+
+Changing the master key is a rollover, as every worker must unwrap the data keys throughout:
+
+    1. deploy PHI_MASTER_KEY=<new> and PHI_PREVIOUS_MASTER_KEY=<old> to every worker; each
+       unwraps a data key under the new key and falls back to the previous one;
+    2. run `python -m app.core.crypto rewrap`, which re-wraps every data key under the new key;
+    3. remove PHI_PREVIOUS_MASTER_KEY once the rewrap has committed.
+
+Encrypted columns cannot be compared in SQL. Columns looked up by equality get a blind index:
+an HMAC of the normalized value under PHI_BLIND_INDEX_KEY, stored in a separate indexed column.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlalchemy import Text, bindparam, insert, select, type_coerce, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "phi1:"
+_HEADER = struct.Struct(">I12s")  # key id, nonce
+
+
+class KeyRing:
+    """Unwrapped data keys as ready-to-use ciphers, plus the active key of each table."""
+
+    def __init__(self, master_key: Optional[bytes], engine_factory: Callable[[], Engine], cache_seconds: float = 300,
+                 previous_master_key: Optional[bytes] = None):
+        self._master = AESGCM(master_key) if master_key else None
+        # Still unwraps data keys during a master key rollover, until they are all re-wrapped
+        self._previous = AESGCM(previous_master_key) if master_key and previous_master_key else None
+        self._engine_factory = engine_factory
+        self.cache_seconds = cache_seconds
+        self.loaded_at: Optional[float] = None
+        self._ciphers: Dict[int, AESGCM] = {}
+        self._active: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._master is not None
+
+    def _wrap(self, data_key: bytes, table: str) -> bytes:
+        nonce = os.urandom(12)
+        return nonce + self._master.encrypt(nonce, data_key, table.encode())
+
+    def _unwrap(self, wrapped: bytes, table: str) -> bytes:
+        try:
+            return self._master.decrypt(wrapped[:12], wrapped[12:], table.encode())
+        except InvalidTag:
+            if self._previous is None:
+                raise
+            return self._previous.decrypt(wrapped[:12], wrapped[12:], table.encode())
+
+    def load(self):
+        """Unwrap every data key; swapped in whole so readers never see a partial ring."""
+        from app.models.data_key import DataKey
+
+        with self._engine_factory().connect() as conn:
+            rows = conn.execute(select(DataKey.id, DataKey.table_name, DataKey.wrapped_key, DataKey.active)).all()
+        ciphers, active = {}, {}
+        for key_id, table, wrapped, is_active in rows:
+            ciphers[key_id] = AESGCM(self._unwrap(wrapped, table))
+            if is_active:
+                active[table] = max(key_id, active.get(table, 0))
+        with self._lock:
+            self._ciphers, self._active = ciphers, active
+            self.loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.cache_seconds:
+            with self._lock:
+                if self.loaded_at is None or time.monotonic() - self.loaded_at > self.cache_seconds:
+                    self.load()
+
+    def create_data_key(self, table: str) -> int:
+        """Make a new data key the active one for `table` (rotation); older keys still decrypt."""
+        from app.models.data_key import DataKey
+
+        with self._lock, self._engine_factory().begin() as conn:
+            conn.execute(update(DataKey).where(DataKey.table_name == table).values(active=False))
+            key_id = conn.execute(
+                insert(DataKey).values(table_name=table, wrapped_key=self._wrap(AESGCM.generate_key(256), table),
+                                       active=True).returning(DataKey.id)
+            ).scalar_one()
+        self.load()
+        logger.info(f"Created data key {key_id} for {table}")
+        return key_id
+
+    def active_cipher(self, table: str) -> Tuple[int, AESGCM]:
+        self._ensure_fresh()
+        key_id = self._active.get(table)
+        if key_id is None:
+            with self._lock:
+                key_id = self._active.get(table) or self.create_data_key(table)
+        return key_id, self._ciphers[key_id]
+
+    def cipher(self, key_id: int) -> AESGCM:
+        self._ensure_fresh()
+        cipher = self._ciphers.get(key_id)
+        if cipher is None:
+            self.load()  # rotated by another worker since our last load
+            cipher = self._ciphers[key_id]
+        return cipher
+
+    def encrypt(self, plaintext: str, context: str) -> str:
+        """Encrypt under the active key of the context's table; context is "table.column"."""
+        key_id, cipher = self.active_cipher(context.split(".", 1)[0])
+        nonce = os.urandom(12)
+        sealed = cipher.encrypt(nonce, plaintext.encode(), context.encode())
+        return PREFIX + base64.b64encode(_HEADER.pack(key_id, nonce) + sealed).decode()
+
+    def decrypt(self, value: str, context: str) -> str:
+        raw = base64.b64decode(value[len(PREFIX):])
+        key_id, nonce = _HEADER.unpack_from(raw)
+        return self.cipher(key_id).decrypt(nonce, raw[_HEADER.size:], context.encode()).decode()
+
+    def rewrap(self, new_master_key: Optional[bytes] = None) -> int:
+        """Re-wrap every data key under a new master key (by default the current one, step 2 of a
+        rollover); the data itself is untouched.
+
+        Workers still holding only the old master key cannot unwrap the result: deploy the new
+        key, with the old one as PHI_PREVIOUS_MASTER_KEY, everywhere first.
+        """
+        from app.models.data_key import DataKey
+
+        new = KeyRing(new_master_key, self._engine_factory) if new_master_key else self
+        with self._lock, self._engine_factory().begin() as conn:
+            rows = conn.execute(select(DataKey.id, DataKey.table_name, DataKey.wrapped_key)).all()
+            for key_id, table, wrapped in rows:
+                conn.execute(update(DataKey).where(DataKey.id == key_id)
+                             .values(wrapped_key=new._wrap(self._unwrap(wrapped, table), table)))
+        if new is not self:
+            self._previous, self._master = self._master, new._master
+        self.load()
+        return len(rows)
+
+
+def decode_master_key(value: str) -> Optional[bytes]:
+    if not value:
+        return None
+    key = base64.urlsafe_b64decode(value)
+    if len(key) != 32:
+        raise ValueError("PHI_MASTER_KEY must be 32 bytes, base64 encoded")
+    return key
+
+
+_keyring: Optional[KeyRing] = None
+
+
+def _default_engine() -> Engine:
+    from app.db.session import engine
+
+    return engine
+
+
+def get_keyring() -> KeyRing:
+    global _keyring
+    if _keyring is None:
+        _keyring = KeyRing(decode_master_key(settings.PHI_MASTER_KEY), _default_engine,
+                           settings.PHI_KEY_CACHE_SECONDS, decode_master_key(settings.PHI_PREVIOUS_MASTER_KEY))
+    return _keyring
+
+
+def configure_keyring(master_key: Optional[bytes], engine_factory: Callable[[], Engine] = _default_engine,
+                      cache_seconds: float = 300, previous_master_key: Optional[bytes] = None) -> KeyRing:
+    """Replace the process-wide key ring (tests, CLIs)."""
+    global _keyring
+    _keyring = KeyRing(master_key, engine_factory, cache_seconds, previous_master_key)
+    return _keyring
+
+
+class EncryptedText(TypeDecorator):
+    """Text encrypted with the table's data key when PHI encryption is enabled."""
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, context: str):
+        super().__init__()
+        self.context = context  # "table.column"
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        keyring = get_keyring()
+        return keyring.encrypt(value, self.context) if keyring.enabled else value
+
+    def process_result_value(self, value, dialect):
+        if value is None or not value.startswith(PREFIX):
+            return value
+        return get_keyring().decrypt(value, self.context)
+
+
+# Blind indexes ---------------------------------------------------------------
+
+NORMALIZERS = {
+    "phone": lambda value: re.sub(r"\D", "", value),
+    "email": lambda value: value.strip().lower(),
+    "diagnosis": lambda value: " ".join(value.lower().split()),
+}
+
+
+@lru_cache(maxsize=64)
+def _blind_key(context: str) -> bytes:
+    root = (settings.PHI_BLIND_INDEX_KEY or settings.SECRET_KEY).encode()
+    return hmac.new(root, f"blind-index:{context}".encode(), hashlib.sha256).digest()
+
+
+def blind_index(value: Optional[str], context: str) -> Optional[str]:
+    """Keyed hash of the normalized value, for indexed equality lookups; context is "table.column"."""
+    if value is None:
+        return None
+    normalized = NORMALIZERS.get(context.rsplit(".", 1)[-1], str.strip)(value)
+    return hmac.new(_blind_key(context), normalized.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+# Maintenance -----------------------------------------------------------------
+
+def reencrypt_all(db, batch_size: int = 1000, attempts: int = 5) -> Dict[str, int]:
+    """Rewrite every encrypted column (and blind index) under the active keys, on every shard, in id order.
+
+    Safe to run while the app serves writes: each row is only written at the version it was read
+    at, and rows edited in between are read again and retried up to `attempts` times.
+    """
+    from app.db.sharding import DIRECTORY, pinned
+    from app.models.medical_record import MedicalRecord
+    from app.models.patient import Patient
+
+    shards = db.info.get("shards")
+    counts = {}
+    for name in (shards.engines if shards is not None else [DIRECTORY]):
+        with pinned(db, None if name == DIRECTORY else name):
+            for model in (Patient, MedicalRecord):
+                rows_done = _reencrypt_table(db, model, batch_size, attempts)
+                counts[model.__tablename__] = counts.get(model.__tablename__, 0) + rows_done
+                logger.info(f"Re-encrypted {rows_done} {model.__tablename__} rows on shard {name}")
+    return counts
+
+
+def _reencrypt_table(db, model, batch_size: int, attempts: int) -> int:
+    columns = [c.key for c in model.__table__.columns if isinstance(c.type, EncryptedText)]
+    last_id, rows_done = 0, 0
+    while True:
+        rows = (db.query(model.id, model.version, *(getattr(model, c) for c in columns))
+                .filter(model.id > last_id).order_by(model.id).limit(batch_size).all())
+        if not rows:
+            return rows_done
+        last_id = rows[-1].id
+        for attempt in range(attempts):
+            stale = _rewrite_rows(db, model, columns, rows)
+            db.commit()
+            rows_done += len(rows) - len(stale)
+            if not stale:
+                break
+            rows = (db.query(model.id, model.version, *(getattr(model, c) for c in columns))
+                    .filter(model.id.in_(stale)).order_by(model.id).all())
+        else:
+            logger.warning(f"{len(stale)} {model.__tablename__} rows kept changing and were not re-encrypted "
+                           f"(ids {stale[:10]}...); run reencrypt again")
+
+
+def _rewrite_rows(db, model, columns, rows) -> list:
+    """Write `rows` back encrypted under the active keys, each at the version it was read at.
+
+    Returns the ids of the rows that changed since they were read (and were therefore not written).
+    """
+    table = model.__table__
+    dialect = db.get_bind(model).dialect
+    values = []
+    for row in rows:
+        plain = {c: getattr(row, c) for c in columns}
+        # Encrypted here rather than by the column type, so the stored values are known below
+        stored = {c: table.c[c].type.process_bind_param(value, dialect) for c, value in plain.items()}
+        if hasattr(model, "blind_indexes"):
+            stored.update(model.blind_indexes(plain))
+        values.append({"row_id": row.id, "old_version": row.version, **{f"new_{k}": v for k, v in stored.items()}})
+    # Core executemany: ORM bulk-by-primary-key would demand each row's current version
+    written = db.execute(
+        update(table).where(table.c.id == bindparam("row_id"), table.c.version == bindparam("old_version"))
+        .values(version=table.c.version + 1,
+                **{key[4:]: bindparam(key, type_=Text()) for key in values[0] if key.startswith("new_")}),
+        values,
+    ).rowcount
+    if dialect.supports_sane_multi_rowcount and written == len(values):
+        return []
+    # Which rows matched? Ours are the ones holding the ciphertexts just written (nonces are unique)
+    current = {row[0]: tuple(row[1:]) for row in db.query(
+        model.id, *(type_coerce(getattr(model, c), Text) for c in columns)
+    ).filter(model.id.in_([v["row_id"] for v in values]))}
+    return [v["row_id"] for v in values
+            if current.get(v["row_id"]) != tuple(v[f"new_{c}"] for c in columns)]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Manage PHI encryption keys.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("generate-key")
+    commands.add_parser("rotate").add_argument("table")
+    commands.add_parser("reencrypt").add_argument("--batch", type=int, default=1000)
+    commands.add_parser("rewrap").add_argument("new_master_key", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "generate-key":
+        print(base64.urlsafe_b64encode(AESGCM.generate_key(256)).decode())
+        raise SystemExit(0)
+    keyring = get_keyring()
+    if not keyring.enabled:
+        parser.error("PHI_MASTER_KEY is not set")
+    if args.command == "rotate":
+        print(f"Data key {keyring.create_data_key(args.table)} is now active for {args.table}")
+    elif args.command == "rewrap":
+        print(f"Re-wrapped {keyring.rewrap(decode_master_key(args.new_master_key or ''))} data keys")
+    else:
+        from app.db.session import SessionLocal
+
+        with SessionLocal() as session:
+            print(reencrypt_all(session, args.batch))
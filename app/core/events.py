@@ -0,0 +1,326 @@
+"""Push appointment changes to dashboards over Server-Sent Events.
+
+Services call record_appointment_events() inside the request's transaction. Each event is written
+to `appointment_events` (its id is the SSE event id, so a reconnecting client resumes with
+Last-Event-ID) and published only after the transaction commits:
+
+* PostgreSQL: the ids are sent with NOTIFY, which the server delivers at commit. Every worker
+  LISTENs on one dedicated connection (PgEventListener), loads the rows and hands them to its
+  in-process EventBroker, so events fan out across workers and hosts.
+* Other databases (single-process development): an after_commit session hook publishes them to
+  the local broker directly.
+
+The broker keeps one small asyncio queue per open stream; an idle stream costs a coroutine and no
+thread or database connection. A stream whose queue overflows is closed and resumes from the table.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import create_engine, delete, event, func, select as sa_select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.mutations import insert_returning
+from app.models.appointment_event import AppointmentEvent
+from app.schemas.appointment import AppointmentResponse
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "appointment_events"
+ADMIN_CHANNEL = "admin"
+
+# NOTIFY payloads are limited to 8000 bytes; ids are sent in comma separated chunks
+_NOTIFY_CHUNK = 500
+
+
+def doctor_channel(doctor_id: int) -> str:
+    return f"doctor:{doctor_id}"
+
+
+def event_channels(event: dict) -> List[str]:
+    """Admins see every appointment, doctors their own."""
+    return [ADMIN_CHANNEL, doctor_channel(event["doctor_id"])]
+
+
+def serialize_event(row: AppointmentEvent) -> dict:
+    return {"id": row.id, "type": row.type, "doctor_id": row.doctor_id, "data": row.data}
+
+
+# Producer side -----------------------------------------------------------
+
+def record_appointment_events(db: Session, event_type: str, appointments: Iterable):
+    """Store one event per appointment in the current transaction; it is pushed once that commits."""
+    rows = [
+        {
+            "type": event_type,
+            "appointment_id": appointment.id,
+            "doctor_id": appointment.doctor_id,
+            "patient_id": appointment.patient_id,
+            "data": AppointmentResponse.model_validate(appointment).model_dump(mode="json"),
+            "created_at": datetime.utcnow(),
+        }
+        for appointment in appointments
+    ]
+    if not rows:
+        return
+    created = insert_returning(db, AppointmentEvent, rows)
+    if db.get_bind(AppointmentEvent).dialect.name == "postgresql":
+        ids = [str(row.id) for row in created]
+        for start in range(0, len(ids), _NOTIFY_CHUNK):
+            db.execute(sa_select(func.pg_notify(CHANNEL, ",".join(ids[start:start + _NOTIFY_CHUNK]))))
+    else:
+        db.info.setdefault("pending_events", []).extend(serialize_event(row) for row in created)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session):
+    pending = session.info.pop("pending_events", None)
+    if pending:
+        get_event_broker().publish(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop("pending_events", None)
+
+
+def load_events_since(db: Session, channel: str, last_id: int, limit: int) -> List[dict]:
+    """Events after `last_id` visible on `channel`, oldest first (for Last-Event-ID resume)."""
+    query = db.query(AppointmentEvent).filter(AppointmentEvent.id > last_id)
+    if channel != ADMIN_CHANNEL:
+        query = query.filter(AppointmentEvent.doctor_id == int(channel.split(":", 1)[1]))
+    return [serialize_event(row) for row in query.order_by(AppointmentEvent.id).limit(limit)]
+
+
+def prune_events(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete events older than EVENTS_RETENTION_HOURS; clients offline longer refetch their lists."""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=settings.EVENTS_RETENTION_HOURS)
+    deleted = db.execute(delete(AppointmentEvent).where(AppointmentEvent.created_at < cutoff)).rowcount
+    db.commit()
+    return deleted
+
+
+# Broker --------------------------------------------------------------------
+
+class Subscription:
+    def __init__(self, channels: List[str], maxsize: int):
+        self.channels = channels
+        # None in the queue means "stream closed" (overflow or shutdown)
+        self.queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(maxsize)
+
+
+class EventBroker:
+    """In-process fan-out from publishers on any thread to subscribers on the event loop."""
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def subscribe(self, channels: List[str]) -> Subscription:
+        """Register a stream; call on the event loop."""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        subscription = Subscription(channels, self.queue_size)
+        for channel in channels:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self) -> int:
+        return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+    def publish(self, events: List[dict]):
+        """Deliver events to matching subscribers; safe to call from any thread."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._dispatch, events)
+
+    def _dispatch(self, events: List[dict]):
+        for event_ in events:
+            delivered = set()
+            for channel in event_channels(event_):
+                for subscription in list(self._subscribers.get(channel, ())):
+                    if subscription not in delivered:
+                        delivered.add(subscription)
+                        self._offer(subscription, event_)
+
+    def _offer(self, subscription: Subscription, event_: dict):
+        try:
+            subscription.queue.put_nowait(event_)
+        except asyncio.QueueFull:
+            logger.warning(f"Event stream on {subscription.channels} fell behind; closing it so the client resumes")
+            self._close(subscription)
+
+    def _close(self, subscription: Subscription):
+        self.unsubscribe(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def close_all(self):
+        """End every open stream (worker shutdown); clients reconnect to another worker."""
+        for subscription in {s for subscribers in self._subscribers.values() for s in subscribers}:
+            self._close(subscription)
+
+
+_broker: Optional[EventBroker] = None
+
+
+def get_event_broker() -> EventBroker:
+    global _broker
+    if _broker is None:
+        _broker = EventBroker(queue_size=settings.EVENTS_QUEUE_SIZE)
+    return _broker
+
+
+# Cross-worker fan-out (PostgreSQL) ---------------------------------------
+
+def create_listen_engine(url: str) -> Engine:
+    """A single-connection engine for LISTEN, so it never takes a connection from the request pool."""
+    return create_engine(url, pool_size=1, max_overflow=0, pool_pre_ping=True)
+
+
+class PgEventListener:
+    """LISTENs for committed event ids on a dedicated connection and feeds them to the broker.
+
+    The connection comes from its own single-connection engine (create_listen_engine), which
+    stop() disposes; rows are loaded through `session_factory`.
+    """
+
+    def __init__(self, engine: Engine, broker: EventBroker, session_factory):
+        self.engine = engine
+        self.broker = broker
+        self.session_factory = session_factory
+        self.last_id: Optional[int] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="event-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.engine.dispose()
+
+    def _run(self):
+        backoff = 0.0
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+                backoff = 0.0
+            except Exception as e:
+                backoff = min(backoff * 2 or 1.0, 30.0)
+                logger.warning(f"Event listener connection lost ({e}); reconnecting in {backoff:.0f}s")
+                self._stopping.wait(backoff)
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        try:
+            dbapi_conn = raw.driver_connection
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            if self.last_id is not None:
+                self._catch_up()  # events committed while we were reconnecting
+            while not self._stopping.is_set():
+                if select.select([dbapi_conn], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                ids = []
+                while dbapi_conn.notifies:
+                    ids += [int(i) for i in dbapi_conn.notifies.pop(0).payload.split(",") if i]
+                if ids:
+                    self._deliver(ids)
+        finally:
+            raw.invalidate()
+
+    def _deliver(self, ids: List[int]):
+        with self.session_factory() as db:
+            rows = db.query(AppointmentEvent).filter(AppointmentEvent.id.in_(ids)).order_by(AppointmentEvent.id).all()
+            events = [serialize_event(row) for row in rows]
+        self._publish(events)
+
+    def _catch_up(self):
+        with self.session_factory() as db:
+            rows = (db.query(AppointmentEvent).filter(AppointmentEvent.id > self.last_id)
+                    .order_by(AppointmentEvent.id).limit(settings.EVENTS_REPLAY_LIMIT).all())
+            events = [serialize_event(row) for row in rows]
+        self._publish(events)
+
+    def _publish(self, events: List[dict]):
+        if events:
+            self.last_id = max(self.last_id or 0, events[-1]["id"])
+            self.broker.publish(events)
+
+
+# SSE stream ----------------------------------------------------------------
+
+def format_sse(event_: dict) -> str:
+    return f"id: {event_['id']}\nevent: {event_['type']}\ndata: {json.dumps(event_['data'])}\n\n"
+
+
+def _load_backlog(session_factory, channel: str, last_id: int):
+    """Missed events, or (None, newest id) when there are too many to replay."""
+    with session_factory() as db:
+        events = load_events_since(db, channel, last_id, settings.EVENTS_REPLAY_LIMIT)
+        if len(events) < settings.EVENTS_REPLAY_LIMIT:
+            return events, None
+        return None, db.query(func.max(AppointmentEvent.id)).scalar()
+
+
+async def stream_events(channel: str, last_event_id: Optional[int], session_factory):
+    """Yield SSE frames: the backlog after `last_event_id`, then live events with keep-alive comments.
+
+    When more events were missed than EVENTS_REPLAY_LIMIT the client gets a `reset` event instead
+    and should refetch its list.
+    """
+    broker = get_event_broker()
+    subscription = broker.subscribe([channel])  # before the backlog query, so nothing falls in between
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        replayed: Set[int] = set()
+        if last_event_id is not None:
+            backlog, newest_id = await run_in_threadpool(_load_backlog, session_factory, channel, last_event_id)
+            if backlog is None:
+                yield f"id: {newest_id}\nevent: reset\ndata: {{}}\n\n"
+            else:
+                for event_ in backlog:
+                    replayed.add(event_["id"])
+                    yield format_sse(event_)
+        while True:
+            try:
+                event_ = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event_ is None:
+                return
+            if event_["id"] not in replayed:
+                yield format_sse(event_)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,264 @@
+"""Idempotency keys for the create endpoints.
+
+A POST to one of IDEMPOTENT_PATHS carrying an `Idempotency-Key` header runs at most once per
+signed-in user and key within IDEMPOTENCY_TTL_SECONDS:
+
+- The first request claims the key with an INSERT into `idempotency_keys`, runs, and stores its
+  status and body there. A 5xx response (or an exception) is not stored: the claim is released
+  and a retry runs again.
+- A retry with the same key and body gets the stored response, marked `Idempotent-Replayed:
+  true`, without reaching the route or the services.
+- A duplicate arriving while the first request still runs waits for its result: on an
+  in-process event when both hit the same worker, by polling the row otherwise. After
+  IDEMPOTENCY_WAIT_SECONDS it gets a 409 and may retry later.
+- Reusing a key for a different request is a 422.
+
+A claim is a lease of IDEMPOTENCY_LOCK_SECONDS that the running request renews every third of
+that, however long it takes. A claim whose request died without a response (a killed worker)
+stops being renewed and is taken over once the lease runs out. Expired keys are deleted hourly
+by the job runner.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_PATHS = frozenset({
+    "/patients/",
+    "/appointments/", "/appointments/batch",
+    "/medical_records/", "/medical_records/batch",
+    "/prescriptions/", "/prescriptions/batch",
+})
+MAX_KEY_LENGTH = 255
+
+
+def _sha256(*parts: bytes) -> str:
+    return hashlib.sha256(b"\0".join(parts)).hexdigest()
+
+
+class IdempotencyStore:
+    """Claims and stored responses in the idempotency_keys table."""
+
+    def __init__(self, engine_factory: Callable[[], Engine], ttl_seconds: float = 86400, lock_seconds: float = 60):
+        self._engine_factory = engine_factory
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+
+    def claim(self, key_hash: str, request_hash: str, now: Optional[datetime] = None) -> Optional[Row]:
+        """Claim the key for this request; returns None once claimed, else the row holding it."""
+        now = now or datetime.utcnow()
+        engine = self._engine_factory()
+        dialect_insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+        with engine.begin() as conn:
+            # An expired key, or a claim abandoned by a request that never finished, is free again
+            conn.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.key_hash == key_hash,
+                or_(IdempotencyKey.expires_at <= now,
+                    and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.locked_until <= now)),
+            ))
+            claimed = conn.execute(
+                dialect_insert(IdempotencyKey)
+                .values(key_hash=key_hash, request_hash=request_hash, created_at=now,
+                        locked_until=now + timedelta(seconds=self.lock_seconds),
+                        expires_at=now + timedelta(seconds=self.ttl_seconds))
+                .on_conflict_do_nothing(index_elements=["key_hash"])
+            ).rowcount
+            if claimed:
+                return None
+            return conn.execute(
+                select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.content_type,
+                       IdempotencyKey.body).where(IdempotencyKey.key_hash == key_hash)
+            ).one_or_none()
+
+    def extend(self, key_hash: str, now: Optional[datetime] = None) -> bool:
+        """Renew an unfinished claim's lease; False when the claim is no longer held."""
+        now = now or datetime.utcnow()
+        with self._engine_factory().begin() as conn:
+            return bool(conn.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key_hash == key_hash, IdempotencyKey.status_code.is_(None))
+                .values(locked_until=now + timedelta(seconds=self.lock_seconds))
+            ).rowcount)
+
+    def complete(self, key_hash: str, status_code: int, content_type: Optional[str], body: bytes):
+        with self._engine_factory().begin() as conn:
+            conn.execute(update(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash)
+                         .values(status_code=status_code, content_type=content_type, body=body))
+
+    def release(self, key_hash: str):
+        with self._engine_factory().begin() as conn:
+            conn.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash,
+                                                      IdempotencyKey.status_code.is_(None)))
+
+
+def prune_idempotency_keys(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete expired keys."""
+    deleted = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= (now or datetime.utcnow()))).rowcount
+    db.commit()
+    return deleted
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def _default_engine() -> Engine:
+    from app.db.session import engine
+
+    return engine
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        _store = IdempotencyStore(_default_engine, settings.IDEMPOTENCY_TTL_SECONDS, settings.IDEMPOTENCY_LOCK_SECONDS)
+    return _store
+
+
+def _principal(authorization: Optional[bytes]) -> Optional[str]:
+    """The verified subject of the bearer token; replays must never cross users."""
+    from app.core.security import decode_access_token
+
+    if not authorization or not authorization.lower().startswith(b"bearer "):
+        return None
+    try:
+        return decode_access_token(authorization[7:].decode()).get("sub")
+    except HTTPException:
+        return None
+
+
+async def _send_response(send, status_code: int, content_type: Optional[str], body: bytes, replayed: bool = False):
+    headers = [(b"content-length", str(len(body)).encode())]
+    if content_type:
+        headers.append((b"content-type", content_type.encode()))
+    if replayed:
+        headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send, status_code: int, detail: str):
+    await _send_response(send, status_code, "application/json", json.dumps({"detail": detail}).encode())
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware running keyed POSTs to the create endpoints at most once."""
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None, wait_seconds: Optional[float] = None):
+        self.app = app
+        self.store = store or get_idempotency_store()
+        self.wait_seconds = settings.IDEMPOTENCY_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self._inflight: Dict[str, asyncio.Event] = {}  # keys this worker is executing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENT_PATHS:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key")
+        principal = _principal(headers.get(b"authorization")) if key else None
+        if principal is None:
+            return await self.app(scope, receive, send)  # no key, or the route answers 401
+        if not key.strip() or len(key) > MAX_KEY_LENGTH:
+            return await _send_error(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+        chunks, more = [], True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more = message.get("more_body", False)
+        body = b"".join(chunks)
+        key_hash = _sha256(principal.encode(), key)
+        request_hash = _sha256(scope["path"].encode(), scope.get("query_string", b""), body)
+
+        deadline, poll = time.monotonic() + self.wait_seconds, 0.05
+        while True:
+            held = await run_in_threadpool(self.store.claim, key_hash, request_hash)
+            if held is None:
+                break
+            if held.request_hash != request_hash:
+                return await _send_error(send, 422, "Idempotency-Key was already used for a different request")
+            if held.status_code is not None:
+                return await _send_response(send, held.status_code, held.content_type, held.body, replayed=True)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return await _send_error(send, 409, "A request with this Idempotency-Key is still in progress")
+            event = self._inflight.get(key_hash)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:  # running in another worker
+                await asyncio.sleep(min(poll, remaining))
+                poll = min(poll * 2, 0.5)
+
+        await self._run(scope, receive, send, body, key_hash)
+
+    async def _run(self, scope, receive, send, body: bytes, key_hash: str):
+        """Run the request, passing its response through and storing it."""
+        event = self._inflight[key_hash] = asyncio.Event()
+        sent_body = False
+
+        async def replay_receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": None, "content_type": None, "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type")
+                response["content_type"] = content_type.decode() if content_type else None
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        heartbeat = asyncio.create_task(self._heartbeat(key_hash))
+        try:
+            await self.app(scope, replay_receive, capture)
+        finally:
+            heartbeat.cancel()
+            try:
+                if response["status"] is not None and response["status"] < 500:
+                    await run_in_threadpool(self.store.complete, key_hash, response["status"],
+                                            response["content_type"], b"".join(response["body"]))
+                else:
+                    await run_in_threadpool(self.store.release, key_hash)
+            except Exception as e:  # the claim's lease then runs out after IDEMPOTENCY_LOCK_SECONDS
+                logger.error(f"Could not store the response of idempotency key {key_hash[:12]}: {e}")
+            finally:
+                self._inflight.pop(key_hash, None)
+                event.set()
+
+    async def _heartbeat(self, key_hash: str):
+        """Renew the claim while the request runs, so no other worker takes it over."""
+        while True:
+            await asyncio.sleep(self.store.lock_seconds / 3)
+            try:
+                held = await run_in_threadpool(self.store.extend, key_hash)
+            except Exception as e:
+                logger.warning(f"Could not renew idempotency key {key_hash[:12]}: {e}")
+                continue
+            if not held:
+                logger.warning(f"Idempotency key {key_hash[:12]} was taken over while its request ran")
+                return
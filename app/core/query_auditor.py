@@ -0,0 +1,217 @@
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Audit for the request currently being handled (set by QueryAuditMiddleware)
+_current_audit: contextvars.ContextVar = contextvars.ContextVar("query_audit", default=None)
+
+# Audits opened with query_budget() see every statement, whichever thread runs it
+_global_audits: List["QueryAudit"] = []
+_global_lock = threading.Lock()
+
+# Per-endpoint budgets, keyed by "METHOD /route/{template}"
+_endpoint_budgets: Dict[str, int] = {}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|:\w+|\$\d+|\?")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block of code or an endpoint issues more queries than allowed."""
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a SQL statement so that queries differing only in literals compare equal."""
+    normalized = _STRING_RE.sub("?", statement)
+    normalized = _PARAM_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("IN (?...)", normalized)
+    return _WHITESPACE_RE.sub(" ", normalized).strip().lower()
+
+
+class QueryAudit:
+    """Collects the statements executed within one request or block of code."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.statements: List[Tuple[str, float]] = []
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration_ms: float):
+        fp = fingerprint(statement)
+        with self._lock:
+            self.statements.append((fp, duration_ms))
+            self.counts[fp] += 1
+
+    @property
+    def query_count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(duration for _, duration in self.statements)
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Return fingerprints executed at least `threshold` times (likely N+1 patterns)."""
+        threshold = threshold or settings.N_PLUS_ONE_THRESHOLD
+        return [(fp, count) for fp, count in self.counts.most_common() if count >= threshold]
+
+    def report(self):
+        """Log any repeated fingerprints as possible N+1 queries."""
+        for fp, count in self.repeated():
+            logger.warning(f"Possible N+1 in {self.label or 'block'}: {count}x {fp}")
+
+
+def _explain(cursor, statement: str, parameters, dialect_name: str) -> Optional[str]:
+    """Run EXPLAIN for a slow SELECT on the same DBAPI connection."""
+    if not statement.lstrip().lower().startswith("select"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    try:
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            return "\n".join(" ".join(str(col) for col in row) for row in explain_cursor.fetchall())
+        finally:
+            explain_cursor.close()
+    except Exception as e:
+        logger.debug(f"EXPLAIN failed: {e}")
+        return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, not conn.info: a failed statement never reaches
+    # after_cursor_execute, and its start time goes away with its context
+    context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - context._query_start_time) * 1000
+
+    audit = _current_audit.get()
+    if audit is not None:
+        audit.record(statement, duration_ms)
+    if _global_audits:
+        with _global_lock:
+            for global_audit in _global_audits:
+                if global_audit is not audit:
+                    global_audit.record(statement, duration_ms)
+
+    if duration_ms >= settings.SLOW_QUERY_MS:
+        plan = None if executemany else _explain(cursor, statement, parameters, conn.dialect.name)
+        logger.warning(f"Slow query ({duration_ms:.1f} ms): {statement}" + (f"\nPlan:\n{plan}" if plan else ""))
+
+
+def instrument_engine(engine: Engine):
+    """Attach the auditing listeners to an engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def audit_queries(label: str = ""):
+    """Audit the statements executed in the current context and report N+1 patterns on exit."""
+    audit = QueryAudit(label)
+    token = _current_audit.set(audit)
+    try:
+        yield audit
+    finally:
+        _current_audit.reset(token)
+        audit.report()
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = ""):
+    """Fail with QueryBudgetExceeded if the block issues more than `max_queries` statements.
+
+    Unlike audit_queries(), this sees statements run on any thread, so it also covers
+    requests made through TestClient.
+    """
+    audit = QueryAudit(label)
+    with _global_lock:
+        _global_audits.append(audit)
+    try:
+        yield audit
+    finally:
+        with _global_lock:
+            _global_audits.remove(audit)
+    if audit.query_count > max_queries:
+        statements = "\n".join(f"  {fp}" for fp, _ in audit.statements)
+        raise QueryBudgetExceeded(
+            f"{label or 'block'} issued {audit.query_count} queries (budget {max_queries}):\n{statements}"
+        )
+
+
+def declare_query_budget(method: str, path: str, max_queries: int):
+    """Declare the maximum number of queries an endpoint may issue per request."""
+    _endpoint_budgets[f"{method.upper()} {path}"] = max_queries
+
+
+def clear_query_budgets():
+    _endpoint_budgets.clear()
+
+
+class QueryAuditMiddleware:
+    """ASGI middleware that audits each HTTP request and enforces declared endpoint budgets.
+
+    The budget is checked when the response starts, after the endpoint and its dependencies
+    (including the get_db commit) have run: over budget, the request is logged, or with
+    QUERY_BUDGET_STRICT answered with a 500 in place of its response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        replaced = False
+
+        async def send_checked(message):
+            nonlocal replaced
+            if message["type"] == "http.response.start":
+                problem = _over_budget(scope, audit)
+                if problem is not None:
+                    logger.warning(problem)
+                    if settings.QUERY_BUDGET_STRICT:
+                        replaced = True
+                        body = json.dumps({"detail": problem}).encode()
+                        await send({"type": "http.response.start", "status": 500,
+                                    "headers": [(b"content-type", b"application/json"),
+                                                (b"content-length", str(len(body)).encode())]})
+                        await send({"type": "http.response.body", "body": body})
+                        return
+            if not replaced:
+                await send(message)
+
+        with audit_queries(f"{scope['method']} {scope['path']}") as audit:
+            await self.app(scope, receive, send_checked)
+
+
+def _over_budget(scope, audit: QueryAudit) -> Optional[str]:
+    route = scope.get("route")
+    key = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+    budget = _endpoint_budgets.get(key)
+    if budget is not None and audit.query_count > budget:
+        return f"{key} issued {audit.query_count} queries (budget {budget})"
+    return None
@@ -1,13 +1,13 @@
 import logging
+from functools import lru_cache
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
 from app.db.session import get_db
+from app.db.sharding import use_shard
 from app.models import Doctor, User  # Assuming User and Doctor models are available
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
 # Secret key for JWT (replace this with a more secure method in production)
 SECRET_KEY = "Xfwsub3eGdLhHaW8OZcpvXq-RgfwW5Q72yEnnpQaxNE"  
@@ -17,8 +17,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 1 hour
 # OAuth2 scheme for Bearer token handling
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-# Password hash context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hash context, built on first use so passlib/bcrypt stay off the import path
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -26,14 +29,15 @@ logging.basicConfig(level=logging.INFO)
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Generate JWT access token."""
+    from jose import jwt
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
@@ -41,6 +45,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def decode_access_token(token: str):
     """Decode JWT and return payload."""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         logger.info(f"Decoded token payload: {payload}")
@@ -49,8 +54,31 @@ def decode_access_token(token: str):
         logger.error("Invalid token.")
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# Short-lived tokens that only open an event stream. EventSource cannot send headers, so they
+# travel in the URL (and so in access logs); they carry no subject or role and are refused as
+# access tokens.
+STREAM_TOKEN_PURPOSE = "event-stream"
+
+def create_stream_token(channel: str, expires_seconds: int) -> str:
+    """Sign a token for the event stream of `channel`."""
+    from jose import jwt
+    expire = datetime.utcnow() + timedelta(seconds=expires_seconds)
+    return jwt.encode({"purpose": STREAM_TOKEN_PURPOSE, "channel": channel, "exp": expire}, SECRET_KEY,
+                      algorithm=ALGORITHM)
+
+def decode_stream_token(token: str) -> str:
+    """The channel a stream token opens; 401 when it is invalid, expired or not a stream token."""
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid stream token")
+    if payload.get("purpose") != STREAM_TOKEN_PURPOSE or not payload.get("channel"):
+        raise HTTPException(status_code=401, detail="Invalid stream token")
+    return payload["channel"]
+
 # Dependency to extract user from JWT
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db, scope="function")) -> User:
     """Decode and verify JWT token, and extract user information."""
     payload = decode_access_token(token)
     email: str = payload.get("sub")
@@ -63,19 +91,24 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise HTTPException(status_code=401, detail="Invalid token")
 
     # Retrieve user from the database using email
-    user = db.query(User).filter(User.email == email).first()
+    user = db.query(User).options(joinedload(User.role)).filter(User.email == email).first()
     
     if not user:
         logger.error(f"User with email {email} not found.")
         raise HTTPException(status_code=404, detail="User not found")
 
+    # Identify the principal so the session can keep its reads on the primary after it writes
+    db.info["principal"] = email
+    # Work on the shard of the user's hospital until a service routes elsewhere
+    use_shard(db, user.shard)
+
     # Log the role name for debugging
     logger.info(f"User role from database: {user.role.name}")
 
     # Return the user object with the role name accessible as `user.role.name`
     return user
 
-def get_current_doctor(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Doctor:
+def get_current_doctor(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db, scope="function")) -> Doctor:
     """Retrieve the current doctor from the JWT token. Handles both admin and doctor roles."""
     payload = decode_access_token(token)
     email: str = payload.get("sub")
@@ -86,6 +119,9 @@ def get_current_doctor(token: str = Depends(oauth2_scheme), db: Session = Depend
     if not email:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Identify the principal for replica stickiness and the access audit log
+    db.info["principal"] = email
+
     # If role is 'admin', we allow access but don't need to fetch a doctor
     if role == "admin":
         logger.info(f"Admin user {email} authorized to access doctor resources.")
@@ -93,6 +129,8 @@ def get_current_doctor(token: str = Depends(oauth2_scheme), db: Session = Depend
 
     # If role is 'doctor', we look up the doctor in the database
     if role == "doctor":
+        if db.info.get("shards") is not None:
+            use_shard(db, db.query(User.shard).filter(User.email == email).scalar())
         doctor = db.query(Doctor).filter(Doctor.email == email).first()
         
         if not doctor:
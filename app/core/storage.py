@@ -0,0 +1,176 @@
+"""Content-addressed blob storage for attachments.
+
+Blobs are keyed by the SHA-256 of their bytes, so uploading the same file twice stores it once.
+An upload is staged by BlobWriter.commit() and only put in place by place(), which the attachment
+service calls as the database transaction recording it commits. lock(digest) serializes that with
+deleting the blob, across processes.
+The backend is chosen by ATTACHMENT_STORAGE. Object storage can be added with
+register_storage_backend(): implement StorageBackend and return None from local_path() to make
+downloads stream through open() instead of being served straight from disk.
+"""
+import contextlib
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from typing import BinaryIO, Callable, ContextManager, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BlobWriter:
+    """Incremental upload: hashes and counts bytes as they are written."""
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        """Finish the upload and return its digest; the bytes stay staged until place() or abort()."""
+        raise NotImplementedError
+
+    def place(self):
+        """Store the staged bytes under their digest (a no-op if identical content is stored)."""
+        raise NotImplementedError
+
+    def abort(self):
+        """Discard the staged or partially written bytes."""
+        raise NotImplementedError
+
+
+class StorageBackend:
+    def writer(self) -> BlobWriter:
+        raise NotImplementedError
+
+    def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def open(self, digest: str) -> BinaryIO:
+        raise NotImplementedError
+
+    def delete(self, digest: str):
+        raise NotImplementedError
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """Filesystem path of the blob when it can be served directly from disk."""
+        return None
+
+    def lock(self, digest: str) -> ContextManager:
+        """Exclusive lock for placing or deleting `digest`; backends shared by processes must override."""
+        return contextlib.nullcontext()
+
+
+class LocalBlobWriter(BlobWriter):
+    def __init__(self, storage: "LocalStorage"):
+        super().__init__()
+        self.storage = storage
+        self.file = tempfile.NamedTemporaryFile(dir=storage.tmp_dir, delete=False)
+
+    def write(self, chunk: bytes):
+        super().write(chunk)
+        self.file.write(chunk)
+
+    def commit(self) -> str:
+        self.digest = self.sha256.hexdigest()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        return self.digest
+
+    def place(self):
+        target = self.storage.path(self.digest)
+        if os.path.exists(target):
+            os.unlink(self.file.name)  # identical content is already stored
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(self.file.name, target)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+class LocalStorage(StorageBackend):
+    """Blobs under <root>/<aa>/<bb>/<digest>; uploads are staged in <root>/tmp on the same filesystem."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._held = threading.local()  # bucket -> [fd, depth] of the locks this thread holds
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def writer(self) -> LocalBlobWriter:
+        return LocalBlobWriter(self)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")
+
+    def delete(self, digest: str):
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self.path(digest)
+
+    @contextlib.contextmanager
+    def lock(self, digest: str):
+        """flock on the blob's <root>/<aa> directory, shared by every worker; re-entrant per thread."""
+        bucket = os.path.join(self.root, digest[:2])
+        held = self._held.__dict__.setdefault("buckets", {})
+        entry = held.get(bucket)
+        if entry is None:
+            os.makedirs(bucket, exist_ok=True)
+            fd = os.open(bucket, os.O_RDONLY)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+            entry = held[bucket] = [fd, 0]
+        entry[1] += 1
+        try:
+            yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del held[bucket]
+                os.close(entry[0])  # releases the lock
+
+
+_BACKENDS: Dict[str, Callable[[], StorageBackend]] = {
+    "local": lambda: LocalStorage(settings.ATTACHMENT_DIR),
+}
+
+
+def register_storage_backend(name: str, factory: Callable[[], StorageBackend]):
+    _BACKENDS[name] = factory
+    get_storage.cache_clear()
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    try:
+        factory = _BACKENDS[settings.ATTACHMENT_STORAGE]
+    except KeyError:
+        raise RuntimeError(f"Unknown ATTACHMENT_STORAGE backend: {settings.ATTACHMENT_STORAGE}")
+    return factory()
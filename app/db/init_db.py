@@ -1,30 +1,34 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
-from app.models.user import Base as UserBase
-from app.models.doctor import Base as DoctorBase
-from app.core.config import settings
 from app.db.base import Base  # Import your Base class
-from app.db.session import engine
-from app.models.role import Role
+from app.db.session import engine, shard_map
+from app.db.sharding import init_shards
+from app.db.partitions import ensure_partitions
+from app.db.search import ensure_search_index
+from app.models.role import seed_roles
 
 def init_roles(db: Session):
     """Initialize the Role table with default roles."""
-    roles = ["admin", "doctor", "patient"]
-    for role_name in roles:
-        existing_role = db.query(Role).filter(Role.name == role_name).first()
-        if not existing_role:
-            new_role = Role(name=role_name)
-            db.add(new_role)
-    db.commit()
+    return seed_roles(db)
 
-def init_db():
-    """Initialize the database and seed roles."""
+def init_db(create_schema: bool = True):
+    """Initialize the database and seed roles.
+
+    In production the schema is owned by Alembic migrations, so only the partition and seed
+    checks run.
+    """
     # Import all the models here to ensure they are registered properly
-    from app.models import patient, doctor, user, medical_record, prescription, appointment, role  # Import your models
+    import app.models  # noqa: F401
 
     # Create tables
-    Base.metadata.create_all(bind=engine)
+    if create_schema:
+        Base.metadata.create_all(bind=engine)
+        ensure_search_index(engine)
+        if shard_map is not None:
+            init_shards(shard_map)
+
+    # Keep the upcoming monthly partitions ahead of the writes that need them
+    ensure_partitions(engine)
 
     # Initialize roles
     with Session(engine) as db:
-        init_roles(db)
\ No newline at end of file
+        init_roles(db)
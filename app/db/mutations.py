@@ -0,0 +1,71 @@
+from typing import List, Optional
+
+from sqlalchemy import delete, insert, inspect, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.compiler import InsertmanyvaluesSentinelOpts
+
+
+def update_returning(db: Session, model, entity_id: int, values: dict, *criteria,
+                     expected_version: Optional[int] = None):
+    """Run `UPDATE ... WHERE id = :id [AND criteria] RETURNING *` in a single round-trip.
+
+    Returns the updated entity, or None when no row matched (missing, or failed an owner check).
+    Only the keys in `values` are written; pass `schema.dict(exclude_unset=True)`.
+
+    Versioned models (a mapper version_id_col) get `version = version + 1` in the same statement.
+    With `expected_version` the row only matches at that version (optimistic concurrency); tell
+    a conflict from a missing row with version_conflict().
+    """
+    version = inspect(model).version_id_col
+    if version is not None:
+        if expected_version is not None:
+            criteria += (version == expected_version,)
+        if values:
+            values = {**values, version.key: version + 1}
+    if not values:
+        return db.query(model).filter(model.id == entity_id, *criteria).first()
+    stmt = (
+        update(model)
+        .where(model.id == entity_id, *criteria)
+        .values(**values)
+        .returning(model)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def version_conflict(db: Session, model, entity_id: int, expected_version: Optional[int], *criteria) -> bool:
+    """After a conditional update matched nothing: whether the row is there, at another version.
+
+    Only runs a query on that failure path, and only when a version was expected.
+    """
+    if expected_version is None:
+        return False
+    return db.query(model.id).filter(model.id == entity_id, *criteria).first() is not None
+
+
+def delete_returning(db: Session, model, entity_id: int, *criteria, returning=None):
+    """Run `DELETE ... WHERE id = :id [AND criteria] RETURNING id` without loading the entity.
+
+    Returns the deleted id (or the `returning` column's value), or None when no row matched.
+    """
+    stmt = delete(model).where(model.id == entity_id, *criteria).returning(model.id if returning is None else returning)
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def insert_returning(db: Session, model, rows: List[dict]) -> list:
+    """Insert `rows` with one multi-row `INSERT ... VALUES (...), (...) RETURNING *`.
+
+    Returns the new entities in the same order as `rows`. On PostgreSQL SQLAlchemy's
+    insertmanyvalues batching keeps RETURNING in parameter order using the primary key as a
+    sentinel. Dialects without sentinel support (SQLite) would get a statement per row that way,
+    so they get a single VALUES list instead and are re-ordered by ascending primary key.
+    """
+    if not rows:
+        return []
+    sentinel = db.get_bind(model).dialect.insertmanyvalues_implicit_sentinel
+    if sentinel & InsertmanyvaluesSentinelOpts.ANY_AUTOINCREMENT:
+        stmt = insert(model).returning(model, sort_by_parameter_order=True)
+        return list(db.scalars(stmt, rows))
+    created = list(db.scalars(insert(model).values(rows).returning(model)))
+    return sorted(created, key=lambda entity: entity.id)
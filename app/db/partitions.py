@@ -0,0 +1,182 @@
+"""Monthly range partitions for the time-series tables (PostgreSQL only).
+
+    python -m app.db.partitions            # create upcoming partitions, archive old ones
+
+`medical_records` is partitioned by visit_date and `appointments` by appointment_date (see the
+partitioning migration). Each month gets its own partition named <table>_YYYY_MM. Partitions
+whose month ended more than ARCHIVE_AFTER_MONTHS ago move to the archive tier: ARCHIVE_TABLESPACE
+(expected to live on cheap, compressed storage) with lz4 TOAST compression on their text
+columns. Archiving rewrites the partition (detach, copy, attach) with its indexes in the same
+tablespace, and it is attached again under its name, so queries do not change and date filters
+prune it.
+"""
+import logging
+import re
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# table -> (partition key, text columns compressed when archived)
+PARTITIONED_TABLES: Dict[str, Tuple[str, List[str]]] = {
+    "medical_records": ("visit_date", ["diagnosis", "treatment", "prescribed_medicines", "notes"]),
+    "appointments": ("appointment_date", ["reason"]),
+}
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month `months` after the month containing `day`."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month.year:04d}_{month.month:02d}"
+
+
+def parse_partition_month(table: str, name: str) -> Optional[date]:
+    match = re.fullmatch(rf"{table}_(\d{{4}})_(\d{{2}})", name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return bool(conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+             "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"),
+        {"table": table},
+    ).scalar())
+
+
+def list_partitions(conn: Connection, table: str) -> List[str]:
+    return list(conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table ORDER BY c.relname"),
+        {"table": table},
+    ).scalars())
+
+
+def create_month_partition(conn: Connection, table: str, month: date) -> str:
+    name = partition_name(table, month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    return name
+
+
+def ensure_partitions(engine: Engine, months_ahead: int = None, today: date = None) -> List[str]:
+    """Create this month's and the next `months_ahead` monthly partitions where missing.
+
+    A month whose rows already landed in the default partition is skipped with a warning;
+    those rows have to be moved out of the default partition before its partition can exist.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = add_months(today or date.today(), 0)
+    created = []
+    with engine.connect() as conn:
+        existing = {table: set(list_partitions(conn, table))
+                    for table in PARTITIONED_TABLES if is_partitioned(conn, table)}
+    for table, partitions in existing.items():
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(table, month) in partitions:
+                continue
+            try:
+                with engine.begin() as conn:
+                    created.append(create_month_partition(conn, table, month))
+            except Exception as e:
+                logger.warning(f"Could not create partition {partition_name(table, month)}: {e}")
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+    return created
+
+
+def archive_partitions(engine: Engine, after_months: int = None, tablespace: str = None,
+                       today: date = None) -> List[str]:
+    """Move partitions older than `after_months` to the archive tablespace and lz4 compression."""
+    if engine.dialect.name != "postgresql":
+        return []
+    after_months = settings.ARCHIVE_AFTER_MONTHS if after_months is None else after_months
+    tablespace = settings.ARCHIVE_TABLESPACE if tablespace is None else tablespace
+    if not tablespace:
+        return []
+    cutoff = add_months(today or date.today(), -after_months)
+    archived = []
+    with engine.connect() as conn:
+        archived_already = set(conn.execute(
+            text("SELECT c.relname FROM pg_class c JOIN pg_tablespace t ON t.oid = c.reltablespace "
+                 "WHERE t.spcname = :tablespace"),
+            {"tablespace": tablespace},
+        ).scalars())
+        candidates = [
+            (table, name)
+            for table in PARTITIONED_TABLES if is_partitioned(conn, table)
+            for name in list_partitions(conn, table)
+        ]
+    for table, name in candidates:
+        month = parse_partition_month(table, name)
+        if month is None or add_months(month, 1) > cutoff or name in archived_already:
+            continue
+        with engine.begin() as conn:
+            archive_partition(conn, table, name, month, tablespace)
+        archived.append(name)
+        logger.info(f"Archived partition {name} to tablespace {tablespace}")
+    return archived
+
+
+def archive_partition(conn: Connection, table: str, name: str, month: date, tablespace: str):
+    """Rewrite one partition into `tablespace`, its text recompressed with lz4 and its indexes moved.
+
+    ALTER TABLE ... SET COMPRESSION only applies to values written afterwards (neither VACUUM FULL
+    nor INSERT ... SELECT recompresses a value that is already compressed), and SET TABLESPACE
+    leaves the indexes behind. So the partition is copied into a new table with every text value
+    rebuilt (`|| ''`), the copy replaces it and is attached again, and the indexes ATTACH creates
+    for it are moved into the tablespace.
+    """
+    text_columns = PARTITIONED_TABLES[table][1]
+    staging = f"{name}_archive"
+    columns = list(conn.execute(
+        text("SELECT column_name FROM information_schema.columns "
+             "WHERE table_name = :name AND is_generated = 'NEVER' ORDER BY ordinal_position"),
+        {"name": name},
+    ).scalars())
+    selected = ", ".join(f"{column} || ''" if column in text_columns else column for column in columns)
+
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    conn.execute(text(f"CREATE TABLE {staging} (LIKE {name} INCLUDING ALL EXCLUDING INDEXES) "
+                      f"WITH (fillfactor = 100) TABLESPACE {tablespace}"))
+    for column in text_columns:
+        conn.execute(text(f"ALTER TABLE {staging} ALTER COLUMN {column} SET COMPRESSION lz4"))
+    conn.execute(text(f"INSERT INTO {staging} ({', '.join(columns)}) SELECT {selected} FROM {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    indexes = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :name AND tablespace IS DISTINCT FROM :tablespace"),
+        {"name": name, "tablespace": tablespace},
+    ).scalars()
+    for index in list(indexes):
+        conn.execute(text(f"ALTER INDEX {index} SET TABLESPACE {tablespace}"))
+    conn.execute(text(f"ANALYZE {name}"))
+
+
+def maintain_partitions(engine: Engine):
+    """Run both maintenance steps (meant for a daily cron; startup only runs ensure_partitions)."""
+    return ensure_partitions(engine), archive_partitions(engine)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from app.db.session import engine
+    created, archived = maintain_partitions(engine)
+    print(f"Created {len(created)} partitions, archived {len(archived)}")
@@ -0,0 +1,276 @@
+"""Read replica routing: replica rotation, the routing session and read-your-writes.
+
+A principal who wrote within REPLICA_STICKY_SECONDS reads from the primary. The time of that
+write travels with the client (ReadYourWritesMiddleware: a `last_write` cookie, or the
+X-Last-Write header for clients without a cookie jar), so the next request is routed the same
+way by whichever worker serves it. Each ReplicaSet also remembers its own process's writers.
+"""
+import contextvars
+import itertools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from app.db.sharding import DIRECTORY, is_sharded
+
+logger = logging.getLogger(__name__)
+
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+class WriteMark:
+    """Wall-clock time of the client's last write, as received and as updated by this request."""
+
+    def __init__(self, at: Optional[float] = None):
+        self.at = at
+        self.changed = False
+
+    def record(self):
+        self.at, self.changed = time.time(), True
+
+
+_write_mark: contextvars.ContextVar = contextvars.ContextVar("last_write", default=None)
+
+
+@contextmanager
+def track_writes(last_write: Optional[float] = None):
+    """Route the sessions of this context by the client's last write; yields the WriteMark."""
+    mark = WriteMark(last_write)
+    token = _write_mark.set(mark)
+    try:
+        yield mark
+    finally:
+        _write_mark.reset(token)
+
+_PG_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def replication_lag(engine: Engine, timeout: float = 2.0) -> float:
+    """Seconds a replica is behind its primary (0 for dialects without streaming replication).
+
+    The query is cancelled after `timeout` seconds; the engine's connect timeout bounds the connect.
+    """
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    with engine.connect() as conn:
+        conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout * 1000)}"))
+        return float(conn.execute(_PG_LAG_SQL).scalar() or 0.0)
+
+
+class ReplicaSet:
+    """Replica engines in round-robin rotation; replicas that lag or fail are taken out of it.
+
+    Lag is probed in a background thread every `check_interval` seconds, so a hung replica never
+    holds up a request: `choose()` only reads the last probe's result. Until the first probe has
+    finished, reads go to the primary.
+    """
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        max_lag: float = 10.0,
+        check_interval: float = 5.0,
+        sticky_seconds: float = 5.0,
+        lag_probe: Callable[[Engine], float] = replication_lag,
+    ):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.lag_probe = lag_probe
+        self._healthy: List[Engine] = []
+        self._checked_at: Optional[float] = None
+        self._probe: Optional[threading.Thread] = None
+        self._counter = itertools.count()
+        self._recent_writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Re-probe replication lag and rebuild the rotation."""
+        healthy = []
+        for engine in self.engines:
+            try:
+                lag = self.lag_probe(engine)
+            except Exception as e:
+                logger.warning(f"Replica {engine.url.render_as_string()} unavailable: {e}")
+                continue
+            if lag > self.max_lag:
+                logger.warning(f"Replica {engine.url.render_as_string()} lagging {lag:.1f}s, out of rotation")
+                continue
+            healthy.append(engine)
+        self._healthy = healthy
+        self._checked_at = time.monotonic()
+
+    def _start_probe(self):
+        """Run refresh() in the background unless a probe is already running (forked workers start their own)."""
+        with self._lock:
+            if self._probe is not None and self._probe.is_alive():
+                return
+            self._probe = threading.Thread(target=self.refresh, name="replica-probe", daemon=True)
+            self._probe.start()
+
+    def choose(self) -> Optional[Engine]:
+        if not self.engines:
+            return None
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self._start_probe()
+        healthy = self._healthy
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def record_write(self, principal: str):
+        now = time.monotonic()
+        if len(self._recent_writes) > 10_000:
+            self._recent_writes = {p: t for p, t in self._recent_writes.items() if now - t <= self.sticky_seconds}
+        self._recent_writes[principal] = now
+
+    def recently_wrote(self, principal: str, last_write: Optional[float] = None) -> bool:
+        """Whether `principal` wrote within the sticky window: in this process, or per the
+        client-carried `last_write` (wall-clock seconds) from any worker."""
+        if last_write is not None and 0 <= time.time() - last_write < self.sticky_seconds:
+            return True
+        wrote_at = self._recent_writes.get(principal)
+        if wrote_at is None:
+            return False
+        if time.monotonic() - wrote_at >= self.sticky_seconds:
+            self._recent_writes.pop(principal, None)
+            return False
+        return True
+
+
+class RoutingSession(Session):
+    """Session that sends reads made inside @read_only service calls to a replica.
+
+    Everything else goes to the primary: flushes, DML, SELECT ... FOR UPDATE, any read in a
+    transaction that has already written, and reads by a principal who wrote within the
+    replica set's sticky window (read-your-writes).
+
+    With hospital shards (app.db.sharding), clinical tables go to the shard the session is
+    pinned to, or the one named by a `shard` bind argument; replicas serve the directory only.
+    """
+
+    def get_bind(self, mapper=None, clause=None, shard=None, **kw):
+        shards = self.info.get("shards")
+        if shards is not None and is_sharded(mapper, clause):
+            name = shard or self.info.get("shard")
+            if name not in (None, DIRECTORY):
+                return shards.engine(name)
+        primary = super().get_bind(mapper, clause=clause, **kw)
+        replicas: Optional[ReplicaSet] = self.info.get("replicas")
+        if (
+            replicas is None
+            or not self.info.get("read_only")
+            or self._flushing
+            or self.info.get("wrote")
+            or isinstance(clause, UpdateBase)
+            or getattr(clause, "_for_update_arg", None) is not None
+        ):
+            return primary
+        principal = self.info.get("principal")
+        mark = _write_mark.get()
+        if principal and replicas.recently_wrote(principal, mark.at if mark else None):
+            return primary
+        return replicas.choose() or primary
+
+
+def _mark_write(session):
+    session.info["wrote"] = True
+    replicas = session.info.get("replicas")
+    principal = session.info.get("principal")
+    if replicas is not None and principal:
+        replicas.record_write(principal)
+        mark = _write_mark.get()
+        if mark is not None:
+            mark.record()
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _track_flush(session, flush_context):
+    _mark_write(session)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _track_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write(orm_execute_state.session)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _reset_write(session):
+    session.info.pop("wrote", None)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _reset_write_on_rollback(session):
+    session.info.pop("wrote", None)
+
+
+def read_only(func):
+    """Mark a function as safe to serve from a replica.
+
+    The session is the first positional argument (services) or the `db` keyword (routes).
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        db = args[0] if args else kwargs["db"]
+        previous = db.info.get("read_only", False)
+        db.info["read_only"] = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db.info["read_only"] = previous
+    return wrapper
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    try:
+        at = float(value)
+    except (TypeError, ValueError):
+        return None
+    return at if math.isfinite(at) else None
+
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware carrying the time of a client's last write between requests.
+
+    Reads it from the `last_write` cookie or the X-Last-Write header and, when the request
+    wrote, returns the new time in both, the cookie expiring with the sticky window.
+    """
+
+    def __init__(self, app, sticky_seconds: float):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        connection = HTTPConnection(scope)
+        last_write = _parse_time(connection.headers.get(LAST_WRITE_HEADER) or connection.cookies.get(LAST_WRITE_COOKIE))
+
+        with track_writes(last_write) as mark:
+            async def send_with_mark(message):
+                if message["type"] == "http.response.start" and mark.changed:
+                    headers = MutableHeaders(scope=message)
+                    value = f"{mark.at:.6f}"
+                    headers.append(LAST_WRITE_HEADER, value)
+                    headers.append("set-cookie", f"{LAST_WRITE_COOKIE}={value}; Max-Age={math.ceil(self.sticky_seconds)}; "
+                                                 "Path=/; HttpOnly; SameSite=Lax")
+                await send(message)
+
+            await self.app(scope, receive, send_with_mark)
@@ -0,0 +1,39 @@
+"""Full-text search column for medical_records (PostgreSQL only).
+
+`search_vector` is a stored generated tsvector over the record's text fields, weighted
+diagnosis (A) > treatment and prescribed_medicines (B) > notes (C), with a GIN index. PostgreSQL
+recomputes it on every INSERT and UPDATE, so it can never drift from the row. It is not mapped on
+the model, which keeps the SQLite schema (and its in-process fallback index) unchanged.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = "english"
+
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(diagnosis, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(treatment, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(prescribed_medicines, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(notes, '')), 'C')"
+)
+
+ADD_SEARCH_VECTOR = (
+    "ALTER TABLE medical_records ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+)
+
+CREATE_SEARCH_INDEX = "CREATE INDEX IF NOT EXISTS ix_medical_records_search ON medical_records USING gin (search_vector)"
+
+
+def ensure_search_index(engine: Engine) -> bool:
+    """Add the search column and index where missing (development schemas built by create_all)."""
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(ADD_SEARCH_VECTOR))
+        conn.execute(text(CREATE_SEARCH_INDEX))
+    return True
@@ -1,19 +1,86 @@
+from functools import partial
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.query_auditor import instrument_engine
+from app.db.routing import ReplicaSet, RoutingSession, replication_lag
+from app.db.sharding import ShardMap, parse_pairs
+
+def engine_options(url: str, secondary: bool = False) -> dict:
+    """Pool sizing for an engine (`secondary`: a replica or shard); SQLite uses SQLAlchemy's own pool defaults."""
+    if url.startswith("sqlite"):
+        return {}
+    pool_size = settings.DB_SECONDARY_POOL_SIZE if secondary and settings.DB_SECONDARY_POOL_SIZE else settings.DB_POOL_SIZE
+    return {"pool_size": pool_size, "max_overflow": settings.DB_MAX_OVERFLOW}
 
 # Create a synchronous database engine
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+if settings.QUERY_AUDIT_ENABLED:
+    instrument_engine(engine)
+
+def _create_replica_set() -> ReplicaSet:
+    """Build the read replica rotation from DATABASE_REPLICA_URLS (comma separated)."""
+    engines = []
+    for url in filter(None, (u.strip() for u in settings.DATABASE_REPLICA_URLS.split(","))):
+        options = engine_options(url, secondary=True)
+        if url.startswith("postgresql"):
+            # A replica that stops answering fails fast rather than holding a request or the lag probe
+            options["connect_args"] = {"connect_timeout": max(1, round(settings.REPLICA_PROBE_TIMEOUT))}
+        replica = create_engine(url, **options)
+        if settings.QUERY_AUDIT_ENABLED:
+            instrument_engine(replica)
+        engines.append(replica)
+    return ReplicaSet(
+        engines,
+        max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+        check_interval=settings.REPLICA_HEALTH_INTERVAL,
+        sticky_seconds=settings.REPLICA_STICKY_SECONDS,
+        lag_probe=partial(replication_lag, timeout=settings.REPLICA_PROBE_TIMEOUT),
+    )
+
+replica_set = _create_replica_set()
+
+def _create_shard_map():
+    """Hospital shards from SHARD_URLS and HOSPITAL_SHARDS; None when there are none."""
+    urls = parse_pairs(settings.SHARD_URLS)
+    if not urls:
+        return None
+    shards = {}
+    for name, url in urls.items():
+        shards[name] = create_engine(url, **engine_options(url, secondary=True))
+        if settings.QUERY_AUDIT_ENABLED:
+            instrument_engine(shards[name])
+    return ShardMap(engine, shards, parse_pairs(settings.HOSPITAL_SHARDS), settings.SHARD_ID_SPAN)
+
+shard_map = _create_shard_map()
+
+def all_engines() -> list:
+    """The primary, replica and shard engines of this process."""
+    engines = [engine, *replica_set.engines]
+    if shard_map is not None:
+        engines += [e for e in shard_map.engines.values() if e is not engine]
+    return engines
 
-# Create a session factory for handling database connections
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create a session factory for handling database connections; reads inside
+# @read_only service calls are routed to replica_set, clinical tables to the pinned shard
+# expire_on_commit=False keeps UPDATE ... RETURNING results usable without a refresh SELECT.
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, expire_on_commit=False, bind=engine,
+    info={"replicas": replica_set, "shards": shard_map},
+)
 Base = declarative_base()
 
-# Dependency to get a database session
+# Dependency to get a database session. The request is one unit of work: services only
+# flush, and the transaction commits once after the endpoint returns (or rolls back if it
+# raised). Use Depends(get_db, scope="function") so the commit lands before the response is sent.
 def get_db():
     db = SessionLocal()
     try:
         yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
@@ -0,0 +1,232 @@
+"""Hospital-based sharding of the clinical tables.
+
+    python -m app.db.sharding init    # create the clinical tables on every shard and set their id ranges
+
+Doctors, patients, appointments, medical records and prescriptions live on the shard of their
+hospital. Everything else (users, roles, permissions, audit log, jobs, medicines, ...) lives in
+the directory, DATABASE_URL, which is also the shard of every hospital not listed in
+HOSPITAL_SHARDS. With SHARD_URLS empty there is only the directory and nothing changes.
+
+Each shard owns a range of ids: shard n (in SHARD_URLS order, the directory being 0) allocates
+ids from n * SHARD_ID_SPAN + 1, so the shard of a doctor, patient or record follows from its id
+without a lookup. Shards must therefore only ever be appended to SHARD_URLS.
+
+A session is pinned to one shard at a time (`use_shard`): the signed-in user's home shard
+(users.shard), re-pinned by the services to the shard of the ids they are given. Lists that
+span hospitals run on every shard in parallel and merge the ordered results (`scatter_gather`).
+
+Shards are created here rather than by Alembic, which manages the directory. Their clinical
+tables keep the foreign keys between themselves but not those into the directory (user ids).
+The in-process search, cohort and load indexes and the analytics rollups still cover the
+directory shard only: they are built and queried on a session pinned to it (`pinned`), and
+changes to rows on other shards are not fed into them (`in_directory`).
+"""
+import argparse
+import heapq
+import itertools
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = "directory"
+# In foreign key order
+SHARDED_TABLES = ("doctors", "patients", "appointments", "medical_records", "prescriptions")
+
+
+class CrossShardError(ValueError):
+    """The ids of one operation belong to different shards (hospitals)."""
+
+
+class ShardMap:
+    """Shard engines, their id ranges, and which hospital lives on which shard."""
+
+    def __init__(self, directory: Engine, shards: Dict[str, Engine], hospitals: Dict[str, str],
+                 id_span: int = 100_000_000):
+        unknown = set(hospitals.values()) - set(shards) - {DIRECTORY}
+        if unknown:
+            raise ValueError(f"HOSPITAL_SHARDS names unknown shards: {', '.join(sorted(unknown))}")
+        self.engines = {DIRECTORY: directory, **shards}
+        self.names = list(self.engines)  # position = shard number
+        self.hospitals = hospitals
+        self.id_span = id_span
+        self._pool = ThreadPoolExecutor(max_workers=len(self.names), thread_name_prefix="shard")
+
+    def engine(self, name: Optional[str]) -> Engine:
+        return self.engines[name or DIRECTORY]
+
+    def for_hospital(self, hospital: Optional[str]) -> str:
+        return self.hospitals.get(hospital or "", DIRECTORY)
+
+    def for_id(self, entity_id: int) -> str:
+        number = (entity_id - 1) // self.id_span
+        if not 0 <= number < len(self.names):
+            return DIRECTORY  # unknown range; the id will simply not be found
+        return self.names[number]
+
+    def id_floor(self, name: str) -> int:
+        """Ids on shard `name` start after this value."""
+        return self.names.index(name) * self.id_span
+
+
+def parse_pairs(value: str) -> Dict[str, str]:
+    """"a=x, b=y" -> {"a": "x", "b": "y"}, in order."""
+    pairs = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        key, _, val = item.partition("=")
+        pairs[key.strip()] = val.strip()
+    return pairs
+
+
+def is_sharded(mapper=None, clause=None) -> bool:
+    if mapper is not None:
+        return inspect(mapper).persist_selectable.name in SHARDED_TABLES
+    return getattr(getattr(clause, "table", None), "name", None) in SHARDED_TABLES
+
+
+# Pinning a session ---------------------------------------------------------
+
+def use_shard(db: Session, name: Optional[str]):
+    """Send the session's clinical statements to shard `name` (None: the directory).
+
+    Pending changes are flushed to the previous shard first. No-op without sharding.
+    """
+    if db.info.get("shards") is None or db.info.get("shard") == name:
+        return
+    if db.new or db.dirty or db.deleted:
+        db.flush()
+    db.info["shard"] = name
+
+
+@contextmanager
+def pinned(db: Session, name: Optional[str]):
+    """Run the block on shard `name` (None: the directory), then return to the previous shard."""
+    previous = db.info.get("shard")
+    use_shard(db, name)
+    try:
+        yield
+    finally:
+        use_shard(db, previous)
+
+
+def in_directory(db: Session, entity_id: Optional[int]) -> bool:
+    """Whether a doctor/patient/record id lives on the directory shard (always, without sharding)."""
+    shards: Optional[ShardMap] = db.info.get("shards")
+    return entity_id is not None and (shards is None or shards.for_id(entity_id) == DIRECTORY)
+
+
+def shard_for_hospital(db: Session, hospital: Optional[str]) -> Optional[str]:
+    """The shard holding `hospital`'s doctors and patients; None for the directory."""
+    shards: Optional[ShardMap] = db.info.get("shards")
+    name = shards.for_hospital(hospital) if shards is not None else DIRECTORY
+    return None if name == DIRECTORY else name
+
+
+def shard_for_ids(db: Session, *entity_ids: Optional[int]) -> Optional[str]:
+    """The one shard of the given doctor/patient/record ids; None for the directory."""
+    shards: Optional[ShardMap] = db.info.get("shards")
+    if shards is None:
+        return None
+    names = {shards.for_id(entity_id) for entity_id in entity_ids if entity_id is not None}
+    if len(names) > 1:
+        raise CrossShardError("The patient and doctor belong to hospitals on different shards")
+    name = names.pop() if names else DIRECTORY
+    return None if name == DIRECTORY else name
+
+
+def route_by_id(db: Session, *entity_ids: Optional[int]):
+    """Pin the session to the shard of the given ids, which must share one (ignored when all are None)."""
+    if any(entity_id is not None for entity_id in entity_ids):
+        use_shard(db, shard_for_ids(db, *entity_ids))
+
+
+def scatter_gather(db: Session, build: Callable[[Session], Query], key: Callable, skip: int = 0,
+                   limit: Optional[int] = None, reverse: bool = False) -> list:
+    """Rows skip..skip+limit of the query `build(session)` across every shard.
+
+    `build` must order its rows by `key` (descending with `reverse`). Each shard is queried in
+    parallel for its first skip+limit rows, and the sorted streams are merged. Without sharding
+    this is one query on `db`.
+    """
+    shards: Optional[ShardMap] = db.info.get("shards")
+    if shards is None:
+        query = build(db).offset(skip)
+        return (query.limit(limit) if limit is not None else query).all()
+
+    def fetch(engine: Engine) -> list:
+        with Session(engine, expire_on_commit=False) as session:
+            query = build(session)
+            return (query.limit(skip + limit) if limit is not None else query).all()
+
+    results = list(shards._pool.map(fetch, shards.engines.values()))
+    merged = heapq.merge(*results, key=key, reverse=reverse)
+    return list(itertools.islice(merged, skip, None if limit is None else skip + limit))
+
+
+# Shard schema --------------------------------------------------------------
+
+def create_shard_schema(engine: Engine, id_floor: int):
+    """Create the clinical tables on a shard (if missing) and move their ids past `id_floor`."""
+    from app.db.base import Base
+    import app.models  # noqa: F401  (register all mappers)
+
+    metadata = MetaData()
+    tables = [Base.metadata.tables[name].to_metadata(metadata) for name in SHARDED_TABLES]
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        for table in tables:
+            if table.name in existing:
+                continue
+            table.dialect_options["sqlite"]["autoincrement"] = True  # ids from sqlite_sequence, which we can seed
+            local_keys = [fk for fk in table.foreign_key_constraints
+                          if fk.elements[0].target_fullname.split(".")[0] in SHARDED_TABLES]
+            conn.execute(CreateTable(table, include_foreign_key_constraints=local_keys))
+            for index in table.indexes:
+                conn.execute(CreateIndex(index))
+        if id_floor:
+            for table in SHARDED_TABLES:
+                _raise_id_floor(conn, table, id_floor)
+
+
+def _raise_id_floor(conn, table: str, floor: int):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                          f"GREATEST(:floor, (SELECT COALESCE(MAX(id), 0) FROM {table})))"), {"floor": floor})
+    elif conn.dialect.name == "sqlite":
+        updated = conn.execute(text("UPDATE sqlite_sequence SET seq = MAX(seq, :floor) WHERE name = :table"),
+                               {"floor": floor, "table": table}).rowcount
+        if not updated:
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:table, :floor)"),
+                         {"floor": floor, "table": table})
+    else:
+        logger.warning(f"Cannot set the id range of {table} on {conn.dialect.name}; set it by hand")
+
+
+def init_shards(shards: ShardMap, names: Optional[Iterable[str]] = None) -> List[str]:
+    """Create the schema of every shard but the directory (whose schema is Alembic's)."""
+    created = []
+    for name in names or shards.names[1:]:
+        create_shard_schema(shards.engine(name), shards.id_floor(name))
+        logger.info(f"Shard {name} ready, ids from {shards.id_floor(name) + 1}")
+        created.append(name)
+    return created
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Manage the hospital shards.")
+    parser.add_argument("command", choices=["init"])
+    args = parser.parse_args()
+
+    from app.db.session import shard_map
+
+    if shard_map is None:
+        parser.error("SHARD_URLS is not set")
+    print(f"Initialized shards: {', '.join(init_shards(shard_map)) or 'none'}")
@@ -0,0 +1,64 @@
+"""Background jobs: a durable queue in the `jobs` table, runners and timer-driven schedules.
+
+Runs inside the API workers (JOBS_IN_PROCESS) or standalone with `python -m app.jobs`.
+"""
+from app.jobs.queue import enqueue, job_handler
+from app.jobs.runner import JobRunner
+
+# Register the built-in job handlers
+from app.jobs import analytics, reminders  # noqa: F401,E402
+
+_runner = None
+
+
+def get_job_runner() -> JobRunner:
+    """The process-wide runner, with the recurring schedules configured."""
+    global _runner
+    if _runner is None:
+        from app.core.config import settings
+        from app.db.session import SessionLocal
+
+        _runner = JobRunner(
+            SessionLocal,
+            concurrency=settings.JOB_CONCURRENCY,
+            poll_interval=settings.JOB_POLL_INTERVAL,
+            batch_size=settings.JOB_BATCH_SIZE,
+        )
+
+        def scan_reminders():
+            with SessionLocal() as db:
+                if reminders.schedule_appointment_reminders(db):
+                    _runner.notify()
+
+        def prune_appointment_events():
+            from app.core.events import prune_events
+
+            with SessionLocal() as db:
+                prune_events(db)
+
+        def prune_idempotency_keys():
+            from app.core.idempotency import prune_idempotency_keys as prune
+
+            with SessionLocal() as db:
+                prune(db)
+
+        def prune_finished_jobs():
+            from app.jobs.queue import prune_jobs
+
+            with SessionLocal() as db:
+                prune_jobs(db)
+
+        def scan_analytics():
+            with SessionLocal() as db:
+                if analytics.schedule_analytics(db):
+                    _runner.notify()
+
+        _runner.every(settings.REMINDER_SCAN_SECONDS, scan_reminders)
+        _runner.every(settings.ANALYTICS_REFRESH_SECONDS, scan_analytics)
+        _runner.every(3600, prune_appointment_events)
+        _runner.every(3600, prune_idempotency_keys)
+        _runner.every(3600, prune_finished_jobs)
+    return _runner
+
+
+__all__ = ["JobRunner", "enqueue", "get_job_runner", "job_handler"]
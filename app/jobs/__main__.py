@@ -0,0 +1,29 @@
+"""Standalone job worker.
+
+    python -m app.jobs
+
+Runs the same runner the API workers start when JOBS_IN_PROCESS is set; any number of these can
+run side by side since jobs are claimed with FOR UPDATE SKIP LOCKED.
+"""
+import logging
+import signal
+import threading
+
+from app.jobs import get_job_runner
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    stopped = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: stopped.set())
+
+    runner = get_job_runner()
+    runner.start()
+    while not stopped.wait(60):
+        logging.getLogger("app.jobs").info(f"Job metrics: {runner.metrics.snapshot()}")
+    runner.stop()
+
+
+if __name__ == "__main__":
+    main()
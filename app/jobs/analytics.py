@@ -0,0 +1,36 @@
+"""Analytics rollups: a periodic incremental refresh plus a daily recompute of recent days."""
+import logging
+import time
+from datetime import date
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.jobs.queue import enqueue, job_handler
+from app.services.analytics_service import recompute_recent, refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+REFRESH_JOB = "analytics_refresh"
+RECOMPUTE_JOB = "analytics_recompute"
+
+
+def schedule_analytics(db: Session, now: Optional[float] = None, today: Optional[date] = None) -> int:
+    """Queue this interval's refresh and today's recompute; the dedupe keys make each scan idempotent."""
+    interval = int((now or time.time()) // settings.ANALYTICS_REFRESH_SECONDS)
+    today = today or date.today()
+    queued = enqueue(db, REFRESH_JOB, dedupe_key=f"{REFRESH_JOB}:{interval}")
+    queued += enqueue(db, RECOMPUTE_JOB, {"day": today.isoformat()}, dedupe_key=f"{RECOMPUTE_JOB}:{today.isoformat()}")
+    db.commit()
+    return queued
+
+
+@job_handler(REFRESH_JOB)
+def run_refresh(db: Session, payload: dict):
+    refresh_rollups(db)
+
+
+@job_handler(RECOMPUTE_JOB)
+def run_recompute(db: Session, payload: dict):
+    recompute_recent(db, date.fromisoformat(payload["day"]))
@@ -0,0 +1,105 @@
+"""Durable job queue on the `jobs` table."""
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.job import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# kind -> handler(db, payload); the handler's writes commit together with the job's completion
+_handlers: Dict[str, Callable[[Session, dict], None]] = {}
+
+
+def job_handler(kind: str):
+    """Register the function that runs jobs of `kind`."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def get_handler(kind: str) -> Optional[Callable[[Session, dict], None]]:
+    return _handlers.get(kind)
+
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, run_at: Optional[datetime] = None,
+            dedupe_key: Optional[str] = None, max_attempts: Optional[int] = None) -> bool:
+    """Queue a job in the caller's transaction. Returns False when `dedupe_key` was already queued."""
+    values = {
+        "kind": kind,
+        "payload": payload or {},
+        "status": JobStatus.QUEUED,
+        "run_at": run_at or datetime.utcnow(),
+        "attempts": 0,
+        "max_attempts": max_attempts or settings.JOB_MAX_ATTEMPTS,
+        "dedupe_key": dedupe_key,
+        "created_at": datetime.utcnow(),
+    }
+    dialect = db.get_bind(Job).dialect.name
+    if dedupe_key and dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(Job).values(**values).on_conflict_do_nothing(index_elements=["dedupe_key"])
+        return db.execute(stmt).rowcount == 1
+    if dedupe_key and db.query(Job.id).filter(Job.dedupe_key == dedupe_key).first():
+        return False
+    db.execute(insert(Job).values(**values))
+    return True
+
+
+def claim_jobs(db: Session, worker_id: str, limit: int, now: Optional[datetime] = None) -> List[Job]:
+    """Lock and mark up to `limit` due jobs as running; concurrent claimers skip each other's rows."""
+    now = now or datetime.utcnow()
+    jobs = (
+        db.query(Job)
+        .filter(Job.status == JobStatus.QUEUED, Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in jobs:
+        job.status = JobStatus.RUNNING
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.attempts += 1
+    db.commit()
+    return jobs
+
+
+def next_run_at(db: Session) -> Optional[datetime]:
+    """When the earliest queued job becomes due."""
+    return db.query(func.min(Job.run_at)).filter(Job.status == JobStatus.QUEUED).scalar()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff: base, 2*base, 4*base ... capped at one hour."""
+    return timedelta(seconds=min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), 3600))
+
+
+def release_stale_jobs(db: Session, now: Optional[datetime] = None) -> int:
+    """Requeue jobs claimed more than JOB_LOCK_TIMEOUT ago that never finished (their worker died)."""
+    now = now or datetime.utcnow()
+    result = db.execute(
+        update(Job)
+        .where(Job.status == JobStatus.RUNNING, Job.locked_at < now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT))
+        .values(status=JobStatus.QUEUED, locked_by=None, locked_at=None, run_at=now)
+    )
+    db.commit()
+    if result.rowcount:
+        logger.warning(f"Requeued {result.rowcount} jobs abandoned by their workers")
+    return result.rowcount
+
+
+def prune_jobs(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete jobs that finished (done or failed) more than JOB_RETENTION_HOURS ago."""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=settings.JOB_RETENTION_HOURS)
+    deleted = db.execute(delete(Job).where(Job.status.in_([JobStatus.DONE, JobStatus.FAILED]),
+                                           Job.finished_at < cutoff)).rowcount
+    db.commit()
+    return deleted
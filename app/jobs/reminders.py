@@ -0,0 +1,67 @@
+"""Appointment reminders: a periodic scan queues one job per upcoming appointment."""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.sharding import route_by_id, scatter_gather
+from app.jobs.queue import enqueue, job_handler
+from app.models.appointment import Appointment, AppointmentStatus
+
+logger = logging.getLogger(__name__)
+
+REMINDER_JOB = "appointment_reminder"
+_INACTIVE = (AppointmentStatus.CANCELED, AppointmentStatus.COMPLETED)
+
+
+def schedule_appointment_reminders(db: Session, now: Optional[datetime] = None) -> int:
+    """Queue reminders for appointments starting within the next lead time plus one scan interval.
+
+    Each reminder runs REMINDER_LEAD_HOURS before its appointment (or right away if that moment
+    passed). The dedupe key includes the appointment time, so a rescheduled appointment gets a
+    fresh reminder and re-scans are no-ops. Appointments are scanned on every shard; the jobs
+    live in the directory.
+    """
+    now = now or datetime.utcnow()
+    lead = timedelta(hours=settings.REMINDER_LEAD_HOURS)
+    horizon = now + lead + timedelta(seconds=settings.REMINDER_SCAN_SECONDS)
+    upcoming = scatter_gather(
+        db,
+        lambda session: (
+            session.query(Appointment.id, Appointment.appointment_date)
+            .filter(Appointment.appointment_date > now, Appointment.appointment_date <= horizon,
+                    Appointment.status.notin_(_INACTIVE))
+            .order_by(Appointment.appointment_date, Appointment.id)
+        ),
+        key=lambda row: (row.appointment_date, row.id),
+    )
+    queued = 0
+    for appointment_id, appointment_date in upcoming:
+        queued += enqueue(
+            db, REMINDER_JOB,
+            {"appointment_id": appointment_id, "appointment_date": appointment_date.isoformat()},
+            run_at=max(now, appointment_date - lead),
+            dedupe_key=f"{REMINDER_JOB}:{appointment_id}:{appointment_date.isoformat()}",
+        )
+    db.commit()
+    if queued:
+        logger.info(f"Queued {queued} appointment reminders")
+    return queued
+
+
+@job_handler(REMINDER_JOB)
+def send_appointment_reminder(db: Session, payload: dict):
+    """Remind the patient, unless the appointment was cancelled, completed or moved since queueing."""
+    route_by_id(db, payload["appointment_id"])
+    appointment = db.get(Appointment, payload["appointment_id"])
+    if appointment is None or appointment.status in _INACTIVE:
+        return
+    if appointment.appointment_date.isoformat() != payload["appointment_date"]:
+        return  # rescheduled; the next scan queues a reminder for the new time
+    # No notification channel exists yet; delivery (SMS/email) plugs in here
+    logger.info(
+        f"Reminder: patient {appointment.patient_id} has an appointment with doctor {appointment.doctor_id} "
+        f"at {appointment.appointment_date:%Y-%m-%d %H:%M}"
+    )
@@ -0,0 +1,205 @@
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.jobs.queue import claim_jobs, get_handler, next_run_at, release_stale_jobs, retry_delay
+from app.jobs.timers import TimerHeap
+from app.models.job import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+class JobMetrics:
+    """Thread-safe counters and timings, per job kind."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, kind: str, outcome: str, seconds: float):
+        with self._lock:
+            self.counts[kind][outcome] += 1
+            self.seconds[kind] += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            uptime = max(time.monotonic() - self.started_at, 1e-9)
+            kinds = {}
+            for kind, counts in self.counts.items():
+                total = sum(counts.values())
+                kinds[kind] = {**counts, "avg_ms": round(self.seconds[kind] / total * 1000, 2)}
+            processed = sum(sum(c.values()) for c in self.counts.values())
+            return {
+                "uptime_seconds": round(uptime, 1),
+                "processed": processed,
+                "jobs_per_second": round(processed / uptime, 3),
+                "kinds": kinds,
+            }
+
+
+class JobRunner:
+    """Claims due jobs and runs them on worker threads; a timer heap drives recurring work.
+
+    The scheduler thread owns the TimerHeap: recurring tasks (stale job release, appointment
+    reminder scans) and a wake-up timed for the earliest queued job, so workers start a delayed job
+    on time instead of waiting for the next poll.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], concurrency: int = 2, poll_interval: float = 5.0,
+                 batch_size: int = 10, worker_id: Optional[str] = None):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.metrics = JobMetrics()
+        self.timers = TimerHeap()
+        self._wakeup = threading.Event()
+        self._timers_changed = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._timers_lock = threading.RLock()
+        self._wakeup_due: Optional[datetime] = None
+
+    # Scheduling ---------------------------------------------------------
+
+    def every(self, interval: float, callback: Callable[[], None], delay: float = 0.0):
+        """Run `callback` on the scheduler thread every `interval` seconds."""
+        with self._timers_lock:
+            self.timers.call_later(delay, callback, interval)
+        self._timers_changed.set()
+
+    def notify(self):
+        """Wake idle workers, e.g. after enqueueing a job that is due now."""
+        self._wakeup.set()
+
+    def _schedule_next_job_wakeup(self):
+        with self.session_factory() as db:
+            due = next_run_at(db)
+        if due is None:
+            return
+        delay = (due - datetime.utcnow()).total_seconds()
+        if delay <= 0:
+            self._wakeup.set()
+        elif delay < self.poll_interval and due != self._wakeup_due:
+            self._wakeup_due = due
+            with self._timers_lock:
+                self.timers.call_later(delay, self._wakeup.set)
+
+    # Execution ----------------------------------------------------------
+
+    def run_once(self, limit: Optional[int] = None) -> int:
+        """Claim and run up to `limit` due jobs on the calling thread; returns how many ran."""
+        with self.session_factory() as db:
+            claimed = [(job.id, job.kind, job.payload, job.attempts, job.max_attempts)
+                       for job in claim_jobs(db, self.worker_id, limit or self.batch_size)]
+        for job in claimed:
+            self._execute(*job)
+        return len(claimed)
+
+    def _execute(self, job_id: int, kind: str, payload: dict, attempts: int, max_attempts: int):
+        started = time.monotonic()
+        handler = get_handler(kind)
+        with self.session_factory() as db:
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler registered for job kind '{kind}'")
+                handler(db, payload)
+                finished = self._finish(db, job_id, status=JobStatus.DONE, finished_at=datetime.utcnow(), last_error=None)
+                outcome = "succeeded" if finished else "lost"
+            except Exception as e:
+                db.rollback()
+                error = f"{type(e).__name__}: {e}"
+                if attempts < max_attempts:
+                    finished = self._finish(db, job_id, status=JobStatus.QUEUED,
+                                            run_at=datetime.utcnow() + retry_delay(attempts), last_error=error)
+                    outcome = "retried" if finished else "lost"
+                    logger.warning(f"Job {job_id} ({kind}) failed on attempt {attempts}/{max_attempts}, retrying: {error}")
+                else:
+                    finished = self._finish(db, job_id, status=JobStatus.FAILED, finished_at=datetime.utcnow(),
+                                            last_error=error)
+                    outcome = "failed" if finished else "lost"
+                    logger.error(f"Job {job_id} ({kind}) failed permanently after {attempts} attempts: {error}")
+        self.metrics.observe(kind, outcome, time.monotonic() - started)
+
+    def _finish(self, db: Session, job_id: int, **values) -> bool:
+        """Record the outcome if this worker still holds the job; otherwise roll back the handler's writes.
+
+        A job running past JOB_LOCK_TIMEOUT is requeued by release_stale_jobs and may already be
+        running elsewhere: that run's outcome, not ours, is the one to keep.
+        """
+        result = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JobStatus.RUNNING, Job.locked_by == self.worker_id)
+            .values(locked_by=None, locked_at=None, **values)
+        )
+        if result.rowcount != 1:
+            db.rollback()
+            logger.warning(f"Job {job_id} was released from {self.worker_id} before it finished; outcome discarded")
+            return False
+        db.commit()
+        return True
+
+    # Threads ------------------------------------------------------------
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                ran = self.run_once()
+            except Exception:
+                logger.exception("Claiming jobs failed")
+                ran = 0
+            if not ran:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _schedule(self):
+        while not self._stopping.is_set():
+            with self._timers_lock:
+                self.timers.run_due()
+            try:
+                self._schedule_next_job_wakeup()
+            except Exception:
+                logger.exception("Looking up the next due job failed")
+            with self._timers_lock:
+                wait = self.timers.seconds_until_next()
+            self._timers_changed.wait(min(wait if wait is not None else self.poll_interval, self.poll_interval))
+            self._timers_changed.clear()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        self.every(settings.JOB_LOCK_TIMEOUT / 2, self.release_stale, delay=0.0)
+        self._threads = [threading.Thread(target=self._schedule, name="jobs-scheduler", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._work, name=f"jobs-worker-{n}", daemon=True) for n in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Job runner {self.worker_id} started with {self.concurrency} workers")
+
+    def stop(self, timeout: float = 10.0):
+        """Let running jobs finish (up to `timeout`) and stop claiming new ones."""
+        self._stopping.set()
+        self._wakeup.set()
+        self._timers_changed.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        logger.info(f"Job runner stopped: {self.metrics.snapshot()}")
+
+    def release_stale(self):
+        with self.session_factory() as db:
+            release_stale_jobs(db)
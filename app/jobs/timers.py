@@ -0,0 +1,42 @@
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHeap:
+    """Min-heap of (due time, callback); recurring timers are pushed back after they fire."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._heap: List[Tuple[float, int, Callable[[], None], Optional[float]]] = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def call_later(self, delay: float, callback: Callable[[], None], interval: Optional[float] = None):
+        """Run `callback` after `delay` seconds, then every `interval` seconds if given."""
+        heapq.heappush(self._heap, (self.clock() + delay, next(self._counter), callback, interval))
+
+    def seconds_until_next(self) -> Optional[float]:
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.clock())
+
+    def run_due(self) -> int:
+        """Fire every timer that is due; returns how many fired."""
+        fired = 0
+        while self._heap and self._heap[0][0] <= self.clock():
+            _, _, callback, interval = heapq.heappop(self._heap)
+            if interval is not None:
+                self.call_later(interval, callback, interval)
+            try:
+                callback()
+            except Exception:
+                logger.exception(f"Timer callback {getattr(callback, '__name__', callback)} failed")
+            fired += 1
+        return fired
@@ -1,20 +1,30 @@
+import time
+_import_started = time.perf_counter()
+
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.routes.patients import router as patient_router
 from app.api.routes.doctors import router as doctor_router
 from app.api.routes.auth import router as auth_router
 from app.api.routes.appointments import router as appointment_router
 from app.api.routes.medicines import router as medicine_router
 from app.api.routes.medical_records import router as medical_record_router
+from app.api.routes.attachments import router as attachment_router
 from app.api.routes.prescriptions import router as prescription_router
 from app.api.routes.users import router as users_router
+from app.api.routes.assignments import router as assignment_router
+from app.api.routes.cohorts import router as cohort_router
+from app.api.routes.analytics import router as analytics_router
 from app.api.routes.routes import router as api_router
-from app.db.session import engine, Base
-from app.models.user import User
+from app.core.audit import AuditContextMiddleware, get_audit_writer
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.query_auditor import QueryAuditMiddleware
+from app.core.config import settings
 from app.db.init_db import init_db
-from app.db.session import get_db
-from app.models.role import seed_roles
+from app.db.routing import ReadYourWritesMiddleware
+from app.db.sharding import CrossShardError
 
 # Configure logging
 logging.basicConfig(
@@ -44,17 +54,94 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
+# Audit per-request queries for N+1 patterns, slow statements and endpoint budgets
+if settings.QUERY_AUDIT_ENABLED:
+    app.add_middleware(QueryAuditMiddleware)
+
+# Expose request path/client to the PHI access audit log
+if settings.AUDIT_ENABLED:
+    app.add_middleware(AuditContextMiddleware)
+
+# Carry each client's last write time, so any worker reads their writes from the primary
+if settings.DATABASE_REPLICA_URLS:
+    app.add_middleware(ReadYourWritesMiddleware, sticky_seconds=settings.REPLICA_STICKY_SECONDS)
+
+# Run retried creates (same Idempotency-Key) once and replay the stored response
+if settings.IDEMPOTENCY_ENABLED:
+    app.add_middleware(IdempotencyMiddleware)
+
+@app.exception_handler(CrossShardError)
+def cross_shard_error(request: Request, exc: CrossShardError):
+    """An operation tied together rows of hospitals on different shards."""
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+@app.on_event("startup")
+def startup_event():
+    """Initialize database and seed roles on startup.
+
+    Development creates missing tables; production trusts Alembic for the schema and
+    only checks the seeded roles with a single query.
+    """
+    started = time.perf_counter()
+    logger.info(f"Starting up application in {settings.STARTUP_MODE} mode...")
+    init_db(create_schema=settings.STARTUP_MODE != "production")
+    logger.info(
+        f"Application startup complete in {(time.perf_counter() - started) * 1000:.1f} ms "
+        f"(module import {_startup_import_ms:.1f} ms)"
+    )
+
+@app.on_event("startup")
+def start_audit_writer():
+    """Start the background writer of the PHI access audit log in this worker."""
+    if settings.AUDIT_ENABLED:
+        get_audit_writer().start()
+
+@app.on_event("shutdown")
+def stop_audit_writer():
+    """Flush queued audit events before the worker exits."""
+    if settings.AUDIT_ENABLED:
+        get_audit_writer().stop()
+
+@app.on_event("startup")
+def start_job_runner():
+    """Run background jobs inside this worker unless a standalone `python -m app.jobs` handles them."""
+    if settings.JOBS_IN_PROCESS:
+        from app.jobs import get_job_runner
+        get_job_runner().start()
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    if settings.JOBS_IN_PROCESS:
+        from app.jobs import get_job_runner
+        get_job_runner().stop()
+
+@app.on_event("startup")
+async def start_event_broker():
+    """Bind the appointment event broker to this worker's loop; on PostgreSQL, LISTEN for other workers' events."""
+    import asyncio
+    from app.core.events import PgEventListener, create_listen_engine, get_event_broker
+    from app.db.session import SessionLocal, engine
+
+    get_event_broker().bind(asyncio.get_running_loop())
+    if engine.dialect.name == "postgresql":
+        app.state.event_listener = PgEventListener(create_listen_engine(settings.DATABASE_URL), get_event_broker(),
+                                                   SessionLocal)
+        app.state.event_listener.start()
+
+@app.on_event("shutdown")
+async def stop_event_broker():
+    from app.core.events import get_event_broker
+
+    get_event_broker().close_all()
+    listener = getattr(app.state, "event_listener", None)
+    if listener is not None:
+        listener.stop()
 
 @app.on_event("startup")
-async def startup_event():
-    """Initialize database and seed roles on startup."""
-    logger.info("Starting up application...")
-    init_db()
-    db = next(get_db())
-    seed_roles(db)
-    logger.info("Application startup complete")
+async def configure_threadpool():
+    """Size the threadpool that runs sync endpoints to match this worker's DB pool."""
+    from anyio import to_thread
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
 
 @app.get("/", tags=["root"])
 def read_root():
@@ -73,11 +160,16 @@ app.include_router(doctor_router, prefix="/doctors", tags=["doctors"])
 app.include_router(appointment_router, prefix="/appointments", tags=["appointments"])
 app.include_router(medicine_router, prefix="/medicines", tags=[" medicines"])
 app.include_router(medical_record_router, prefix="/medical_records", tags=["medical_records"])
+app.include_router(attachment_router, prefix="/medical_records", tags=["attachments"])
 app.include_router(prescription_router, prefix="/prescriptions", tags=["prescriptions"])
+app.include_router(assignment_router, prefix="/assignments", tags=["assignments"])
+app.include_router(cohort_router, prefix="/cohorts", tags=["cohorts"])
+app.include_router(analytics_router, prefix="/api/analytics", tags=["analytics"])
 app.include_router(api_router, prefix="/api")
 
 logger.info("All routes registered successfully")
+_startup_import_ms = (time.perf_counter() - _import_started) * 1000
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
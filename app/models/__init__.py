@@ -6,4 +6,14 @@ from .appointment import Appointment
 from .medical_record import MedicalRecord
 from .medicine import Medicine
 from .patient import Patient
-from .prescription import Prescription
\ No newline at end of file
+from .prescription import Prescription
+from .role import Role
+from .permission import Permission
+from .attachment import Attachment
+from .audit_log import AuditLog
+from .job import Job, JobStatus
+from .appointment_event import AppointmentEvent
+from .drug_interaction import DrugInteraction
+from .analytics import AnalyticsRollup, AnalyticsWatermark
+from .data_key import DataKey
+from .idempotency_key import IdempotencyKey
@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import Column, Date, DateTime, Integer, String, UniqueConstraint
+from app.core.crypto import EncryptedText
+from app.db.base import Base
+
+class AnalyticsRollup(Base):
+    """A pre-aggregated count: `metric` for `dimension` (a doctor, diagnosis or medicine) in one period."""
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (
+        UniqueConstraint("metric", "grain", "period_start", "dimension", name="uq_analytics_rollups_key"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    metric = Column(String, nullable=False)  # visits, diagnoses, appointments or prescriptions
+    grain = Column(String, nullable=False)  # day, week or month
+    period_start = Column(Date, nullable=False)
+    dimension = Column(String, nullable=False)  # diagnoses: the blind index of the diagnosis
+    label = Column(EncryptedText("analytics_rollups.label"), nullable=True)  # diagnoses: the diagnosis itself
+    count = Column(Integer, nullable=False, default=0)
+
+class AnalyticsWatermark(Base):
+    """The highest source row id already counted into the rollups."""
+    __tablename__ = "analytics_watermarks"
+    __table_args__ = {'extend_existing': True}
+
+    source = Column(String, primary_key=True)  # source table name
+    last_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -16,10 +16,13 @@ class Appointment(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
     doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False, index=True)
-    appointment_date = Column(DateTime, nullable=False)
+    appointment_date = Column(DateTime, nullable=False, index=True)
     reason = Column(String, nullable=False)
     status = Column(String, default=AppointmentStatus.PENDING, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by every update; an If-Match update only applies at the version it names
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     patient = relationship("Patient", back_populates="appointments")
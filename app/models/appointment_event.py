@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, JSON, String
+from app.db.base import Base
+
+class AppointmentEvent(Base):
+    """An appointment change pushed to dashboards; the id is the SSE event id clients resume from."""
+    __tablename__ = "appointment_events"
+    __table_args__ = (
+        Index("ix_appointment_events_doctor_id_id", "doctor_id", "id"),
+        {'extend_existing': True},
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    type = Column(String, nullable=False)  # "created", "status_changed" or "updated"
+    appointment_id = Column(Integer, nullable=False)
+    doctor_id = Column(Integer, nullable=False)
+    patient_id = Column(Integer, nullable=False)
+    data = Column(JSON, nullable=False)  # the appointment as the API returns it
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+
+class Attachment(Base):
+    __tablename__ = "attachments"
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # No database FK: medical_records is partitioned and its key is (id, visit_date)
+    medical_record_id = Column(Integer, nullable=False, index=True)
+    sha256 = Column(String(64), nullable=False, index=True)  # content address of the stored blob
+    size_bytes = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    medical_record = relationship(
+        "MedicalRecord",
+        primaryjoin="foreign(Attachment.medical_record_id) == MedicalRecord.id",
+        back_populates="attachments",
+        viewonly=True,
+    )
@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+from app.db.base import Base
+
+class AuditLog(Base):
+    """One access to protected health information (written in batches by app.core.audit)."""
+    __tablename__ = "audit_log"
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    occurred_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    actor = Column(String, nullable=True, index=True)  # email of the authenticated principal
+    action = Column(String, nullable=False)  # "view" or "list"
+    resource_type = Column(String, nullable=False)  # "patient", "medical_record", ...
+    resource_id = Column(Integer, nullable=True)
+    patient_id = Column(Integer, nullable=True, index=True)  # whose PHI was accessed, when known
+    path = Column(String, nullable=True)
+    client_ip = Column(String, nullable=True)
@@ -0,0 +1,14 @@
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, Integer, LargeBinary, String
+from app.db.base import Base
+
+class DataKey(Base):
+    """A table's data encryption key, wrapped by the master key (see app.core.crypto)."""
+    __tablename__ = "data_keys"
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String, nullable=False, index=True)
+    wrapped_key = Column(LargeBinary, nullable=False)  # nonce + AES-GCM(master key, data key)
+    active = Column(Boolean, nullable=False, default=True)  # encrypts new values; inactive keys only decrypt
+    created_at = Column(DateTime, default=datetime.utcnow)
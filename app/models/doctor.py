@@ -2,9 +2,6 @@ from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class Doctor(Base):
     __tablename__ = "doctors"
@@ -22,6 +19,9 @@ class Doctor(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped by every update; an If-Match update only applies at the version it names
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     appointments = relationship("Appointment", back_populates="doctor")
@@ -36,4 +36,5 @@ class Doctor(Base):
     @classmethod
     def hash_password(cls, password: str) -> str:
         """Method to hash the password, to be used during user creation/updating."""
-        return pwd_context.hash(password)
+        from app.core.security import hash_password
+        return hash_password(password)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, Text, UniqueConstraint
+from app.db.base import Base
+
+class DrugInteraction(Base):
+    """A known interaction between two medicines, stored by normalized name with medicine_a < medicine_b."""
+    __tablename__ = "drug_interactions"
+    __table_args__ = (
+        UniqueConstraint("medicine_a", "medicine_b", name="uq_drug_interactions_pair"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    medicine_a = Column(String, nullable=False)
+    medicine_b = Column(String, nullable=False)
+    severity = Column(String, nullable=False)  # minor, moderate, major or contraindicated
+    description = Column(Text, nullable=True)
@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+from app.db.base import Base
+
+class IdempotencyKey(Base):
+    """A POST made with an Idempotency-Key header, and once it finished, its response (see app.core.idempotency)."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = {'extend_existing': True}
+
+    key_hash = Column(String(64), primary_key=True)  # sha256 of principal and Idempotency-Key
+    request_hash = Column(String(64), nullable=False)  # sha256 of path, query string and body
+    status_code = Column(Integer, nullable=True)  # None while the first request is in flight
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)  # claim lease, renewed while the request runs
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, event
 from sqlalchemy.orm import relationship
+from app.core.crypto import EncryptedText, blind_index
 from app.db.base import Base
 
 class MedicalRecord(Base):
@@ -9,12 +10,35 @@ class MedicalRecord(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
     doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False, index=True)
-    diagnosis = Column(Text, nullable=False)
+    diagnosis = Column(EncryptedText("medical_records.diagnosis"), nullable=False)
     treatment = Column(Text, nullable=False)
     prescribed_medicines = Column(Text, nullable=True)
-    visit_date = Column(Date, nullable=False)
-    notes = Column(Text, nullable=True)
+    visit_date = Column(Date, nullable=False, index=True)
+    notes = Column(EncryptedText("medical_records.notes"), nullable=True)
+    # Blind index of the normalized diagnosis: the analytics rollups group by it
+    diagnosis_bidx = Column(String(32), nullable=True)
+    # Bumped by every update; an If-Match update only applies at the version it names
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     patient = relationship("Patient", back_populates="medical_records")
     doctor = relationship("Doctor", back_populates="medical_records")
+    attachments = relationship(
+        "Attachment",
+        primaryjoin="MedicalRecord.id == foreign(Attachment.medical_record_id)",
+        back_populates="medical_record",
+        viewonly=True,
+    )
+
+    @staticmethod
+    def blind_indexes(values: dict) -> dict:
+        """Blind index column for the diagnosis in `values` (for Core inserts and updates)."""
+        if "diagnosis" not in values:
+            return {}
+        return {"diagnosis_bidx": blind_index(values["diagnosis"], "medical_records.diagnosis")}
+
+@event.listens_for(MedicalRecord, "before_insert")
+@event.listens_for(MedicalRecord, "before_update")
+def _set_blind_indexes(mapper, connection, target):
+    target.diagnosis_bidx = blind_index(target.diagnosis, "medical_records.diagnosis")
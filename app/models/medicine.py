@@ -12,3 +12,4 @@ class Medicine(Base):
     price = Column(Float, nullable=False)
     stock = Column(Integer, nullable=False, default=0)
     expiry_date = Column(String, nullable=False)
+    therapeutic_class = Column(String, nullable=True)  # e.g. "nsaid"; two active drugs of one class are duplicate therapy
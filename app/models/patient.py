@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, Date, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, Date, Boolean, ForeignKey, DateTime, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from app.core.crypto import EncryptedText, blind_index
 from app.db.base import Base
 
 class Patient(Base):
     __tablename__ = "patients"
+    __table_args__ = (
+        UniqueConstraint("phone_bidx", name="uq_patients_phone_bidx"),
+        UniqueConstraint("email_bidx", name="uq_patients_email_bidx"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
@@ -13,12 +18,18 @@ class Patient(Base):
     last_name = Column(String, nullable=False)
     age = Column(Integer, nullable=False)
     gender = Column(String, nullable=False)
-    phone = Column(String, unique=True, nullable=False)
-    email = Column(String, unique=True, nullable=True)
-    address = Column(Text, nullable=False)
-    medical_history = Column(Text, nullable=True)
+    phone = Column(EncryptedText("patients.phone"), nullable=False)
+    email = Column(EncryptedText("patients.email"), nullable=True)
+    address = Column(EncryptedText("patients.address"), nullable=False)
+    medical_history = Column(EncryptedText("patients.medical_history"), nullable=True)
+    # Blind indexes: phone and email are encrypted, so uniqueness and lookups use these
+    phone_bidx = Column(String(32), nullable=True)
+    email_bidx = Column(String(32), nullable=True)
     is_active = Column(Boolean, default=True)
     date_registered = Column(DateTime, default=datetime.utcnow)  # Add this field
+    # Bumped by every update; an If-Match update only applies at the version it names
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
     doctor_id=Column(Integer,ForeignKey("doctors.id"),nullable=True)
 
@@ -27,3 +38,15 @@ class Patient(Base):
     prescriptions = relationship("Prescription", back_populates="patient")
     doctor = relationship("Doctor", back_populates="patients")
     appointments = relationship("Appointment", back_populates="patient")
+
+    @staticmethod
+    def blind_indexes(values: dict) -> dict:
+        """Blind index columns for the phone/email in `values` (for Core inserts and updates)."""
+        return {f"{field}_bidx": blind_index(values[field], f"patients.{field}")
+                for field in ("phone", "email") if field in values}
+
+@event.listens_for(Patient, "before_insert")
+@event.listens_for(Patient, "before_update")
+def _set_blind_indexes(mapper, connection, target):
+    target.phone_bidx = blind_index(target.phone, "patients.phone")
+    target.email_bidx = blind_index(target.email, "patients.email")
@@ -1,21 +1,39 @@
-from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey
+from datetime import date
+from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, Index, and_, event, or_
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
 class Prescription(Base):
     __tablename__ = "prescriptions"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Active-medication lookups: range scans on start_date (per patient) and end_date (per medicine)
+        Index("ix_prescriptions_patient_active", "patient_id", "start_date", "end_date"),
+        Index("ix_prescriptions_medicine_active", "medicine_key", "end_date", "start_date"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
     doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False, index=True)
     medicine_name = Column(String, nullable=False)
+    medicine_key = Column(String, nullable=True)  # normalized medicine_name, set by the services
     dosage = Column(String, nullable=False)
     frequency = Column(String, nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=True)
     notes = Column(Text, nullable=True)
 
+    @classmethod
+    def active_on(cls, day: date):
+        """Started on or before `day` and not ended before it (a NULL end_date is open-ended)."""
+        return and_(cls.start_date <= day, or_(cls.end_date.is_(None), cls.end_date >= day))
+
     # Relationships
     patient = relationship("Patient", back_populates="prescriptions")
     doctor = relationship("Doctor", back_populates="prescriptions")
+
+@event.listens_for(Prescription, "before_insert")
+def _set_medicine_key(mapper, connection, prescription):
+    if prescription.medicine_key is None and prescription.medicine_name:
+        from app.services.drug_safety_service import normalize_medicine
+        prescription.medicine_key = normalize_medicine(prescription.medicine_name)
@@ -15,17 +15,15 @@ class Role(Base):
     # Relationship with User
     users = relationship("User", back_populates="role")
 
+DEFAULT_ROLES = ["admin", "doctor", "patient"]
+
 def seed_roles(db: Session):
-    """Seed the Role table with default roles."""
-    logging.basicConfig(level=logging.INFO)  # Configure logging
-    
-    roles = ["admin", "doctor", "patient"]
-    for role_name in roles:
-        existing_role = db.query(Role).filter(Role.name == role_name).first()
-        if not existing_role:
-            role = Role(name=role_name)
-            db.add(role)
-            logging.info(f"Added role: {role_name}")
-        else:
-            logging.info(f"Role already exists: {role_name}")
-    db.commit()
+    """Seed the Role table with default roles, checking existing ones with a single query."""
+    existing = {name for (name,) in db.query(Role.name).filter(Role.name.in_(DEFAULT_ROLES)).all()}
+    missing = [name for name in DEFAULT_ROLES if name not in existing]
+    for role_name in missing:
+        db.add(Role(name=role_name))
+        logging.info(f"Added role: {role_name}")
+    if missing:
+        db.commit()
+    return missing
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from datetime import date, datetime
+from typing import List, Optional
+
+class RollupPoint(BaseModel):
+    period_start: date
+    dimension: str  # doctor id, normalized diagnosis or medicine key
+    count: int
+
+class RollupStatus(BaseModel):
+    source: str
+    metrics: List[str]
+    last_id: int
+    pending_ids: int  # source ids above the watermark, counted by the next refresh
+    updated_at: Optional[datetime] = None
@@ -5,6 +5,7 @@ class AppointmentBase(BaseModel):
     patient_id: int
     doctor_id: int
     appointment_date: datetime
+    reason: str
 
 class AppointmentCreate(AppointmentBase):
     pass
@@ -14,6 +15,7 @@ class AppointmentUpdate(BaseModel):
 
 class AppointmentResponse(AppointmentBase):
     id: int
+    version: int
     status: str
     created_at: datetime
 
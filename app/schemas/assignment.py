@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class AssignmentRequest(BaseModel):
+    """Which doctors a patient may be assigned to; omitted fields match any."""
+    specialty: Optional[str] = None
+    hospital: Optional[str] = None
+
+class RebalanceRequest(AssignmentRequest):
+    limit: Optional[int] = None  # assign at most this many patients
+
+class AssignmentResponse(BaseModel):
+    patient_id: int
+    doctor_id: int
+
+class DoctorLoadResponse(BaseModel):
+    doctor_id: int
+    patients: int
+    upcoming_appointments: int
+    load: float
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class AttachmentResponse(BaseModel):
+    """Schema for returning attachment metadata."""
+    id: int
+    medical_record_id: int
+    filename: str
+    content_type: str
+    size_bytes: int
+    sha256: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
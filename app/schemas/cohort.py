@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Union
+
+class CohortQuery(BaseModel):
+    """A boolean cohort expression; see app.services.cohort_service for the criteria."""
+    expression: Union[Dict[str, Any], List[Any]] = Field(..., example={"and": [
+        {"gender": "F"}, {"age": {"min": 40, "max": 60}}, {"diagnosis": "diabetes"},
+        {"medicine": "metformin"}, {"registered": {"from": "2026-01"}},
+    ]})
+    count_only: bool = False
+    after: Optional[int] = None  # last patient id of the previous page
+    limit: int = Field(100, ge=1, le=10000)
+
+class CohortResponse(BaseModel):
+    count: int
+    patient_ids: List[int]
+    next_after: Optional[int] = None  # pass as `after` for the next page
@@ -24,6 +24,7 @@ class DoctorUpdate(BaseModel):
 
 class DoctorResponse(DoctorBase):
     id: int
+    version: int
 
     class Config:
         orm_mode = True
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 
 class MedicalRecordBase(BaseModel):
     patient_id: int = Field(..., example=1)
@@ -17,14 +17,26 @@ class MedicalRecordCreate(MedicalRecordBase):
 
 class MedicalRecordUpdate(BaseModel):
     """Schema for updating medical record details."""
-    diagnosis: Optional[str]
-    treatment: Optional[str]
-    prescribed_medicines: Optional[str]
-    notes: Optional[str]
+    diagnosis: Optional[str] = None
+    treatment: Optional[str] = None
+    prescribed_medicines: Optional[str] = None
+    notes: Optional[str] = None
 
 class MedicalRecordResponse(MedicalRecordBase):
     """Schema for returning medical record details."""
     id: int
+    version: int
 
     class Config:
         orm_mode = True
+
+class MedicalRecordSearchHit(BaseModel):
+    """A search result: the record, its relevance and a highlighted excerpt (HTML, matches in <mark>)."""
+    record: MedicalRecordResponse
+    rank: float
+    highlight: str
+
+class MedicalRecordSearchPage(BaseModel):
+    """One page of search results; pass next_cursor back as `cursor` for the next page."""
+    results: List[MedicalRecordSearchHit]
+    next_cursor: Optional[str] = None
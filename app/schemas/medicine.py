@@ -8,6 +8,7 @@ class MedicineBase(BaseModel):
     price: float = Field(..., example=25.50)
     stock: int = Field(..., example=100)
     expiry_date: str = Field(..., example="2026-05-10")
+    therapeutic_class: Optional[str] = Field(None, example="analgesic")
 
 class MedicineCreate(MedicineBase):
     """Schema for creating a new medicine."""
@@ -15,10 +16,11 @@ class MedicineCreate(MedicineBase):
 
 class MedicineUpdate(BaseModel):
     """Schema for updating medicine details."""
-    description: Optional[str]
-    price: Optional[float]
-    stock: Optional[int]
-    expiry_date: Optional[str]
+    description: Optional[str] = None
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    expiry_date: Optional[str] = None
+    therapeutic_class: Optional[str] = None
 
 class MedicineResponse(MedicineBase):
     """Schema for returning medicine details."""
@@ -28,6 +28,7 @@ class PatientUpdate(BaseModel):
 
 class PatientResponse(BaseModel):
     id: int
+    version: int
     first_name: str
     last_name: str
     age: int
@@ -1,16 +1,16 @@
 from pydantic import BaseModel, Field
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 
 class PrescriptionBase(BaseModel):
     patient_id: int = Field(..., example=1)
     doctor_id: int = Field(..., example=2)
-    medical_record_id: Optional[int] = Field(None, example=5)
     medicine_name: str = Field(..., example="Paracetamol")
-    dosage: str = Field(..., example="500mg, twice a day")
-    duration: str = Field(..., example="7 days")
-    instructions: Optional[str] = Field(None, example="Take after meals")
-    date_prescribed: date = Field(..., example="2025-03-22")
+    dosage: str = Field(..., example="500mg")
+    frequency: str = Field(..., example="Twice a day")
+    start_date: date = Field(..., example="2025-03-22")
+    end_date: Optional[date] = Field(None, example="2025-03-29")
+    notes: Optional[str] = Field(None, example="Take after meals")
 
 class PrescriptionCreate(PrescriptionBase):
     """Schema for creating a new prescription."""
@@ -18,14 +18,24 @@ class PrescriptionCreate(PrescriptionBase):
 
 class PrescriptionUpdate(BaseModel):
     """Schema for updating prescription details."""
-    medicine_name: Optional[str]
-    dosage: Optional[str]
-    duration: Optional[str]
-    instructions: Optional[str]
+    medicine_name: Optional[str] = None
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+    end_date: Optional[date] = None
+    notes: Optional[str] = None
+
+class SafetyAlert(BaseModel):
+    """An interaction or duplicate found when the prescription was created."""
+    type: str  # interaction, duplicate or duplicate_therapy
+    severity: str
+    medicine: str
+    conflicts_with: str
+    description: Optional[str] = None
 
 class PrescriptionResponse(PrescriptionBase):
     """Schema for returning prescription details."""
     id: int
+    safety_alerts: List[SafetyAlert] = []  # only filled in on create
 
     class Config:
         orm_mode = True
@@ -0,0 +1,236 @@
+"""Production server launcher.
+
+    python -m app.serve
+
+Binds the listening socket once, optionally imports the app in the master (PRELOAD_APP), then
+pre-forks WEB_CONCURRENCY uvicorn workers that share the socket. Each worker's DB pools and
+threadpool are sized so that all workers together stay within DB_CONNECTION_BUDGET on every
+database server: the primary (request threads, plus the connections held by the audit writer,
+the in-process job runner, idempotency claims and the LISTEN connection) and each replica and
+shard (request threads only).
+SIGTERM/SIGINT drain workers gracefully; workers exit after MAX_REQUESTS_PER_WORKER requests
+and are replaced to contain memory growth.
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.serve")
+
+# A worker dying faster than this after spawn counts as a crash loop
+MIN_WORKER_LIFETIME = 1.0
+
+
+@dataclass
+class WorkerResources:
+    workers: int
+    pool_size: int  # primary pool: request threads and background users
+    max_overflow: int
+    threadpool_size: int
+    secondary_pool_size: int  # each replica and shard pool
+
+
+def background_connections() -> int:
+    """Primary pool connections a worker's background threads may hold besides request threads."""
+    count = 0
+    if settings.AUDIT_ENABLED:
+        count += 1  # the audit writer thread
+    if settings.JOBS_IN_PROCESS:
+        count += settings.JOB_CONCURRENCY + 1  # job threads and the scheduler
+    if settings.IDEMPOTENCY_ENABLED:
+        count += 1  # claims and lease renewals, outside the request's session
+    return count
+
+
+def listen_connections() -> int:
+    """Connections outside every pool: the appointment event LISTEN connection on PostgreSQL."""
+    return 1 if settings.DATABASE_URL.startswith("postgresql") else 0
+
+
+def plan_worker_resources(connection_budget: int, workers: int, background: int = 0,
+                          listen: int = 0) -> WorkerResources:
+    """Split a global DB connection budget evenly across workers.
+
+    Pools get no overflow so the budget is a hard cap. On the primary, each worker's share
+    covers its LISTEN connection and a pool holding the request threads plus `background`
+    connections; the threadpool matches the request part, as extra threads would only block
+    waiting for a connection. Replicas and shards only serve requests, so their pools get the
+    whole share.
+    """
+    workers = max(1, workers)
+    per_worker = max(1, connection_budget // workers)
+    threads = per_worker - listen - background
+    if threads < 1:
+        logger.warning(f"DB_CONNECTION_BUDGET {connection_budget} leaves no connections for request threads "
+                       f"({workers} workers, {background + listen} background connections each)")
+        threads = 1
+    return WorkerResources(workers=workers, pool_size=threads + background, max_overflow=0,
+                           threadpool_size=threads, secondary_pool_size=per_worker)
+
+
+def apply_worker_resources(resources: WorkerResources):
+    """Write the per-worker sizing into settings (and the environment, for re-imports)."""
+    for name, value in (
+        ("DB_POOL_SIZE", resources.pool_size),
+        ("DB_MAX_OVERFLOW", resources.max_overflow),
+        ("THREADPOOL_SIZE", resources.threadpool_size),
+        ("DB_SECONDARY_POOL_SIZE", resources.secondary_pool_size),
+    ):
+        setattr(settings, name, value)
+        os.environ[name] = str(value)
+
+
+def dispose_inherited_engines():
+    """Drop the pooled connections a forked worker inherited from the master, on every engine."""
+    from app.db.session import all_engines
+
+    for engine in all_engines():
+        engine.dispose(close=False)  # never share the master's pooled connections
+
+
+def bind_socket() -> socket.socket:
+    family = socket.AF_INET6 if ":" in settings.SERVER_HOST else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((settings.SERVER_HOST, settings.SERVER_PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, app):
+    """Body of a forked worker: drop inherited DB connections and serve until told to stop."""
+    import uvicorn
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+
+    dispose_inherited_engines()
+
+    max_requests = settings.MAX_REQUESTS_PER_WORKER or None
+    if max_requests and settings.MAX_REQUESTS_JITTER:
+        max_requests += random.randint(0, settings.MAX_REQUESTS_JITTER)
+
+    config = uvicorn.Config(
+        app or "app.main:app",
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=settings.GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        log_level="info",
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Arbiter:
+    """Master process: forks workers, replaces the ones that exit and drains all on shutdown."""
+
+    def __init__(self, sock: socket.socket, app, workers: int):
+        self.sock = sock
+        self.app = app
+        self.target = workers
+        self.workers = {}  # pid -> spawn time
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.sock, self.app)
+            except Exception:
+                logger.exception("Worker crashed")
+                os._exit(1)
+            os._exit(0)
+        self.workers[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def handle_stop(self, signum, frame):
+        if not self.stopping:
+            logger.info(f"Received {signal.Signals(signum).name}, draining {len(self.workers)} workers")
+        self.stopping = True
+
+    def reap(self):
+        """Collect exited workers; returns how many exited suspiciously fast."""
+        crashed = 0
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return crashed
+            if pid == 0:
+                return crashed
+            started = self.workers.pop(pid, None)
+            if started is not None and time.monotonic() - started < MIN_WORKER_LIFETIME:
+                crashed += 1
+            logger.info(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        backoff = 0.0
+        for _ in range(self.target):
+            self.spawn()
+
+        while not self.stopping:
+            crashed = self.reap()
+            backoff = min(backoff * 2 or 0.5, 30.0) if crashed else 0.0
+            if backoff:
+                logger.warning(f"Workers are exiting right after start; retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+            while not self.stopping and len(self.workers) < self.target:
+                self.spawn()  # replaces recycled (max requests) and crashed workers
+            time.sleep(0.5)
+
+        self.drain()
+
+    def drain(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+        deadline = time.monotonic() + settings.GRACEFUL_TIMEOUT + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning(f"Worker {pid} did not drain in time, killing")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.reap()
+        logger.info("All workers stopped")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not hasattr(os, "fork"):
+        sys.exit("app.serve requires a platform with os.fork(); use uvicorn directly instead")
+
+    resources = plan_worker_resources(settings.DB_CONNECTION_BUDGET, settings.WEB_CONCURRENCY,
+                                      background_connections(), listen_connections())
+    apply_worker_resources(resources)
+    logger.info(
+        f"Starting {resources.workers} workers on {settings.SERVER_HOST}:{settings.SERVER_PORT}; "
+        f"per worker: {resources.pool_size} primary DB connections, {resources.secondary_pool_size} per replica "
+        f"or shard, {resources.threadpool_size} threads"
+    )
+
+    sock = bind_socket()
+    app = None
+    if settings.PRELOAD_APP:
+        from app.main import app  # imported once, shared copy-on-write by the workers
+
+    Arbiter(sock, app, resources.workers).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
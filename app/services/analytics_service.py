@@ -0,0 +1,243 @@
+"""Pre-aggregated analytics: counts per day, week and month in `analytics_rollups`.
+
+    python -m app.services.analytics_service refresh                 # count rows added since the last run
+    python -m app.services.analytics_service rebuild [--since DATE]  # recompute from the source tables
+
+Each source table has a watermark, the highest row id already counted. A refresh aggregates
+only the rows above it, ANALYTICS_BATCH_SIZE ids at a time, with one GROUP BY (day, dimension)
+per metric, rolls the day counts up to weeks and months in Python, and adds them to the rollups
+with an upsert. The API reads the rollups only.
+
+Ids only catch inserts. Edits, deletes, and rows committed late by a transaction that started
+before the refresh are corrected by a daily rebuild of the last ANALYTICS_RECOMPUTE_DAYS.
+
+Diagnoses are PHI and stored encrypted, so they are grouped by their blind index
+(medical_records.diagnosis_bidx, an HMAC of the normalized text), which is also the rollup's
+dimension. The diagnosis itself is kept, encrypted, in the rollup's label and decrypted on read.
+Records without a blind index (written before it existed) are skipped until
+`python -m app.core.crypto reencrypt` fills it in.
+"""
+import argparse
+import logging
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Date, delete, func, null
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.crypto import NORMALIZERS, blind_index
+from app.db.routing import read_only
+from app.models.analytics import AnalyticsRollup, AnalyticsWatermark
+from app.models.appointment import Appointment
+from app.models.medical_record import MedicalRecord
+from app.models.prescription import Prescription
+
+logger = logging.getLogger(__name__)
+
+GRAINS = ("day", "week", "month")
+
+# source table -> (model, the date each row counts on, {metric: dimension column})
+SOURCES = {
+    "medical_records": (MedicalRecord, MedicalRecord.visit_date,
+                        {"visits": MedicalRecord.doctor_id, "diagnoses": MedicalRecord.diagnosis_bidx}),
+    "appointments": (Appointment, func.date(Appointment.appointment_date, type_=Date),
+                     {"appointments": Appointment.doctor_id}),
+    "prescriptions": (Prescription, Prescription.start_date, {"prescriptions": Prescription.medicine_key}),
+}
+METRICS = {metric: source for source, (_, _, metrics) in SOURCES.items() for metric in metrics}
+# metric -> the column its dimension stands for, when the dimension is a blind index of it
+LABELS = {"diagnoses": MedicalRecord.diagnosis}
+
+DayCounts = Counter  # (metric, day, dimension, label) -> count
+
+
+def period_start(day: date, grain: str) -> date:
+    if grain == "week":
+        return day - timedelta(days=day.weekday())  # ISO weeks start on Monday
+    if grain == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _dimension(metric: str, value) -> str:
+    """The stored dimension of a value (as given by API callers)."""
+    if metric == "diagnoses":
+        return blind_index(str(value), "medical_records.diagnosis")
+    return str(value)
+
+
+def _label(metric: str, value) -> Optional[str]:
+    if metric not in LABELS:
+        return None
+    return NORMALIZERS["diagnosis"](value)[:200]
+
+
+def _day_counts(db: Session, source: str, after_id: int, upto_id: int, since: Optional[date] = None) -> DayCounts:
+    """Source rows with after_id < id <= upto_id (and dated on or after `since`), counted per day and dimension."""
+    model, day_column, metrics = SOURCES[source]
+    counts: DayCounts = Counter()
+    for metric, dimension_column in metrics.items():
+        # A blind-indexed dimension brings one of its (decrypted) values along as the label
+        label_column = func.min(LABELS[metric]) if metric in LABELS else null()
+        query = (
+            db.query(day_column, dimension_column, label_column, func.count(model.id))
+            .filter(model.id > after_id, model.id <= upto_id, day_column.isnot(None), dimension_column.isnot(None))
+        )
+        if since is not None:
+            query = query.filter(day_column >= since)
+        for day, dimension, label, count in query.group_by(day_column, dimension_column):
+            counts[(metric, day, str(dimension), _label(metric, label))] += count
+    return counts
+
+
+def _roll_up(day_counts: DayCounts, since: Optional[date] = None, before: bool = False) -> Counter:
+    """Day counts -> (metric, grain, period_start, dimension) counts.
+
+    With `since`, only periods starting on or after since's period of each grain (or, with
+    `before`, only the periods before it).
+    """
+    rollups = Counter()
+    for (metric, day, dimension, label), count in day_counts.items():
+        for grain in GRAINS:
+            if since is None or (day >= period_start(since, grain)) != before:
+                rollups[(metric, grain, period_start(day, grain), dimension, label)] += count
+    return rollups
+
+
+def _add_to_rollups(db: Session, rollups: Counter):
+    """Upsert, adding to the counts already there."""
+    if not rollups:
+        return
+    dialect = db.get_bind(AnalyticsRollup).dialect.name
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(AnalyticsRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["metric", "grain", "period_start", "dimension"],
+        set_={"count": AnalyticsRollup.count + stmt.excluded["count"]},
+    )
+    rows = [{"metric": m, "grain": g, "period_start": p, "dimension": d, "label": label, "count": c}
+            for (m, g, p, d, label), c in rollups.items()]
+    for start in range(0, len(rows), 1000):
+        db.execute(stmt, rows[start:start + 1000])
+
+
+def _lock_watermark(db: Session, source: str) -> AnalyticsWatermark:
+    """The source's watermark row, locked so concurrent refreshes never count the same rows twice."""
+    watermark = db.query(AnalyticsWatermark).filter(AnalyticsWatermark.source == source).with_for_update().first()
+    if watermark is None:
+        watermark = AnalyticsWatermark(source=source, last_id=0)
+        db.add(watermark)
+        db.flush()
+    return watermark
+
+
+def refresh_rollups(db: Session, batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Count every source row above its watermark; returns the ids covered per source. The caller commits."""
+    batch_size = batch_size or settings.ANALYTICS_BATCH_SIZE
+    covered = {}
+    for source, (model, _, _) in SOURCES.items():
+        watermark = _lock_watermark(db, source)
+        high = db.query(func.max(model.id)).scalar() or 0
+        start = watermark.last_id
+        while watermark.last_id < high:
+            upto = min(watermark.last_id + batch_size, high)
+            _add_to_rollups(db, _roll_up(_day_counts(db, source, watermark.last_id, upto)))
+            watermark.last_id = upto
+        if watermark.last_id != start:
+            watermark.updated_at = datetime.utcnow()
+            logger.info(f"Analytics rollups: counted {source} ids {start + 1}..{watermark.last_id}")
+        covered[source] = watermark.last_id - start
+    db.flush()
+    return covered
+
+
+def rebuild_rollups(db: Session, since: Optional[date] = None):
+    """Recompute the rollups of periods starting on or after `since` (all periods without it). The caller commits."""
+    for source, (model, _, metrics) in SOURCES.items():
+        watermark = _lock_watermark(db, source)
+        high = db.query(func.max(model.id)).scalar() or 0
+        if since is not None:
+            # Rows above the watermark dated before the rebuilt periods would be skipped otherwise
+            _add_to_rollups(db, _roll_up(_day_counts(db, source, watermark.last_id, high), since, before=True))
+        for grain in GRAINS:
+            stale = delete(AnalyticsRollup).where(AnalyticsRollup.metric.in_(list(metrics)),
+                                                  AnalyticsRollup.grain == grain)
+            if since is not None:
+                stale = stale.where(AnalyticsRollup.period_start >= period_start(since, grain))
+            db.execute(stale)
+        earliest = None if since is None else min(period_start(since, grain) for grain in GRAINS)
+        _add_to_rollups(db, _roll_up(_day_counts(db, source, 0, high, earliest), since))
+        watermark.last_id = high
+        watermark.updated_at = datetime.utcnow()
+        logger.info(f"Analytics rollups: rebuilt {source} up to id {high}" + (f" since {since}" if since else ""))
+    db.flush()
+
+
+def recompute_recent(db: Session, today: Optional[date] = None):
+    """Rebuild the last ANALYTICS_RECOMPUTE_DAYS, picking up edits, deletes and late commits."""
+    rebuild_rollups(db, (today or date.today()) - timedelta(days=settings.ANALYTICS_RECOMPUTE_DAYS))
+
+
+# Reads -----------------------------------------------------------------------
+
+@read_only
+def get_rollup_series(db: Session, metric: str, grain: str = "day", start: Optional[date] = None,
+                      end: Optional[date] = None, dimension: Optional[str] = None,
+                      top: Optional[int] = None) -> List[dict]:
+    """Counts per period (oldest first) and dimension (largest first); `top` keeps the N largest per period."""
+    if metric not in METRICS:
+        raise HTTPException(status_code=404, detail=f"Unknown metric '{metric}'")
+    if grain not in GRAINS:
+        raise HTTPException(status_code=422, detail=f"grain must be one of {', '.join(GRAINS)}")
+    query = db.query(AnalyticsRollup.period_start, AnalyticsRollup.dimension, AnalyticsRollup.label,
+                     AnalyticsRollup.count).filter(
+        AnalyticsRollup.metric == metric, AnalyticsRollup.grain == grain)
+    if start is not None:
+        query = query.filter(AnalyticsRollup.period_start >= period_start(start, grain))
+    if end is not None:
+        query = query.filter(AnalyticsRollup.period_start <= end)
+    if dimension is not None:
+        query = query.filter(AnalyticsRollup.dimension == _dimension(metric, dimension))
+    rows = query.order_by(AnalyticsRollup.period_start, AnalyticsRollup.count.desc(), AnalyticsRollup.dimension)
+
+    series, per_period = [], defaultdict(int)
+    for period, dimension_value, label, count in rows:
+        per_period[period] += 1
+        if top is None or per_period[period] <= top:
+            series.append({"period_start": period, "dimension": label or dimension_value, "count": count})
+    return series
+
+
+@read_only
+def get_rollup_status(db: Session) -> List[dict]:
+    """Each source's watermark and how many newer ids wait for the next refresh."""
+    watermarks = {w.source: w for w in db.query(AnalyticsWatermark)}
+    status = []
+    for source, (model, _, metrics) in SOURCES.items():
+        high = db.query(func.max(model.id)).scalar() or 0
+        watermark = watermarks.get(source)
+        last_id = watermark.last_id if watermark else 0
+        status.append({"source": source, "metrics": list(metrics), "last_id": last_id,
+                       "pending_ids": max(high - last_id, 0),
+                       "updated_at": watermark.updated_at if watermark else None})
+    return status
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from app.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain the analytics rollup tables.")
+    parser.add_argument("command", choices=["refresh", "rebuild"])
+    parser.add_argument("--since", type=date.fromisoformat, help="rebuild only periods from this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    with SessionLocal() as session:
+        if args.command == "rebuild":
+            rebuild_rollups(session, args.since)
+        else:
+            refresh_rollups(session)
+        session.commit()
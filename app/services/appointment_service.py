@@ -1,30 +1,72 @@
+from typing import List, Optional
 from sqlalchemy.orm import Session
+from app.core.events import record_appointment_events
+from app.db.routing import read_only
+from app.db.mutations import insert_returning, update_returning, version_conflict
+from app.db.sharding import route_by_id
 from app.models.appointment import Appointment
+from app.services.assignment_service import ACTIVE_APPOINTMENT_STATUSES, track_appointments
 from app.schemas.appointment import AppointmentCreate, AppointmentUpdate
+from app.services.batch_service import validate_batch
 from fastapi import HTTPException
 
 def create_appointment(db: Session, appointment_data: AppointmentCreate, patient_id: int):
     """Create a new appointment."""
-    new_appointment = Appointment(**appointment_data.dict(), patient_id=patient_id)
+    route_by_id(db, patient_id, appointment_data.doctor_id)
+    new_appointment = Appointment(**{**appointment_data.dict(), "patient_id": patient_id})
     db.add(new_appointment)
-    db.commit()
-    db.refresh(new_appointment)
+    db.flush()
+    record_appointment_events(db, "created", [new_appointment])
+    track_appointments(db, [new_appointment])
     return new_appointment
 
+def create_appointments(db: Session, appointments: List[AppointmentCreate], doctor_id: Optional[int] = None):
+    """Create many appointments with one multi-row INSERT; all or none are written."""
+    validate_batch(db, appointments, doctor_id=doctor_id)
+    created = insert_returning(db, Appointment, [appointment.dict() for appointment in appointments])
+    record_appointment_events(db, "created", created)
+    track_appointments(db, created)
+    return created
+
+@read_only
 def get_appointments_by_patient(db: Session, patient_id: int):
     """Get appointments by patient ID."""
+    route_by_id(db, patient_id)
     return db.query(Appointment).filter(Appointment.patient_id == patient_id).all()
 
+@read_only
 def get_appointments_by_doctor(db: Session, doctor_id: int):
     """Get appointments by doctor ID."""
+    route_by_id(db, doctor_id)
     return db.query(Appointment).filter(Appointment.doctor_id == doctor_id).all()
 
-def update_appointment_status(db: Session, appointment_id: int, update_data: AppointmentUpdate, doctor_id: int):
-    """Update the status of an appointment."""
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id, Appointment.doctor_id == doctor_id).first()
-    if appointment:
-        for key, value in update_data.dict(exclude_unset=True).items():
-            setattr(appointment, key, value)
-        db.commit()
-        db.refresh(appointment)
+def update_appointment_status(db: Session, appointment_id: int, update_data: AppointmentUpdate, doctor_id: int,
+                              expected_version: Optional[int] = None):
+    """Update the status of an appointment owned by the given doctor.
+
+    Returns None if there is no such appointment; 409 if it is no longer at `expected_version`.
+    """
+    values = update_data.dict(exclude_unset=True)
+    route_by_id(db, appointment_id)
+    owned = Appointment.doctor_id == doctor_id
+    active = Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+    was_active = None
+    if "status" in values:
+        # Compare-and-set on whether the appointment was active, so the doctor's load moves once per
+        # real transition even under concurrent updates. Appointments are usually active: one statement
+        for was_active, previous in ((True, active), (False, ~active)):
+            appointment = update_returning(db, Appointment, appointment_id, values, owned, previous,
+                                           expected_version=expected_version)
+            if appointment is not None:
+                break
+    else:
+        appointment = update_returning(db, Appointment, appointment_id, values, owned,
+                                       expected_version=expected_version)
+    if appointment is None and version_conflict(db, Appointment, appointment_id, expected_version, owned):
+        raise HTTPException(status_code=409, detail="Appointment was modified by another request; reload it and retry")
+    if appointment is not None and values:
+        record_appointment_events(db, "status_changed" if "status" in values else "updated", [appointment])
+        is_active = appointment.status in ACTIVE_APPOINTMENT_STATUSES
+        if was_active is not None and was_active != is_active:
+            track_appointments(db, [appointment], sign=1 if is_active else -1)
     return appointment
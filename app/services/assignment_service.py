@@ -0,0 +1,256 @@
+"""Load-aware assignment of patients to doctors.
+
+A doctor's load is their assigned patients plus ASSIGNMENT_APPOINTMENT_WEIGHT per upcoming
+(pending or confirmed) appointment. DoctorLoadIndex keeps a min-heap of loads for every
+(specialty, hospital) pool, including the "any specialty" and "any hospital" pools, so picking
+the least-loaded doctor is O(log n). Assignments and appointment changes adjust loads in place;
+the index is rebuilt from the database every ASSIGNMENT_REFRESH_SECONDS (upcoming appointments
+age out, and other workers write too) and whenever doctors change.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, event, func, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.sharding import CrossShardError, in_directory, pinned, route_by_id, shard_for_ids, use_shard
+from app.models.appointment import Appointment, AppointmentStatus
+from app.models.doctor import Doctor
+from app.models.patient import Patient
+from app.services.cohort_service import mark_patients_changed
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_APPOINTMENT_STATUSES = (AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED)
+
+PoolKey = Tuple[Optional[str], Optional[str]]
+
+
+def _normalize(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip().lower()
+    return value or None
+
+
+class DoctorLoadIndex:
+    """Least-loaded doctor per (specialty, hospital) pool; heaps are pruned lazily."""
+
+    def __init__(self, appointment_weight: float = 0.5):
+        self.appointment_weight = appointment_weight
+        self.loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self._pools: Dict[int, List[PoolKey]] = {}  # doctor id -> the pools it belongs to
+        self._patients: Dict[int, int] = defaultdict(int)
+        self._appointments: Dict[int, int] = defaultdict(int)
+        self._heaps: Dict[PoolKey, List[Tuple[float, int]]] = defaultdict(list)
+        self._members: Dict[PoolKey, Set[int]] = defaultdict(set)
+
+    def load(self, doctors: Iterable[Tuple[int, Optional[str], Optional[str]]],
+             patient_counts: Dict[int, int], appointment_counts: Dict[int, int]):
+        """Replace the whole index: (id, specialty, hospital) of each active doctor plus their counts."""
+        with self._lock:
+            self._pools.clear()
+            self._heaps.clear()
+            self._members.clear()
+            self._patients = defaultdict(int, patient_counts)
+            self._appointments = defaultdict(int, appointment_counts)
+            for doctor_id, specialty, hospital in doctors:
+                specialty, hospital = _normalize(specialty), _normalize(hospital)
+                keys = list(dict.fromkeys([(specialty, hospital), (specialty, None), (None, hospital), (None, None)]))
+                self._pools[doctor_id] = keys
+                for key in keys:
+                    self._members[key].add(doctor_id)
+                    self._heaps[key].append((self.load_of(doctor_id), doctor_id))
+            for heap in self._heaps.values():
+                heapq.heapify(heap)
+            self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self, max_age: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age
+
+    def load_of(self, doctor_id: int) -> float:
+        return self._patients[doctor_id] + self.appointment_weight * self._appointments[doctor_id]
+
+    def adjust(self, doctor_id: Optional[int], patients: int = 0, appointments: int = 0):
+        """Change a doctor's counts and re-push their entry; older entries are skipped on pick."""
+        if doctor_id is None:
+            return
+        with self._lock:
+            self._patients[doctor_id] += patients
+            self._appointments[doctor_id] += appointments
+            for key in self._pools.get(doctor_id, ()):
+                heap = self._heaps[key]
+                heapq.heappush(heap, (self.load_of(doctor_id), doctor_id))
+                if len(heap) > 4 * len(self._members[key]) + 16:
+                    self._heaps[key] = [(self.load_of(d), d) for d in self._members[key]]
+                    heapq.heapify(self._heaps[key])
+
+    def pick(self, specialty: Optional[str] = None, hospital: Optional[str] = None) -> Optional[int]:
+        """The least-loaded doctor in the pool (lowest id on ties), or None if the pool is empty."""
+        with self._lock:
+            heap = self._heaps.get((_normalize(specialty), _normalize(hospital)))
+            while heap:
+                load, doctor_id = heap[0]
+                if doctor_id in self._pools and load == self.load_of(doctor_id):
+                    return doctor_id
+                heapq.heappop(heap)
+            return None
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            rows = [
+                {"doctor_id": doctor_id, "patients": self._patients[doctor_id],
+                 "upcoming_appointments": self._appointments[doctor_id], "load": self.load_of(doctor_id)}
+                for doctor_id in self._pools
+            ]
+        return sorted(rows, key=lambda row: (row["load"], row["doctor_id"]))
+
+
+_index = DoctorLoadIndex()
+
+
+def get_load_index(db: Session) -> DoctorLoadIndex:
+    """The process-wide index over the directory shard's doctors, rebuilt when stale."""
+    _index.appointment_weight = settings.ASSIGNMENT_APPOINTMENT_WEIGHT
+    if _index.is_stale(settings.ASSIGNMENT_REFRESH_SECONDS):
+        with _index._lock, pinned(db, None):
+            if _index.is_stale(settings.ASSIGNMENT_REFRESH_SECONDS):
+                rebuild_load_index(db, _index)
+    return _index
+
+
+def rebuild_load_index(db: Session, index: DoctorLoadIndex, now: Optional[datetime] = None):
+    """Load active doctors and their current counts with three aggregate queries."""
+    now = now or datetime.utcnow()
+    doctors = db.query(Doctor.id, Doctor.specialty, Doctor.hospital).filter(Doctor.is_active.is_(True)).all()
+    patient_counts = dict(
+        db.query(Patient.doctor_id, func.count(Patient.id))
+        .filter(Patient.doctor_id.isnot(None), Patient.is_active.is_(True))
+        .group_by(Patient.doctor_id)
+        .all()
+    )
+    appointment_counts = dict(
+        db.query(Appointment.doctor_id, func.count(Appointment.id))
+        .filter(Appointment.appointment_date >= now, Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES))
+        .group_by(Appointment.doctor_id)
+        .all()
+    )
+    index.load(doctors, patient_counts, appointment_counts)
+    logger.info(f"Doctor load index rebuilt with {len(doctors)} doctors")
+
+
+# Load changes are applied at once (so a bulk rebalance sees its own picks) and undone if the
+# transaction rolls back.
+
+def track_load(db: Session, doctor_id: Optional[int], patients: int = 0, appointments: int = 0):
+    if _index.loaded_at is None or not in_directory(db, doctor_id):
+        return
+    _index.adjust(doctor_id, patients, appointments)
+    db.info.setdefault("load_deltas", []).append((doctor_id, patients, appointments))
+
+
+def track_appointments(db: Session, appointments: Iterable[Appointment], sign: int = 1):
+    """Count newly booked (sign=1) or closed (sign=-1) upcoming appointments."""
+    now = datetime.utcnow()
+    for appointment in appointments:
+        if appointment.appointment_date >= now:
+            track_load(db, appointment.doctor_id, appointments=sign)
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_load_deltas(session: Session):
+    session.info.pop("load_deltas", None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _undo_load_deltas(session: Session):
+    for doctor_id, patients, appointments in reversed(session.info.pop("load_deltas", [])):
+        _index.adjust(doctor_id, -patients, -appointments)
+
+
+def invalidate_load_index():
+    """Doctors were added, changed or removed; rebuild on next use."""
+    _index.invalidate()
+
+
+# Assignment ----------------------------------------------------------------
+
+def assign_patient(db: Session, patient_id: int, specialty: Optional[str] = None, hospital: Optional[str] = None,
+                   reassign: bool = False) -> dict:
+    """Assign a patient to the least-loaded matching doctor.
+
+    Doctors are picked from the directory shard's load index; a patient on another shard cannot
+    take one (CrossShardError).
+    """
+    route_by_id(db, patient_id)
+    previous = None
+    if reassign:
+        patient = db.query(Patient.id, Patient.doctor_id).filter(Patient.id == patient_id).first()
+        if not patient:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        previous = patient.doctor_id
+
+    index = get_load_index(db)
+    track_load(db, previous, patients=-1)
+    doctor_id = index.pick(specialty, hospital)
+    if doctor_id is None:
+        raise HTTPException(status_code=404, detail="No active doctor matches the requested specialty and hospital")
+    if shard_for_ids(db, doctor_id) != shard_for_ids(db, patient_id):
+        raise CrossShardError("The patient's hospital is on another shard than the available doctors")
+    # Compare-and-set: only while the patient still has the doctor seen above (none, without reassign)
+    unchanged = Patient.doctor_id.is_(None) if previous is None else Patient.doctor_id == previous
+    assigned = db.execute(
+        update(Patient).where(Patient.id == patient_id, unchanged)
+        .values(doctor_id=doctor_id, version=Patient.version + 1).returning(Patient.id)
+    ).scalar_one_or_none()
+    if assigned is None:
+        if db.query(Patient.id).filter(Patient.id == patient_id).first() is None:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        raise HTTPException(status_code=409, detail="Patient already has a doctor" if not reassign
+                            else "Patient was reassigned by another request; reload it and retry")
+    track_load(db, doctor_id, patients=1)
+    mark_patients_changed(db, [patient_id])
+    return {"patient_id": patient_id, "doctor_id": doctor_id}
+
+
+def rebalance_unassigned(db: Session, specialty: Optional[str] = None, hospital: Optional[str] = None,
+                         limit: Optional[int] = None) -> List[dict]:
+    """Assign every active, unassigned patient (oldest first); one executemany UPDATE for all.
+
+    Like the load index, this covers the directory shard.
+    """
+    use_shard(db, None)
+    query = (
+        db.query(Patient.id)
+        .filter(Patient.doctor_id.is_(None), Patient.is_active.is_(True))
+        .order_by(Patient.date_registered, Patient.id)
+    )
+    patient_ids = [row.id for row in (query.limit(limit) if limit else query)]
+    index = get_load_index(db)
+    assignments = []
+    for patient_id in patient_ids:
+        doctor_id = index.pick(specialty, hospital)
+        if doctor_id is None:
+            break
+        track_load(db, doctor_id, patients=1)
+        assignments.append({"patient_id": patient_id, "doctor_id": doctor_id})
+    if assignments:
+        # Core executemany: ORM bulk-by-primary-key would demand each row's current version
+        patients = Patient.__table__
+        db.execute(
+            update(patients).where(patients.c.id == bindparam("patient_id"))
+            .values(doctor_id=bindparam("doctor_id"), version=patients.c.version + 1),
+            assignments,
+        )
+        mark_patients_changed(db, [a["patient_id"] for a in assignments])
+        logger.info(f"Assigned {len(assignments)} of {len(patient_ids)} unassigned patients")
+    return assignments
@@ -0,0 +1,218 @@
+"""Attachments of medical records, stored as content-addressed blobs (app.core.storage).
+
+Blobs follow the transaction that records them. An upload stays staged until the transaction
+commits: its blob is put in place in before_commit, under the digest's storage lock, and the
+lock is held until the commit is over; a rollback discards it. Deleting the last attachment of
+a blob removes the blob after the commit, under the same lock, and only if no attachment row
+references it by then. So a delete never removes a blob that a concurrent upload deduplicated
+onto, and a rolled-back upload leaves no orphan.
+"""
+import contextlib
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.storage import BlobWriter, StorageBackend
+from app.db.routing import read_only
+from app.models.attachment import Attachment
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UploadedBlob:
+    sha256: str
+    size: int
+    filename: str
+    content_type: str
+    writer: Optional[BlobWriter] = field(default=None, repr=False)  # staged until the transaction commits
+    storage: Optional[StorageBackend] = field(default=None, repr=False)
+
+
+class _FilePartReceiver:
+    """python-multipart callbacks that stream the `file` field of a form into a BlobWriter."""
+
+    def __init__(self, storage: StorageBackend, field: str, max_bytes: int):
+        self.storage = storage
+        self.field = field
+        self.max_bytes = max_bytes
+        self.writer: Optional[BlobWriter] = None
+        self.blob: Optional[UploadedBlob] = None
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._capturing = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._capturing = False
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if params.get(b"name", b"").decode() != self.field or b"filename" not in params or self.blob:
+            return  # other form fields are skipped
+        content_type = self._headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+        self.writer = self.storage.writer()
+        self.blob = UploadedBlob("", 0, params[b"filename"].decode("utf-8", "replace"), content_type,
+                                 self.writer, self.storage)
+        self._capturing = True
+
+    def on_part_data(self, data, start, end):
+        if not self._capturing:
+            return
+        self.writer.write(data[start:end])
+        if self.writer.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"Attachment exceeds {self.max_bytes} bytes")
+
+    def on_part_end(self):
+        if self._capturing:
+            self.blob.size = self.writer.size
+            self.blob.sha256 = self.writer.commit()
+            self._capturing = False
+
+
+async def receive_upload(request: Request, storage: StorageBackend, max_bytes: int, field: str = "file") -> UploadedBlob:
+    """Stream a multipart/form-data body into storage chunk by chunk; the file is never held in memory."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    receiver = _FilePartReceiver(storage, field, max_bytes)
+    parser = MultipartParser(params[b"boundary"], receiver.callbacks())
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(parser.write, chunk)  # disk writes stay off the event loop
+        parser.finalize()
+    except Exception:
+        if receiver.writer is not None:
+            receiver.writer.abort()
+        raise
+
+    if receiver._capturing:  # body ended in the middle of the file part
+        receiver.writer.abort()
+        raise HTTPException(status_code=400, detail="Incomplete multipart body")
+    if receiver.blob is None:
+        raise HTTPException(status_code=400, detail=f"Missing '{field}' file field")
+    return receiver.blob
+
+
+def create_attachment(db: Session, record_id: int, blob: UploadedBlob, user_id: Optional[int] = None):
+    """Record an uploaded blob against a medical record; the blob is stored when the transaction commits."""
+    attachment = Attachment(
+        medical_record_id=record_id,
+        sha256=blob.sha256,
+        size_bytes=blob.size,
+        content_type=blob.content_type,
+        filename=blob.filename,
+        uploaded_by=user_id,
+    )
+    if blob.writer is not None:
+        db.info.setdefault("attachment_uploads", []).append(blob)
+    db.add(attachment)
+    db.flush()
+    logger.info(f"Attachment {attachment.id} ({blob.size} bytes, sha256 {blob.sha256[:12]}) added to record {record_id}")
+    return attachment
+
+
+@read_only
+def get_attachments(db: Session, record_id: int):
+    """List the attachments of a medical record."""
+    return db.query(Attachment).filter(Attachment.medical_record_id == record_id).order_by(Attachment.id).all()
+
+
+@read_only
+def get_attachment(db: Session, record_id: int, attachment_id: int):
+    """Get one attachment of a medical record."""
+    return db.query(Attachment).filter(
+        Attachment.id == attachment_id, Attachment.medical_record_id == record_id
+    ).first()
+
+
+def delete_attachment(db: Session, attachment: Attachment, storage: StorageBackend):
+    """Delete an attachment; its blob goes too after the commit unless another row still references it."""
+    db.delete(attachment)
+    db.flush()
+    db.info.setdefault("attachment_deletes", []).append((storage, attachment.sha256))
+
+
+def _referenced(session: Session, digest: str) -> bool:
+    """Whether a committed attachment row references the blob (on a fresh connection)."""
+    with session.get_bind(mapper=inspect(Attachment)).connect() as conn:
+        return conn.execute(select(Attachment.id).where(Attachment.sha256 == digest).limit(1)).first() is not None
+
+
+def _delete_unreferenced(session: Session, storage: StorageBackend, digest: str):
+    with storage.lock(digest):
+        if not _referenced(session, digest):
+            storage.delete(digest)
+
+
+@event.listens_for(Session, "before_commit")
+def _place_uploads(session: Session):
+    uploads = session.info.get("attachment_uploads")
+    if not uploads:
+        return
+    locks = session.info["attachment_locks"] = contextlib.ExitStack()
+    for blob in uploads:
+        locks.enter_context(blob.storage.lock(blob.sha256))  # held until the rows are committed
+        blob.writer.place()
+
+
+@event.listens_for(Session, "after_commit")
+def _finish_blobs(session: Session):
+    session.info.pop("attachment_uploads", None)
+    locks = session.info.pop("attachment_locks", None)
+    if locks is not None:
+        locks.close()
+    for storage, digest in session.info.pop("attachment_deletes", ()):
+        try:
+            _delete_unreferenced(session, storage, digest)
+        except Exception as e:
+            logger.error(f"Could not remove blob {digest[:12]}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_blobs(session: Session):
+    session.info.pop("attachment_deletes", None)
+    locks = session.info.pop("attachment_locks", None)
+    try:
+        for blob in session.info.pop("attachment_uploads", ()):
+            blob.writer.abort()
+            if locks is not None:  # placed in before_commit, then the commit failed
+                try:
+                    if not _referenced(session, blob.sha256):
+                        blob.storage.delete(blob.sha256)
+                except Exception as e:
+                    logger.error(f"Could not remove blob {blob.sha256[:12]}: {e}")
+    finally:
+        if locks is not None:
+            locks.close()
@@ -104,8 +104,7 @@ def register_user(db: Session, register_data: UserCreate):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    db.flush()
 
     logger.info(f"User registered successfully: {new_user.email}")
     return {"message": "User registered successfully", "user": new_user}
@@ -119,7 +118,7 @@ def delete_user_or_doctor(db: Session, email: str):
     
     if entity:
         db.delete(entity)
-        db.commit()
+        db.flush()
         logger.info(f"{entity.__class__.__name__} with email {email} deleted successfully")
         return {"message": f"{entity.__class__.__name__} with email {email} deleted successfully"}
     
@@ -131,16 +130,9 @@ def create_role(db: Session, name: str, permissions: list):
     """Create a new role and assign permissions."""
     logger.info(f"Creating role: {name}")
 
-    role = Role(name=name)
+    role = Role(name=name, permissions=[Permission(action=perm_action) for perm_action in permissions])
     db.add(role)
-    db.commit()
-    db.refresh(role)
-
-    for perm_action in permissions:
-        permission = Permission(action=perm_action, role_id=role.id)
-        db.add(permission)
-
-    db.commit()
+    db.flush()
     logger.info(f"Role '{name}' created successfully with permissions: {permissions}")
     return role
 
@@ -155,8 +147,7 @@ def assign_role_to_user(db: Session, user: User, role_name: str):
         raise HTTPException(status_code=404, detail="Role not found")
 
     user.role_id = role.id
-    db.commit()
-    db.refresh(user)
+    db.flush()
 
     logger.info(f"Role '{role_name}' assigned to user '{user.email}' successfully")
     return user
@@ -0,0 +1,48 @@
+import logging
+from typing import List, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.sharding import route_by_id
+from app.models.doctor import Doctor
+from app.models.patient import Patient
+
+logger = logging.getLogger(__name__)
+
+
+def validate_batch(db: Session, items: List[BaseModel], doctor_id: Optional[int] = None):
+    """Check a whole batch before anything is written; raises 422 listing every bad item by index.
+
+    Referenced patients and doctors are looked up with one IN query each. When `doctor_id` is
+    given, every item must belong to that doctor. The whole batch must live on one shard, which
+    the session is pinned to.
+    """
+    if not items:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} items")
+
+    patient_ids = {item.patient_id for item in items}
+    doctor_ids = {item.doctor_id for item in items}
+    route_by_id(db, *patient_ids, *doctor_ids)
+    known_patients = {pid for (pid,) in db.query(Patient.id).filter(Patient.id.in_(patient_ids))}
+    known_doctors = {did for (did,) in db.query(Doctor.id).filter(Doctor.id.in_(doctor_ids))}
+
+    errors = []
+    for index, item in enumerate(items):
+        item_errors = []
+        if item.patient_id not in known_patients:
+            item_errors.append(f"Patient {item.patient_id} not found")
+        if item.doctor_id not in known_doctors:
+            item_errors.append(f"Doctor {item.doctor_id} not found")
+        elif doctor_id is not None and item.doctor_id != doctor_id:
+            item_errors.append("Item belongs to another doctor")
+        if item_errors:
+            errors.append({"index": index, "errors": item_errors})
+
+    if errors:
+        logger.warning(f"Rejected batch of {len(items)}: {len(errors)} invalid items")
+        raise HTTPException(status_code=422, detail=errors)
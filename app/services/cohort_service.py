@@ -0,0 +1,340 @@
+"""Cohort queries over patients, answered from in-memory bitmap indexes.
+
+Every indexed attribute value (gender "f", age 42, doctor 3, diagnosis term "diabetes", active
+medicine "metformin", registration month "2026-05", active flag) has a bitmap: a Python int
+whose bit n is set when patient n has that value. Patient ids are dense sequential integers, so
+a bitmap over a million patients is ~125 KB and AND/OR/NOT over it run at C speed. Most values
+(diagnosis terms above all) belong to few patients, and a bitmap each would cost the whole id
+range per value. Values held by fewer than one id in SPARSE_RATIO of their range are therefore
+kept as sorted id arrays (8 bytes per patient) and turned into a bitmap only while a query uses
+them, so the index takes at most 8 bytes per (patient, value) pair. A cohort expression such as
+
+    {"and": [{"gender": "F"}, {"age": {"min": 40, "max": 60}}, {"diagnosis": "diabetes"},
+             {"medicine": "metformin"}, {"registered": {"from": "2026-01"}}]}
+
+is a handful of big-int operations, with no joins against the primary.
+
+Service-layer writes mark the patients they touch; after commit those patients' bits are
+recomputed on the next query (three queries for the whole dirty set). The index is rebuilt
+every COHORT_REFRESH_SECONDS and at the first query of a new day, as prescriptions become
+active or end with the date.
+"""
+import logging
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import date
+from functools import reduce
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.sharding import in_directory, pinned
+
+from app.core.config import settings
+from app.models.medical_record import MedicalRecord
+from app.models.patient import Patient
+from app.models.prescription import Prescription
+from app.services.drug_safety_service import normalize_medicine
+from app.services.search_service import tokenize
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, Any]  # (dimension, value)
+
+DIMENSIONS = ("gender", "age", "doctor", "diagnosis", "medicine", "registered", "active")
+
+# A value with fewer patients than 1/SPARSE_RATIO of its id range is stored as an id array:
+# an id costs 64 bits in the array and one bit of the whole range in a bitmap
+SPARSE_RATIO = 64
+
+Posting = Union[int, array]  # a bitmap, or the sorted patient ids of a rare value
+
+
+def _bitmap(ids: Iterable[int]) -> int:
+    """Build a bitmap in one pass; OR-ing bits into an int one at a time is quadratic."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for patient_id in ids:
+        bits[patient_id >> 3] |= 1 << (patient_id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _posting(ids: List[int]) -> Posting:
+    """The cheaper of a sorted id array and a bitmap for these (distinct) patient ids."""
+    if len(ids) * SPARSE_RATIO < max(ids, default=0):
+        return array("q", sorted(ids))
+    return _bitmap(ids)
+
+
+def _compact(bitmap: int) -> Posting:
+    if bitmap.bit_count() * SPARSE_RATIO < bitmap.bit_length():
+        return array("q", bitmap_ids(bitmap))
+    return bitmap
+
+
+def _as_bitmap(posting: Posting) -> int:
+    return posting if isinstance(posting, int) else _bitmap(posting)
+
+
+def _size(posting: Posting) -> int:
+    if isinstance(posting, int):
+        return (posting.bit_length() + 7) // 8
+    return len(posting) * posting.itemsize
+
+
+def bitmap_ids(bitmap: int, after: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+    """Set bits (patient ids) in ascending order, starting after `after`."""
+    start = 0 if after is None else after + 1
+    data = (bitmap >> start).to_bytes((bitmap.bit_length() - start) // 8 + 1, "little") if bitmap >> start else b""
+    ids = []
+    for offset, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            ids.append(start + offset * 8 + low.bit_length() - 1)
+            if limit is not None and len(ids) == limit:
+                return ids
+            byte ^= low
+    return ids
+
+
+def patient_keys(age: Optional[int], gender: Optional[str], doctor_id: Optional[int], registered, is_active,
+                 diagnoses: Iterable[str], medicines: Iterable[str]) -> FrozenSet[Key]:
+    """Every indexed (dimension, value) of one patient."""
+    keys: Set[Key] = {("active", bool(is_active) if is_active is not None else True)}
+    if age is not None:
+        keys.add(("age", age))
+    if gender:
+        keys.add(("gender", gender.strip().lower()))
+    if doctor_id is not None:
+        keys.add(("doctor", doctor_id))
+    if registered is not None:
+        keys.add(("registered", registered.strftime("%Y-%m")))
+    for diagnosis in diagnoses:
+        keys.update(("diagnosis", term) for term in tokenize(diagnosis))
+    keys.update(("medicine", medicine) for medicine in medicines if medicine)
+    return frozenset(keys)
+
+
+class CohortIndex:
+    """Postings (bitmaps or id arrays) per (dimension, value) plus each patient's keys, for incremental updates."""
+
+    def __init__(self):
+        self.loaded_at: Optional[float] = None
+        self.loaded_on: Optional[date] = None
+        self._bitmaps: Dict[str, Dict[Any, Posting]] = defaultdict(dict)
+        self._keys: Dict[int, FrozenSet[Key]] = {}
+        self._all = 0
+        self._dirty: Set[int] = set()
+        self._lock = threading.RLock()
+
+    def load(self, patients: Dict[int, FrozenSet[Key]], today: Optional[date] = None):
+        """Replace the whole index with {patient id: keys}."""
+        members: Dict[Key, List[int]] = defaultdict(list)
+        for patient_id, keys in patients.items():
+            for key in keys:
+                members[key].append(patient_id)
+        bitmaps: Dict[str, Dict[Any, Posting]] = defaultdict(dict)
+        for (dimension, value), ids in members.items():
+            bitmaps[dimension][value] = _posting(ids)
+        with self._lock:
+            self._bitmaps, self._keys, self._all = bitmaps, dict(patients), _bitmap(patients)
+            self._dirty.clear()
+            self.loaded_at, self.loaded_on = time.monotonic(), today or date.today()
+
+    def update(self, patients: Dict[int, Optional[FrozenSet[Key]]]):
+        """Replace the keys of some patients (None removes the patient); one pass per changed bitmap."""
+        with self._lock:
+            cleared: Dict[Key, List[int]] = defaultdict(list)
+            added: Dict[Key, List[int]] = defaultdict(list)
+            for patient_id, keys in patients.items():
+                old = self._keys.pop(patient_id, frozenset())
+                new = keys or frozenset()
+                if keys is not None:
+                    self._keys[patient_id] = keys
+                for key in old - new:
+                    cleared[key].append(patient_id)
+                for key in new - old:
+                    added[key].append(patient_id)
+            for key in cleared.keys() | added.keys():
+                dimension, value = key
+                bitmap = self._bitmap(dimension, value) & ~_bitmap(cleared.get(key, ()))
+                bitmap |= _bitmap(added.get(key, ()))
+                if bitmap:
+                    self._bitmaps[dimension][value] = _compact(bitmap)
+                else:
+                    self._bitmaps[dimension].pop(value, None)
+            removed = [patient_id for patient_id, keys in patients.items() if keys is None]
+            self._all = (self._all & ~_bitmap(removed)) | _bitmap(p for p, keys in patients.items() if keys is not None)
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self, max_age: float) -> bool:
+        return self.loaded_at is None or self.loaded_on != date.today() or time.monotonic() - self.loaded_at > max_age
+
+    def mark_dirty(self, patient_ids: Iterable[int]):
+        with self._lock:
+            self._dirty.update(patient_ids)
+
+    def take_dirty(self) -> Set[int]:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    # Evaluation --------------------------------------------------------------
+
+    def _bitmap(self, dimension: str, value) -> int:
+        return _as_bitmap(self._bitmaps[dimension].get(value, 0))
+
+    def evaluate(self, expression) -> int:
+        """Bitmap of the patients matching `expression`; raises ValueError on a malformed one.
+
+        A dict ANDs its entries, a list ANDs its items. Entries are "and"/"or" (lists),
+        "not", or a dimension: gender, doctor, medicine, active, diagnosis (every term of
+        the text), age (a number or {"min", "max"}) and registered ("YYYY-MM" or {"from", "to"}).
+        """
+        with self._lock:
+            if isinstance(expression, list):
+                return reduce(lambda acc, item: acc & self.evaluate(item), expression, self._all)
+            if not isinstance(expression, dict) or not expression:
+                raise ValueError("A cohort expression is a non-empty object or list")
+            return reduce(lambda acc, item: acc & self._term(*item), expression.items(), self._all)
+
+    def _term(self, name: str, value) -> int:
+        bitmap = self._bitmap
+        if name in ("and", "or"):
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"'{name}' takes a non-empty list")
+            parts = [self.evaluate(item) for item in value]
+            return reduce(int.__and__, parts) if name == "and" else reduce(int.__or__, parts)
+        if name == "not":
+            return self._all & ~self.evaluate(value)
+        if name == "gender":
+            return bitmap("gender", str(value).strip().lower())
+        if name == "doctor":
+            return bitmap("doctor", int(value))
+        if name == "active":
+            return bitmap("active", bool(value))
+        if name == "medicine":
+            return bitmap("medicine", normalize_medicine(str(value)))
+        if name == "diagnosis":
+            terms = tokenize(str(value))
+            if not terms:
+                raise ValueError("'diagnosis' needs at least one search term")
+            return reduce(int.__and__, (bitmap("diagnosis", term) for term in terms))
+        if name == "age":
+            low, high = (value, value) if not isinstance(value, dict) else (value.get("min"), value.get("max"))
+            return self._range("age", low, high)
+        if name == "registered":
+            low, high = (value, value) if not isinstance(value, dict) else (value.get("from"), value.get("to"))
+            return self._range("registered", low, high)
+        raise ValueError(f"Unknown cohort criterion '{name}'; expected and, or, not or one of {', '.join(DIMENSIONS)}")
+
+    def _range(self, dimension: str, low, high) -> int:
+        """OR of the bitmaps whose value lies in [low, high]; either bound may be omitted."""
+        return reduce(int.__or__, (
+            _as_bitmap(posting) for value, posting in self._bitmaps[dimension].items()
+            if (low is None or value >= low) and (high is None or value <= high)
+        ), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "patients": len(self._keys),
+                "bitmaps": {dimension: len(values) for dimension, values in self._bitmaps.items()},
+                "bytes": sum(_size(posting) for values in self._bitmaps.values() for posting in values.values()),
+                "pending_updates": len(self._dirty),
+                "age_seconds": None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1),
+            }
+
+
+def collect_patient_keys(db: Session, patient_ids: Optional[Set[int]] = None,
+                         today: Optional[date] = None) -> Dict[int, FrozenSet[Key]]:
+    """Keys of all (or the given) patients, with one query per source table."""
+    today = today or date.today()
+    patients = db.query(Patient.id, Patient.age, Patient.gender, Patient.doctor_id, Patient.date_registered,
+                        Patient.is_active)
+    records = db.query(MedicalRecord.patient_id, MedicalRecord.diagnosis)
+    prescriptions = db.query(Prescription.patient_id, Prescription.medicine_key).filter(Prescription.active_on(today))
+    if patient_ids is not None:
+        patients = patients.filter(Patient.id.in_(patient_ids))
+        records = records.filter(MedicalRecord.patient_id.in_(patient_ids))
+        prescriptions = prescriptions.filter(Prescription.patient_id.in_(patient_ids))
+
+    diagnoses: Dict[int, List[str]] = defaultdict(list)
+    for patient_id, diagnosis in records.yield_per(5000):
+        diagnoses[patient_id].append(diagnosis)
+    medicines: Dict[int, List[str]] = defaultdict(list)
+    for patient_id, medicine_key in prescriptions.yield_per(5000):
+        medicines[patient_id].append(medicine_key)
+    return {
+        p.id: patient_keys(p.age, p.gender, p.doctor_id, p.date_registered, p.is_active,
+                           diagnoses.get(p.id, ()), medicines.get(p.id, ()))
+        for p in patients.yield_per(5000)
+    }
+
+
+_index = CohortIndex()
+
+
+def get_cohort_index(db: Session) -> CohortIndex:
+    """The process-wide index: rebuilt when stale, otherwise brought up to date with recent writes.
+
+    It covers the patients of the directory shard, whatever shard the session is pinned to.
+    """
+    with _index._lock, pinned(db, None):
+        if _index.is_stale(settings.COHORT_REFRESH_SECONDS):
+            started = time.perf_counter()
+            _index.load(collect_patient_keys(db))
+            logger.info(f"Cohort index rebuilt over {len(_index._keys)} patients "
+                        f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        else:
+            dirty = _index.take_dirty()
+            if dirty:
+                found = collect_patient_keys(db, dirty)
+                _index.update({patient_id: found.get(patient_id) for patient_id in dirty})
+    return _index
+
+
+def mark_patients_changed(db: Session, patient_ids: Iterable[Optional[int]]):
+    """Recompute these patients' bits once the transaction commits."""
+    if _index.loaded_at is not None:
+        db.info.setdefault("cohort_dirty", set()).update(p for p in patient_ids if in_directory(db, p))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_cohort_dirty(session: Session):
+    dirty = session.info.pop("cohort_dirty", None)
+    if dirty:
+        _index.mark_dirty(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cohort_dirty(session: Session):
+    session.info.pop("cohort_dirty", None)
+
+
+def invalidate_cohort_index():
+    _index.invalidate()
+
+
+def query_cohort(db: Session, expression, count_only: bool = False, after: Optional[int] = None,
+                 limit: int = 100) -> dict:
+    """Size of the cohort and, unless count_only, one page of its patient ids (ascending, after `after`)."""
+    index = get_cohort_index(db)
+    try:
+        bitmap = index.evaluate(expression)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    patient_ids = [] if count_only else bitmap_ids(bitmap, after, limit + 1)
+    return {
+        "count": bitmap.bit_count(),
+        "patient_ids": patient_ids[:limit],
+        "next_after": patient_ids[limit - 1] if len(patient_ids) > limit else None,
+    }
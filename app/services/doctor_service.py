@@ -1,4 +1,8 @@
+from typing import Optional, Sequence
 from sqlalchemy.orm import Session
+from app.db.routing import read_only
+from app.db.mutations import update_returning, delete_returning, version_conflict
+from app.db.sharding import CrossShardError, route_by_id, scatter_gather, shard_for_hospital, shard_for_ids, use_shard
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
 from app.models.doctor import Doctor
@@ -6,6 +10,7 @@ from app.models.user import User
 from app.models.role import Role
 from app.schemas.doctor import DoctorCreate, DoctorUpdate
 from app.core.security import hash_password  # Function to hash passwords
+from app.services.assignment_service import invalidate_load_index
 
 def create_doctor(db: Session, doctor_data: DoctorCreate):
     """Create a new doctor in the database with hashed password and corresponding user."""
@@ -18,16 +23,21 @@ def create_doctor(db: Session, doctor_data: DoctorCreate):
         if not doctor_role:
             raise HTTPException(status_code=500, detail="Doctor role not found in database")
         
+        # The doctor lives on the shard of their hospital; the user stays in the directory
+        shard = shard_for_hospital(db, doctor_data.hospital if hasattr(doctor_data, 'hospital') else None)
+
         # Create a User record first
         new_user = User(
             username=doctor_data.email.split('@')[0],  # Use email prefix as username
             email=doctor_data.email,
             hashed_password=hashed_password,
             is_active=True,
-            role_id=doctor_role.id
+            role_id=doctor_role.id,
+            shard=shard
         )
         db.add(new_user)
         db.flush()  # Flush to get the user ID without committing
+        use_shard(db, shard)
         
         # Now create the doctor record linked to the user
         new_doctor = Doctor(
@@ -44,8 +54,8 @@ def create_doctor(db: Session, doctor_data: DoctorCreate):
         
         # Add the new doctor to the database session
         db.add(new_doctor)
-        db.commit()  # Commit both user and doctor
-        db.refresh(new_doctor)  # Refresh to get the updated doctor object
+        db.flush()
+        invalidate_load_index()
         return new_doctor
     except IntegrityError as e:
         db.rollback()  # Rollback the transaction in case of an error (e.g., duplicate email/phone)
@@ -54,38 +64,46 @@ def create_doctor(db: Session, doctor_data: DoctorCreate):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
-def get_doctors(db: Session):
-    """Retrieve all doctors from the database."""
-    return db.query(Doctor).all()
+@read_only
+def get_doctors(db: Session, options: Sequence = ()):
+    """Retrieve all doctors from the database, across every shard; `options` are loader options."""
+    return scatter_gather(db, lambda session: session.query(Doctor).options(*options).order_by(Doctor.id),
+                          key=lambda d: d.id)
 
-def get_doctor_by_id(db: Session, doctor_id: int):
+@read_only
+def get_doctor_by_id(db: Session, doctor_id: int, options: Sequence = ()):
     """Retrieve a doctor by ID."""
-    doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
+    route_by_id(db, doctor_id)
+    doctor = db.query(Doctor).options(*options).filter(Doctor.id == doctor_id).first()
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return doctor
 
-def update_doctor(db: Session, doctor_id: int, doctor_data: DoctorUpdate):
-    """Update a doctor by ID."""
-    doctor = get_doctor_by_id(db, doctor_id)  # Ensure the doctor exists
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor not found")
-    
+def update_doctor(db: Session, doctor_id: int, doctor_data: DoctorUpdate, expected_version: Optional[int] = None):
+    """Update a doctor by ID; 409 if it is no longer at `expected_version`."""
+    values = doctor_data.dict(exclude_unset=True)
+
     # If password is provided, hash it before saving
-    if doctor_data.password:
-        doctor_data.password = hash_password(doctor_data.password)
-    
-    # Update doctor fields based on input data
-    for key, value in doctor_data.dict(exclude_unset=True).items():
-        setattr(doctor, key, value)  # Update the doctor instance
+    password = values.pop("password", None)
+    if password:
+        values["hashed_password"] = hash_password(password)
 
-    db.commit()  # Commit the changes to the database
-    db.refresh(doctor)  # Refresh to get the updated doctor instance
+    route_by_id(db, doctor_id)
+    if "hospital" in values and shard_for_hospital(db, values["hospital"]) != shard_for_ids(db, doctor_id):
+        raise CrossShardError("Moving a doctor to a hospital on another shard is not supported")
+    doctor = update_returning(db, Doctor, doctor_id, values, expected_version=expected_version)
+    if not doctor:
+        if version_conflict(db, Doctor, doctor_id, expected_version):
+            raise HTTPException(status_code=409, detail="Doctor was modified by another request; reload it and retry")
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    if values.keys() & {"specialty", "hospital", "is_active"}:
+        invalidate_load_index()
     return doctor
 
 def delete_doctor(db: Session, doctor_id: int):
     """Delete a doctor by ID."""
-    doctor = get_doctor_by_id(db, doctor_id)  # Ensure the doctor exists
-    db.delete(doctor)  # Remove doctor from the session
-    db.commit()  # Commit to delete the doctor from the database
+    route_by_id(db, doctor_id)
+    if delete_returning(db, Doctor, doctor_id) is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    invalidate_load_index()
     return {"message": "Doctor deleted successfully"}
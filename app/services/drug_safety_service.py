@@ -0,0 +1,207 @@
+"""Drug-interaction and duplicate-therapy checks for new prescriptions.
+
+    python -m app.services.drug_safety_service interactions.csv   # medicine_a,medicine_b,severity[,description]
+
+The `drug_interactions` table and each medicine's therapeutic class are loaded once into an
+InteractionGraph: medicine names are normalized ("Ibuprofen 400 mg tablet" -> "ibuprofen") and
+interned to small integer ids, and each id maps to a dict of the ids it interacts with. A
+prescription is then checked against the patient's k active prescriptions with k dict lookups.
+The graph reloads every DRUG_SAFETY_REFRESH_SECONDS and when medicines or interactions change.
+"""
+import csv
+import logging
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.drug_interaction import DrugInteraction
+from app.models.medicine import Medicine
+from app.models.prescription import Prescription
+
+logger = logging.getLogger(__name__)
+
+SEVERITIES = ("minor", "moderate", "major", "contraindicated")
+_SEVERITY_RANK = {severity: rank for rank, severity in enumerate(SEVERITIES)}
+
+_STRENGTH = re.compile(r"\b\d+(\.\d+)?\s*(mg|mcg|µg|g|ml|iu|units?|%)\b")
+_FORMS = re.compile(r"\b(tablets?|tabs?|capsules?|caps?|syrup|suspension|injection|inj|cream|ointment|drops|sr|er|xr)\b")
+
+
+@lru_cache(maxsize=4096)
+def normalize_medicine(name: str) -> str:
+    """Reduce a prescribed name to the drug it names: lowercase, without strength or dosage form."""
+    name = _FORMS.sub(" ", _STRENGTH.sub(" ", name.lower()))
+    return " ".join(re.sub(r"[^\w\s-]", " ", name).split())
+
+
+class InteractionGraph:
+    """Medicine interactions as an adjacency map over interned medicine ids."""
+
+    def __init__(self):
+        self.loaded_at: Optional[float] = None
+        self._ids: Dict[str, int] = {}
+        self._edges: Dict[int, Dict[int, Tuple[str, Optional[str]]]] = defaultdict(dict)
+        self._classes: Dict[int, str] = {}
+
+    def load(self, interactions: Iterable[Tuple[str, str, str, Optional[str]]],
+             classes: Iterable[Tuple[str, Optional[str]]]):
+        """Build from (medicine_a, medicine_b, severity, description) and (medicine, class) rows."""
+        ids: Dict[str, int] = {}
+        edges: Dict[int, Dict[int, Tuple[str, Optional[str]]]] = defaultdict(dict)
+        medicine_classes: Dict[int, str] = {}
+        intern = lambda name: ids.setdefault(normalize_medicine(name), len(ids))  # noqa: E731
+        for medicine_a, medicine_b, severity, description in interactions:
+            a, b = intern(medicine_a), intern(medicine_b)
+            edges[a][b] = edges[b][a] = (severity, description)
+        for medicine, therapeutic_class in classes:
+            if therapeutic_class:
+                medicine_classes[intern(medicine)] = therapeutic_class.strip().lower()
+        # Swap in complete structures so concurrent readers never see a half-built graph
+        self._ids, self._edges, self._classes = ids, edges, medicine_classes
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self, max_age: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age
+
+    def check(self, medicine: str, others: Sequence[str]) -> List[dict]:
+        """Alerts for `medicine` against each of `others` (the patient's other drugs)."""
+        key = normalize_medicine(medicine)
+        medicine_id = self._ids.get(key)
+        edges = self._edges.get(medicine_id, {}) if medicine_id is not None else {}
+        medicine_class = self._classes.get(medicine_id)
+        alerts = []
+        for other in others:
+            other_key = normalize_medicine(other)
+            other_id = self._ids.get(other_key)
+            if other_key == key:
+                alerts.append(_alert("duplicate", "moderate", medicine, other, "Same drug is already prescribed"))
+            elif other_id in edges:
+                severity, description = edges[other_id]
+                alerts.append(_alert("interaction", severity, medicine, other, description))
+            elif medicine_class and self._classes.get(other_id) == medicine_class:
+                alerts.append(_alert("duplicate_therapy", "moderate", medicine, other,
+                                     f"Both are {medicine_class}"))
+        return alerts
+
+
+def _alert(kind: str, severity: str, medicine: str, conflicts_with: str, description: Optional[str]) -> dict:
+    return {"type": kind, "severity": severity, "medicine": medicine, "conflicts_with": conflicts_with,
+            "description": description}
+
+
+_graph = InteractionGraph()
+_graph_lock = threading.Lock()
+
+
+def get_interaction_graph(db: Session) -> InteractionGraph:
+    """The process-wide graph, reloaded when stale."""
+    if _graph.is_stale(settings.DRUG_SAFETY_REFRESH_SECONDS):
+        with _graph_lock:
+            if _graph.is_stale(settings.DRUG_SAFETY_REFRESH_SECONDS):
+                _graph.load(
+                    db.query(DrugInteraction.medicine_a, DrugInteraction.medicine_b,
+                             DrugInteraction.severity, DrugInteraction.description).all(),
+                    db.query(Medicine.name, Medicine.therapeutic_class)
+                    .filter(Medicine.therapeutic_class.isnot(None)).all(),
+                )
+    return _graph
+
+
+def invalidate_interaction_graph():
+    _graph.invalidate()
+
+
+def active_medicines(db: Session, patient_ids: Iterable[int], on: Optional[date] = None) -> Dict[int, List[str]]:
+    """Medicine names of each patient's prescriptions not ended before `on` (current or upcoming), in one query."""
+    on = on or date.today()
+    rows = (
+        db.query(Prescription.patient_id, Prescription.medicine_name)
+        .filter(Prescription.patient_id.in_(set(patient_ids)),
+                or_(Prescription.end_date.is_(None), Prescription.end_date >= on))
+        .all()
+    )
+    medicines: Dict[int, List[str]] = defaultdict(list)
+    for patient_id, medicine_name in rows:
+        medicines[patient_id].append(medicine_name)
+    return medicines
+
+
+def check_prescriptions(db: Session, items: Sequence, acknowledge: bool = False) -> List[List[dict]]:
+    """Alerts for each new prescription, against the patient's active drugs and earlier items of the batch.
+
+    Raises 409 listing the blocking alerts (DRUG_SAFETY_BLOCK_SEVERITY or worse) unless the
+    prescriber acknowledged them.
+    """
+    graph = get_interaction_graph(db)
+    current = active_medicines(db, (item.patient_id for item in items))
+    alerts = []
+    for item in items:
+        others = current[item.patient_id]
+        alerts.append(graph.check(item.medicine_name, others))
+        others.append(item.medicine_name)
+
+    block_rank = _SEVERITY_RANK.get(settings.DRUG_SAFETY_BLOCK_SEVERITY, len(SEVERITIES))
+    blocking = [
+        {"index": index, "alerts": [a for a in item_alerts if _SEVERITY_RANK.get(a["severity"], 0) >= block_rank]}
+        for index, item_alerts in enumerate(alerts)
+    ]
+    blocking = [entry for entry in blocking if entry["alerts"]]
+    if blocking and not acknowledge:
+        logger.warning(f"Prescription blocked by {sum(len(e['alerts']) for e in blocking)} safety alerts")
+        raise HTTPException(status_code=409, detail={
+            "message": "Prescription conflicts with the patient's active medication; resubmit with "
+                       "acknowledge_alerts=true to prescribe anyway",
+            "alerts": blocking,
+        })
+    return alerts
+
+
+def import_interactions(db: Session, rows: Iterable[Tuple[str, str, str, Optional[str]]]) -> int:
+    """Upsert interaction pairs (normalized, order-independent); returns how many rows were given."""
+    values = []
+    for medicine_a, medicine_b, severity, description in rows:
+        severity = severity.strip().lower()
+        if severity not in _SEVERITY_RANK:
+            raise ValueError(f"Unknown severity '{severity}' for {medicine_a} / {medicine_b}")
+        a, b = sorted((normalize_medicine(medicine_a), normalize_medicine(medicine_b)))
+        values.append({"medicine_a": a, "medicine_b": b, "severity": severity, "description": description or None})
+    if not values:
+        return 0
+    dialect = db.get_bind(DrugInteraction).dialect.name
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(DrugInteraction)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["medicine_a", "medicine_b"],
+        set_={"severity": stmt.excluded.severity, "description": stmt.excluded.description},
+    )
+    db.execute(stmt, values)
+    invalidate_interaction_graph()
+    return len(values)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from app.db.session import SessionLocal
+
+    with open(sys.argv[1], newline="", encoding="utf-8") as source, SessionLocal() as session:
+        reader = csv.reader(source)
+        rows = [(row + [None])[:4] for row in reader if row and not row[0].startswith("#")]
+        if rows and rows[0][0].strip().lower() == "medicine_a":
+            rows = rows[1:]  # header
+        count = import_interactions(session, rows)
+        session.commit()
+    print(f"Imported {count} drug interactions")
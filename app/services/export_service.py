@@ -0,0 +1,250 @@
+"""De-identified, columnar dataset export for offline analysis.
+
+    python -m app.services.export_service OUT_DIR [--format parquet|arrow] [--tables patients,...]
+        [--database-url URL] [--chunk-size N] [--row-group-size N] [--workers N] [--date-precision month]
+
+Patients, medical records, prescriptions and appointments are read in id order, CHUNK rows at
+a time (keyset pagination), de-identified, and appended to one Parquet or Arrow IPC file per
+table. A row group is written once enough chunks have accumulated, so memory is bounded by one
+row group per table regardless of table size. Tables are exported in parallel, each on its own
+connection.
+
+De-identification:
+- names, phone, email, address, user ids and free-text notes and reasons are dropped
+- ages become five-year bands, with 90 and over top-coded as "90+"
+- dates are truncated to EXPORT_DATE_PRECISION (month by default; "year" matches HIPAA safe harbor)
+- patient, doctor and row ids are replaced by keyed pseudonyms: HMAC-SHA256 under
+  EXPORT_PSEUDONYM_KEY, truncated to 63 bits. The same patient gets the same pseudonym in every
+  table and every export made with the same key, and without the key it cannot be reversed.
+
+Writing needs pyarrow (`pip install pyarrow`), which the API itself does not use.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.appointment import Appointment
+from app.models.medical_record import MedicalRecord
+from app.models.patient import Patient
+from app.models.prescription import Prescription
+
+logger = logging.getLogger(__name__)
+
+DATE_PRECISIONS = ("year", "month", "day")
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+class Deidentifier:
+    """Turns source rows into de-identified output rows."""
+
+    def __init__(self, key: str, date_precision: str = "month"):
+        if not key:
+            raise ValueError("A pseudonym key is required (EXPORT_PSEUDONYM_KEY or --key)")
+        if date_precision not in DATE_PRECISIONS:
+            raise ValueError(f"date precision must be one of {', '.join(DATE_PRECISIONS)}")
+        self._key = key.encode()
+        self.date_precision = date_precision
+
+    def pseudonym(self, namespace: str, value: Optional[int]) -> Optional[int]:
+        """A stable 63-bit id for `value`; namespaces keep patient 7 and doctor 7 apart."""
+        if value is None:
+            return None
+        digest = hmac.new(self._key, f"{namespace}:{value}".encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], "big") >> 1
+
+    def date(self, value) -> Optional[date]:
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            value = value.date()
+        if self.date_precision == "year":
+            return value.replace(month=1, day=1)
+        if self.date_precision == "month":
+            return value.replace(day=1)
+        return value
+
+    @staticmethod
+    def age_band(age: Optional[int]) -> Optional[str]:
+        if age is None:
+            return None
+        if age >= 90:
+            return "90+"
+        low = max(age, 0) // 5 * 5
+        return f"{low}-{low + 4}"
+
+
+# table -> (model, source columns, output schema as (name, arrow type alias), row transform)
+EXPORT_TABLES: Dict[str, tuple] = {
+    "patients": (
+        Patient,
+        [Patient.id, Patient.doctor_id, Patient.age, Patient.gender, Patient.is_active, Patient.date_registered],
+        [("patient", "int64"), ("doctor", "int64"), ("age_band", "string"), ("gender", "string"),
+         ("is_active", "bool"), ("registered", "date32")],
+        lambda d, r: (d.pseudonym("patient", r.id), d.pseudonym("doctor", r.doctor_id), d.age_band(r.age),
+                      r.gender, r.is_active, d.date(r.date_registered)),
+    ),
+    "medical_records": (
+        MedicalRecord,
+        [MedicalRecord.id, MedicalRecord.patient_id, MedicalRecord.doctor_id, MedicalRecord.visit_date,
+         MedicalRecord.diagnosis, MedicalRecord.treatment, MedicalRecord.prescribed_medicines],
+        [("record", "int64"), ("patient", "int64"), ("doctor", "int64"), ("visit", "date32"),
+         ("diagnosis", "string"), ("treatment", "string"), ("prescribed_medicines", "string")],
+        lambda d, r: (d.pseudonym("medical_record", r.id), d.pseudonym("patient", r.patient_id),
+                      d.pseudonym("doctor", r.doctor_id), d.date(r.visit_date), r.diagnosis, r.treatment,
+                      r.prescribed_medicines),
+    ),
+    "prescriptions": (
+        Prescription,
+        [Prescription.id, Prescription.patient_id, Prescription.doctor_id, Prescription.medicine_name,
+         Prescription.medicine_key, Prescription.dosage, Prescription.frequency, Prescription.start_date,
+         Prescription.end_date],
+        [("prescription", "int64"), ("patient", "int64"), ("doctor", "int64"), ("medicine_name", "string"),
+         ("medicine", "string"), ("dosage", "string"), ("frequency", "string"), ("start", "date32"),
+         ("end", "date32")],
+        lambda d, r: (d.pseudonym("prescription", r.id), d.pseudonym("patient", r.patient_id),
+                      d.pseudonym("doctor", r.doctor_id), r.medicine_name, r.medicine_key, r.dosage, r.frequency,
+                      d.date(r.start_date), d.date(r.end_date)),
+    ),
+    "appointments": (
+        Appointment,
+        [Appointment.id, Appointment.patient_id, Appointment.doctor_id, Appointment.appointment_date,
+         Appointment.status],
+        [("appointment", "int64"), ("patient", "int64"), ("doctor", "int64"), ("scheduled", "date32"),
+         ("status", "string")],
+        lambda d, r: (d.pseudonym("appointment", r.id), d.pseudonym("patient", r.patient_id),
+                      d.pseudonym("doctor", r.doctor_id), d.date(r.appointment_date), r.status),
+    ),
+}
+
+
+def iter_chunks(db: Session, table: str, deidentifier: Deidentifier, chunk_size: int) -> Iterator[Dict[str, list]]:
+    """De-identified rows of `table` as column lists, `chunk_size` rows at a time, in id order."""
+    model, columns, schema, transform = EXPORT_TABLES[table]
+    names = [name for name, _ in schema]
+    last_id = None
+    while True:
+        query = db.query(*columns)
+        if last_id is not None:
+            query = query.filter(model.id > last_id)
+        rows = query.order_by(model.id).limit(chunk_size).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        values = [transform(deidentifier, row) for row in rows]
+        yield {name: [row[i] for row in values] for i, name in enumerate(names)}
+        if len(rows) < chunk_size:
+            return
+
+
+def _arrow_schema(table: str):
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.type_for_alias(alias)) for name, alias in EXPORT_TABLES[table][2]])
+
+
+def export_table(engine: Engine, table: str, path: str, deidentifier: Deidentifier, file_format: str = "parquet",
+                 chunk_size: int = 10000, row_group_size: int = 100000) -> int:
+    """Write one table to `path` (via a temporary file, renamed on success); returns the row count."""
+    import pyarrow as pa
+
+    schema = _arrow_schema(table)
+    partial = path + ".partial"
+    rows, pending, pending_rows = 0, [], 0
+    with Session(engine) as db, pa.OSFile(partial, "wb") as sink:
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+            flush = lambda batches: writer.write_table(pa.Table.from_batches(batches, schema),  # noqa: E731
+                                                      row_group_size=row_group_size)
+        else:
+            writer = pa.ipc.new_file(sink, schema)
+            flush = lambda batches: [writer.write_batch(batch) for batch in batches]  # noqa: E731
+        try:
+            for columns in iter_chunks(db, table, deidentifier, chunk_size):
+                batch = pa.RecordBatch.from_pydict(columns, schema=schema)
+                pending.append(batch)
+                pending_rows += batch.num_rows
+                rows += batch.num_rows
+                if pending_rows >= row_group_size:
+                    flush(pending)
+                    pending, pending_rows = [], 0
+            if pending:
+                flush(pending)
+        finally:
+            writer.close()
+    os.replace(partial, path)
+    logger.info(f"Exported {rows} {table} rows to {path}")
+    return rows
+
+
+def export_dataset(engine: Engine, out_dir: str, deidentifier: Deidentifier, tables: Sequence[str] = tuple(EXPORT_TABLES),
+                   file_format: str = "parquet", chunk_size: int = 10000, row_group_size: int = 100000,
+                   workers: int = 4) -> Dict[str, int]:
+    """Export `tables` in parallel into `out_dir`, plus a manifest.json; returns rows per table."""
+    unknown = set(tables) - set(EXPORT_TABLES)
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tables)))) as pool:
+        futures = {
+            table: pool.submit(export_table, engine, table, os.path.join(out_dir, table + FORMATS[file_format]),
+                               deidentifier, file_format, chunk_size, row_group_size)
+            for table in tables
+        }
+        counts = {table: future.result() for table, future in futures.items()}
+    manifest = {
+        "exported_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "format": file_format,
+        "date_precision": deidentifier.date_precision,
+        "tables": {table: {"file": table + FORMATS[file_format], "rows": rows} for table, rows in counts.items()},
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Exported {sum(counts.values())} rows in {time.perf_counter() - started:.1f} s")
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Export a de-identified columnar dataset.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--tables", default=",".join(EXPORT_TABLES), help="comma separated")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--key", default=settings.EXPORT_PSEUDONYM_KEY, help="pseudonym key (EXPORT_PSEUDONYM_KEY)")
+    parser.add_argument("--date-precision", choices=DATE_PRECISIONS, default=settings.EXPORT_DATE_PRECISION)
+    parser.add_argument("--chunk-size", type=int, default=settings.EXPORT_CHUNK_SIZE)
+    parser.add_argument("--row-group-size", type=int, default=settings.EXPORT_ROW_GROUP_SIZE)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        parser.error("the export needs pyarrow: pip install pyarrow")
+    try:
+        deidentifier = Deidentifier(args.key, args.date_precision)
+    except ValueError as e:
+        parser.error(str(e))
+    engine = create_engine(args.database_url)
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    export_dataset(engine, args.out_dir, deidentifier, tables, args.format, args.chunk_size, args.row_group_size,
+                   args.workers)
+
+
+if __name__ == "__main__":
+    main()
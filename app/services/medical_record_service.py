@@ -1,37 +1,86 @@
+from datetime import date
+from typing import List, Optional, Sequence
 from sqlalchemy.orm import Session
+from app.db.routing import read_only
+from app.db.mutations import insert_returning, update_returning, delete_returning, version_conflict
+from app.db.sharding import route_by_id, scatter_gather
 from app.models.medical_record import MedicalRecord
 from app.schemas.medical_record import MedicalRecordCreate, MedicalRecordUpdate
+from app.services.batch_service import validate_batch
+from app.services.cohort_service import mark_patients_changed
+from app.services.search_service import index_medical_records, unindex_medical_record
+from fastapi import HTTPException
 
 def create_medical_record(db: Session, record_data: MedicalRecordCreate):
     """Create a new medical record."""
+    route_by_id(db, record_data.patient_id, record_data.doctor_id)
     new_record = MedicalRecord(**record_data.dict())
     db.add(new_record)
-    db.commit()
-    db.refresh(new_record)
+    db.flush()
+    index_medical_records(db, [new_record])
+    mark_patients_changed(db, [new_record.patient_id])
     return new_record
 
-def get_medical_record_by_id(db: Session, record_id: int):
+def create_medical_records(db: Session, records: List[MedicalRecordCreate], doctor_id: Optional[int] = None):
+    """Create many medical records with one multi-row INSERT; all or none are written.
+
+    With `doctor_id`, every record must be written by that doctor.
+    """
+    validate_batch(db, records, doctor_id=doctor_id)
+    created = insert_returning(db, MedicalRecord, [record.dict() for record in records])
+    index_medical_records(db, created)
+    mark_patients_changed(db, {record.patient_id for record in created})
+    return created
+
+@read_only
+def get_medical_record_by_id(db: Session, record_id: int, options: Sequence = ()):
     """Get a medical record by ID."""
-    return db.query(MedicalRecord).filter(MedicalRecord.id == record_id).first()
-
-def get_all_medical_records(db: Session, skip: int = 0, limit: int = 10):
-    """Retrieve a paginated list of medical records."""
-    return db.query(MedicalRecord).offset(skip).limit(limit).all()
-
-def update_medical_record(db: Session, record_id: int, record_data: MedicalRecordUpdate):
-    """Update a medical record."""
-    record = db.query(MedicalRecord).filter(MedicalRecord.id == record_id).first()
-    if record:
-        for key, value in record_data.dict(exclude_unset=True).items():
-            setattr(record, key, value)
-        db.commit()
-        db.refresh(record)
+    route_by_id(db, record_id)
+    return db.query(MedicalRecord).options(*options).filter(MedicalRecord.id == record_id).first()
+
+@read_only
+def get_all_medical_records(db: Session, skip: int = 0, limit: int = 10, patient_id: Optional[int] = None,
+                            visit_from: Optional[date] = None, visit_to: Optional[date] = None,
+                            options: Sequence = ()):
+    """Retrieve a paginated list of medical records, newest visits first.
+
+    A visit_date range lets PostgreSQL prune the monthly partitions outside it. Without a
+    patient the list spans every shard. `options` are loader options (columns, relations).
+    """
+    def build(session: Session):
+        query = session.query(MedicalRecord).options(*options)
+        if patient_id is not None:
+            query = query.filter(MedicalRecord.patient_id == patient_id)
+        if visit_from is not None:
+            query = query.filter(MedicalRecord.visit_date >= visit_from)
+        if visit_to is not None:
+            query = query.filter(MedicalRecord.visit_date <= visit_to)
+        return query.order_by(MedicalRecord.visit_date.desc(), MedicalRecord.id.desc())
+
+    if patient_id is not None:
+        route_by_id(db, patient_id)
+        return build(db).offset(skip).limit(limit).all()
+    return scatter_gather(db, build, key=lambda r: (r.visit_date, r.id), skip=skip, limit=limit, reverse=True)
+
+def update_medical_record(db: Session, record_id: int, record_data: MedicalRecordUpdate,
+                          expected_version: Optional[int] = None):
+    """Update a medical record. Returns None if it does not exist; 409 if it is no longer at `expected_version`."""
+    route_by_id(db, record_id)
+    record = update_returning(db, MedicalRecord, record_id, record_data.dict(exclude_unset=True),
+                              expected_version=expected_version)
+    if record is None and version_conflict(db, MedicalRecord, record_id, expected_version):
+        raise HTTPException(status_code=409, detail="Medical record was modified by another request; reload it and retry")
+    if record is not None:
+        index_medical_records(db, [record])
+        mark_patients_changed(db, [record.patient_id])
     return record
 
 def delete_medical_record(db: Session, record_id: int):
-    """Delete a medical record."""
-    record = db.query(MedicalRecord).filter(MedicalRecord.id == record_id).first()
-    if record:
-        db.delete(record)
-        db.commit()
-    return record
+    """Delete a medical record. Returns the deleted id, or None if it did not exist."""
+    route_by_id(db, record_id)
+    patient_id = delete_returning(db, MedicalRecord, record_id, returning=MedicalRecord.patient_id)
+    if patient_id is None:
+        return None
+    unindex_medical_record(db, record_id)
+    mark_patients_changed(db, [patient_id])
+    return record_id
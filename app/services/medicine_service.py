@@ -1,37 +1,40 @@
 from sqlalchemy.orm import Session
+from app.db.routing import read_only
+from app.db.mutations import update_returning, delete_returning
 from app.models.medicine import Medicine
 from app.schemas.medicine import MedicineCreate, MedicineUpdate
+from app.services.drug_safety_service import invalidate_interaction_graph
 
 def create_medicine(db: Session, medicine_data: MedicineCreate):
     """Create a new medicine."""
     new_medicine = Medicine(**medicine_data.dict())
     db.add(new_medicine)
-    db.commit()
-    db.refresh(new_medicine)
+    db.flush()
+    if new_medicine.therapeutic_class:
+        invalidate_interaction_graph()
     return new_medicine
 
+@read_only
 def get_medicine_by_id(db: Session, medicine_id: int):
     """Get a medicine by ID."""
     return db.query(Medicine).filter(Medicine.id == medicine_id).first()
 
+@read_only
 def get_all_medicines(db: Session, skip: int = 0, limit: int = 10):
     """Get all medicines."""
     return db.query(Medicine).offset(skip).limit(limit).all()
 
 def update_medicine(db: Session, medicine_id: int, medicine_data: MedicineUpdate):
     """Update a medicine."""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
-    if medicine:
-        for key, value in medicine_data.dict(exclude_unset=True).items():
-            setattr(medicine, key, value)
-        db.commit()
-        db.refresh(medicine)
+    values = medicine_data.dict(exclude_unset=True)
+    medicine = update_returning(db, Medicine, medicine_id, values)
+    if "therapeutic_class" in values:
+        invalidate_interaction_graph()
     return medicine
 
 def delete_medicine(db: Session, medicine_id: int):
-    """Delete a medicine."""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
-    if medicine:
-        db.delete(medicine)
-        db.commit()
+    """Delete a medicine. Returns None if it did not exist."""
+    if delete_returning(db, Medicine, medicine_id) is None:
+        return None
+    invalidate_interaction_graph()
     return {"message": "Medicine deleted successfully"}
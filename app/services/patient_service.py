@@ -1,8 +1,16 @@
+from typing import Optional, Sequence
 from sqlalchemy.orm import Session
+from app.db.routing import read_only
+from app.db.mutations import update_returning, delete_returning, version_conflict
+from app.db.sharding import route_by_id, scatter_gather
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
 from app.models.patient import Patient
 from app.schemas.patient import PatientCreate, PatientUpdate
+from app.core.config import settings
+from app.core.crypto import blind_index
+from app.services.assignment_service import get_load_index, track_load
+from app.services.cohort_service import mark_patients_changed
 import logging
 
 
@@ -12,9 +20,13 @@ def create_patient(db: Session, patient: PatientCreate) -> Patient:
     """Create a new patient."""
     try:
         new_patient = Patient(**patient.dict())
+        if settings.AUTO_ASSIGN_PATIENTS:
+            new_patient.doctor_id = get_load_index(db).pick()
+            track_load(db, new_patient.doctor_id, patients=1)
+        route_by_id(db, new_patient.doctor_id)  # patients live on their doctor's shard
         db.add(new_patient)
-        db.commit()
-        db.refresh(new_patient)
+        db.flush()
+        mark_patients_changed(db, [new_patient.id])
         logger.info(f"Patient  created successfully: {new_patient.id}")
         return new_patient  # Ensure the full Patient object is returned
     except HTTPException as http_exc:
@@ -23,36 +35,53 @@ def create_patient(db: Session, patient: PatientCreate) -> Patient:
         logger.error(f"Error creating patient: {e}")
         raise HTTPException(status_code=400, detail="Error creating patient")
 
-def get_patients(db: Session):
-    """Get all patients."""
-    return db.query(Patient).all()
+@read_only
+def get_patients(db: Session, options: Sequence = ()):
+    """Get all patients, across every shard; `options` are loader options (columns, relations)."""
+    return scatter_gather(db, lambda session: session.query(Patient).options(*options).order_by(Patient.id),
+                          key=lambda p: p.id)
 
-def get_patient_by_id(db: Session, patient_id: int):
+@read_only
+def get_patient_by_id(db: Session, patient_id: int, options: Sequence = ()):
     """Get a patient by ID."""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+    route_by_id(db, patient_id)
+    patient = db.query(Patient).options(*options).filter(Patient.id == patient_id).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient
 
-def update_patient(db: Session, patient_id: int, patient_data: PatientUpdate):
-    """Update a patient."""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
+@read_only
+def find_patient_by_contact(db: Session, phone: Optional[str] = None, email: Optional[str] = None):
+    """Look a patient up by phone or email through their blind indexes (the columns are encrypted)."""
+    if phone is None and email is None:
+        raise HTTPException(status_code=422, detail="Give a phone or an email")
+    query = db.query(Patient)
+    if phone is not None:
+        query = query.filter(Patient.phone_bidx == blind_index(phone, "patients.phone"))
+    if email is not None:
+        query = query.filter(Patient.email_bidx == blind_index(email, "patients.email"))
+    patient = query.first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
+    return patient
 
-    for key, value in patient_data.dict().items():
-        setattr(patient, key, value)
-
-    db.commit()
-    db.refresh(patient)
+def update_patient(db: Session, patient_id: int, patient_data: PatientUpdate, expected_version: Optional[int] = None):
+    """Update a patient, writing only the fields that were set; 409 if it is no longer at `expected_version`."""
+    values = patient_data.dict(exclude_unset=True)
+    route_by_id(db, patient_id)
+    patient = update_returning(db, Patient, patient_id, {**values, **Patient.blind_indexes(values)},
+                               expected_version=expected_version)
+    if not patient:
+        if version_conflict(db, Patient, patient_id, expected_version):
+            raise HTTPException(status_code=409, detail="Patient was modified by another request; reload it and retry")
+        raise HTTPException(status_code=404, detail="Patient not found")
+    mark_patients_changed(db, [patient_id])
     return patient
 
 def delete_patient(db: Session, patient_id: int):
     """Delete a patient."""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    route_by_id(db, patient_id)
+    if delete_returning(db, Patient, patient_id) is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-
-    db.delete(patient)
-    db.commit()
+    mark_patients_changed(db, [patient_id])
     return {"message": "Patient deleted successfully"}
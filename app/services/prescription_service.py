@@ -1,37 +1,96 @@
+from datetime import date
+from typing import List, Optional
 from sqlalchemy.orm import Session
+from app.db.routing import read_only
+from app.db.mutations import insert_returning, update_returning, delete_returning
+from app.db.sharding import route_by_id, scatter_gather
 from app.models.prescription import Prescription
 from app.schemas.prescription import PrescriptionCreate, PrescriptionUpdate
+from app.services.batch_service import validate_batch
+from app.services.cohort_service import mark_patients_changed
+from app.services.drug_safety_service import check_prescriptions, normalize_medicine
 
-def create_prescription(db: Session, prescription_data: PrescriptionCreate):
-    """Create a new prescription."""
+def create_prescription(db: Session, prescription_data: PrescriptionCreate, acknowledge_alerts: bool = False):
+    """Create a new prescription after checking it against the patient's active medication."""
+    route_by_id(db, prescription_data.patient_id, prescription_data.doctor_id)
+    alerts = check_prescriptions(db, [prescription_data], acknowledge=acknowledge_alerts)[0]
     new_prescription = Prescription(**prescription_data.dict())
     db.add(new_prescription)
-    db.commit()
-    db.refresh(new_prescription)
+    db.flush()
+    new_prescription.safety_alerts = alerts
+    mark_patients_changed(db, [new_prescription.patient_id])
     return new_prescription
 
+def create_prescriptions(db: Session, prescriptions: List[PrescriptionCreate], doctor_id: Optional[int] = None,
+                         acknowledge_alerts: bool = False):
+    """Create many prescriptions with one multi-row INSERT; all or none are written."""
+    validate_batch(db, prescriptions, doctor_id=doctor_id)
+    alerts = check_prescriptions(db, prescriptions, acknowledge=acknowledge_alerts)
+    rows = [{**prescription.dict(), "medicine_key": normalize_medicine(prescription.medicine_name)}
+            for prescription in prescriptions]
+    created = insert_returning(db, Prescription, rows)
+    for prescription, item_alerts in zip(created, alerts):
+        prescription.safety_alerts = item_alerts
+    mark_patients_changed(db, {prescription.patient_id for prescription in created})
+    return created
+
+@read_only
 def get_prescription_by_id(db: Session, prescription_id: int):
     """Get a prescription by ID."""
+    route_by_id(db, prescription_id)
     return db.query(Prescription).filter(Prescription.id == prescription_id).first()
 
+@read_only
 def get_all_prescriptions(db: Session, skip: int = 0, limit: int = 10):
-    """Get all prescriptions."""
-    return db.query(Prescription).offset(skip).limit(limit).all()
+    """Get all prescriptions in id order, across every shard."""
+    return scatter_gather(db, lambda session: session.query(Prescription).order_by(Prescription.id),
+                          key=lambda p: p.id, skip=skip, limit=limit)
+
+@read_only
+def get_active_prescriptions_for_patient(db: Session, patient_id: int, on: Optional[date] = None):
+    """Prescriptions the patient is on as of `on` (default today)."""
+    route_by_id(db, patient_id)
+    return (
+        db.query(Prescription)
+        .filter(Prescription.patient_id == patient_id, Prescription.active_on(on or date.today()))
+        .order_by(Prescription.start_date, Prescription.id)
+        .all()
+    )
+
+@read_only
+def get_active_prescriptions_for_medicine(db: Session, medicine_name: str, on: Optional[date] = None,
+                                          skip: int = 0, limit: int = 100):
+    """Active prescriptions of a medicine as of `on`, matched by normalized name ("Warfarin 5mg" is warfarin).
+
+    Spans every shard.
+    """
+    medicine_key, day = normalize_medicine(medicine_name), on or date.today()
+    return scatter_gather(
+        db,
+        lambda session: (
+            session.query(Prescription)
+            .filter(Prescription.medicine_key == medicine_key, Prescription.active_on(day))
+            .order_by(Prescription.id)
+        ),
+        key=lambda p: p.id, skip=skip, limit=limit,
+    )
 
 def update_prescription(db: Session, prescription_id: int, prescription_data: PrescriptionUpdate):
     """Update a prescription."""
-    prescription = db.query(Prescription).filter(Prescription.id == prescription_id).first()
-    if prescription:
-        for key, value in prescription_data.dict(exclude_unset=True).items():
-            setattr(prescription, key, value)
-        db.commit()
-        db.refresh(prescription)
+    values = prescription_data.dict(exclude_unset=True)
+    if "medicine_name" in values:
+        values["medicine_key"] = normalize_medicine(values["medicine_name"])
+    route_by_id(db, prescription_id)
+    prescription = update_returning(db, Prescription, prescription_id, values)
+    if prescription is not None:
+        mark_patients_changed(db, [prescription.patient_id])
     return prescription
 
 def delete_prescription(db: Session, prescription_id: int):
-    """Delete a prescription."""
-    prescription = db.query(Prescription).filter(Prescription.id == prescription_id).first()
-    if prescription:
-        db.delete(prescription)
-        db.commit()
+    """Delete a prescription. Returns None if it did not exist."""
+    route_by_id(db, prescription_id)
+    patient_id = delete_returning(db, Prescription, prescription_id, returning=Prescription.patient_id)
+    if patient_id is None:
+        return None
+    mark_patients_changed(db, [patient_id])
     return {"message": "Prescription deleted successfully"}
@@ -0,0 +1,316 @@
+"""Ranked full-text search over medical records.
+
+PostgreSQL uses the generated `search_vector` column (app.db.search): websearch_to_tsquery
+syntax, a GIN lookup, ts_rank_cd ranking, and ts_headline computed only for the rows of the
+returned page. Other databases (SQLite in development and tests), and PostgreSQL once diagnoses
+are encrypted (app.core.crypto), use MemorySearchIndex, an in-process inverted index built on
+first search and kept current by the medical record service after each commit. Other workers'
+writes reach it too: each search first indexes the records inserted above the id watermark of the
+last read, and the whole index is rebuilt every SEARCH_REFRESH_SECONDS for their updates and
+deletes.
+
+Results are ordered by (rank desc, id desc) and paged with an opaque cursor holding the last
+(rank, id), so later pages neither skip nor repeat rows the way offsets do.
+"""
+import base64
+import binascii
+import html
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import REAL, and_, cast, event, func, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.crypto import get_keyring
+from app.db.search import SEARCH_CONFIG
+from app.db.sharding import in_directory, pinned
+from app.models.medical_record import MedicalRecord
+from app.models.patient import Patient
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ("diagnosis", "treatment", "prescribed_medicines", "notes")
+# Mirrors the A/B/B/C weights of the tsvector (ts_rank's defaults 1.0, 0.4, 0.2)
+FIELD_WEIGHTS = {"diagnosis": 1.0, "treatment": 0.4, "prescribed_medicines": 0.4, "notes": 0.2}
+
+# ts_headline marks matches with these; the text is HTML-escaped before they become <mark> tags
+_START, _STOP = "⟦", "⟧"
+_HEADLINE_OPTIONS = f"StartSel={_START}, StopSel={_STOP}, MaxWords=25, MinWords=8, MaxFragments=2"
+
+
+@dataclass
+class SearchScope:
+    """Which records a caller may search; no fields set means every record (admins)."""
+    patient_id: Optional[int] = None  # patients: their own records
+    doctor_id: Optional[int] = None  # doctors: records they wrote or of patients assigned to them
+
+
+def encode_cursor(rank: float, record_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, record_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(record_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _marked_to_html(marked: str) -> str:
+    return html.escape(marked).replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+# PostgreSQL ------------------------------------------------------------------
+
+def _scope_criteria(scope: SearchScope) -> list:
+    criteria = []
+    if scope.patient_id is not None:
+        criteria.append(MedicalRecord.patient_id == scope.patient_id)
+    if scope.doctor_id is not None:
+        assigned = select(Patient.id).where(Patient.doctor_id == scope.doctor_id)
+        criteria.append(or_(MedicalRecord.doctor_id == scope.doctor_id, MedicalRecord.patient_id.in_(assigned)))
+    return criteria
+
+
+def _search_postgresql(db: Session, query: str, scope: SearchScope, after: Optional[Tuple[float, int]],
+                       limit: int) -> List[Tuple[MedicalRecord, float, str]]:
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    vector = literal_column("medical_records.search_vector")
+    rank = func.ts_rank_cd(vector, tsquery)
+    page = select(MedicalRecord.id.label("id"), rank.label("rank")).where(vector.op("@@")(tsquery), *_scope_criteria(scope))
+    if after is not None:
+        after_rank = cast(after[0], REAL)
+        page = page.where(or_(rank < after_rank, and_(rank == after_rank, MedicalRecord.id < after[1])))
+    page = page.order_by(rank.desc(), MedicalRecord.id.desc()).limit(limit).subquery()
+
+    document = func.concat_ws(" … ", *(getattr(MedicalRecord, field) for field in SEARCH_FIELDS))
+    headline = func.ts_headline(SEARCH_CONFIG, document, tsquery, _HEADLINE_OPTIONS)
+    rows = (
+        db.query(MedicalRecord, page.c.rank, headline)
+        .join(page, page.c.id == MedicalRecord.id)
+        .order_by(page.c.rank.desc(), MedicalRecord.id.desc())
+        .all()
+    )
+    return [(record, float(record_rank), _marked_to_html(marked)) for record, record_rank, marked in rows]
+
+
+# In-process fallback -------------------------------------------------------
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it no not of on or the to was were with".split()
+)
+
+
+def _stem(token: str) -> str:
+    """A crude plural stripper, so "infections" finds "infection"."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [_stem(t) for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class MemorySearchIndex:
+    """Inverted index: term -> {record id: field-weighted term frequency}."""
+
+    def __init__(self):
+        self.built_at: Optional[float] = None
+        self.high_id = 0  # highest record id read from the database
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._docs: Dict[int, Tuple[int, int, Set[str]]] = {}  # id -> (patient_id, doctor_id, terms)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    @property
+    def built(self) -> bool:
+        return self.built_at is not None
+
+    def is_stale(self, max_age: float) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > max_age
+
+    def replace(self, other: "MemorySearchIndex"):
+        """Take over a freshly built index's contents; swapped in whole, as searches hold the lock."""
+        with self._lock:
+            self._postings, self._docs = other._postings, other._docs
+            self.high_id, self.built_at = other.high_id, time.monotonic()
+
+    def add(self, record_id: int, patient_id: int, doctor_id: int, fields: Dict[str, Optional[str]]):
+        with self._lock:
+            self.remove(record_id)
+            terms = set()
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in tokenize(fields.get(field)):
+                    postings = self._postings[term]
+                    postings[record_id] = postings.get(record_id, 0.0) + weight
+                    terms.add(term)
+            self._docs[record_id] = (patient_id, doctor_id, terms)
+
+    def remove(self, record_id: int):
+        with self._lock:
+            doc = self._docs.pop(record_id, None)
+            for term in doc[2] if doc else ():
+                postings = self._postings[term]
+                postings.pop(record_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, terms: Sequence[str], patient_id: Optional[int] = None, doctor_id: Optional[int] = None,
+               assigned: Set[int] = frozenset()) -> List[Tuple[float, int]]:
+        """(score, id) of records containing every term, best first; tf-idf scored."""
+        with self._lock:
+            lists = [self._postings.get(term, {}) for term in dict.fromkeys(terms)]
+            if not lists or not all(lists):
+                return []
+            lists.sort(key=len)
+            candidates = set(lists[0]).intersection(*lists[1:])
+            total = len(self._docs)
+            results = []
+            for record_id in candidates:
+                record_patient, record_doctor, _ = self._docs[record_id]
+                if patient_id is not None and record_patient != patient_id:
+                    continue
+                if doctor_id is not None and record_doctor != doctor_id and record_patient not in assigned:
+                    continue
+                score = sum(postings[record_id] * math.log(1 + total / len(postings)) for postings in lists)
+                results.append((round(score, 6), record_id))
+        results.sort(key=lambda hit: (-hit[0], -hit[1]))
+        return results
+
+
+def _highlight(record: MedicalRecord, terms: Set[str], window: int = 12) -> str:
+    """A window of words around the first match, matches wrapped in <mark>."""
+    for field in SEARCH_FIELDS:
+        words = (getattr(record, field) or "").split()
+        hits = [i for i, word in enumerate(words) if set(tokenize(word)) & terms]
+        if not hits:
+            continue
+        start = max(0, hits[0] - window // 2)
+        snippet = []
+        for word in words[start:start + window]:
+            snippet.append(f"{_START}{word}{_STOP}" if set(tokenize(word)) & terms else word)
+        return _marked_to_html(("… " if start else "") + " ".join(snippet) + (" …" if start + window < len(words) else ""))
+    return ""
+
+
+_memory_index = MemorySearchIndex()
+
+
+def _record_fields(record) -> Dict[str, Optional[str]]:
+    return {field: getattr(record, field) for field in SEARCH_FIELDS}
+
+
+def _read_records(db: Session, index: MemorySearchIndex):
+    """Index the records above the index's watermark (all of them for a new index)."""
+    columns = [MedicalRecord.id, MedicalRecord.patient_id, MedicalRecord.doctor_id]
+    columns += [getattr(MedicalRecord, field) for field in SEARCH_FIELDS]
+    for row in db.query(*columns).filter(MedicalRecord.id > index.high_id).order_by(MedicalRecord.id).yield_per(1000):
+        index.add(row.id, row.patient_id, row.doctor_id, _record_fields(row))
+        index.high_id = row.id
+
+
+def get_memory_index(db: Session) -> MemorySearchIndex:
+    """The in-process index over the directory shard's records.
+
+    Built on first use and rebuilt every SEARCH_REFRESH_SECONDS; in between, records other
+    workers inserted since the last read are added before it is searched.
+    """
+    with _memory_index._lock, pinned(db, None):
+        if _memory_index.is_stale(settings.SEARCH_REFRESH_SECONDS):
+            started = time.perf_counter()
+            fresh = MemorySearchIndex()
+            _read_records(db, fresh)
+            _memory_index.replace(fresh)
+            logger.info(f"Built in-process search index over {len(_memory_index)} medical records "
+                        f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        else:
+            _read_records(db, _memory_index)
+    return _memory_index
+
+
+def _search_memory(db: Session, query: str, scope: SearchScope, after: Optional[Tuple[float, int]],
+                   limit: int) -> List[Tuple[MedicalRecord, float, str]]:
+    terms = tokenize(query)
+    with pinned(db, None):  # the index, and so its records, are the directory shard's
+        assigned = set()
+        if scope.doctor_id is not None:
+            assigned = {pid for (pid,) in db.query(Patient.id).filter(Patient.doctor_id == scope.doctor_id)}
+        hits = get_memory_index(db).search(terms, scope.patient_id, scope.doctor_id, assigned)
+        if after is not None:
+            hits = [(score, rid) for score, rid in hits if score < after[0] or (score == after[0] and rid < after[1])]
+        hits = hits[:limit]
+        records = {r.id: r for r in db.query(MedicalRecord).filter(MedicalRecord.id.in_([rid for _, rid in hits]))}
+    term_set = set(terms)
+    return [(records[rid], score, _highlight(records[rid], term_set)) for score, rid in hits if rid in records]
+
+
+# Index maintenance (fallback only; PostgreSQL's generated column needs none) -------
+
+def _uses_postgresql(db: Session) -> bool:
+    """The tsvector column indexes stored text, so it is useless once diagnoses are encrypted."""
+    return db.get_bind(MedicalRecord).dialect.name == "postgresql" and not get_keyring().enabled
+
+
+def _uses_memory_index(db: Session) -> bool:
+    return not _uses_postgresql(db) and _memory_index.built
+
+
+def index_medical_records(db: Session, records: Sequence[MedicalRecord]):
+    """Queue records for the in-process index; applied once the transaction commits."""
+    if _uses_memory_index(db):
+        pending = db.info.setdefault("search_pending", [])
+        pending += [("add", r.id, r.patient_id, r.doctor_id, _record_fields(r))
+                    for r in records if in_directory(db, r.id)]
+
+
+def unindex_medical_record(db: Session, record_id: int):
+    if _uses_memory_index(db) and in_directory(db, record_id):
+        db.info.setdefault("search_pending", []).append(("remove", record_id, None, None, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_search_pending(session: Session):
+    for action, record_id, patient_id, doctor_id, fields in session.info.pop("search_pending", []):
+        if action == "add":
+            _memory_index.add(record_id, patient_id, doctor_id, fields)
+        else:
+            _memory_index.remove(record_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_search_pending(session: Session):
+    session.info.pop("search_pending", None)
+
+
+# Entry point -----------------------------------------------------------------
+
+def search_medical_records(db: Session, query: str, scope: SearchScope, cursor: Optional[str] = None,
+                           limit: int = 20) -> dict:
+    """One page of matching records with rank and an HTML highlight, plus the next page's cursor."""
+    if not query.strip():
+        raise HTTPException(status_code=422, detail="Search query is empty")
+    after = decode_cursor(cursor) if cursor else None
+    if _uses_postgresql(db):
+        hits = _search_postgresql(db, query, scope, after, limit + 1)
+    else:
+        hits = _search_memory(db, query, scope, after, limit + 1)
+    page = hits[:limit]
+    next_cursor = encode_cursor(page[-1][1], page[-1][0].id) if len(hits) > limit else None
+    return {
+        "results": [{"record": record, "rank": rank, "highlight": highlight} for record, rank, highlight in page],
+        "next_cursor": next_cursor,
+    }
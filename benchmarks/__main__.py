@@ -0,0 +1,100 @@
+"""Benchmark CLI.
+
+    python -m benchmarks seed --scale 1            # seed the synthetic dataset into DATABASE_URL
+    python -m benchmarks run --workload mixed      # run in-process and report per-route latency
+    python -m benchmarks run --url http://localhost:8000 --baseline benchmarks/baseline.json
+"""
+import argparse
+import logging
+import os
+import sys
+
+from benchmarks.dataset import DatasetSpec, seed_dataset
+from benchmarks.report import compare, format_table, load_json, save_json, summarize
+from benchmarks.workload import WORKLOADS, http_client_factory, in_process_client_factory, run_workload
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_MANIFEST = os.path.join(RESULTS_DIR, "dataset.json")
+
+
+def cmd_seed(args):
+    from app.db.session import engine
+
+    spec = DatasetSpec(
+        patients=args.patients, doctors=args.doctors, appointments=args.appointments,
+        medical_records=args.records, prescriptions=args.prescriptions,
+        patient_users=args.patient_users, seed=args.seed, chunk_size=args.chunk_size,
+    ).scaled(args.scale)
+    manifest = seed_dataset(engine, spec, create_schema=args.create_schema)
+    os.makedirs(os.path.dirname(args.manifest), exist_ok=True)
+    save_json(args.manifest, manifest)
+    print(f"Dataset manifest written to {args.manifest}")
+
+
+def cmd_run(args):
+    manifest = load_json(args.manifest)
+    factory = http_client_factory(args.url) if args.url else in_process_client_factory()
+    recorder, elapsed = run_workload(
+        factory, manifest, workload=args.workload, users=args.users,
+        iterations=args.iterations, seed=args.seed, duration=args.duration,
+    )
+    summary = summarize(recorder, elapsed)
+    summary["workload"] = args.workload
+    summary["mode"] = "http" if args.url else "in-process"
+    print(format_table(summary))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        save_json(args.output, summary)
+    if args.save_baseline:
+        save_json(args.save_baseline, summary)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline and os.path.exists(args.baseline):
+        regressions = compare(summary, load_json(args.baseline), tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show application INFO logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    defaults = DatasetSpec()
+    seed = sub.add_parser("seed", help="Bulk-load a synthetic dataset")
+    seed.add_argument("--scale", type=float, default=1.0, help="Multiply every row count by this factor")
+    seed.add_argument("--patients", type=int, default=defaults.patients)
+    seed.add_argument("--doctors", type=int, default=defaults.doctors)
+    seed.add_argument("--appointments", type=int, default=defaults.appointments)
+    seed.add_argument("--records", type=int, default=defaults.medical_records)
+    seed.add_argument("--prescriptions", type=int, default=defaults.prescriptions)
+    seed.add_argument("--patient-users", type=int, default=defaults.patient_users)
+    seed.add_argument("--chunk-size", type=int, default=defaults.chunk_size)
+    seed.add_argument("--seed", type=int, default=defaults.seed)
+    seed.add_argument("--create-schema", action="store_true", help="Create tables before seeding")
+    seed.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    seed.set_defaults(func=cmd_seed)
+
+    run = sub.add_parser("run", help="Run a scripted workload and report latency")
+    run.add_argument("--workload", choices=sorted(WORKLOADS), default="mixed")
+    run.add_argument("--url", help="Base URL of a running server; in-process when omitted")
+    run.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    run.add_argument("--iterations", type=int, default=100, help="Actions per virtual user")
+    run.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed iteration count")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    run.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    run.add_argument("--baseline", help="Fail with exit code 1 on regressions against this summary")
+    run.add_argument("--save-baseline", help="Write this run's summary as the new baseline")
+    run.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown before flagging")
+    run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
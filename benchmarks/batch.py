@@ -0,0 +1,87 @@
+"""Batch writes versus one POST per row.
+
+    python -m benchmarks.batch --size 20 --rounds 10
+    python -m benchmarks.batch --url http://localhost:8000 --size 50
+
+Creates `size` medical records per round, first as `size` single POSTs and then as one POST to
+/medical_records/batch, and reports the median wall time of each. Needs a seeded dataset
+(python -m benchmarks seed) for the doctor login and patient/doctor ids.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date
+
+from benchmarks.__main__ import DEFAULT_MANIFEST
+from benchmarks.dataset import BENCH_PASSWORD, doctor_email
+from benchmarks.report import load_json
+from benchmarks.workload import http_client_factory, in_process_client_factory
+
+
+def _records(manifest: dict, rng: random.Random, size: int) -> list:
+    patients, doctors = manifest["patient_ids"], manifest["doctor_ids"]
+    return [
+        {
+            "patient_id": rng.randint(*patients),
+            "doctor_id": rng.randint(*doctors),
+            "diagnosis": "Benchmark visit",
+            "treatment": "Observation",
+            "visit_date": date.today().isoformat(),
+        }
+        for _ in range(size)
+    ]
+
+
+def _timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+
+def run(client, manifest: dict, size: int, rounds: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    token = client.post("/auth/token", data={"username": doctor_email(0), "password": BENCH_PASSWORD})
+    token.raise_for_status()
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+    def singles(records):
+        for record in records:
+            client.post("/medical_records/", json=record, headers=headers).raise_for_status()
+
+    def batch(records):
+        client.post("/medical_records/batch", json=records, headers=headers).raise_for_status()
+
+    single_ms, batch_ms = [], []
+    for _ in range(rounds):
+        single_ms.append(_timed(lambda: singles(_records(manifest, rng, size))))
+        batch_ms.append(_timed(lambda: batch(_records(manifest, rng, size))))
+    return {
+        "size": size,
+        "rounds": rounds,
+        "single_posts_ms": round(statistics.median(single_ms), 1),
+        "batch_post_ms": round(statistics.median(batch_ms), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.batch")
+    parser.add_argument("--size", type=int, default=20, help="Records created per round")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--url", help="Base URL of a running server; in-process when omitted")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    factory = http_client_factory(args.url) if args.url else in_process_client_factory()
+    client = factory()
+    try:
+        result = run(client, load_json(args.manifest), args.size, args.rounds)
+    finally:
+        client.close()
+    speedup = result["single_posts_ms"] / max(result["batch_post_ms"], 0.001)
+    print(f"{args.size} records: {result['single_posts_ms']} ms as single POSTs, "
+          f"{result['batch_post_ms']} ms as one batch ({speedup:.1f}x), median of {args.rounds} rounds")
+
+
+if __name__ == "__main__":
+    main()
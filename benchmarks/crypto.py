@@ -0,0 +1,108 @@
+"""Decrypt cost of PHI encryption on list reads.
+
+    python -m benchmarks.crypto --rows 20000
+
+Fills an in-memory SQLite database with `rows` medical records and reports rows/s for:
+- decrypting the stored diagnoses one value at a time the naive way (unwrap the data key and
+  build a cipher per value) versus through the KeyRing's cached ciphers
+- loading every record through the ORM with encryption off and on
+"""
+import argparse
+import base64
+import time
+from datetime import date
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401  (register all mappers)
+from app.core import crypto
+from app.db.base import Base
+from app.models.data_key import DataKey
+from app.models.medical_record import MedicalRecord
+
+
+def _engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _fill(engine, rows: int):
+    with Session(engine) as db:
+        db.add_all(
+            MedicalRecord(patient_id=i % 500 + 1, doctor_id=i % 40 + 1, diagnosis=f"Diagnosis {i % 300}",
+                          treatment="Observation", notes="Follow up in two weeks", visit_date=date(2026, 1, 1))
+            for i in range(rows)
+        )
+        db.commit()
+
+
+def _rate(rows: int, func) -> float:
+    started = time.perf_counter()
+    func()
+    return rows / (time.perf_counter() - started)
+
+
+def _load_all(engine):
+    with Session(engine) as db:
+        db.query(MedicalRecord).all()
+
+
+def run(rows: int) -> dict:
+    results = {}
+
+    crypto.configure_keyring(None)
+    plain = _engine()
+    _fill(plain, rows)
+    results["orm_plaintext"] = _rate(rows, lambda: _load_all(plain))
+
+    encrypted = _engine()
+    master_key = AESGCM.generate_key(256)
+    keyring = crypto.configure_keyring(master_key, lambda: encrypted)
+    _fill(encrypted, rows)
+    results["orm_encrypted"] = _rate(rows, lambda: _load_all(encrypted))
+
+    with encrypted.connect() as conn:
+        values = conn.execute(text("SELECT diagnosis FROM medical_records")).scalars().all()
+        wrapped = dict(conn.execute(select(DataKey.id, DataKey.wrapped_key)).all())
+    context = b"medical_records.diagnosis"
+    master = AESGCM(master_key)
+
+    def naive():
+        for value in values:
+            raw = base64.b64decode(value[len(crypto.PREFIX):])
+            key_id, nonce = crypto._HEADER.unpack_from(raw)
+            key = wrapped[key_id]
+            data_key = master.decrypt(key[:12], key[12:], b"medical_records")
+            AESGCM(data_key).decrypt(nonce, raw[crypto._HEADER.size:], context)
+
+    def cached():
+        for value in values:
+            keyring.decrypt(value, "medical_records.diagnosis")
+
+    results["decrypt_naive"] = _rate(rows, naive)
+    results["decrypt_cached"] = _rate(rows, cached)
+    crypto.configure_keyring(None)
+    return {name: round(rate) for name, rate in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.crypto")
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    result = run(args.rows)
+    print(f"{args.rows} medical records, rows/s:")
+    print(f"  decrypt, per-value key unwrap:  {result['decrypt_naive']:>10}")
+    print(f"  decrypt, cached ciphers:        {result['decrypt_cached']:>10} "
+          f"({result['decrypt_cached'] / max(result['decrypt_naive'], 1):.1f}x)")
+    print(f"  ORM list, plaintext:            {result['orm_plaintext']:>10}")
+    print(f"  ORM list, encrypted:            {result['orm_encrypted']:>10} "
+          f"({result['orm_encrypted'] / max(result['orm_plaintext'], 1):.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Reproducible synthetic dataset for benchmarks, loaded through bulk inserts."""
+import csv
+import io
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.security import hash_password
+from app.db.base import Base
+from app.models import Appointment, Doctor, MedicalRecord, Patient, Prescription, User
+from app.models.role import Role
+
+logger = logging.getLogger(__name__)
+
+BENCH_PASSWORD = "benchmark"
+BENCH_DOMAIN = "bench.shrs"
+
+SPECIALTIES = ["Cardiology", "Dermatology", "General Medicine", "Neurology", "Orthopedics", "Pediatrics", "Psychiatry"]
+HOSPITALS = ["Apollo Hospital", "City Care", "Green Valley Clinic", "Sunrise Medical", "Lakeside General"]
+DIAGNOSES = ["Hypertension", "Type 2 diabetes", "Acute bronchitis", "Migraine", "Asthma", "Osteoarthritis",
+             "Anxiety disorder", "Hypothyroidism", "Gastritis", "Urinary tract infection"]
+MEDICINES = ["Metformin", "Amlodipine", "Azithromycin", "Paracetamol", "Salbutamol", "Ibuprofen",
+             "Levothyroxine", "Omeprazole", "Sertraline", "Atorvastatin"]
+STATUSES = ["pending", "confirmed", "canceled", "completed"]
+
+
+@dataclass
+class DatasetSpec:
+    """Row counts for each table. Defaults are small enough for a laptop; scale up for load tests."""
+    patients: int = 10_000
+    doctors: int = 200
+    appointments: int = 50_000
+    medical_records: int = 50_000
+    prescriptions: int = 50_000
+    patient_users: int = 1_000
+    seed: int = 42
+    chunk_size: int = 10_000
+
+    def scaled(self, factor: float) -> "DatasetSpec":
+        return DatasetSpec(
+            patients=int(self.patients * factor),
+            doctors=max(1, int(self.doctors * factor)),
+            appointments=int(self.appointments * factor),
+            medical_records=int(self.medical_records * factor),
+            prescriptions=int(self.prescriptions * factor),
+            patient_users=min(int(self.patient_users * factor), int(self.patients * factor)),
+            seed=self.seed,
+            chunk_size=self.chunk_size,
+        )
+
+
+def doctor_email(n: int) -> str:
+    return f"doctor{n}@{BENCH_DOMAIN}"
+
+
+def patient_email(n: int) -> str:
+    return f"patient{n}@{BENCH_DOMAIN}"
+
+
+def admin_email() -> str:
+    return f"admin@{BENCH_DOMAIN}"
+
+
+def _copy_rows(conn: Connection, table, columns, rows):
+    """Load rows with COPY on PostgreSQL/psycopg2.
+
+    Values go through each column type's bind processor first, as they would in an INSERT, so
+    PHI columns are stored encrypted.
+    """
+    processors = [table.c[c].type.bind_processor(conn.dialect) for c in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        values = (row[c] if process is None else process(row[c]) for c, process in zip(columns, processors))
+        writer.writerow(["\\N" if value is None else value for value in values])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def bulk_insert(conn: Connection, table, rows, chunk_size: int):
+    """Insert an iterable of row dicts in chunks, using COPY where the driver supports it."""
+    use_copy = conn.dialect.driver == "psycopg2"
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _flush(conn, table, chunk, use_copy)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        _flush(conn, table, chunk, use_copy)
+        total += len(chunk)
+    return total
+
+
+def _flush(conn, table, chunk, use_copy):
+    if use_copy:
+        _copy_rows(conn, table, list(chunk[0].keys()), chunk)
+    else:
+        conn.execute(table.insert(), chunk)
+
+
+def _next_id(conn: Connection, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(conn: Connection):
+    if conn.dialect.name != "postgresql":
+        return
+    for model in (User, Doctor, Patient, Appointment, MedicalRecord, Prescription):
+        table = model.__tablename__
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def _role_ids(conn: Connection) -> dict:
+    existing = dict(conn.execute(select(Role.name, Role.id)).all())
+    for name in ("admin", "doctor", "patient"):
+        if name not in existing:
+            existing[name] = conn.execute(Role.__table__.insert().values(name=name).returning(Role.id)).scalar_one()
+    return existing
+
+
+def seed_dataset(engine: Engine, spec: DatasetSpec, create_schema: bool = False) -> dict:
+    """Seed the synthetic dataset and return the id ranges that workloads draw from."""
+    rng = random.Random(spec.seed)
+    hashed = hash_password(BENCH_PASSWORD)  # one hash shared by every synthetic account
+    now = datetime.utcnow()
+    today = date.today()
+    timings = {}
+
+    if create_schema:
+        Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        roles = _role_ids(conn)
+        user_start = _next_id(conn, User)
+        doctor_start = _next_id(conn, Doctor)
+        patient_start = _next_id(conn, Patient)
+
+        def timed(name, table, rows):
+            started = time.perf_counter()
+            count = bulk_insert(conn, table, rows, spec.chunk_size)
+            timings[name] = {"rows": count, "seconds": round(time.perf_counter() - started, 3)}
+            logger.info(f"Seeded {count} {name} in {timings[name]['seconds']}s")
+
+        n_users = 1 + spec.doctors + spec.patient_users
+
+        def users():
+            yield {"id": user_start, "username": f"bench_admin_{user_start}", "email": admin_email(),
+                   "hashed_password": hashed, "is_active": True, "role_id": roles["admin"],
+                   "created_at": now, "updated_at": now}
+            for n in range(spec.doctors):
+                yield {"id": user_start + 1 + n, "username": f"bench_doctor_{user_start + 1 + n}",
+                       "email": doctor_email(n), "hashed_password": hashed, "is_active": True,
+                       "role_id": roles["doctor"], "created_at": now, "updated_at": now}
+            for n in range(spec.patient_users):
+                uid = user_start + 1 + spec.doctors + n
+                yield {"id": uid, "username": f"bench_patient_{uid}", "email": patient_email(n),
+                       "hashed_password": hashed, "is_active": True, "role_id": roles["patient"],
+                       "created_at": now, "updated_at": now}
+
+        def doctors():
+            for n in range(spec.doctors):
+                yield {"id": doctor_start + n, "user_id": user_start + 1 + n, "name": f"Dr. Bench {n}",
+                       "specialty": rng.choice(SPECIALTIES), "email": doctor_email(n), "contact": f"8{n:09d}",
+                       "experience": rng.randint(1, 35), "hospital": rng.choice(HOSPITALS),
+                       "hashed_password": hashed, "is_active": True, "created_at": now, "updated_at": now}
+
+        def patients():
+            for n in range(spec.patients):
+                yield {"id": patient_start + n,
+                       "user_id": user_start + 1 + spec.doctors + n if n < spec.patient_users else None,
+                       "doctor_id": doctor_start + rng.randrange(spec.doctors),
+                       "first_name": f"Patient{n}", "last_name": "Bench", "age": rng.randint(1, 95),
+                       "gender": rng.choice(["Male", "Female"]), "phone": f"9{patient_start + n:09d}",
+                       "email": patient_email(n), "address": f"{n} Benchmark Road",
+                       "medical_history": rng.choice(DIAGNOSES), "is_active": True,
+                       "date_registered": now - timedelta(days=rng.randrange(3650)),
+                       **Patient.blind_indexes({"phone": f"9{patient_start + n:09d}", "email": patient_email(n)})}
+
+        def appointments():
+            for _ in range(spec.appointments):
+                yield {"patient_id": patient_start + rng.randrange(spec.patients),
+                       "doctor_id": doctor_start + rng.randrange(spec.doctors),
+                       "appointment_date": now + timedelta(hours=rng.randint(-24 * 365, 24 * 90)),
+                       "reason": rng.choice(DIAGNOSES), "status": rng.choice(STATUSES), "created_at": now}
+
+        def medical_records():
+            for _ in range(spec.medical_records):
+                patient_id = patient_start + rng.randrange(spec.patients)
+                doctor_id = doctor_start + rng.randrange(spec.doctors)
+                diagnosis = rng.choice(DIAGNOSES)
+                yield {"patient_id": patient_id, "doctor_id": doctor_id,
+                       "diagnosis": diagnosis, "treatment": "Standard care",
+                       "prescribed_medicines": rng.choice(MEDICINES),
+                       "visit_date": today - timedelta(days=rng.randrange(3650)), "notes": None,
+                       **MedicalRecord.blind_indexes({"diagnosis": diagnosis})}
+
+        def prescriptions():
+            for _ in range(spec.prescriptions):
+                start = today - timedelta(days=rng.randrange(1000))
+                yield {"patient_id": patient_start + rng.randrange(spec.patients),
+                       "doctor_id": doctor_start + rng.randrange(spec.doctors),
+                       "medicine_name": rng.choice(MEDICINES), "dosage": "500mg", "frequency": "twice a day",
+                       "start_date": start,
+                       "end_date": None if rng.random() < 0.2 else start + timedelta(days=rng.randint(5, 365)),
+                       "notes": None}
+
+        timed("users", User.__table__, users())
+        timed("doctors", Doctor.__table__, doctors())
+        timed("patients", Patient.__table__, patients())
+        timed("appointments", Appointment.__table__, appointments())
+        timed("medical_records", MedicalRecord.__table__, medical_records())
+        timed("prescriptions", Prescription.__table__, prescriptions())
+        _reset_sequences(conn)
+
+    return {
+        "doctor_ids": [doctor_start, doctor_start + spec.doctors - 1],
+        "patient_ids": [patient_start, patient_start + spec.patients - 1],
+        "doctors": spec.doctors,
+        "patient_users": spec.patient_users,
+        "users": n_users,
+        "timings": timings,
+    }
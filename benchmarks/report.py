@@ -0,0 +1,73 @@
+"""Latency/throughput summaries and comparison against a stored baseline."""
+import json
+import math
+from typing import Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(recorder, elapsed: float) -> dict:
+    routes = {}
+    total = 0
+    for route, samples in sorted(recorder.samples.items()):
+        total += len(samples)
+        routes[route] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(route, 0),
+            "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+        }
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "routes": routes,
+    }
+
+
+def compare(summary: dict, baseline: dict, tolerance: float = 0.15) -> List[str]:
+    """Return human-readable regressions: p95/p99 slower or throughput lower than baseline beyond `tolerance`."""
+    regressions = []
+    if baseline.get("throughput_rps") and summary["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(
+            f"overall throughput {summary['throughput_rps']} rps < baseline {baseline['throughput_rps']} rps"
+        )
+    for route, stats in summary["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and stats[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{route} {key} {stats[key]} > baseline {base[key]}")
+    return regressions
+
+
+def format_table(summary: dict) -> str:
+    lines = [f"{'route':<45} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for route, s in summary["routes"].items():
+        lines.append(
+            f"{route:<45} {s['count']:>7} {s['errors']:>5} {s['throughput_rps']:>8} "
+            f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}"
+        )
+    lines.append(f"total: {summary['requests']} requests in {summary['elapsed_s']}s "
+                 f"({summary['throughput_rps']} rps)")
+    return "\n".join(lines)
+
+
+def load_json(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_json(path: str, data: Dict):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
@@ -0,0 +1,96 @@
+"""Cold-start timing: import app.main and run its startup handlers in fresh interpreters.
+
+    python -m benchmarks.startup --runs 5                 # development mode
+    STARTUP_MODE=production python -m benchmarks.startup  # migration-driven mode
+    python -m benchmarks.startup --compare main           # before (a git revision) and after
+    python -m benchmarks.startup --compare A --to B       # between two revisions
+
+--compare checks revisions out into temporary git worktrees and times them the same way, with
+the same environment and database, then prints both and the change. "After" is the working
+tree unless --to names a revision.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Run with `python -c` so a baseline revision needs no copy of this script
+_CHILD = """
+import json, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app):
+    ready = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "startup_ms": (ready - imported) * 1000}))
+"""
+
+
+def measure(runs: int, mode: str, tree: Optional[str] = None) -> dict:
+    """Median import, startup and whole-process times of `runs` cold starts of `tree` (default: this one)."""
+    env = dict(os.environ, STARTUP_MODE=mode, PYTHONDONTWRITEBYTECODE="0")
+    if tree:
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [tree, env.get("PYTHONPATH")]))
+    samples = []
+    for _ in range(runs + 1):  # the first run only writes bytecode caches
+        began = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", _CHILD], cwd=tree, env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        sample = json.loads(out)
+        sample["process_ms"] = (time.perf_counter() - began) * 1000
+        samples.append(sample)
+    samples = samples[1:]
+    return {key: round(statistics.median(s[key] for s in samples), 1) for key in samples[0]}
+
+
+@contextmanager
+def _checkout(revision: str):
+    """A temporary git worktree of `revision`."""
+    with tempfile.TemporaryDirectory(prefix="startup-") as parent:
+        tree = os.path.join(parent, "tree")
+        subprocess.run(["git", "worktree", "add", "--detach", tree, revision], check=True, capture_output=True)
+        try:
+            yield tree
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", tree], check=True, capture_output=True)
+
+
+def compare(runs: int, mode: str, revision: str, to: Optional[str] = None) -> dict:
+    """Time `revision` (before) and `to` or the working tree (after)."""
+    with _checkout(revision) as tree:
+        before = measure(runs, mode, tree)
+    if to is None:
+        return {"before": before, "after": measure(runs, mode)}
+    with _checkout(to) as tree:
+        return {"before": before, "after": measure(runs, mode, tree)}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", default=os.environ.get("STARTUP_MODE", "development"))
+    parser.add_argument("--compare", metavar="REV", help="also time this git revision and print the change")
+    parser.add_argument("--to", metavar="REV", help="with --compare: time this revision instead of the working tree")
+    args = parser.parse_args()
+    if args.compare:
+        result = compare(args.runs, args.mode, args.compare, args.to)
+        print(f"{args.mode}, median of {args.runs} runs:")
+        for key in ("import_ms", "startup_ms", "process_ms"):
+            before, after = result["before"][key], result["after"][key]
+            print(f"  {key[:-3]:<8} {before:>8.1f} ms -> {after:>8.1f} ms ({(after - before) / before:+.0%})")
+        return
+    result = measure(args.runs, args.mode)
+    print(f"{args.mode}: median import {result['import_ms']} ms, startup {result['startup_ms']} ms, "
+          f"whole process {result['process_ms']} ms over {args.runs} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Scripted request mixes run against the app in-process or over HTTP."""
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.dataset import BENCH_PASSWORD, admin_email, doctor_email, patient_email
+
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    """Thread-safe latency samples per route template."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, status_code: int):
+        with self._lock:
+            self.samples[route].append(seconds * 1000)
+            if status_code >= 500:
+                self.errors[route] += 1
+
+
+class VirtualUser:
+    """One simulated client: a persona with its own HTTP client and token."""
+
+    def __init__(self, client, recorder: Recorder, manifest: dict, persona: str, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.manifest = manifest
+        self.persona = persona
+        self.rng = rng
+        self.email = self._email()
+        self.headers = {}
+
+    def _email(self) -> str:
+        if self.persona == "admin":
+            return admin_email()
+        if self.persona == "doctor":
+            return doctor_email(self.rng.randrange(self.manifest["doctors"]))
+        return patient_email(self.rng.randrange(max(1, self.manifest["patient_users"])))
+
+    def request(self, method: str, route: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = self.client.request(method, url, headers=self.headers, **kwargs)
+        self.recorder.record(f"{method} {route}", time.perf_counter() - started, response.status_code)
+        return response
+
+    def _patient_id(self) -> int:
+        low, high = self.manifest["patient_ids"]
+        return self.rng.randint(low, high)
+
+    def _doctor_id(self) -> int:
+        low, high = self.manifest["doctor_ids"]
+        return self.rng.randint(low, high)
+
+    # Scripted actions -----------------------------------------------------
+
+    def login(self):
+        response = self.request("POST", "/auth/token", "/auth/token",
+                                data={"username": self.email, "password": BENCH_PASSWORD})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def dashboard(self):
+        if self.persona == "admin":
+            self.request("GET", "/api/users", "/api/users")
+            self.request("GET", "/doctors/", "/doctors/")
+        elif self.persona == "doctor":
+            self.request("GET", "/appointments/doctor", "/appointments/doctor")
+            self.request("GET", "/medical_records/", "/medical_records/", params={"limit": 10})
+        else:
+            self.request("GET", "/medical_records/", "/medical_records/", params={"limit": 10})
+
+    def patient_chart(self):
+        patient_id = self._patient_id()
+        self.request("GET", "/patients/{patient_id}", f"/patients/{patient_id}")
+        self.request("GET", "/medical_records/", "/medical_records/", params={"limit": 20})
+        self.request("GET", "/prescriptions/prescriptions/", "/prescriptions/prescriptions/", params={"limit": 20})
+
+    def write(self):
+        self.request("POST", "/medical_records/", "/medical_records/", json={
+            "patient_id": self._patient_id(),
+            "doctor_id": self._doctor_id(),
+            "diagnosis": "Benchmark visit",
+            "treatment": "Observation",
+            "visit_date": date.today().isoformat(),
+        })
+
+
+# (action name, weight) per persona; weights are relative
+WORKLOADS: Dict[str, List[Tuple[str, int]]] = {
+    "mixed": [("login", 1), ("dashboard", 4), ("patient_chart", 4), ("write", 1)],
+    "read_heavy": [("login", 1), ("dashboard", 5), ("patient_chart", 10)],
+    "write_heavy": [("login", 1), ("dashboard", 1), ("write", 8)],
+}
+
+PERSONAS = [("doctor", 6), ("patient", 3), ("admin", 1)]
+
+
+def _weighted(rng: random.Random, choices: List[Tuple[str, int]]) -> str:
+    names, weights = zip(*choices)
+    return rng.choices(names, weights=weights)[0]
+
+
+def run_workload(
+    client_factory: Callable[[], object],
+    manifest: dict,
+    workload: str = "mixed",
+    users: int = 10,
+    iterations: int = 100,
+    seed: int = 42,
+    duration: Optional[float] = None,
+) -> Tuple[Recorder, float]:
+    """Run `users` virtual users concurrently; each performs `iterations` actions (or runs for `duration` seconds)."""
+    recorder = Recorder()
+    actions = WORKLOADS[workload]
+
+    def run_user(index: int):
+        rng = random.Random(seed + index)
+        client = client_factory()
+        try:
+            user = VirtualUser(client, recorder, manifest, _weighted(rng, PERSONAS), rng)
+            user.login()
+            deadline = time.perf_counter() + duration if duration else None
+            done = 0
+            while (deadline and time.perf_counter() < deadline) or (not deadline and done < iterations):
+                getattr(user, _weighted(rng, actions))()
+                done += 1
+        finally:
+            close = getattr(client, "close", None)
+            if close:
+                close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for future in [pool.submit(run_user, i) for i in range(users)]:
+            future.result()
+    return recorder, time.perf_counter() - started
+
+
+def in_process_client_factory():
+    """Clients that call the FastAPI app directly, without a network hop."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    return lambda: TestClient(app, raise_server_exceptions=False)
+
+
+def http_client_factory(base_url: str, timeout: float = 30.0):
+    """Clients that talk to a running server over HTTP."""
+    import httpx
+
+    return lambda: httpx.Client(base_url=base_url, timeout=timeout)
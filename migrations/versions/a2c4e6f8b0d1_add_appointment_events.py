@@ -0,0 +1,41 @@
+"""Add appointment events
+
+Revision ID: a2c4e6f8b0d1
+Revises: f1b3d5e7a9c2
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2c4e6f8b0d1'
+down_revision: Union[str, None] = 'f1b3d5e7a9c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('appointment_events',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('appointment_id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_appointment_events_doctor_id_id', 'appointment_events', ['doctor_id', 'id'], unique=False)
+    op.create_index(op.f('ix_appointment_events_created_at'), 'appointment_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_appointment_events_created_at'), table_name='appointment_events')
+    op.drop_index('ix_appointment_events_doctor_id_id', table_name='appointment_events')
+    op.drop_table('appointment_events')
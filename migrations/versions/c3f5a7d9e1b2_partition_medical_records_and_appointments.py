@@ -0,0 +1,105 @@
+"""Partition medical_records and appointments by month
+
+Revision ID: c3f5a7d9e1b2
+Revises: aabef733f9e6
+Create Date: 2026-10-19 12:00:00.000000
+
+Rebuilds both tables as RANGE partitioned tables (PostgreSQL only): medical_records by
+visit_date, appointments by appointment_date. Existing rows are copied into monthly partitions
+covering their date range plus MONTHS_AHEAD months; anything outside lands in a default
+partition. The primary key becomes (id, <date column>) as partitioning requires; ids keep
+coming from the original sequences. Later months are created by app.db.partitions.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f5a7d9e1b2'
+down_revision: Union[str, None] = 'aabef733f9e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+MONTHS_BACK = 120  # older rows (e.g. mistyped dates) go to the default partition
+
+TABLES = {
+    "medical_records": ("visit_date", """
+        id INTEGER NOT NULL DEFAULT nextval('medical_records_id_seq'),
+        patient_id INTEGER NOT NULL REFERENCES patients (id),
+        doctor_id INTEGER NOT NULL REFERENCES doctors (id),
+        diagnosis TEXT NOT NULL,
+        treatment TEXT NOT NULL,
+        prescribed_medicines TEXT,
+        visit_date DATE NOT NULL,
+        notes TEXT"""),
+    "appointments": ("appointment_date", """
+        id INTEGER NOT NULL DEFAULT nextval('appointments_id_seq'),
+        patient_id INTEGER NOT NULL REFERENCES patients (id),
+        doctor_id INTEGER NOT NULL REFERENCES doctors (id),
+        appointment_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        reason VARCHAR NOT NULL,
+        status VARCHAR NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE"""),
+}
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rebuild(table: str, key: str, columns: str, partitioned: bool) -> None:
+    bind = op.get_bind()
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    op.execute(f"ALTER INDEX {table}_pkey RENAME TO {table}_old_pkey")
+    op.execute(f"DROP INDEX IF EXISTS ix_{table}_patient_id")
+    op.execute(f"DROP INDEX IF EXISTS ix_{table}_doctor_id")
+
+    if partitioned:
+        op.execute(
+            f"CREATE TABLE {table} ({columns}, CONSTRAINT {table}_pkey PRIMARY KEY (id, {key})) "
+            f"PARTITION BY RANGE ({key})"
+        )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        first = bind.execute(sa.text(f"SELECT min({key}) FROM {table}_old")).scalar()
+        month = max(_add_months(first or date.today(), 0), _add_months(date.today(), -MONTHS_BACK))
+        last = _add_months(date.today(), MONTHS_AHEAD)
+        while month <= last:
+            following = _add_months(month, 1)
+            op.execute(
+                f"CREATE TABLE {table}_{month.year:04d}_{month.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+            month = following
+    else:
+        op.execute(f"CREATE TABLE {table} ({columns}, CONSTRAINT {table}_pkey PRIMARY KEY (id))")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+    op.execute(f"DROP TABLE {table}_old")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.create_index(f"ix_{table}_patient_id", table, ["patient_id"], unique=False)
+    op.create_index(f"ix_{table}_doctor_id", table, ["doctor_id"], unique=False)
+    if partitioned:
+        op.create_index(f"ix_{table}_{key}", table, [key], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table, (key, columns) in TABLES.items():
+        _rebuild(table, key, columns, partitioned=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table, (key, columns) in TABLES.items():
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_{key}")
+        _rebuild(table, key, columns, partitioned=False)
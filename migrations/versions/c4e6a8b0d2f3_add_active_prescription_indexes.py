@@ -0,0 +1,65 @@
+"""Add medicine_key and active-medication indexes to prescriptions
+
+Revision ID: c4e6a8b0d2f3
+Revises: b3d5f7a9c1e2
+Create Date: 2026-10-19 18:00:00.000000
+
+medicine_key is backfilled once per distinct medicine_name. On PostgreSQL the indexes are built
+CONCURRENTLY so a large prescriptions table stays writable meanwhile.
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e6a8b0d2f3'
+down_revision: Union[str, None] = 'b3d5f7a9c1e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_prescriptions_patient_active": ["patient_id", "start_date", "end_date"],
+    "ix_prescriptions_medicine_active": ["medicine_key", "end_date", "start_date"],
+}
+
+# Frozen copy of app.services.drug_safety_service.normalize_medicine as of this revision, so the
+# backfill keeps producing the keys it did whatever later changes the service makes
+_STRENGTH = re.compile(r"\b\d+(\.\d+)?\s*(mg|mcg|µg|g|ml|iu|units?|%)\b")
+_FORMS = re.compile(r"\b(tablets?|tabs?|capsules?|caps?|syrup|suspension|injection|inj|cream|ointment|drops|sr|er|xr)\b")
+
+
+def normalize_medicine(name: str) -> str:
+    name = _FORMS.sub(" ", _STRENGTH.sub(" ", name.lower()))
+    return " ".join(re.sub(r"[^\w\s-]", " ", name).split())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('prescriptions', sa.Column('medicine_key', sa.String(), nullable=True))
+
+    bind = op.get_bind()
+    names = [row[0] for row in bind.execute(sa.text("SELECT DISTINCT medicine_name FROM prescriptions"))]
+    if names:
+        bind.execute(
+            sa.text("UPDATE prescriptions SET medicine_key = :key WHERE medicine_name = :name"),
+            [{"key": normalize_medicine(name), "name": name} for name in names],
+        )
+
+    if bind.dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, columns in INDEXES.items():
+                op.create_index(name, 'prescriptions', columns, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, columns in INDEXES.items():
+            op.create_index(name, 'prescriptions', columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in INDEXES:
+        op.drop_index(name, table_name='prescriptions')
+    op.drop_column('prescriptions', 'medicine_key')
@@ -0,0 +1,32 @@
+"""Add a renewable lease to idempotency key claims
+
+Revision ID: d1f3b5c7e9a0
+Revises: c0e2a4b6d8f9
+Create Date: 2026-10-20 12:00:00.000000
+
+Unfinished claims were taken over IDEMPOTENCY_LOCK_SECONDS after created_at, even while their
+request still ran. `locked_until` is renewed by the running request instead. Claims unfinished at
+upgrade time get their created_at as lease end and become free at once.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f3b5c7e9a0'
+down_revision: Union[str, None] = 'c0e2a4b6d8f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('idempotency_keys', sa.Column('locked_until', sa.DateTime(), nullable=True))
+    op.execute("UPDATE idempotency_keys SET locked_until = created_at WHERE status_code IS NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('idempotency_keys', 'locked_until')
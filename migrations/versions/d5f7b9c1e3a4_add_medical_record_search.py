@@ -0,0 +1,46 @@
+"""Add the full-text search column and GIN index to medical_records
+
+Revision ID: d5f7b9c1e3a4
+Revises: c4e6a8b0d2f3
+Create Date: 2026-10-19 19:00:00.000000
+
+PostgreSQL only: `search_vector` is a stored generated tsvector (see app.db.search), so no
+trigger is needed to keep it current. Adding it rewrites medical_records once. Other databases
+search with the application's in-process index and need no schema change.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f7b9c1e3a4'
+down_revision: Union[str, None] = 'c4e6a8b0d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of app.db.search's DDL as of this revision
+ADD_SEARCH_VECTOR = (
+    "ALTER TABLE medical_records ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(diagnosis, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(treatment, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(prescribed_medicines, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(notes, '')), 'C')) STORED"
+)
+CREATE_SEARCH_INDEX = "CREATE INDEX IF NOT EXISTS ix_medical_records_search ON medical_records USING gin (search_vector)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(ADD_SEARCH_VECTOR)
+    op.execute(CREATE_SEARCH_INDEX)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_medical_records_search")
+    op.execute("ALTER TABLE medical_records DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,45 @@
+"""Add audit_log
+
+Revision ID: e5a7c9b3d2f1
+Revises: d8e2f4a6b1c3
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9b3d2f1'
+down_revision: Union[str, None] = 'd8e2f4a6b1c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('audit_log',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('occurred_at', sa.DateTime(), nullable=False),
+    sa.Column('actor', sa.String(), nullable=True),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('resource_type', sa.String(), nullable=False),
+    sa.Column('resource_id', sa.Integer(), nullable=True),
+    sa.Column('patient_id', sa.Integer(), nullable=True),
+    sa.Column('path', sa.String(), nullable=True),
+    sa.Column('client_ip', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_audit_log_occurred_at'), 'audit_log', ['occurred_at'], unique=False)
+    op.create_index(op.f('ix_audit_log_actor'), 'audit_log', ['actor'], unique=False)
+    op.create_index(op.f('ix_audit_log_patient_id'), 'audit_log', ['patient_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_audit_log_patient_id'), table_name='audit_log')
+    op.drop_index(op.f('ix_audit_log_actor'), table_name='audit_log')
+    op.drop_index(op.f('ix_audit_log_occurred_at'), table_name='audit_log')
+    op.drop_table('audit_log')
@@ -0,0 +1,39 @@
+"""Group the diagnoses rollup by a blind index and encrypt its label
+
+Revision ID: e8b0d2f4a6c7
+Revises: d1f3b5c7e9a0
+Create Date: 2026-10-21 09:00:00.000000
+
+medical_records.diagnosis is encrypted, so the diagnoses rollup grouped by ciphertext (one group
+per record) and stored each decrypted diagnosis in analytics_rollups.dimension in plaintext. The
+rollup now groups by medical_records.diagnosis_bidx and keeps the diagnosis in an encrypted label.
+
+The plaintext diagnoses rollups are deleted here. Afterwards run
+`python -m app.core.crypto reencrypt`, which fills in diagnosis_bidx, then
+`python -m app.services.analytics_service rebuild`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b0d2f4a6c7'
+down_revision: Union[str, None] = 'd1f3b5c7e9a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('medical_records', sa.Column('diagnosis_bidx', sa.String(length=32), nullable=True))
+    op.add_column('analytics_rollups', sa.Column('label', sa.Text(), nullable=True))
+    op.execute("DELETE FROM analytics_rollups WHERE metric = 'diagnoses'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM analytics_rollups WHERE metric = 'diagnoses'")
+    op.drop_column('analytics_rollups', 'label')
+    op.drop_column('medical_records', 'diagnosis_bidx')
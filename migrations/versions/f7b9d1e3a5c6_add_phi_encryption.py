@@ -0,0 +1,71 @@
+"""Add data keys and blind indexes for PHI field encryption
+
+Revision ID: f7b9d1e3a5c6
+Revises: e6a8c0d2f4b5
+Create Date: 2026-10-19 21:00:00.000000
+
+Encrypted values are longer than the plaintext and unique by construction (random nonces), so
+patients.phone and patients.email become TEXT and their uniqueness moves to the blind index
+columns, backfilled here. Existing values stay plaintext (and readable) until
+`python -m app.core.crypto reencrypt` runs with PHI_MASTER_KEY set.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.crypto import blind_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b9d1e3a5c6'
+down_revision: Union[str, None] = 'e6a8c0d2f4b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('data_keys',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('wrapped_key', sa.LargeBinary(), nullable=False),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_data_keys_table_name'), 'data_keys', ['table_name'], unique=False)
+
+    op.add_column('patients', sa.Column('phone_bidx', sa.String(length=32), nullable=True))
+    op.add_column('patients', sa.Column('email_bidx', sa.String(length=32), nullable=True))
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, phone, email FROM patients")).all()
+    if rows:
+        bind.execute(
+            sa.text("UPDATE patients SET phone_bidx = :phone_bidx, email_bidx = :email_bidx WHERE id = :id"),
+            [{"id": id_, "phone_bidx": blind_index(phone, "patients.phone"),
+              "email_bidx": blind_index(email, "patients.email")} for id_, phone, email in rows],
+        )
+    op.create_unique_constraint('uq_patients_phone_bidx', 'patients', ['phone_bidx'])
+    op.create_unique_constraint('uq_patients_email_bidx', 'patients', ['email_bidx'])
+
+    if bind.dialect.name == "postgresql":
+        op.drop_constraint('patients_phone_key', 'patients', type_='unique')
+        op.drop_constraint('patients_email_key', 'patients', type_='unique')
+        op.alter_column('patients', 'phone', type_=sa.Text(), existing_nullable=False)
+        op.alter_column('patients', 'email', type_=sa.Text(), existing_nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column('patients', 'email', type_=sa.String(), existing_nullable=True)
+        op.alter_column('patients', 'phone', type_=sa.String(), existing_nullable=False)
+        op.create_unique_constraint('patients_email_key', 'patients', ['email'])
+        op.create_unique_constraint('patients_phone_key', 'patients', ['phone'])
+    op.drop_constraint('uq_patients_email_bidx', 'patients', type_='unique')
+    op.drop_constraint('uq_patients_phone_bidx', 'patients', type_='unique')
+    op.drop_column('patients', 'email_bidx')
+    op.drop_column('patients', 'phone_bidx')
+    op.drop_index(op.f('ix_data_keys_table_name'), table_name='data_keys')
+    op.drop_table('data_keys')
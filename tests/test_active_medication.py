@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app.models import Doctor, Patient, Prescription
+from app.schemas.prescription import PrescriptionCreate, PrescriptionUpdate
+from app.services.prescription_service import (
+    create_prescriptions, get_active_prescriptions_for_medicine, get_active_prescriptions_for_patient,
+    update_prescription,
+)
+
+
+@pytest.fixture
+def prescriptions(db):
+    patients = [Patient(first_name="P", last_name=str(n), age=40, gender="F", phone=str(n), address="x") for n in range(2)]
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    db.add_all([*patients, doctor])
+    db.flush()
+    courses = [
+        (patients[0].id, "Warfarin 5 mg tablet", date(2024, 1, 1), None),
+        (patients[0].id, "Amoxicillin", date(2024, 3, 1), date(2024, 3, 10)),
+        (patients[1].id, "warfarin", date(2024, 2, 1), date(2024, 6, 30)),
+    ]
+    create_prescriptions(db, [
+        PrescriptionCreate(patient_id=patient_id, doctor_id=doctor.id, medicine_name=name, dosage="1",
+                           frequency="daily", start_date=start, end_date=end)
+        for patient_id, name, start, end in courses
+    ])
+    db.commit()
+    return [p.id for p in patients]
+
+
+def test_active_medication_per_patient_and_medicine(db, prescriptions):
+    first, second = prescriptions
+    assert [p.medicine_name for p in get_active_prescriptions_for_patient(db, first, date(2024, 3, 10))] == [
+        "Warfarin 5 mg tablet", "Amoxicillin"]
+    assert [p.medicine_name for p in get_active_prescriptions_for_patient(db, first, date(2024, 3, 11))] == [
+        "Warfarin 5 mg tablet"]
+
+    on_warfarin = lambda day: sorted(p.patient_id for p in get_active_prescriptions_for_medicine(db, "WARFARIN", day))
+    assert on_warfarin(date(2024, 1, 15)) == [first]
+    assert on_warfarin(date(2024, 6, 30)) == [first, second]
+    assert on_warfarin(date(2023, 12, 31)) == []
+
+
+def test_medicine_key_follows_renames(db, prescriptions):
+    prescription = db.query(Prescription).filter(Prescription.medicine_name == "Amoxicillin").one()
+    update_prescription(db, prescription.id, PrescriptionUpdate(medicine_name="Warfarin 1mg"))
+    db.commit()
+    assert len(get_active_prescriptions_for_medicine(db, "warfarin", date(2024, 3, 5))) == 3
+
+
+def test_medicine_lookup_uses_the_active_index(db, prescriptions):
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM prescriptions WHERE medicine_key = 'warfarin' "
+        "AND start_date <= '2024-03-01' AND (end_date IS NULL OR end_date >= '2024-03-01')"
+    )).all()
+    assert "ix_prescriptions_medicine_active" in " ".join(str(row) for row in plan)
@@ -0,0 +1,84 @@
+from datetime import date
+
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlalchemy import text
+
+from app.core import crypto
+from app.models import AnalyticsRollup, Doctor, MedicalRecord, Patient
+from app.services.analytics_service import _day_counts, get_rollup_series, rebuild_rollups, refresh_rollups
+
+
+@pytest.fixture
+def clinic(db):
+    doctors = [Doctor(name=f"Dr. {n}", specialty="GP", email=f"{n}@example.com", contact=n, experience=3,
+                      hashed_password="x") for n in "AB"]
+    patient = Patient(first_name="P", last_name="Q", age=40, gender="F", phone="1", address="x")
+    db.add_all([*doctors, patient])
+    db.flush()
+    return patient.id, [d.id for d in doctors]
+
+
+def visit(db, patient_id, doctor_id, day, diagnosis="Influenza"):
+    record = MedicalRecord(patient_id=patient_id, doctor_id=doctor_id, diagnosis=diagnosis, treatment="x",
+                           visit_date=day)
+    db.add(record)
+    db.flush()
+    return record
+
+
+def test_refresh_counts_only_rows_above_the_watermark(db, clinic):
+    patient_id, (a, b) = clinic
+    visit(db, patient_id, a, date(2026, 3, 2))
+    visit(db, patient_id, a, date(2026, 3, 4), "Acute  BRONCHITIS")
+    visit(db, patient_id, b, date(2026, 3, 10))
+    assert refresh_rollups(db, batch_size=2)["medical_records"] == 3
+
+    visit(db, patient_id, b, date(2026, 3, 11))
+    assert refresh_rollups(db)["medical_records"] == 1
+    assert refresh_rollups(db)["medical_records"] == 0
+
+    weekly = get_rollup_series(db, "visits", "week")
+    assert [(p["period_start"], p["dimension"], p["count"]) for p in weekly] == [
+        (date(2026, 3, 2), str(a), 2), (date(2026, 3, 9), str(b), 2)]
+    top = get_rollup_series(db, "diagnoses", "month", top=1)
+    assert [(p["dimension"], p["count"]) for p in top] == [("influenza", 3)]
+    assert get_rollup_series(db, "diagnoses", "month", dimension="acute bronchitis")[0]["count"] == 1
+
+
+def test_rebuild_since_recomputes_recent_periods_only(db, clinic):
+    patient_id, (a, _) = clinic
+    old = visit(db, patient_id, a, date(2026, 1, 15))
+    recent = visit(db, patient_id, a, date(2026, 3, 20))
+    refresh_rollups(db)
+
+    db.delete(recent)
+    visit(db, patient_id, a, date(2026, 1, 16))  # above the watermark, before the rebuilt window
+    db.delete(old)  # outside the window: stays counted until a full rebuild
+    db.flush()
+    rebuild_rollups(db, since=date(2026, 3, 1))
+
+    monthly = {p["period_start"]: p["count"] for p in get_rollup_series(db, "visits", "month")}
+    assert monthly == {date(2026, 1, 1): 2}
+    rebuild_rollups(db)
+    assert {p["period_start"]: p["count"] for p in get_rollup_series(db, "visits", "month")} == {date(2026, 1, 1): 1}
+    assert db.query(AnalyticsRollup).filter(AnalyticsRollup.grain == "day").count() == 2  # one visit, one diagnosis
+
+
+def test_diagnoses_are_grouped_and_stored_without_plaintext(engine, db, clinic, monkeypatch):
+    monkeypatch.setattr(crypto, "_keyring", None)
+    crypto.configure_keyring(AESGCM.generate_key(256), lambda: engine)
+    patient_id, (a, _) = clinic
+    for diagnosis in ("Influenza", "influenza ", "INFLUENZA", "Asthma"):
+        visit(db, patient_id, a, date(2026, 3, 2), diagnosis)
+
+    day_counts = _day_counts(db, "medical_records", 0, 10)
+    assert sorted(count for (metric, *_), count in day_counts.items() if metric == "diagnoses") == [1, 3]
+    refresh_rollups(db)
+
+    stored = db.execute(text("SELECT dimension, label FROM analytics_rollups WHERE metric = 'diagnoses'")).all()
+    assert stored and not any("nfluenza" in dimension + label or "sthma" in dimension + label
+                              for dimension, label in stored)
+    assert [(p["dimension"], p["count"]) for p in get_rollup_series(db, "diagnoses", "day")] == [
+        ("influenza", 3), ("asthma", 1)]
+    assert get_rollup_series(db, "diagnoses", "day", dimension="InFluenza")[0]["count"] == 3
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.core.query_auditor import instrument_engine, query_budget
+from app.models import Appointment, Doctor, Patient
+from app.schemas.appointment import AppointmentUpdate
+from app.services import assignment_service
+from app.services.appointment_service import update_appointment_status
+from app.services.assignment_service import DoctorLoadIndex, assign_patient, get_load_index, rebalance_unassigned
+
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch):
+    index = DoctorLoadIndex()
+    monkeypatch.setattr(assignment_service, "_index", index)
+    return index
+
+
+def test_index_picks_least_loaded_doctor_per_pool(index):
+    index.load([(1, "Cardiology", "North"), (2, "cardiology", "South"), (3, "GP", "North")],
+               patient_counts={1: 3, 2: 1}, appointment_counts={3: 4})
+
+    assert index.pick("Cardiology") == 2
+    assert index.pick("Cardiology", "North") == 1
+    assert index.pick(hospital="north") == 3  # 4 appointments * 0.5 < 3 patients
+    assert index.pick() == 2
+    index.adjust(2, patients=3)
+    assert index.pick() == 3
+    assert index.pick("Dermatology") is None
+
+
+def test_rebalance_spreads_unassigned_patients_by_load(engine, db, index):
+    doctors = [Doctor(name=f"Dr. {n}", specialty="GP", email=f"{n}@example.com", contact=n, experience=3,
+                      hashed_password="x") for n in "AB"]
+    db.add_all(doctors)
+    db.flush()
+    busy = Patient(first_name="P", last_name="0", age=40, gender="F", phone="0", address="x", doctor_id=doctors[0].id)
+    db.add_all([busy] + [Patient(first_name="P", last_name=str(n), age=40, gender="F", phone=str(n), address="x")
+                         for n in range(1, 6)])
+    db.flush()
+    db.add(Appointment(patient_id=busy.id, doctor_id=doctors[1].id, reason="x",
+                       appointment_date=datetime.utcnow() + timedelta(days=2)))
+    db.commit()
+
+    instrument_engine(engine)
+    with query_budget(5):  # 3 to build the index, the unassigned patients, one executemany UPDATE
+        assignments = rebalance_unassigned(db)
+    db.commit()
+
+    assert len(assignments) == 5
+    counts = {d.id: db.query(Patient).filter(Patient.doctor_id == d.id).count() for d in doctors}
+    assert counts == {doctors[0].id: 3, doctors[1].id: 3}
+    assert [row["load"] for row in index.snapshot()] == [3.0, 3.5]
+
+
+def test_failed_assignment_rolls_back_its_load(db, index):
+    db.add(Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x"))
+    db.add(Patient(first_name="P", last_name="Q", age=40, gender="F", phone="1", address="x"))
+    db.commit()
+
+    assert assign_patient(db, 1) == {"patient_id": 1, "doctor_id": 1}
+    db.rollback()
+    assert index.load_of(1) == 0
+    assert db.query(Patient).one().doctor_id is None
+
+
+def test_assignment_is_a_compare_and_set(engine, db, index):
+    db.add(Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x"))
+    db.add_all([Patient(first_name="P", last_name=str(n), age=40, gender="F", phone=str(n), address="x")
+                for n in range(2)])
+    db.commit()
+    get_load_index(db)
+    instrument_engine(engine)
+
+    with query_budget(1):  # the conditional UPDATE only
+        assert assign_patient(db, 1) == {"patient_id": 1, "doctor_id": 1}
+    db.commit()
+
+    db.execute(update(Patient).where(Patient.id == 2).values(doctor_id=1))  # another request got there first
+    with pytest.raises(HTTPException) as exc:
+        assign_patient(db, 2)
+    assert exc.value.status_code == 409
+    db.rollback()
+    assert index.load_of(1) == 1
+
+
+def test_appointment_status_moves_the_load_once(engine, db, index):
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3,
+                    hashed_password="x")
+    db.add_all([doctor, Patient(first_name="P", last_name="Q", age=40, gender="F", phone="1", address="x")])
+    db.flush()
+    db.add(Appointment(patient_id=1, doctor_id=doctor.id, reason="x",
+                       appointment_date=datetime.utcnow() + timedelta(days=2)))
+    db.commit()
+    get_load_index(db)
+    assert index.load_of(doctor.id) == 0.5
+    instrument_engine(engine)
+
+    with query_budget(2):  # the conditional UPDATE and the appointment event
+        update_appointment_status(db, 1, AppointmentUpdate(status="canceled"), doctor.id)
+    update_appointment_status(db, 1, AppointmentUpdate(status="canceled"), doctor.id)  # a second cancel
+    db.commit()
+    assert index.load_of(doctor.id) == 0
+
+    update_appointment_status(db, 1, AppointmentUpdate(status="confirmed"), doctor.id)
+    db.commit()
+    assert index.load_of(doctor.id) == 0.5
@@ -0,0 +1,144 @@
+import hashlib
+import os
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes.attachments import router
+from app.core import storage as storage_module
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.db.routing import RoutingSession
+from app.db.session import get_db
+from app.models import Attachment, Doctor, MedicalRecord, Patient
+from app.services.attachment_service import UploadedBlob, create_attachment, delete_attachment
+
+
+@pytest.fixture
+def client(engine, tmp_path, monkeypatch):
+    storage_module.register_storage_backend("test", lambda: storage_module.LocalStorage(str(tmp_path)))
+    monkeypatch.setattr(settings, "ATTACHMENT_STORAGE", "test")
+    monkeypatch.setattr(settings, "ATTACHMENT_MAX_BYTES", 1024 * 1024)
+    Session = sessionmaker(class_=RoutingSession, autoflush=False, expire_on_commit=False, bind=engine)
+
+    with Session() as db:
+        # User ids deliberately differ from the patient and doctor ids they own
+        db.add_all([
+            Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="Road", user_id=2),
+            Patient(first_name="Bob", last_name="Ray", age=50, gender="M", phone="2", address="Lane", user_id=1),
+            Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x"),
+            Doctor(name="Dr. B", specialty="GP", email="b@example.com", contact="2", experience=3, hashed_password="x"),
+        ])
+        db.flush()
+        db.add_all([
+            MedicalRecord(patient_id=1, doctor_id=1, diagnosis="Fracture", treatment="Cast", visit_date=date(2030, 1, 1)),
+            MedicalRecord(patient_id=2, doctor_id=2, diagnosis="Flu", treatment="Rest", visit_date=date(2030, 1, 2)),
+        ])
+        db.commit()
+
+    def session():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    api = FastAPI()
+    api.include_router(router, prefix="/medical_records")
+    api.dependency_overrides[get_db] = session
+    users = [SimpleNamespace(id=1, email="admin@example.com", role=SimpleNamespace(name="admin"))]
+    api.dependency_overrides[get_current_user] = lambda: users[-1]
+    yield TestClient(api), tmp_path, users.append
+    storage_module.get_storage.cache_clear()
+
+
+def _blobs(root):
+    return [name for _, _, files in os.walk(root) for name in files]
+
+
+def test_upload_is_content_addressed_and_deduplicated(client):
+    api, root, _ = client
+    scan = os.urandom(300_000)
+
+    first = api.post("/medical_records/1/attachments", files={"file": ("xray.png", scan, "image/png")})
+    second = api.post("/medical_records/1/attachments", files={"file": ("copy.png", scan, "image/png")})
+
+    assert first.status_code == 200, first.text
+    assert first.json()["sha256"] == hashlib.sha256(scan).hexdigest()
+    assert first.json()["size_bytes"] == len(scan)
+    assert second.json()["sha256"] == first.json()["sha256"]
+    assert _blobs(root) == [first.json()["sha256"]]  # stored once, staging dir empty
+    assert len(api.get("/medical_records/1/attachments").json()) == 2
+
+    ranged = api.get(f"/medical_records/1/attachments/{first.json()['id']}", headers={"Range": "bytes=100-199"})
+    assert ranged.status_code == 206
+    assert ranged.content == scan[100:200]
+
+    api.delete(f"/medical_records/1/attachments/{first.json()['id']}")
+    assert _blobs(root) == [first.json()["sha256"]]  # still referenced by the copy
+    api.delete(f"/medical_records/1/attachments/{second.json()['id']}")
+    assert _blobs(root) == []
+
+
+def test_oversized_upload_is_rejected_and_discarded(client):
+    api, root, _ = client
+
+    response = api.post("/medical_records/1/attachments", files={"file": ("big.bin", os.urandom(2 * 1024 * 1024))})
+
+    assert response.status_code == 413
+    assert _blobs(root) == []
+    assert api.get("/medical_records/1/attachments").json() == []
+
+
+def test_patients_and_doctors_are_matched_by_their_own_ids(client):
+    api, _, login = client
+    upload = {"file": ("scan.png", b"scan", "image/png")}
+    first = api.post("/medical_records/1/attachments", files=upload).json()
+    second = api.post("/medical_records/2/attachments", files=upload).json()
+
+    login(SimpleNamespace(id=2, email="ann@example.com", role=SimpleNamespace(name="patient")))  # owns patient 1
+    assert api.get("/medical_records/1/attachments").status_code == 200
+    assert api.get("/medical_records/2/attachments").status_code == 403
+
+    login(SimpleNamespace(id=9, email="b@example.com", role=SimpleNamespace(name="doctor")))  # is doctor 2
+    assert api.delete(f"/medical_records/1/attachments/{first['id']}").status_code == 403
+    assert api.delete(f"/medical_records/2/attachments/{second['id']}").status_code == 200
+
+
+def test_rolled_back_upload_leaves_no_blob(engine, tmp_path):
+    storage = storage_module.LocalStorage(str(tmp_path))
+    writer = storage.writer()
+    writer.write(b"scan")
+    blob = UploadedBlob(writer.commit(), 4, "scan.png", "image/png", writer, storage)
+    db = sessionmaker(bind=engine)()
+    create_attachment(db, 1, blob)
+    db.rollback()
+
+    assert _blobs(tmp_path) == []
+
+
+def test_delete_keeps_a_blob_a_concurrent_upload_committed(engine, tmp_path):
+    storage = storage_module.LocalStorage(str(tmp_path))
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+    def upload(db):
+        writer = storage.writer()
+        writer.write(b"scan")
+        return create_attachment(db, 1, UploadedBlob(writer.commit(), 4, "scan.png", "image/png", writer, storage))
+
+    with Session() as db:
+        first = upload(db)
+        db.commit()
+    deleting, uploading = Session(), Session()
+    delete_attachment(deleting, deleting.get(Attachment, first.id), storage)
+    deleting.flush()
+    upload(uploading)  # deduplicates onto the blob the delete is about to remove
+    deleting.commit()
+    uploading.commit()
+
+    assert _blobs(tmp_path) == [first.sha256]
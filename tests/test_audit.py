@@ -0,0 +1,111 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.dependencies import get_current_user
+from app.api.routes.routes import router
+from app.core import audit as audit_module
+from app.core.audit import AuditContextMiddleware, AuditWriter
+from app.core.config import settings
+from app.core.query_auditor import instrument_engine, query_budget
+from app.db.session import get_db
+from app.models import AuditLog, MedicalRecord
+
+
+def _event(n):
+    return {"actor": "dr@example.com", "action": "view", "resource_type": "patient", "resource_id": n,
+            "patient_id": n, "path": f"/patients/{n}", "client_ip": "10.0.0.1"}
+
+
+def test_events_are_written_in_batches(engine, db, tmp_path):
+    instrument_engine(engine)
+    writer = AuditWriter(engine, batch_size=50, spill_path=str(tmp_path / "spill.jsonl"))
+    for n in range(120):
+        writer.record(_event(n))
+
+    with query_budget(3):  # 50 + 50 + 20
+        writer.stop()
+
+    assert db.query(AuditLog).count() == 120
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_full_queue_and_failed_writes_spill_then_replay(engine, db, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing-dir' / 'x.db'}")
+    writer = AuditWriter(broken, max_queue=2, enqueue_timeout=0.01, spill_path=str(spill))
+
+    for n in range(5):
+        writer.record(_event(n))  # 3 overflow the queue straight into the spill file
+    writer.stop()  # the 2 queued ones fail to insert and are spilled too
+    assert len(spill.read_text().splitlines()) == 5
+
+    writer.engine = engine
+    assert writer.replay_spill() == 5
+    assert sorted(r.resource_id for r in db.query(AuditLog)) == [0, 1, 2, 3, 4]
+    assert not spill.exists()
+
+
+def _spilled(n):
+    return {**_event(n), "occurred_at": datetime(2026, 1, 1)}
+
+
+def test_corrupt_spill_lines_are_quarantined(engine, db, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    writer = AuditWriter(engine, spill_path=str(spill))
+    writer._spill([_spilled(1)])
+    with open(spill, "a") as f:
+        f.write('{"actor": "torn\n')
+    writer._spill([_spilled(2)])
+
+    assert writer.replay_spill() == 2
+    assert sorted(r.resource_id for r in db.query(AuditLog)) == [1, 2]
+    assert (tmp_path / "spill.jsonl.corrupt").read_text() == '{"actor": "torn\n'
+
+
+def test_replay_failing_partway_resumes_without_duplicates(engine, db, tmp_path, monkeypatch):
+    writer = AuditWriter(engine, batch_size=2, spill_path=str(tmp_path / "spill.jsonl"))
+    writer._spill([_spilled(n) for n in range(5)])
+    insert = writer._insert
+    calls = []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        return len(calls) != 2 and insert(batch)
+
+    monkeypatch.setattr(writer, "_insert", flaky)
+    assert writer.replay_spill() == 2  # the second batch fails
+    assert writer.replay_spill() == 3
+
+    assert sorted(r.resource_id for r in db.query(AuditLog)) == [0, 1, 2, 3, 4]
+    assert not (tmp_path / "spill.jsonl.replay").exists()
+
+
+def test_admin_record_list_is_audited(engine, db, tmp_path, monkeypatch):
+    db.add_all([MedicalRecord(patient_id=p, doctor_id=1, diagnosis=f"Dx {p}", treatment="Rest",
+                              visit_date=date(2024, 1, p)) for p in (1, 2)])
+    db.commit()
+    writer = AuditWriter(engine, spill_path=str(tmp_path / "spill.jsonl"))
+    monkeypatch.setattr(audit_module, "_writer", writer)
+    monkeypatch.setattr(settings, "AUDIT_ENABLED", True)
+
+    def session():
+        with sessionmaker(bind=engine)() as session:
+            session.info["principal"] = "admin@example.com"
+            yield session
+
+    api = FastAPI()
+    api.add_middleware(AuditContextMiddleware)
+    api.include_router(router, prefix="/api")
+    api.dependency_overrides[get_db] = session
+    api.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1, role=SimpleNamespace(name="admin"))
+    assert len(TestClient(api).get("/api/medical_records").json()) == 2
+    writer.stop()
+
+    logged = db.query(AuditLog.actor, AuditLog.action, AuditLog.resource_type, AuditLog.patient_id, AuditLog.path)
+    assert sorted(logged) == [("admin@example.com", "list", "medical_record", p, "/api/medical_records")
+                              for p in (1, 2)]
@@ -0,0 +1,71 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.query_auditor import instrument_engine, query_budget
+from app.models import Appointment, Doctor, Patient, Prescription
+from app.schemas.appointment import AppointmentCreate
+from app.schemas.medical_record import MedicalRecordCreate
+from app.schemas.prescription import PrescriptionCreate
+from app.services.appointment_service import create_appointments
+from app.services.drug_safety_service import get_interaction_graph
+from app.services.medical_record_service import create_medical_records
+from app.services.prescription_service import create_prescriptions
+
+
+@pytest.fixture
+def people(db):
+    patient = Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="Old Road")
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    db.add_all([patient, doctor])
+    db.commit()
+    return patient.id, doctor.id
+
+
+def test_batch_inserts_in_one_statement_and_keeps_order(engine, db, people):
+    get_interaction_graph(db)  # loaded once per process, not per request
+    instrument_engine(engine)
+    patient_id, doctor_id = people
+    items = [
+        PrescriptionCreate(patient_id=patient_id, doctor_id=doctor_id, medicine_name=name, dosage="1 tab",
+                           frequency="Daily", start_date=date(2030, 1, 1))
+        for name in ("Amoxicillin", "Ibuprofen", "Omeprazole")
+    ]
+
+    with query_budget(4):  # patient lookup, doctor lookup, active medication, one INSERT ... RETURNING
+        created = create_prescriptions(db, items, doctor_id=doctor_id)
+
+    assert [p.medicine_name for p in created] == ["Amoxicillin", "Ibuprofen", "Omeprazole"]
+    assert all(p.id for p in created)
+
+
+def test_batch_rejects_all_items_and_reports_indexes(db, people):
+    patient_id, doctor_id = people
+    start = datetime(2030, 1, 1, 9)
+    items = [
+        AppointmentCreate(patient_id=patient_id, doctor_id=doctor_id, appointment_date=start, reason="Follow-up"),
+        AppointmentCreate(patient_id=999, doctor_id=doctor_id, appointment_date=start + timedelta(days=7),
+                          reason="Follow-up"),
+        AppointmentCreate(patient_id=patient_id, doctor_id=doctor_id, appointment_date=start, reason="Other doctor"),
+    ]
+
+    with pytest.raises(HTTPException) as exc:
+        create_appointments(db, items, doctor_id=doctor_id + 1)
+
+    assert exc.value.status_code == 422
+    assert [error["index"] for error in exc.value.detail] == [0, 1, 2]
+    assert db.query(Appointment).count() == 0
+    assert db.query(Prescription).count() == 0
+
+
+def test_record_batch_belongs_to_the_writing_doctor(db, people):
+    patient_id, doctor_id = people
+    items = [MedicalRecordCreate(patient_id=patient_id, doctor_id=doctor_id, diagnosis="Flu", treatment="Rest",
+                                 visit_date=date(2030, 1, 1))]
+
+    with pytest.raises(HTTPException) as exc:
+        create_medical_records(db, items, doctor_id=doctor_id + 1)
+
+    assert exc.value.detail == [{"index": 0, "errors": ["Item belongs to another doctor"]}]
+    assert [r.diagnosis for r in create_medical_records(db, items, doctor_id=doctor_id)] == ["Flu"]
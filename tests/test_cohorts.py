@@ -0,0 +1,86 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.query_auditor import instrument_engine, query_budget
+from app.models import Doctor, MedicalRecord, Patient, Prescription
+from app.schemas.medical_record import MedicalRecordCreate
+from app.schemas.patient import PatientUpdate
+from app.services import cohort_service
+from app.services.cohort_service import CohortIndex, bitmap_ids, query_cohort
+from app.services.medical_record_service import create_medical_record
+from app.services.patient_service import update_patient
+
+DIABETIC_WOMEN_40_60 = {"and": [{"gender": "F"}, {"age": {"min": 40, "max": 60}}, {"diagnosis": "diabetes"},
+                                {"medicine": "Metformin 500 mg"}]}
+
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch):
+    index = CohortIndex()
+    monkeypatch.setattr(cohort_service, "_index", index)
+    return index
+
+
+@pytest.fixture
+def patients(db):
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    db.add(doctor)
+    db.flush()
+    people = [("F", 45), ("F", 52), ("M", 50), ("F", 70), ("F", 41)]
+    patients = [Patient(first_name="P", last_name=str(n), age=age, gender=gender, phone=str(n), address="x",
+                        date_registered=datetime(2026, 1 + n, 1)) for n, (gender, age) in enumerate(people)]
+    db.add_all(patients)
+    db.flush()
+    for patient in patients[:4]:
+        db.add(MedicalRecord(patient_id=patient.id, doctor_id=doctor.id, diagnosis="Type 2 diabetes", treatment="x",
+                             visit_date=date(2026, 3, 1)))
+        db.add(Prescription(patient_id=patient.id, doctor_id=doctor.id, medicine_name="Metformin", dosage="1",
+                            frequency="daily", start_date=date(2026, 1, 1)))
+    db.commit()
+    return [p.id for p in patients]
+
+
+def test_bitmap_ids_pages_in_order():
+    bitmap = sum(1 << n for n in (3, 9, 64, 1000))
+    assert bitmap_ids(bitmap) == [3, 9, 64, 1000]
+    assert bitmap_ids(bitmap, after=9, limit=1) == [64]
+    assert bitmap_ids(0) == []
+
+
+def test_cohort_expressions(db, patients):
+    assert query_cohort(db, DIABETIC_WOMEN_40_60) == {"count": 2, "patient_ids": patients[:2], "next_after": None}
+    assert query_cohort(db, DIABETIC_WOMEN_40_60, limit=1)["next_after"] == patients[0]
+    assert query_cohort(db, {"or": [{"gender": "M"}, {"age": {"min": 70}}]}, count_only=True)["count"] == 2
+    assert query_cohort(db, {"not": {"diagnosis": "diabetes"}})["patient_ids"] == [patients[4]]
+    assert query_cohort(db, {"registered": {"from": "2026-02", "to": "2026-03"}})["patient_ids"] == patients[1:3]
+    with pytest.raises(HTTPException) as error:
+        query_cohort(db, {"height": 180})
+    assert error.value.status_code == 422
+
+
+def test_writes_refresh_only_the_patients_they_touch(engine, db, patients):
+    query_cohort(db, DIABETIC_WOMEN_40_60)  # builds the index
+    update_patient(db, patients[1], PatientUpdate(age=61))
+    create_medical_record(db, MedicalRecordCreate(patient_id=patients[4], doctor_id=1, diagnosis="Diabetes mellitus",
+                                                  treatment="x", visit_date=date(2026, 4, 1)))
+    db.commit()
+
+    instrument_engine(engine)
+    with query_budget(3):  # patients, diagnoses and active medicines of the two changed patients
+        assert query_cohort(db, {"and": [{"gender": "F"}, {"age": {"min": 40, "max": 60}},
+                                         {"diagnosis": "diabetes"}]})["patient_ids"] == [patients[0], patients[4]]
+
+
+def test_rare_values_cost_ids_not_the_id_range(index):
+    # 2,000 patients spread over a million ids, each with a diagnosis term of its own
+    patients = {n * 500: frozenset({("gender", "f"), ("diagnosis", f"term{n}")}) for n in range(1, 2001)}
+    index.load(patients)
+    assert index.snapshot()["bytes"] <= 2 * 2000 * 8  # at most 8 bytes per (patient, value); dense: ~125 MB
+    assert bitmap_ids(index.evaluate({"diagnosis": "term7"})) == [3500]
+
+    index.update({3500: frozenset({("gender", "f"), ("diagnosis", "term8")})})
+    assert bitmap_ids(index.evaluate({"diagnosis": "term8"})) == [3500, 4000]
+    assert index.evaluate({"diagnosis": "term7"}) == 0
+    assert index.snapshot()["bytes"] <= 2 * 2000 * 8
@@ -0,0 +1,123 @@
+import base64
+from datetime import date
+
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlalchemy import text
+
+from app.core import crypto
+from app.core.crypto import KeyRing, configure_keyring
+from app.models import MedicalRecord, Patient
+from app.schemas.patient import PatientUpdate
+from app.services.patient_service import find_patient_by_contact, update_patient
+
+
+MASTER_KEY = AESGCM.generate_key(256)
+
+
+@pytest.fixture
+def keyring(engine, monkeypatch):
+    monkeypatch.setattr(crypto, "_keyring", None)
+    return configure_keyring(MASTER_KEY, lambda: engine)
+
+
+def add_patient(db, phone="(987) 654-3210", email="Jane@Example.com"):
+    patient = Patient(first_name="Jane", last_name="Doe", age=40, gender="F", phone=phone, email=email,
+                      address="1 Main St", medical_history="Asthma")
+    db.add(patient)
+    db.commit()
+    return patient
+
+
+def test_phi_is_stored_encrypted_and_read_back_transparently(db, keyring):
+    patient = add_patient(db)
+    db.add(MedicalRecord(patient_id=patient.id, doctor_id=1, diagnosis="Asthma", treatment="Inhaler",
+                         visit_date=date(2026, 1, 5), notes="Private"))
+    db.commit()
+    db.expunge_all()
+
+    raw = db.execute(text("SELECT phone, address, medical_history FROM patients")).one()
+    assert all(value.startswith(crypto.PREFIX) and "Main" not in value for value in raw)
+    assert db.execute(text("SELECT diagnosis FROM medical_records")).scalar().startswith(crypto.PREFIX)
+    loaded = db.query(Patient).one()
+    assert (loaded.phone, loaded.address, loaded.medical_history) == ("(987) 654-3210", "1 Main St", "Asthma")
+    assert db.query(MedicalRecord.diagnosis).scalar() == "Asthma"
+
+
+def test_blind_indexes_find_patients_by_normalized_contact(db, keyring):
+    patient = add_patient(db)
+    assert find_patient_by_contact(db, phone="987-654-3210").id == patient.id
+    assert find_patient_by_contact(db, email=" jane@example.COM ").id == patient.id
+
+    update_patient(db, patient.id, PatientUpdate(phone="555 0100"))
+    db.commit()
+    assert find_patient_by_contact(db, phone="5550100").id == patient.id
+
+
+def test_rotated_keys_keep_old_values_readable(engine, db, keyring):
+    add_patient(db)
+    old_key, _ = keyring.active_cipher("patients")
+    other_worker = KeyRing(MASTER_KEY, lambda: engine)
+    other_worker.load()
+
+    new_key = keyring.create_data_key("patients")
+    add_patient(db, phone="1", email=None)
+    db.expunge_all()
+
+    assert new_key != old_key
+    values = [row[0] for row in db.execute(text("SELECT phone FROM patients ORDER BY id"))]
+    assert [other_worker.decrypt(v, "patients.phone") for v in values] == ["(987) 654-3210", "1"]
+    with pytest.raises(Exception):
+        keyring.decrypt(values[0], "patients.address")  # bound to its column
+
+
+def test_reencrypt_rewrites_rows_under_the_active_key(engine, db, keyring):
+    patient = add_patient(db)
+    db.add(MedicalRecord(patient_id=patient.id, doctor_id=1, diagnosis="Asthma", treatment="Inhaler",
+                         visit_date=date(2026, 1, 5)))
+    db.commit()
+    new_key = keyring.create_data_key("patients")
+
+    assert crypto.reencrypt_all(db, batch_size=1) == {"patients": 1, "medical_records": 1}
+    db.expunge_all()
+
+    raw = db.execute(text("SELECT phone, version FROM patients")).one()
+    assert crypto._HEADER.unpack_from(base64.b64decode(raw.phone[len(crypto.PREFIX):]))[0] == new_key
+    assert raw.version == 2
+    assert find_patient_by_contact(db, phone="9876543210").address == "1 Main St"
+    assert db.query(MedicalRecord.diagnosis).scalar() == "Asthma"
+
+
+def test_reencrypt_retries_rows_edited_since_they_were_read(engine, db, keyring, monkeypatch):
+    patient_id = add_patient(db).id
+    keyring.create_data_key("patients")
+    rewrite = crypto._rewrite_rows
+    edits = []
+
+    def edited_meanwhile(db, model, columns, rows):
+        if model is Patient and not edits:  # another request commits an edit after the batch was read
+            edits.append(db.execute(Patient.__table__.update().values(
+                address="2 New St", version=Patient.__table__.c.version + 1)))
+        return rewrite(db, model, columns, rows)
+
+    monkeypatch.setattr(crypto, "_rewrite_rows", edited_meanwhile)
+    assert crypto.reencrypt_all(db)["patients"] == 1
+    db.expunge_all()
+
+    assert db.get(Patient, patient_id).address == "2 New St"  # the edit survived
+    assert db.execute(text("SELECT version FROM patients")).scalar() == 3
+
+
+def test_master_key_rollover_keeps_every_worker_reading(engine, db, keyring):
+    add_patient(db)
+    phone = db.execute(text("SELECT phone FROM patients")).scalar()
+    new_master = AESGCM.generate_key(256)
+    rolled = KeyRing(new_master, lambda: engine, previous_master_key=MASTER_KEY)
+    stale = KeyRing(new_master, lambda: engine, cache_seconds=0, previous_master_key=MASTER_KEY)
+    assert stale.decrypt(phone, "patients.phone") == "(987) 654-3210"  # wrapped under the old key
+
+    assert rolled.rewrap() == 1
+    assert stale.decrypt(phone, "patients.phone") == "(987) 654-3210"  # reloaded, now under the new key
+    assert KeyRing(new_master, lambda: engine).decrypt(phone, "patients.phone") == "(987) 654-3210"
+    with pytest.raises(Exception):
+        KeyRing(MASTER_KEY, lambda: engine).load()
@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.query_auditor import instrument_engine, query_budget
+from app.models import Doctor, Medicine, Patient, Prescription
+from app.schemas.prescription import PrescriptionCreate
+from app.services import drug_safety_service
+from app.services.drug_safety_service import InteractionGraph, import_interactions, normalize_medicine
+from app.services.prescription_service import create_prescription, create_prescriptions
+
+
+@pytest.fixture
+def patient(db, monkeypatch):
+    monkeypatch.setattr(drug_safety_service, "_graph", InteractionGraph())
+    patient = Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="Old Road")
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    db.add_all([patient, doctor])
+    db.add(Medicine(name="Ibuprofen", manufacturer="x", price=1, expiry_date="2030", therapeutic_class="NSAID"))
+    db.add(Medicine(name="Naproxen", manufacturer="x", price=1, expiry_date="2030", therapeutic_class="nsaid"))
+    import_interactions(db, [("Warfarin", "Aspirin", "major", "Bleeding risk"), ("Warfarin", "Paracetamol", "minor", None)])
+    db.flush()
+    db.add(Prescription(patient_id=patient.id, doctor_id=doctor.id, medicine_name="Warfarin 5 mg tablet",
+                        dosage="5mg", frequency="daily", start_date=date.today() - timedelta(days=30)))
+    db.add(Prescription(patient_id=patient.id, doctor_id=doctor.id, medicine_name="Aspirin", dosage="75mg",
+                        frequency="daily", start_date=date(2020, 1, 1), end_date=date(2020, 2, 1)))  # ended
+    db.commit()
+    return patient.id, doctor.id
+
+
+def _rx(patient_id, doctor_id, medicine):
+    return PrescriptionCreate(patient_id=patient_id, doctor_id=doctor_id, medicine_name=medicine, dosage="1",
+                              frequency="daily", start_date=date.today())
+
+
+def test_normalize_medicine_drops_strength_and_form():
+    assert normalize_medicine("  Ibuprofen 400 mg Tablets ") == "ibuprofen"
+    assert normalize_medicine("Amoxicillin 250mg/5ml syrup") == "amoxicillin"
+
+
+def test_minor_interaction_is_reported_and_major_one_blocks(engine, db, patient):
+    patient_id, doctor_id = patient
+    created = create_prescription(db, _rx(patient_id, doctor_id, "Paracetamol 500mg"))
+    assert [(a["type"], a["severity"], a["conflicts_with"]) for a in created.safety_alerts] == [
+        ("interaction", "minor", "Warfarin 5 mg tablet")]
+
+    instrument_engine(engine)
+    with query_budget(1), pytest.raises(HTTPException) as exc:  # graph is cached: one active-drug query
+        create_prescription(db, _rx(patient_id, doctor_id, "aspirin"))
+    assert exc.value.status_code == 409
+    assert exc.value.detail["alerts"][0]["alerts"][0]["description"] == "Bleeding risk"
+
+    created = create_prescription(db, _rx(patient_id, doctor_id, "aspirin"), acknowledge_alerts=True)
+    assert created.safety_alerts[0]["severity"] == "major"
+
+
+def test_batch_reports_duplicates_within_the_regimen(db, patient):
+    patient_id, doctor_id = patient
+    created = create_prescriptions(db, [_rx(patient_id, doctor_id, m) for m in ("Ibuprofen", "Naproxen 250 mg", "Warfarin")])
+    assert [[a["type"] for a in p.safety_alerts] for p in created] == [[], ["duplicate_therapy"], ["duplicate"]]
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes.appointments import create_event_stream_token, get_event_channel
+
+from app.core import events
+from app.core.events import ADMIN_CHANNEL, EventBroker, doctor_channel, stream_events
+from app.core.security import create_access_token, create_stream_token, get_current_user
+from app.models import AppointmentEvent, Doctor, Patient
+from app.schemas.appointment import AppointmentCreate, AppointmentUpdate
+from app.services.appointment_service import create_appointment, update_appointment_status
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = EventBroker(queue_size=2)
+    monkeypatch.setattr(events, "_broker", broker)
+    return broker
+
+
+@pytest.fixture
+def people(db):
+    patient = Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="Old Road")
+    doctors = [Doctor(name=f"Dr. {n}", specialty="GP", email=f"{n}@example.com", contact="1", experience=3,
+                      hashed_password="x") for n in "AB"]
+    db.add_all([patient, *doctors])
+    db.commit()
+    return patient.id, doctors[0].id, doctors[1].id
+
+
+def _book(db, patient_id, doctor_id):
+    data = AppointmentCreate(patient_id=patient_id, doctor_id=doctor_id, reason="checkup",
+                             appointment_date=datetime.utcnow() + timedelta(days=1))
+    return create_appointment(db, data, patient_id)
+
+
+def test_events_are_published_after_commit_to_matching_streams(db, people, broker):
+    patient_id, doctor_a, doctor_b = people
+
+    async def scenario():
+        admin, mine, other = (broker.subscribe([c]) for c in (ADMIN_CHANNEL, doctor_channel(doctor_a),
+                                                               doctor_channel(doctor_b)))
+        appointment = _book(db, patient_id, doctor_a)
+        await asyncio.sleep(0)
+        assert mine.queue.empty()  # nothing before commit
+        db.commit()
+        update_appointment_status(db, appointment.id, AppointmentUpdate(status="confirmed"), doctor_a)
+        db.rollback()
+        update_appointment_status(db, appointment.id, AppointmentUpdate(status="canceled"), doctor_a)
+        db.commit()
+        await asyncio.sleep(0)
+        return [[q.queue.get_nowait()["type"] for _ in range(q.queue.qsize())] for q in (admin, mine, other)]
+
+    admin, mine, other = asyncio.run(scenario())
+    assert admin == mine == ["created", "status_changed"]
+    assert other == []
+
+
+def test_slow_stream_is_closed_when_its_queue_overflows(broker):
+    async def scenario():
+        subscription = broker.subscribe([ADMIN_CHANNEL])
+        broker.publish([{"id": n, "type": "created", "doctor_id": 1, "data": {}} for n in range(3)])
+        await asyncio.sleep(0)
+        return subscription.queue.get_nowait(), broker.subscriber_count()
+
+    assert asyncio.run(scenario()) == (None, 0)
+
+
+def test_reconnecting_stream_replays_missed_events_then_goes_live(engine, db, people, broker):
+    patient_id, doctor_a, doctor_b = people
+    _book(db, patient_id, doctor_a)
+    _book(db, patient_id, doctor_b)
+    db.commit()
+    first_id = db.query(AppointmentEvent).order_by(AppointmentEvent.id).first().id
+
+    async def scenario():
+        stream = stream_events(doctor_channel(doctor_a), first_id - 1, sessionmaker(bind=engine))
+        frames = [await stream.__anext__(), await stream.__anext__()]
+        _book(db, patient_id, doctor_a)
+        db.commit()
+        frames.append(await stream.__anext__())
+        await stream.aclose()
+        return frames
+
+    retry, replayed, live = asyncio.run(scenario())
+    assert retry.startswith("retry:")
+    assert replayed.startswith(f"id: {first_id}\nevent: created\n")
+    assert live.startswith(f"id: {first_id + 2}\nevent: created\n")
+    assert broker.subscriber_count() == 0
+
+
+def test_streams_open_with_a_single_purpose_token_not_the_access_token(db, people):
+    _, doctor_a, _ = people
+    access_token = create_access_token({"sub": "A@example.com", "role": "doctor"})
+
+    issued = create_event_stream_token(token=access_token, db=db)
+    assert issued["expires_in"] == 60
+    assert get_event_channel(stream_token=issued["stream_token"], token=None, db=db) == doctor_channel(doctor_a)
+    with pytest.raises(HTTPException):
+        get_current_user(issued["stream_token"], db)  # opens the stream and nothing else
+    with pytest.raises(HTTPException):
+        get_event_channel(stream_token=access_token, token=None, db=db)
+    with pytest.raises(HTTPException):
+        get_event_channel(stream_token=create_stream_token(ADMIN_CHANNEL, -1), token=None, db=db)  # expired
@@ -0,0 +1,52 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.models import Appointment, Doctor, MedicalRecord, Patient
+from app.services.export_service import Deidentifier, export_dataset, iter_chunks
+
+
+@pytest.fixture
+def clinic(db):
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    db.add(doctor)
+    db.flush()
+    patients = [Patient(first_name="Jane", last_name=f"Doe{n}", age=age, gender="F", phone=str(n), address="1 Main St",
+                        doctor_id=doctor.id, date_registered=datetime(2026, 2, 14)) for n, age in enumerate((42, 93, 7))]
+    db.add_all(patients)
+    db.flush()
+    db.add(MedicalRecord(patient_id=patients[0].id, doctor_id=doctor.id, diagnosis="Asthma", treatment="Inhaler",
+                         visit_date=date(2026, 3, 17), notes="Called Jane at home"))
+    db.add(Appointment(patient_id=patients[0].id, doctor_id=doctor.id, reason="Jane's cough",
+                       appointment_date=datetime(2026, 4, 2, 9, 30)))
+    db.commit()
+    return patients
+
+
+def test_chunks_are_deidentified_and_pseudonyms_join_across_tables(db, clinic):
+    deidentifier = Deidentifier("secret", date_precision="month")
+    chunks = list(iter_chunks(db, "patients", deidentifier, chunk_size=2))
+    records = next(iter_chunks(db, "medical_records", deidentifier, chunk_size=10))
+
+    assert [len(chunk["patient"]) for chunk in chunks] == [2, 1]
+    patients = {name: sum((chunk[name] for chunk in chunks), []) for name in chunks[0]}
+    assert set(patients) == {"patient", "doctor", "age_band", "gender", "is_active", "registered"}
+    assert patients["age_band"] == ["40-44", "90+", "5-9"]
+    assert patients["registered"] == [date(2026, 2, 1)] * 3
+    assert records["patient"] == [patients["patient"][0]]
+    assert patients["patient"][0] not in (clinic[0].id, None)
+    assert "notes" not in records and records["visit"] == [date(2026, 3, 1)]
+    assert Deidentifier("other").pseudonym("patient", clinic[0].id) != patients["patient"][0]
+    with pytest.raises(ValueError):
+        Deidentifier("")
+
+
+def test_export_writes_row_groups(engine, db, clinic, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    counts = export_dataset(engine, str(tmp_path), Deidentifier("secret"), chunk_size=1, row_group_size=2)
+
+    assert counts == {"patients": 3, "medical_records": 1, "prescriptions": 0, "appointments": 1}
+    patients = pq.ParquetFile(tmp_path / "patients.parquet")
+    assert patients.metadata.num_row_groups == 2
+    assert "first_name" not in patients.schema_arrow.names
+    assert (tmp_path / "manifest.json").exists()
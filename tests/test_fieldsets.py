@@ -0,0 +1,104 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes.doctors import doctor_fields
+from app.api.routes.medical_records import router as records_router
+from app.core import audit as audit_module
+from app.core.audit import AuditWriter
+from app.core.config import settings
+from app.api.routes.patients import patient_fields
+from app.core.query_auditor import instrument_engine, query_budget
+from app.core.security import get_current_user
+from app.db.routing import RoutingSession
+from app.db.session import get_db
+from app.models import AuditLog, Doctor, MedicalRecord, Patient
+from app.services.doctor_service import get_doctors
+from app.services.patient_service import get_patients
+
+
+def _seed(db):
+    doctors = [Doctor(name=f"Dr. {n}", specialty="GP", email=f"{n}@example.com", contact=str(n), experience=3,
+                      hashed_password="x") for n in range(2)]
+    db.add_all(doctors)
+    db.flush()
+    db.add_all([Patient(first_name="P", last_name=str(n), age=40, gender="F", phone=str(n), address="Long Road",
+                        medical_history="Asthma", doctor_id=doctors[n % 2].id) for n in range(6)])
+    db.commit()
+    db.expunge_all()
+
+
+def test_fields_and_expand_select_only_what_was_asked(engine, db):
+    instrument_engine(engine)
+    _seed(db)
+    view = patient_fields(fields="id,last_name", expand="doctor", db=db)
+
+    with query_budget(2) as audit:  # the patients, then their doctors in one IN query
+        patients = get_patients(db, view.options())
+        rows = [view.dump(patient) for patient in patients]
+
+    assert "medical_history" not in audit.statements[0][0] and "address" not in audit.statements[0][0]
+    assert rows[1] == {"id": patients[1].id, "last_name": "1",
+                       "doctor": {"id": patients[1].doctor_id, "name": "Dr. 1", "specialty": "GP",
+                                  "email": "1@example.com", "contact": "1", "experience": 3, "hospital": None,
+                                  "version": 1}}
+
+    doctors = get_doctors(db, doctor_fields(fields=None, expand="patients", db=db).options())
+    assert [len(doctor.patients) for doctor in doctors] == [3, 3]
+
+
+def test_expanded_patients_are_audited(engine, db, tmp_path, monkeypatch):
+    _seed(db)
+    writer = AuditWriter(engine, spill_path=str(tmp_path / "spill.jsonl"))
+    monkeypatch.setattr(audit_module, "_writer", writer)
+    monkeypatch.setattr(settings, "AUDIT_ENABLED", True)
+    view = doctor_fields(fields="name", expand="patients", db=db)
+
+    view.respond(get_doctors(db, view.options()))
+    writer.stop()
+
+    logged = db.query(AuditLog.resource_type, AuditLog.resource_id, AuditLog.patient_id, AuditLog.action).all()
+    patient_ids = [p.id for p in db.query(Patient).order_by(Patient.id)]
+    assert sorted(logged) == [("patient", pid, pid, "list") for pid in patient_ids]
+
+
+def test_full_response_without_parameters_and_422_for_unknown_names():
+    view = patient_fields(fields=None, expand=None, db=None)
+    assert not view.sparse and view.options() == [] and view.respond(["entity"]) == ["entity"]
+
+    for fields, expand in [("id,hashed_password", None), ("", None), (None, "appointments")]:
+        with pytest.raises(HTTPException) as exc:
+            patient_fields(fields=fields, expand=expand, db=None)
+        assert exc.value.status_code == 422
+
+
+def test_patients_cannot_fetch_other_patients_records(engine):
+    Session = sessionmaker(class_=RoutingSession, autoflush=False, expire_on_commit=False, bind=engine)
+    with Session() as db:
+        # User 1 owns patient 2, not patient 1
+        db.add_all([Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="1 Elm St",
+                            user_id=2),
+                     Patient(first_name="Bob", last_name="Ray", age=50, gender="M", phone="2", address="x", user_id=1)])
+        db.flush()
+        db.add_all([MedicalRecord(patient_id=p, doctor_id=1, diagnosis=f"Dx {p}", treatment="Rest",
+                                  visit_date=date(2024, 1, p)) for p in (1, 2)])
+        db.commit()
+
+    def session():
+        with Session() as db:
+            yield db
+
+    api = FastAPI()
+    api.include_router(records_router, prefix="/medical_records")
+    api.dependency_overrides[get_db] = session
+    api.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        id=1, email="bob@example.com", role=SimpleNamespace(name="patient"))
+    client = TestClient(api)
+
+    assert client.get("/medical_records/1?expand=patient").status_code == 403
+    own = client.get("/medical_records/2?expand=patient")
+    assert own.status_code == 200 and own.json()["patient"]["first_name"] == "Bob"
@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import create_engine
+
+from app.core.idempotency import IdempotencyMiddleware, IdempotencyStore
+from app.core.security import create_access_token
+from app.models import IdempotencyKey
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A file database: the middleware claims keys from several threads at once."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}")
+    IdempotencyKey.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+def make_app(engine, handler):
+    app = FastAPI()
+    calls = []
+
+    @app.post("/patients/")
+    async def create(payload: dict):
+        calls.append(payload)
+        return await handler(len(calls))
+
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(lambda: engine), wait_seconds=5)
+    return app, calls
+
+
+def post(app, *requests):
+    """Send the (body, key, user) requests concurrently."""
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/patients/", json=body, headers={
+                    "Idempotency-Key": key, "Authorization": f"Bearer {create_access_token({'sub': user})}"})
+                for body, key, user in requests
+            ))
+    return asyncio.run(run())
+
+
+async def created(count):
+    await asyncio.sleep(0.05)
+    return {"id": count}
+
+
+def test_retries_replay_the_stored_response(engine):
+    app, calls = make_app(engine, created)
+    first, = post(app, ({"name": "Ann"}, "k1", "doc@example.com"))
+    retry, = post(app, ({"name": "Ann"}, "k1", "doc@example.com"))
+    other_user, = post(app, ({"name": "Ann"}, "k1", "other@example.com"))
+    reused, = post(app, ({"name": "Bob"}, "k1", "doc@example.com"))
+
+    assert retry.json() == first.json() == {"id": 1} and retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true" and "idempotent-replayed" not in first.headers
+    assert other_user.json() == {"id": 2}
+    assert reused.status_code == 422
+    assert len(calls) == 2
+
+
+def test_concurrent_duplicates_wait_for_the_first(engine):
+    app, calls = make_app(engine, created)
+    responses = post(app, *[({"name": "Ann"}, "k1", "doc@example.com")] * 3)
+
+    assert [r.json() for r in responses] == [{"id": 1}] * 3
+    assert len(calls) == 1
+
+
+def test_server_errors_are_not_stored(engine):
+    async def flaky(count):
+        if count == 1:
+            raise HTTPException(status_code=503, detail="try again")
+        return {"id": count}
+
+    app, calls = make_app(engine, flaky)
+    failed, = post(app, ({"name": "Ann"}, "k1", "doc@example.com"))
+    retry, = post(app, ({"name": "Ann"}, "k1", "doc@example.com"))
+
+    assert failed.status_code == 503 and retry.json() == {"id": 2}
+    assert len(calls) == 2
+
+
+def test_a_slow_request_keeps_its_claim_past_the_lock_time(engine):
+    calls = []
+
+    def worker():
+        app = FastAPI()
+
+        @app.post("/patients/")
+        async def create(payload: dict):
+            calls.append(payload)
+            await asyncio.sleep(0.6)
+            return {"id": len(calls)}
+
+        store = IdempotencyStore(lambda: engine, lock_seconds=0.15)
+        app.add_middleware(IdempotencyMiddleware, store=store, wait_seconds=5)
+        return app
+
+    first, second = worker(), worker()
+    headers = {"Idempotency-Key": "k1", "Authorization": f"Bearer {create_access_token({'sub': 'doc@example.com'})}"}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(first), base_url="http://test") as a, \
+                httpx.AsyncClient(transport=httpx.ASGITransport(second), base_url="http://test") as b:
+            original = asyncio.create_task(a.post("/patients/", json={"name": "Ann"}, headers=headers))
+            await asyncio.sleep(0.4)  # well past the lock time: the claim lives on its renewals
+            return await asyncio.gather(original, b.post("/patients/", json={"name": "Ann"}, headers=headers))
+
+    responses = asyncio.run(run())
+    assert [r.json() for r in responses] == [{"id": 1}] * 2
+    assert len(calls) == 1
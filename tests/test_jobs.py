@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.jobs import JobRunner, enqueue, job_handler
+from app.jobs.queue import prune_jobs, release_stale_jobs
+from app.jobs.reminders import REMINDER_JOB, schedule_appointment_reminders
+from app.jobs.timers import TimerHeap
+from app.models import Appointment, Doctor, Job, JobStatus, Patient
+
+calls = []
+
+
+@job_handler("test_echo")
+def _echo(db, payload):
+    calls.append(payload)
+
+
+@job_handler("test_boom")
+def _boom(db, payload):
+    raise RuntimeError("boom")
+
+
+@job_handler("test_outlives_lock")
+def _outlives_lock(db, payload):
+    db.add(Patient(first_name="Written", last_name="Twice", age=1, gender="F", phone="9", address="-"))
+    # Past JOB_LOCK_TIMEOUT: another runner's scheduler requeues the job and someone else claims it
+    with db.get_bind().connect() as conn:
+        release_stale_jobs(Session(bind=conn), now=datetime.utcnow() + timedelta(days=1))
+
+
+def test_enqueue_dedupes_and_runner_completes(engine, db):
+    calls.clear()
+    assert enqueue(db, "test_echo", {"n": 1}, dedupe_key="echo:1")
+    assert not enqueue(db, "test_echo", {"n": 1}, dedupe_key="echo:1")
+    enqueue(db, "test_echo", {"n": 2}, run_at=datetime.utcnow() + timedelta(hours=1))
+    db.commit()
+
+    runner = JobRunner(sessionmaker(bind=engine))
+    assert runner.run_once() == 1  # the delayed job is not due yet
+    assert calls == [{"n": 1}]
+    assert runner.metrics.snapshot()["kinds"]["test_echo"]["succeeded"] == 1
+    assert db.query(Job).filter(Job.status == JobStatus.DONE).count() == 1
+
+
+def test_failing_job_backs_off_then_fails(engine, db):
+    enqueue(db, "test_boom", max_attempts=2)
+    db.commit()
+    runner = JobRunner(sessionmaker(bind=engine))
+
+    assert runner.run_once() == 1
+    job = db.query(Job).one()
+    assert job.status == JobStatus.QUEUED and job.run_at > datetime.utcnow()
+    assert job.last_error == "RuntimeError: boom"
+
+    job.run_at = datetime.utcnow()
+    db.commit()
+    assert runner.run_once() == 1
+    db.expire_all()
+    assert db.query(Job).one().status == JobStatus.FAILED
+
+
+def test_reminders_are_queued_once_per_appointment(engine, db):
+    patient = Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="Old Road")
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    db.add_all([patient, doctor])
+    db.flush()
+    now = datetime.utcnow()
+    db.add_all([
+        Appointment(patient_id=patient.id, doctor_id=doctor.id, appointment_date=now + timedelta(hours=2), reason="a"),
+        Appointment(patient_id=patient.id, doctor_id=doctor.id, appointment_date=now + timedelta(days=30), reason="b"),
+    ])
+    db.commit()
+
+    assert schedule_appointment_reminders(db, now) == 1
+    assert schedule_appointment_reminders(db, now) == 0
+    assert JobRunner(sessionmaker(bind=engine)).run_once() == 1
+    assert db.query(Job).filter(Job.kind == REMINDER_JOB).one().status == JobStatus.DONE
+
+
+def test_timer_heap_fires_in_due_order_and_repeats():
+    now = [0.0]
+    timers = TimerHeap(clock=lambda: now[0])
+    fired = []
+    timers.call_later(5, lambda: fired.append("late"))
+    timers.call_later(1, lambda: fired.append("tick"), interval=2)
+
+    now[0] = 1
+    assert timers.run_due() == 1
+    now[0] = 6  # a late scheduler fires each overdue timer once, no catch-up burst
+    assert timers.run_due() == 2
+    assert fired == ["tick", "tick", "late"]
+    assert timers.seconds_until_next() == 2
+
+
+def test_a_released_job_discards_its_late_outcome(engine, db):
+    enqueue(db, "test_outlives_lock")
+    db.commit()
+    runner = JobRunner(sessionmaker(bind=engine))
+
+    assert runner.run_once() == 1
+    assert runner.metrics.snapshot()["kinds"]["test_outlives_lock"]["lost"] == 1
+    job = db.query(Job).one()
+    assert (job.status, job.locked_by) == (JobStatus.QUEUED, None)  # left to whoever holds it now
+    assert db.query(Patient).filter(Patient.first_name == "Written").count() == 0
+
+
+def test_finished_jobs_are_pruned_after_retention(engine, db):
+    now = datetime.utcnow()
+    db.add_all([
+        Job(kind="k", payload={}, status=JobStatus.DONE, finished_at=now - timedelta(days=30)),
+        Job(kind="k", payload={}, status=JobStatus.FAILED, finished_at=now - timedelta(days=30)),
+        Job(kind="k", payload={}, status=JobStatus.DONE, finished_at=now),
+        Job(kind="k", payload={}, status=JobStatus.QUEUED, run_at=now - timedelta(days=30)),
+    ])
+    db.commit()
+
+    assert prune_jobs(db, now) == 2
+    assert sorted(job.status for job in db.query(Job)) == [JobStatus.DONE, JobStatus.QUEUED]
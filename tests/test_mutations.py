@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.dependencies import if_match_version
+from app.core.query_auditor import instrument_engine, query_budget
+from app.models import Appointment, Doctor, Patient
+from app.schemas.appointment import AppointmentUpdate
+from app.schemas.patient import PatientUpdate
+from app.services.appointment_service import update_appointment_status
+from app.services.patient_service import delete_patient, update_patient
+
+
+def _patient(db):
+    patient = Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="Old Road",
+                      medical_history="Asthma")
+    db.add(patient)
+    db.commit()
+    return patient
+
+
+def test_update_writes_only_set_fields_in_one_statement(engine, db):
+    instrument_engine(engine)
+    patient_id = _patient(db).id
+
+    with query_budget(1):
+        updated = update_patient(db, patient_id, PatientUpdate(address="New Road"))
+
+    assert updated.address == "New Road"
+    assert updated.medical_history == "Asthma"
+    assert updated.first_name == "Ann"
+
+
+def test_update_and_delete_keep_404(db):
+    with pytest.raises(HTTPException) as exc:
+        update_patient(db, 999, PatientUpdate(address="x"))
+    assert exc.value.status_code == 404
+
+    with pytest.raises(HTTPException) as exc:
+        delete_patient(db, 999)
+    assert exc.value.status_code == 404
+
+
+def test_delete_is_one_statement(engine, db):
+    instrument_engine(engine)
+    patient_id = _patient(db).id
+
+    with query_budget(1):
+        delete_patient(db, patient_id)
+    assert db.query(Patient).count() == 0
+
+
+def test_appointment_update_checks_owner(db):
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    patient = _patient(db)
+    db.add(doctor)
+    db.flush()
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, appointment_date=datetime(2030, 1, 1),
+                              reason="Checkup")
+    db.add(appointment)
+    db.commit()
+
+    assert update_appointment_status(db, appointment.id, AppointmentUpdate(status="confirmed"), doctor.id + 1) is None
+    updated = update_appointment_status(db, appointment.id, AppointmentUpdate(status="confirmed"), doctor.id)
+    assert updated.status == "confirmed"
+
+
+def test_stale_version_is_a_409_and_writes_nothing(engine, db):
+    instrument_engine(engine)
+    patient_id = _patient(db).id
+
+    with query_budget(1):
+        updated = update_patient(db, patient_id, PatientUpdate(address="New Road"), expected_version=1)
+    db.commit()
+    assert updated.version == 2
+
+    with pytest.raises(HTTPException) as exc:
+        update_patient(db, patient_id, PatientUpdate(address="Stale Road"), expected_version=1)
+    assert exc.value.status_code == 409
+    db.rollback()
+    assert db.get(Patient, patient_id).address == "New Road"
+
+    with pytest.raises(HTTPException) as exc:
+        update_patient(db, 999, PatientUpdate(address="x"), expected_version=1)
+    assert exc.value.status_code == 404
+
+
+def test_if_match_parses_etags():
+    assert if_match_version(None) is None and if_match_version("*") is None
+    assert if_match_version('"3"') == 3 and if_match_version('W/"3"') == 3
+    with pytest.raises(HTTPException) as exc:
+        if_match_version("3")
+    assert exc.value.status_code == 400
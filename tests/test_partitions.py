@@ -0,0 +1,85 @@
+from datetime import date
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes.medical_records import router
+from app.core.security import get_current_user
+from app.db.partitions import (
+    add_months, archive_partition, archive_partitions, ensure_partitions, parse_partition_month, partition_name
+)
+from app.db.routing import RoutingSession
+from app.db.session import get_db
+from app.models import MedicalRecord, Patient
+
+
+def test_month_arithmetic_and_names():
+    assert add_months(date(2025, 11, 17), 0) == date(2025, 11, 1)
+    assert add_months(date(2025, 11, 17), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 31), -1) == date(2024, 12, 1)
+    assert partition_name("medical_records", date(2026, 2, 1)) == "medical_records_2026_02"
+    assert parse_partition_month("medical_records", "medical_records_2026_02") == date(2026, 2, 1)
+    assert parse_partition_month("medical_records", "medical_records_default") is None
+
+
+def test_maintenance_is_a_no_op_off_postgresql(engine):
+    assert ensure_partitions(engine, months_ahead=3) == []
+    assert archive_partitions(engine, after_months=1, tablespace="archive") == []
+
+
+class _RecordingConnection:
+    """Records the SQL archive_partition runs; answers its two catalog queries."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if "information_schema.columns" in sql:
+            rows = ["id", "patient_id", "diagnosis", "visit_date", "notes"]
+        elif "pg_indexes" in sql:
+            rows = ["medical_records_2024_01_pkey"]
+        else:
+            rows = []
+        return SimpleNamespace(scalars=lambda: iter(rows))
+
+
+def test_archiving_rewrites_the_partition_and_moves_its_indexes():
+    conn = _RecordingConnection()
+    archive_partition(conn, "medical_records", "medical_records_2024_01", date(2024, 1, 1), "archive")
+    sql = [s for s in conn.statements if "information_schema" not in s and "pg_indexes" not in s]
+
+    assert sql[0] == "ALTER TABLE medical_records DETACH PARTITION medical_records_2024_01"
+    assert "TABLESPACE archive" in sql[1] and "EXCLUDING INDEXES" in sql[1]
+    assert ("INSERT INTO medical_records_2024_01_archive (id, patient_id, diagnosis, visit_date, notes) "
+            "SELECT id, patient_id, diagnosis || '', visit_date, notes || '' FROM medical_records_2024_01") in sql
+    assert sql.index("ALTER TABLE medical_records_2024_01_archive RENAME TO medical_records_2024_01") < sql.index(
+        "ALTER TABLE medical_records ATTACH PARTITION medical_records_2024_01 "
+        "FOR VALUES FROM ('2024-01-01') TO ('2024-02-01')")
+    assert "ALTER INDEX medical_records_2024_01_pkey SET TABLESPACE archive" in sql
+
+
+def test_patients_list_only_their_own_records(engine):
+    Session = sessionmaker(class_=RoutingSession, autoflush=False, expire_on_commit=False, bind=engine)
+    with Session() as db:
+        # User 1 owns patient 2, not patient 1
+        db.add_all([Patient(first_name="Ann", last_name="Lee", age=40, gender="F", phone="1", address="x", user_id=2),
+                    Patient(first_name="Bob", last_name="Ray", age=50, gender="M", phone="2", address="x", user_id=1)])
+        db.flush()
+        db.add_all([MedicalRecord(patient_id=p, doctor_id=1, diagnosis=f"Dx {p}", treatment="Rest",
+                                  visit_date=date(2024, 1, p)) for p in (1, 2)])
+        db.commit()
+
+    def session():
+        with Session() as db:
+            yield db
+
+    api = FastAPI()
+    api.include_router(router, prefix="/medical_records")
+    api.dependency_overrides[get_db] = session
+    api.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        id=1, email="bob@example.com", role=SimpleNamespace(name="patient"))
+    assert [r["diagnosis"] for r in TestClient(api).get("/medical_records/").json()] == ["Dx 2"]
@@ -0,0 +1,103 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.query_auditor import (
+    QueryAuditMiddleware, QueryBudgetExceeded, audit_queries, clear_query_budgets, declare_query_budget, fingerprint,
+    instrument_engine, query_budget,
+)
+from app.models import Doctor, Patient
+
+
+def _seed(db, n_patients=6):
+    doctor = Doctor(name="Dr. A", specialty="GP", email="a@example.com", contact="1", experience=3, hashed_password="x")
+    db.add(doctor)
+    db.flush()
+    for i in range(n_patients):
+        db.add(Patient(first_name=f"P{i}", last_name="X", age=30, gender="F", phone=str(i), address="-", doctor_id=doctor.id))
+    db.commit()
+    db.expunge_all()
+
+
+def test_fingerprint_ignores_literals():
+    assert fingerprint("SELECT * FROM patients WHERE id = 1") == fingerprint("select *  from patients where id = 42")
+    assert fingerprint("SELECT 1 FROM t WHERE name = 'bob'") == fingerprint("SELECT 1 FROM t WHERE name = 'alice'")
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == fingerprint("SELECT * FROM t WHERE id IN (?)")
+
+
+def test_lazy_relationship_loop_is_flagged_as_n_plus_one(engine, db):
+    instrument_engine(engine)
+    _seed(db)
+
+    with audit_queries("patients loop") as audit:
+        for patient in db.query(Patient).all():
+            patient.appointments  # lazy load per row
+    assert audit.repeated(threshold=5)
+
+
+def test_query_budget(engine, db):
+    instrument_engine(engine)
+    _seed(db, n_patients=2)
+
+    with query_budget(1):
+        db.query(Patient).all()
+
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(1):
+            db.query(Patient).all()
+            db.query(Doctor).all()
+
+
+def test_failed_statements_leave_no_timing_state(engine):
+    instrument_engine(engine)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.rollback()
+        with audit_queries() as audit:
+            conn.execute(text("SELECT 1"))
+        assert audit.query_count == 1
+        assert not conn.info.get("query_start_time")
+
+
+@pytest.fixture
+def api(engine, monkeypatch):
+    instrument_engine(engine)
+    Session = sessionmaker(bind=engine)
+
+    def session():
+        with Session() as db:
+            yield db
+
+    app = FastAPI()
+    app.add_middleware(QueryAuditMiddleware)
+
+    @app.get("/patients/{n}")
+    def patients(n: int, db=Depends(session, scope="function")):
+        return [len(db.query(Patient).all()) for _ in range(n)]
+
+    declare_query_budget("GET", "/patients/{n}", 2)
+    yield TestClient(app)
+    clear_query_budgets()
+
+
+def test_endpoint_budget_is_logged_per_route(api, caplog):
+    assert api.get("/patients/2").json() == [0, 0]
+    assert "budget" not in caplog.text
+
+    assert api.get("/patients/3").status_code == 200
+    assert "GET /patients/{n} issued 3 queries (budget 2)" in caplog.text
+
+
+def test_strict_endpoint_budget_fails_the_request_before_it_is_sent(api, monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_BUDGET_STRICT", True)
+    assert api.get("/patients/2").status_code == 200
+
+    over = api.get("/patients/3")
+    assert over.status_code == 500
+    assert over.json() == {"detail": "GET /patients/{n} issued 3 queries (budget 2)"}
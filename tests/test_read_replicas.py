@@ -0,0 +1,133 @@
+import threading
+import time
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.routing import ReadYourWritesMiddleware, ReplicaSet, RoutingSession, read_only, track_writes
+from app.models import Medicine
+
+
+def _database(path, marker):
+    """A SQLite database holding one medicine whose name tells us which database answered."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(Medicine.__table__.insert(), {"id": 1, "name": marker, "manufacturer": "x", "price": 1.0,
+                                                   "stock": 1, "expiry_date": "2030-01-01"})
+    return engine
+
+
+@read_only
+def _read_name(db):
+    return db.query(Medicine.name).filter(Medicine.id == 1).scalar()
+
+
+def _session_factory(tmp_path, lag=0.0, sticky_seconds=5.0):
+    primary = _database(tmp_path / "primary.db", "primary")
+    replica = _database(tmp_path / "replica.db", "replica")
+    replicas = ReplicaSet([replica], max_lag=10.0, check_interval=60.0, sticky_seconds=sticky_seconds,
+                          lag_probe=lambda engine: lag)
+    replicas.refresh()
+    return sessionmaker(class_=RoutingSession, bind=primary, info={"replicas": replicas})
+
+
+def test_read_only_calls_use_replica_and_other_reads_use_primary(tmp_path):
+    db = _session_factory(tmp_path)()
+    assert _read_name(db) == "replica"
+    assert db.query(Medicine.name).filter(Medicine.id == 1).scalar() == "primary"
+
+
+def test_principal_reads_own_writes_from_primary(tmp_path):
+    factory = _session_factory(tmp_path)
+    writer = factory(info={"principal": "doc@example.com"})
+    writer.add(Medicine(name="new", manufacturer="x", price=1.0, stock=1, expiry_date="2030-01-01"))
+    writer.commit()
+
+    assert _read_name(factory(info={"principal": "doc@example.com"})) == "primary"
+    assert _read_name(factory(info={"principal": "other@example.com"})) == "replica"
+
+
+def test_sticky_window_expires(tmp_path):
+    factory = _session_factory(tmp_path, sticky_seconds=0.0)
+    writer = factory(info={"principal": "doc@example.com"})
+    writer.add(Medicine(name="new", manufacturer="x", price=1.0, stock=1, expiry_date="2030-01-01"))
+    writer.commit()
+
+    assert _read_name(factory(info={"principal": "doc@example.com"})) == "replica"
+
+
+def test_lagging_replica_is_taken_out_of_rotation(tmp_path):
+    db = _session_factory(tmp_path, lag=60.0)()
+    assert _read_name(db) == "primary"
+
+
+def test_a_hung_replica_probe_never_blocks_a_request(tmp_path):
+    replica = _database(tmp_path / "replica.db", "replica")
+    answered = threading.Event()
+    replicas = ReplicaSet([replica], check_interval=0.0, lag_probe=lambda engine: answered.wait(10) and 0.0)
+
+    started = time.monotonic()
+    assert replicas.choose() is None  # probing in the background; the primary serves meanwhile
+    assert replicas.choose() is None
+    assert time.monotonic() - started < 1.0
+
+    answered.set()
+    replicas._probe.join()
+    assert replicas.choose() is replica
+
+
+def test_stickiness_travels_with_the_client_to_other_workers(tmp_path):
+    primary = _database(tmp_path / "primary.db", "primary")
+    replica = _database(tmp_path / "replica.db", "replica")
+    # Two workers: each has its own ReplicaSet, so neither knows what the other saw written
+    workers = []
+    for _ in range(2):
+        replicas = ReplicaSet([replica], check_interval=60.0, lag_probe=lambda engine: 0.0)
+        replicas.refresh()
+        workers.append(sessionmaker(class_=RoutingSession, bind=primary, info={"replicas": replicas}))
+
+    with track_writes() as mark:
+        writer = workers[0](info={"principal": "doc@example.com"})
+        writer.add(Medicine(name="new", manufacturer="x", price=1.0, stock=1, expiry_date="2030-01-01"))
+        writer.commit()
+    with track_writes(mark.at):
+        assert _read_name(workers[1](info={"principal": "doc@example.com"})) == "primary"
+    with track_writes(None):
+        assert _read_name(workers[1](info={"principal": "doc@example.com"})) == "replica"
+
+
+def test_middleware_returns_and_reads_the_last_write(tmp_path):
+    factory = _session_factory(tmp_path)
+
+    def get_session():
+        db = factory(info={"principal": "doc@example.com"})
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware, sticky_seconds=5.0)
+
+    @app.post("/write")
+    def write(db=Depends(get_session, scope="function")):
+        db.add(Medicine(name="new", manufacturer="x", price=1.0, stock=1, expiry_date="2030-01-01"))
+
+    @app.get("/read")
+    def read(db=Depends(get_session, scope="function")):
+        return _read_name(db)
+
+    fresh = TestClient(app)
+    assert fresh.get("/read").json() == "replica"
+    written = fresh.post("/write")
+    assert "last_write=" in written.headers["set-cookie"] and "Max-Age=5" in written.headers["set-cookie"]
+    factory.kw["info"]["replicas"]._recent_writes.clear()  # as if served by another worker
+    assert fresh.get("/read").json() == "primary"  # cookie
+    other = TestClient(app)
+    assert other.get("/read", headers={"X-Last-Write": written.headers["X-Last-Write"]}).json() == "primary"
+    assert other.get("/read").json() == "replica"
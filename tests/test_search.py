@@ -0,0 +1,101 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert, update
+
+from app.core.config import settings
+from app.models import Doctor, MedicalRecord, Patient
+from app.schemas.medical_record import MedicalRecordCreate, MedicalRecordUpdate
+from app.services import search_service
+from app.services.medical_record_service import create_medical_records, delete_medical_record, update_medical_record
+from app.services.search_service import MemorySearchIndex, SearchScope, search_medical_records
+
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch):
+    index = MemorySearchIndex()
+    monkeypatch.setattr(search_service, "_memory_index", index)
+    return index
+
+
+@pytest.fixture
+def records(db):
+    doctors = [Doctor(name=f"Dr. {n}", specialty="GP", email=f"{n}@example.com", contact=n, experience=3,
+                      hashed_password="x") for n in "AB"]
+    db.add_all(doctors)
+    db.flush()
+    patients = [Patient(first_name="P", last_name=str(n), age=40, gender="F", phone=str(n), address="x")
+                for n in range(2)]
+    patients[1].doctor_id = doctors[1].id
+    db.add_all(patients)
+    db.flush()
+    visits = [
+        (patients[0], doctors[0], "Acute bronchitis", "Rest and fluids", None, "Smoker"),
+        (patients[0], doctors[0], "Hypertension", "Lifestyle changes", "Amlodipine", "History of bronchitis"),
+        (patients[1], doctors[0], "Chronic bronchitis <flare>", "Inhaler", "Salbutamol", None),
+    ]
+    created = create_medical_records(db, [
+        MedicalRecordCreate(patient_id=p.id, doctor_id=d.id, diagnosis=dx, treatment=tx, prescribed_medicines=rx,
+                            visit_date=date(2024, 5, 1), notes=notes)
+        for p, d, dx, tx, rx, notes in visits
+    ])
+    db.commit()
+    return [r.id for r in created], [p.id for p in patients], [d.id for d in doctors]
+
+
+def test_search_ranks_pages_and_highlights(db, records):
+    record_ids, _, _ = records
+    first = search_medical_records(db, "bronchitis", SearchScope(), limit=2)
+    rest = search_medical_records(db, "bronchitis", SearchScope(), cursor=first["next_cursor"], limit=2)
+
+    hits = first["results"] + rest["results"]
+    assert [h["record"].id for h in hits] == [record_ids[2], record_ids[0], record_ids[1]]  # diagnosis beats notes
+    assert rest["next_cursor"] is None
+    assert hits[0]["highlight"] == "Chronic <mark>bronchitis</mark> &lt;flare&gt;"
+    assert [h["record"].id for h in search_medical_records(db, "bronchitis smoker", SearchScope())["results"]] == [
+        record_ids[0]]
+    with pytest.raises(HTTPException):
+        search_medical_records(db, "bronchitis", SearchScope(), cursor="not-a-cursor")
+
+
+def test_search_is_scoped_to_the_caller(db, records):
+    record_ids, patient_ids, doctor_ids = records
+    by_patient = search_medical_records(db, "bronchitis", SearchScope(patient_id=patient_ids[1]))
+    by_assigned_doctor = search_medical_records(db, "bronchitis", SearchScope(doctor_id=doctor_ids[1]))
+
+    assert [h["record"].id for h in by_patient["results"]] == [record_ids[2]]
+    assert [h["record"].id for h in by_assigned_doctor["results"]] == [record_ids[2]]
+
+
+def test_index_follows_committed_changes_only(db, records):
+    record_ids, _, _ = records
+    search_medical_records(db, "bronchitis", SearchScope())  # builds the index
+
+    update_medical_record(db, record_ids[0], MedicalRecordUpdate(diagnosis="Pneumonia"))
+    db.rollback()
+    assert search_medical_records(db, "pneumonia", SearchScope())["results"] == []
+
+    update_medical_record(db, record_ids[0], MedicalRecordUpdate(diagnosis="Pneumonia"))
+    delete_medical_record(db, record_ids[2])
+    db.commit()
+    assert [h["record"].id for h in search_medical_records(db, "pneumonia", SearchScope())["results"]] == [
+        record_ids[0]]
+    assert [h["record"].id for h in search_medical_records(db, "bronchitis", SearchScope())["results"]] == [
+        record_ids[1]]
+
+
+def test_index_picks_up_other_workers_writes(db, records, monkeypatch):
+    record_ids, patient_ids, doctor_ids = records
+    search_medical_records(db, "bronchitis", SearchScope())  # builds the index
+
+    # Committed by another worker: no search_pending reaches this process's index
+    db.execute(insert(MedicalRecord).values(patient_id=patient_ids[0], doctor_id=doctor_ids[0], diagnosis="Asthma",
+                                            treatment="Inhaler", visit_date=date(2024, 6, 1)))
+    db.execute(update(MedicalRecord).where(MedicalRecord.id == record_ids[1]).values(diagnosis="Gout"))
+    db.commit()
+    assert len(search_medical_records(db, "asthma", SearchScope())["results"]) == 1  # inserts: next search
+    assert search_medical_records(db, "gout", SearchScope())["results"] == []
+
+    monkeypatch.setattr(settings, "SEARCH_REFRESH_SECONDS", 0)
+    assert [h["record"].id for h in search_medical_records(db, "gout", SearchScope())["results"]] == [record_ids[1]]
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.db import session as session_module
+from app.serve import background_connections, dispose_inherited_engines, plan_worker_resources
+
+
+def test_budget_covers_background_and_listen_connections(monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_ENABLED", True)
+    monkeypatch.setattr(settings, "JOBS_IN_PROCESS", True)
+    monkeypatch.setattr(settings, "JOB_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "IDEMPOTENCY_ENABLED", True)
+    background = background_connections()
+    resources = plan_worker_resources(40, 4, background=background, listen=1)
+
+    assert background == 5  # audit writer, two job threads, the scheduler, idempotency
+    assert resources.pool_size + 1 == 10  # primary pool plus LISTEN: the worker's share of 40
+    assert resources.threadpool_size == resources.pool_size - background == 4
+    assert resources.secondary_pool_size == 10 and resources.max_overflow == 0
+
+
+def test_a_tight_budget_keeps_one_request_thread(monkeypatch):
+    resources = plan_worker_resources(8, 4, background=3, listen=1)
+    assert (resources.threadpool_size, resources.pool_size) == (1, 4)
+
+
+def test_forked_workers_drop_every_inherited_pool(monkeypatch):
+    disposed = []
+
+    def engine(name):
+        return SimpleNamespace(dispose=lambda close=True: disposed.append((name, close)))
+
+    primary = engine("primary")
+    monkeypatch.setattr(session_module, "engine", primary)
+    monkeypatch.setattr(session_module, "replica_set", SimpleNamespace(engines=[engine("replica")]))
+    monkeypatch.setattr(session_module, "shard_map", SimpleNamespace(engines={"": primary, "east": engine("east")}))
+    dispose_inherited_engines()
+
+    assert disposed == [("primary", False), ("replica", False), ("east", False)]
@@ -0,0 +1,160 @@
+import base64
+from datetime import date, datetime, timedelta
+
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes import routes as admin_routes
+from app.core import crypto
+from app.db.base import Base
+from app.db.routing import RoutingSession
+from app.db.sharding import CrossShardError, ShardMap, init_shards, use_shard
+from app.jobs.reminders import schedule_appointment_reminders
+from app.models import Appointment, Patient, User
+from app.models.role import seed_roles
+from app.schemas.doctor import DoctorCreate
+from app.schemas.medical_record import MedicalRecordCreate
+from app.services import assignment_service, cohort_service
+from app.services.assignment_service import DoctorLoadIndex, assign_patient, get_load_index
+from app.services.cohort_service import CohortIndex, get_cohort_index
+from app.services.doctor_service import create_doctor, get_doctors
+from app.services.medical_record_service import create_medical_record, get_all_medical_records, get_medical_record_by_id
+
+
+@pytest.fixture
+def shards(tmp_path):
+    directory = create_engine(f"sqlite:///{tmp_path / 'directory.db'}")
+    Base.metadata.create_all(bind=directory)
+    shard_map = ShardMap(
+        directory,
+        {name: create_engine(f"sqlite:///{tmp_path / name}.db") for name in ("north", "south")},
+        {"North General": "north", "South Clinic": "south"},
+        id_span=1000,
+    )
+    init_shards(shard_map)
+    factory = sessionmaker(class_=RoutingSession, bind=directory, expire_on_commit=False, info={"shards": shard_map})
+    with factory() as db:
+        seed_roles(db)
+        db.commit()
+    yield shard_map, factory
+    for engine in shard_map.engines.values():
+        engine.dispose()
+
+
+def add_doctor(factory, name, hospital):
+    with factory() as db:
+        doctor = create_doctor(db, DoctorCreate(name=name, specialty="GP", email=f"{name}@example.com", contact=name,
+                                                experience=5, hospital=hospital, password="secret"))
+        patient = Patient(first_name=name, last_name="Patient", age=30, gender="F", phone=name, address="x",
+                          doctor_id=doctor.id)
+        db.add(patient)
+        db.commit()
+        return doctor.id, patient.id
+
+
+def add_record(factory, patient_id, doctor_id, visit):
+    with factory() as db:
+        record = create_medical_record(db, MedicalRecordCreate(patient_id=patient_id, doctor_id=doctor_id,
+                                                               diagnosis="Flu", treatment="Rest", visit_date=visit))
+        db.commit()
+        return record.id
+
+
+def test_clinical_rows_live_on_their_hospitals_shard(shards):
+    shard_map, factory = shards
+    north_doctor, north_patient = add_doctor(factory, "north", "North General")
+    south_doctor, south_patient = add_doctor(factory, "south", "South Clinic")
+    record = add_record(factory, south_patient, south_doctor, date(2026, 3, 1))
+
+    assert 1000 < north_doctor <= 2000 and 2000 < south_doctor <= 3000 and 2000 < record <= 3000
+    with shard_map.engine("south").connect() as conn:
+        assert conn.execute(text("SELECT id FROM medical_records")).scalars().all() == [record]
+    with shard_map.engine("north").connect() as conn:
+        assert conn.execute(text("SELECT id FROM patients")).scalars().all() == [north_patient]
+    with factory() as db:
+        assert {u.shard for u in db.query(User).filter(User.email.like("%@example.com"))} == {"north", "south"}
+        assert get_medical_record_by_id(db, record).patient_id == south_patient
+
+
+def test_admin_lists_merge_every_shard_in_order(shards):
+    _, factory = shards
+    north_doctor, north_patient = add_doctor(factory, "north", "North General")
+    south_doctor, south_patient = add_doctor(factory, "south", "South Clinic")
+    home_doctor, home_patient = add_doctor(factory, "home", None)
+    visits = {
+        add_record(factory, north_patient, north_doctor, date(2026, 1, 10)): date(2026, 1, 10),
+        add_record(factory, south_patient, south_doctor, date(2026, 1, 20)): date(2026, 1, 20),
+        add_record(factory, home_patient, home_doctor, date(2026, 1, 15)): date(2026, 1, 15),
+        add_record(factory, north_patient, north_doctor, date(2026, 1, 25)): date(2026, 1, 25),
+    }
+    newest_first = sorted(visits, key=lambda record_id: (visits[record_id], record_id), reverse=True)
+
+    with factory() as db:
+        assert [d.id for d in get_doctors(db)] == sorted([north_doctor, south_doctor, home_doctor])
+        assert [r.id for r in get_all_medical_records(db, skip=0, limit=10)] == newest_first
+        assert [r.id for r in get_all_medical_records(db, skip=1, limit=2)] == newest_first[1:3]
+        assert [r.id for r in get_all_medical_records(db, patient_id=north_patient)] == newest_first[0:4:3]
+
+
+def test_records_cannot_tie_together_hospitals_on_different_shards(shards):
+    _, factory = shards
+    north_doctor, _ = add_doctor(factory, "north", "North General")
+    _, south_patient = add_doctor(factory, "south", "South Clinic")
+
+    with pytest.raises(CrossShardError):
+        add_record(factory, south_patient, north_doctor, date(2026, 1, 1))
+
+
+def test_process_indexes_cover_the_directory_whatever_the_session_shard(shards, monkeypatch):
+    _, factory = shards
+    _, north_patient = add_doctor(factory, "north", "North General")
+    home_doctor, home_patient = add_doctor(factory, "home", None)
+    monkeypatch.setattr(assignment_service, "_index", DoctorLoadIndex())
+    monkeypatch.setattr(cohort_service, "_index", CohortIndex())
+
+    with factory() as db:
+        use_shard(db, "north")  # a north user's request
+        assert [row["doctor_id"] for row in get_load_index(db).snapshot()] == [home_doctor]
+        assert list(get_cohort_index(db)._keys) == [home_patient]
+        assert db.info["shard"] == "north"
+        with pytest.raises(CrossShardError):
+            assign_patient(db, north_patient, reassign=True)
+
+
+def test_reencrypt_covers_every_shard(shards, monkeypatch):
+    shard_map, factory = shards
+    monkeypatch.setattr(crypto, "_keyring", None)
+    keyring = crypto.configure_keyring(AESGCM.generate_key(256), lambda: shard_map.engine(None))
+    keyring.create_data_key("patients")  # not from inside a session's write transaction (SQLite locks)
+    add_doctor(factory, "north", "North General")
+    add_doctor(factory, "home", None)
+    new_key = keyring.create_data_key("patients")
+
+    with factory() as db:
+        assert crypto.reencrypt_all(db)["patients"] == 2
+    with shard_map.engine("north").connect() as conn:
+        phone = conn.execute(text("SELECT phone FROM patients")).scalar()
+    assert crypto._HEADER.unpack_from(base64.b64decode(phone[len(crypto.PREFIX):]))[0] == new_key
+
+
+def test_admin_routes_and_reminders_cover_every_shard(shards):
+    _, factory = shards
+    north_doctor, north_patient = add_doctor(factory, "north", "North General")
+    home_doctor, home_patient = add_doctor(factory, "home", None)
+    records = [add_record(factory, north_patient, north_doctor, date(2026, 1, 10)),
+               add_record(factory, home_patient, home_doctor, date(2026, 1, 11))]
+    now = datetime(2026, 3, 1, 9)
+    with factory() as db:
+        for doctor_id, patient_id in ((north_doctor, north_patient), (home_doctor, home_patient)):
+            use_shard(db, db.info["shards"].for_id(patient_id))
+            db.add(Appointment(patient_id=patient_id, doctor_id=doctor_id, reason="Checkup",
+                               appointment_date=now + timedelta(hours=2)))
+            db.flush()
+        db.commit()
+
+    with factory() as db:
+        assert [r.id for r in admin_routes.get_all_medical_records(db=db)] == sorted(records)
+        assert len(admin_routes.get_all_appointments(db=db)) == 2
+        assert schedule_appointment_reminders(db, now) == 2
@@ -0,0 +1,48 @@
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+import app.db.session as session_module
+from app.db.routing import RoutingSession
+from app.models import Role
+from app.services.auth_service import create_role
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    monkeypatch.setattr(session_module, "SessionLocal", sessionmaker(class_=RoutingSession, autoflush=False,
+                                                                     expire_on_commit=False, bind=engine))
+    sessions = []
+
+    def current_session(db=Depends(session_module.get_db, scope="function")):
+        return db
+
+    api = FastAPI()
+
+    @api.post("/roles/{name}")
+    def make_role(name: str, fail: bool = False, db=Depends(session_module.get_db, scope="function"),
+                  same_db=Depends(current_session)):
+        sessions.append(db is same_db)
+        create_role(db, name, ["read_patient", "edit_patient"])
+        if fail:
+            raise HTTPException(status_code=409, detail="conflict")
+        return {"ok": True}
+
+    return TestClient(api), sessions
+
+
+def test_request_commits_once_and_shares_one_session(client, db):
+    api, sessions = client
+
+    assert api.post("/roles/nurse").status_code == 200
+    assert sessions == [True]
+    role = db.query(Role).filter(Role.name == "nurse").one()
+    assert sorted(p.action for p in role.permissions) == ["edit_patient", "read_patient"]
+
+
+def test_error_rolls_back_every_step(client, db):
+    api, _ = client
+
+    assert api.post("/roles/nurse?fail=true").status_code == 409
+    assert db.query(Role).filter(Role.name == "nurse").count() == 0